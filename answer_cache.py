@@ -0,0 +1,221 @@
+"""
+Module Answer Cache - Cache des réponses devant QASystem.ask
+
+Deux niveaux :
+1. exact     : question normalisée (casse, accents, ponctuation, espaces)
+2. sémantique: similarité cosinus entre embeddings de questions, au-dessus
+               d'un seuil configurable, avec le modèle d'embedding existant
+
+Éviction LRU + TTL, budget mémoire, et invalidation complète quand
+l'index vectoriel change (empreinte du manifeste).
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import replace
+
+import numpy as np
+
+# Références numériques (articles, montants, durées) qui doivent être
+# identiques pour qu'une réponse sémantiquement proche soit réutilisée
+_NUMBER_RE = re.compile(r"\d+(?:[-.]\d+)*")
+_PUNCT_RE = re.compile(r"[^\w\s-]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normaliser une question pour le cache exact"""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+class _Entry:
+    __slots__ = ("result", "embedding", "numbers", "size", "created_at")
+
+    def __init__(self, result, embedding, numbers, size):
+        self.result = result
+        self.embedding = embedding
+        self.numbers = numbers
+        self.size = size
+        self.created_at = time.monotonic()
+
+
+class CacheLookup:
+    """Résultat d'une recherche dans le cache (réutilisé pour store())"""
+
+    def __init__(self, key: str, result=None, tier: str = None, embedding=None):
+        self.key = key
+        self.result = result
+        self.tier = tier
+        self.embedding = embedding
+
+    @property
+    def hit(self) -> bool:
+        return self.result is not None
+
+
+def _entry_size(result, embedding) -> int:
+    """Estimation de l'empreinte mémoire d'une entrée (octets)"""
+    chars = len(result.question) + len(result.answer or "")
+    chars += sum(len(chunk.content) for chunk in result.chunks)
+    size = 2 * chars + 256 * (len(result.chunks) + 1)
+    if embedding is not None:
+        size += embedding.nbytes
+    return size
+
+
+class AnswerCache:
+    """
+    Cache de réponses à deux niveaux
+
+    Args:
+        embed_fn: Fonction texte -> vecteur (None désactive le niveau sémantique)
+        similarity_threshold: Similarité cosinus minimale pour un hit sémantique
+        max_entries: Nombre maximal d'entrées (LRU)
+        ttl: Durée de vie d'une entrée en secondes (0 = illimitée)
+        max_bytes: Budget mémoire approximatif
+    """
+
+    def __init__(self, embed_fn=None, similarity_threshold: float = 0.92,
+                 max_entries: int = 1024, ttl: float = 3600, max_bytes: int = 64 * 1024 * 1024):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.index_version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._matrix_keys = []
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ---------- gestion des entrées ----------
+
+    def _expired(self, entry: _Entry) -> bool:
+        return bool(self.ttl) and time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            if entry.embedding is not None:
+                self._matrix = None
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def _semantic_matrix(self):
+        """Matrice des embeddings (reconstruite paresseusement)"""
+        if self._matrix is None:
+            keys = [k for k, e in self._entries.items() if e.embedding is not None]
+            self._matrix_keys = keys
+            self._matrix = np.stack([self._entries[k].embedding for k in keys]) if keys else None
+        return self._matrix
+
+    def _embed(self, text: str):
+        vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # ---------- API ----------
+
+    def set_index_version(self, version: str):
+        """Vider le cache si l'index vectoriel a changé"""
+        with self._lock:
+            if version != self.index_version:
+                if self.index_version is not None:
+                    self.invalidations += 1
+                self.index_version = version
+                self._entries.clear()
+                self._bytes = 0
+                self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._matrix = None
+
+    def lookup(self, question: str) -> CacheLookup:
+        """Chercher une réponse (exact puis sémantique)"""
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits_exact += 1
+                return CacheLookup(key, entry.result, "exact")
+
+        if self.embed_fn is None:
+            with self._lock:
+                self.misses += 1
+            return CacheLookup(key)
+
+        # Encodage hors verrou: c'est l'étape la plus coûteuse
+        embedding = self._embed(question)
+        numbers = _NUMBER_RE.findall(key)
+        with self._lock:
+            matrix = self._semantic_matrix()
+            if matrix is not None:
+                scores = matrix @ embedding
+                for index in np.argsort(-scores):
+                    if scores[index] < self.similarity_threshold:
+                        break
+                    candidate_key = self._matrix_keys[index]
+                    candidate = self._entries.get(candidate_key)
+                    if candidate is None or self._expired(candidate) or candidate.numbers != numbers:
+                        continue
+                    self._entries.move_to_end(candidate_key)
+                    self.hits_semantic += 1
+                    return CacheLookup(key, candidate.result, "semantic", embedding)
+            self.misses += 1
+        return CacheLookup(key, embedding=embedding)
+
+    def store(self, lookup: CacheLookup, result):
+        """Enregistrer une réponse calculée après un miss"""
+        if not result.answer:
+            return
+        # Les temps d'exécution ne sont pas réutilisés tels quels
+        result = replace(result, timings={})
+        entry = _Entry(result, lookup.embedding, _NUMBER_RE.findall(lookup.key),
+                       _entry_size(result, lookup.embedding))
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(lookup.key)
+            self._entries[lookup.key] = entry
+            self._bytes += entry.size
+            if entry.embedding is not None:
+                self._matrix = None
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_exact + self.hits_semantic) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "index_version": self.index_version,
+            }
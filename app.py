@@ -2,9 +2,16 @@ print("Importing sys, os, io, Path...")
 import sys
 import os
 import io
+import json
+import math
+import time
+import asyncio
+import threading
 from pathlib import Path
 print("Importing contextlib, logging...")
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from dataclasses import replace
 import logging
 
 print("BOOTING SERVER...")
@@ -36,10 +43,11 @@ sys.path.insert(0, str(BASE_DIR))
 
 print("Importing FastAPI components...")
 # Imports FastAPI
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
 import uvicorn
 from dotenv import load_dotenv
@@ -50,48 +58,72 @@ load_dotenv()
 # ============================================================
 # LOGGING
 # ============================================================
+# LOG_LEVEL=DEBUG: réponses et trace de chaque requête (désactivé par défaut)
 logger = logging.getLogger("legal-ai-api")
-logger.setLevel(logging.INFO)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
 
 # Variables globales pour le système RAG
 qa_system = None
 config = None
 
-print("Importing RAG components...")
-# Imports RAG
-
-
-try:
-    from rag.config import RAGConfig
-    from rag.qa_system import QASystem
-    from rag.vector_store import VectorStoreManager
-    from rag.llm_manager import LLMManager
-    from rag.database import DatabaseManager
-    RAG_AVAILABLE = True
-    print("[OK] Modules RAG importés avec succès")
-except ImportError as e:
-    print(f"[WARNING] Erreur import RAG: {e}")
-    RAG_AVAILABLE = False
-except Exception as e:
-    print(f"[WARNING] Erreur initialisation RAG: {type(e).__name__}: {e}")
-    RAG_AVAILABLE = False
-
-# Fallback/Simple RAG always available
-print("Initialisation RAG simple...")
-try:
-    from simple_rag import SimpleQASystem, RAGConfig as SimpleRAGConfig
-    SIMPLE_RAG_AVAILABLE = True
-    print("[OK] Modules RAG simples chargés")
-except Exception as e:
-    print(f"[WARNING] Modules RAG simples non disponibles: {e}")
-    SIMPLE_RAG_AVAILABLE = False
+# Pool d'inférence: récupération + génération hors de la boucle asyncio
+from batch_ask import BatchRunner, parse_questions
+from coalescing import RequestCoalescer
+from history_store import MAX_PAGE_SIZE
+from contract_analysis import AnalysisJob
+from inference_pool import InferencePool, QueueFullError
+from llm_runtime import GenerationCancelled, GenerationContext, generation_stats
+from startup_phases import StartupTracker
+from observability import MetricsRegistry, ObservabilityMiddleware, TraceBuffer
+from http_payload import (
+    CompressionMiddleware, ConditionalMiddleware, PayloadStats, slim_payload, slim_source, truncate_text
+)
+
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", 8))
+inference_pool = InferencePool(workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_SIZE)
+
+# Requêtes identiques simultanées (question normalisée): une seule inférence partagée
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "true").lower() == "true"
+coalescer = RequestCoalescer(enabled=COALESCE_REQUESTS)
+
+# Réponses extractives (sans LLM) sur un pool séparé: sur demande, ou en mode
+# dégradé quand l'attente estimée dépasse le SLO ou que la file est pleine
+EXTRACTIVE_FALLBACK = os.environ.get("EXTRACTIVE_FALLBACK", "true").lower() == "true"
+EXTRACTIVE_SLO_MS = float(os.environ.get("EXTRACTIVE_SLO_MS", 15000))
+EXTRACTIVE_WORKERS = int(os.environ.get("EXTRACTIVE_WORKERS", 2))
+extractive_pool = InferencePool(workers=EXTRACTIVE_WORKERS, max_queue=4 * EXTRACTIVE_WORKERS, name="extractive")
+
+# Traces par requête (X-Request-ID) et métriques /api/metrics
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", 30000))
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", 256))
+metrics = MetricsRegistry()
+traces = TraceBuffer(TRACE_BUFFER_SIZE)
 
+# Compression gzip/brotli des réponses et cache HTTP (ETag, 304)
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 1024))
+STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", 3600))
+payload_stats = PayloadStats()
 
 # ============ MODÈLES PYDANTIC ============
 
 class QuestionRequest(BaseModel):
     """Modèle pour une question"""
     question: str
+    extractive: bool = False  # Passages surlignés, sans génération
+    fields: list[str] | None = None  # Champs de la réponse conservés (None = tous)
+    excerpt_chars: int | None = None  # Longueur maximale des extraits (0 = sans extrait)
+
+
+class AnalysisRequest(BaseModel):
+    """Contrat à analyser clause par clause"""
+    text: str
+    excerpt_chars: int | None = None  # Longueur maximale des extraits des sources
 
 
 class HealthResponse(BaseModel):
@@ -99,6 +131,42 @@ class HealthResponse(BaseModel):
     status: str
     rag_ready: bool
     llm_available: bool
+    llm_backend: str | None = None
+
+
+class LivenessResponse(BaseModel):
+    """Réponse de liveness (processus vivant)"""
+    status: str
+    uptime_s: float
+
+
+class ReadinessResponse(BaseModel):
+    """État du démarrage par composant"""
+    status: str
+    ready: bool
+    elapsed_s: float
+    eta_s: float
+    error: str | None = None
+    components: dict
+    imports_ms: dict = {}
+
+
+class StatsResponse(BaseModel):
+    """Statistiques de service (dimensionnement des réplicas)"""
+    inference: dict
+    generation: dict
+    answer_cache: dict | None = None
+    batching: dict | None = None
+    prefix_cache: dict | None = None
+    extractive: dict | None = None
+    embeddings: dict | None = None
+    retrieval: dict | None = None
+    vector_index: dict | None = None
+    coalescing: dict | None = None
+    analysis: dict | None = None
+    context: dict | None = None
+    history: dict | None = None
+    http: dict | None = None
 
 
 class AnswerResponse(BaseModel):
@@ -108,6 +176,8 @@ class AnswerResponse(BaseModel):
     answer: str
     sources: list
     source_count: int
+    timings: dict = {}
+    mode: str = "generative"  # "extractive": extraits des textes, aucun texte généré
 
 
 class HistoryItem(BaseModel):
@@ -122,6 +192,29 @@ class HistoryResponse(BaseModel):
     """Réponse d'historique"""
     success: bool
     history: list[HistoryItem]
+    next_cursor: str | None = None
+
+
+class DocumentsResponse(BaseModel):
+    """Documents de l'index et imports récents"""
+    success: bool
+    documents: list[dict]
+    jobs: list[dict]
+
+
+class IngestionJobResponse(BaseModel):
+    """Progression d'un ajout, remplacement ou suppression de document"""
+    job_id: str
+    action: str
+    name: str
+    status: str
+    stage: str
+    chunks_total: int
+    chunks_indexed: int
+    progress: float
+    error: str | None = None
+    created_at: float
+    elapsed_s: float
 
 
 # ============ FONCTIONS INITIALES ============
@@ -129,15 +222,59 @@ class HistoryResponse(BaseModel):
 # Mode de fonctionnement
 FORCE_SIMPLE_RAG = True  # Toujours utiliser le mode simple pour la stabilité locale
 
+# Démarrage progressif: le serveur écoute pendant le chargement des modèles
+startup = StartupTracker()
+RAG_AVAILABLE = False
+SIMPLE_RAG_AVAILABLE = False
+VectorStoreManager = LLMManager = DatabaseManager = None
+
+
+def import_rag_modules():
+    """Importer la pile RAG (torch, transformers, langchain, chromadb) en arrière-plan"""
+    global RAG_AVAILABLE, SIMPLE_RAG_AVAILABLE, VectorStoreManager, LLMManager, DatabaseManager
+    global SimpleQASystem, SimpleRAGConfig, build_vector_store, load_llm, open_history_db, apply_stub_config
+    
+    print("Importing RAG components...")
+    startup.run_imports()
+    
+    try:
+        from rag.config import RAGConfig
+        from rag.qa_system import QASystem
+        from rag.vector_store import VectorStoreManager
+        from rag.llm_manager import LLMManager
+        from rag.database import DatabaseManager
+        RAG_AVAILABLE = True
+        print("[OK] Modules RAG importés avec succès")
+    except ImportError as e:
+        print(f"[WARNING] Erreur import RAG: {e}")
+        RAG_AVAILABLE = False
+    except Exception as e:
+        print(f"[WARNING] Erreur initialisation RAG: {type(e).__name__}: {e}")
+        RAG_AVAILABLE = False
+    
+    # Fallback/Simple RAG always available
+    print("Initialisation RAG simple...")
+    try:
+        from simple_rag import SimpleQASystem, RAGConfig as SimpleRAGConfig, build_vector_store, load_llm, open_history_db
+        from stub_models import apply_stub_config
+        SIMPLE_RAG_AVAILABLE = True
+        print("[OK] Modules RAG simples chargés")
+    except Exception as e:
+        print(f"[WARNING] Modules RAG simples non disponibles: {e}")
+        SIMPLE_RAG_AVAILABLE = False
+
+
 def init_rag_system():
     """Initialiser le système RAG au démarrage"""
     global qa_system, config
     
+    import_rag_modules()
+    
     if FORCE_SIMPLE_RAG or not RAG_AVAILABLE:
         print("[INFO] Utilisation du mode RAG simple (plus rapide et stable)")
         if SIMPLE_RAG_AVAILABLE:
             try:
-                qa_system = SimpleQASystem()
+                qa_system = SimpleQASystem(startup=startup)
                 print("[OK] Systeme RAG (simple) pret!")
                 return True
             except Exception as e:
@@ -156,31 +293,25 @@ def init_rag_system():
             print("[ERROR] Modules RAG incomplètement importés")
             raise ImportError("Modules RAG manquants")
         
-        # Config
-        config = RAGConfig()
-        
-        # Vector Store
-        vector_store = VectorStoreManager(config)
-        vector_store.initialize_embeddings()
-        
-        # Charger ou créer le vector store
-        documents = vector_store.load_documents(config.CLEANED_DIR)
-        if documents:
-            chunks = vector_store.chunk_documents(documents)
-            vector_store.create_vectorstore(chunks)
-        else:
-            print("[WARNING] Aucun document a traiter, continuant sans vector store")
-            vector_store.vectorstore = None
-        
-        # LLM
-        llm = LLMManager(config)
-        llm.load_model()
+        # Config (paramètres de service inclus)
+        config = SimpleRAGConfig()
+        if config.STUB_MODELS:
+            apply_stub_config(config)
         
-        # Database
-        db = DatabaseManager(config.DB_PATH)
+        # LLM chargé pendant l'ouverture de l'index (embedding partagé + index persistant)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-loader") as loader:
+            llm_future = loader.submit(load_llm, config, startup)
+            vector_store, manifest = build_vector_store(config, startup)
+            
+            # Database
+            with startup.phase("db"):
+                db = open_history_db(config)
+            
+            llm = llm_future.result()
         
         # QA System
-        qa_system = QASystem(vector_store, llm, db)
+        qa_system = SimpleQASystem(config, vector_store, llm, db)
+        qa_system.set_index_manifest(manifest)
         
         print("[OK] Systeme RAG complet pret!")
         return True
@@ -189,7 +320,7 @@ def init_rag_system():
         if SIMPLE_RAG_AVAILABLE:
             print("[WARNING] Basculement vers mode fallback simple...")
             try:
-                qa_system = SimpleQASystem()
+                qa_system = SimpleQASystem(startup=startup)
                 print("[OK] Mode fallback activé")
                 return True
             except Exception as ex:
@@ -199,6 +330,32 @@ def init_rag_system():
             return False
 
 
+def start_rag_system():
+    """Phase de chargement en arrière-plan (le serveur répond déjà)"""
+    try:
+        if init_rag_system():
+            startup.mark_ready()
+            print(f"[OK] Système prêt en {startup.elapsed():.1f}s")
+        else:
+            startup.mark_failed("Initialisation du système RAG impossible")
+    except Exception as e:
+        print(f"[ERROR] Échec du démarrage: {e}")
+        startup.mark_failed(e)
+
+
+# Worker forké (WORKERS > 1): l'index en mémoire n'est pas partagé entre workers
+forked_worker = False
+
+
+def after_worker_fork():
+    """Dans chaque worker forké: connexion SQLite propre au processus"""
+    global forked_worker
+    forked_worker = True
+    db = getattr(qa_system, "db", None)
+    if hasattr(db, "reopen"):
+        db.reopen()
+
+
 # ============ LIFESPAN (Startup/Shutdown) ============
 
 @asynccontextmanager
@@ -208,13 +365,22 @@ async def lifespan(app: FastAPI):
     print("=" * 80)
     print("[LEGAL AI] Serveur FastAPI")
     print("=" * 80)
-    init_rag_system()
+    # En mode multi-worker, le système est déjà chargé par le maître avant le fork
+    if qa_system is None:
+        threading.Thread(target=start_rag_system, name="rag-startup", daemon=True).start()
     print(f"Frontend: {BASE_DIR / 'frontend'}")
     print(f"Backend: {BACKEND_DIR}")
     print("=" * 80)
     yield
     # Shutdown
     print("\n[SHUTDOWN] Arret du serveur...")
+    inference_pool.shutdown()
+    extractive_pool.shutdown()
+    if getattr(qa_system, "documents", None) is not None:
+        qa_system.documents.shutdown()
+    # Conversations encore en file écrites avant l'arrêt
+    if _history_store() is not None:
+        _history_store().close()
 
 
 # ============ CRÉATION APP ============
@@ -226,6 +392,23 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# ============ MIDDLEWARE COMPRESSION / CACHE HTTP ============
+
+# Frontend revalidé à chaque chargement (304 si inchangé), fichiers statiques
+# gardés STATIC_MAX_AGE secondes, GET idempotents de l'API revalidés par ETag
+app.add_middleware(ConditionalMiddleware, stats=payload_stats, rules=[
+    ("/", "no-cache"),
+    ("/index.html", "no-cache"),
+    ("/static/*", f"public, max-age={STATIC_MAX_AGE}"),
+    ("/api/history", "private, no-cache"),
+    ("/api/documents", "private, no-cache"),
+])
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES, stats=payload_stats)
+
+# ============ MIDDLEWARE TRACES / MÉTRIQUES ============
+
+app.add_middleware(ObservabilityMiddleware, registry=metrics, traces=traces, slow_ms=TRACE_SLOW_MS)
+
 # ============ MIDDLEWARE CORS ============
 
 app.add_middleware(
@@ -234,6 +417,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Answer-Mode"],
 )
 
 # ============ ROUTES STATIQUES ============
@@ -244,6 +428,89 @@ app.add_middleware(
 
 # ============ ROUTES API ============
 
+def _build_sources(chunks):
+    """Construire les sources à partir des chunks vus par le LLM"""
+    sources = []
+    for chunk in chunks:
+        sources.append({
+            "id": chunk.rank,
+            "name": chunk.source,
+            "excerpt": chunk.content,  # Contenu COMPLET sans troncature
+            "relevance": "Haut",
+            "score": chunk.score
+        })
+        if getattr(chunk, "highlights", None) is not None:
+            # Positions (caractères) des phrases qui répondent dans l'extrait
+            sources[-1]["highlights"] = chunk.highlights
+    return sources
+
+
+def _answer_with_sources(answer: str, sources: list) -> str:
+    """Ajouter le nom des articles entre parenthèses à la réponse"""
+    article_names = [source["name"] for source in sources]
+    if article_names:
+        articles_str = ", ".join(set(article_names))  # Supprimer les doublons
+        return f"{answer}\n\n(Source: {articles_str})"
+    return answer
+
+
+def _slim_answer(answer: AnswerResponse, request: QuestionRequest):
+    """Réponse allégée si le client l'a demandée (fields, excerpt_chars)"""
+    if request.fields is None and request.excerpt_chars is None:
+        return answer
+    headers = {"X-Answer-Mode": answer.mode} if answer.mode == "extractive" else None
+    return JSONResponse(slim_payload(answer.model_dump(), request.fields, request.excerpt_chars), headers=headers)
+
+
+def _require_rag():
+    """
+    Vérifier que le système RAG est prêt
+    
+    Raises:
+        HTTPException 503: Pendant le démarrage (en-tête Retry-After = temps
+            restant estimé) ou si l'initialisation a échoué
+    """
+    if qa_system:
+        return
+    if not startup.failed:
+        eta = startup.eta()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Système en cours de démarrage, prêt dans ~{math.ceil(eta)}s",
+            headers={"Retry-After": str(max(1, math.ceil(eta)))}
+        )
+    raise HTTPException(
+        status_code=503,
+        detail="Système RAG non initialisé"
+    )
+
+
+@app.get("/api/live", response_model=LivenessResponse)
+async def live():
+    """
+    Liveness: le processus répond (indépendant du chargement des modèles)
+    """
+    return LivenessResponse(status="alive", uptime_s=round(time.time() - startup.started_at, 3))
+
+
+@app.get("/api/ready", response_model=ReadinessResponse)
+async def ready():
+    """
+    Readiness: état et durée de chargement de chaque composant
+    
+    Retourne 200 quand le système peut répondre aux questions, 503 pendant
+    le démarrage (avec le temps restant estimé) ou après un échec.
+    """
+    state = startup.state()
+    if state["ready"] and qa_system:
+        return ReadinessResponse(**state)
+    return JSONResponse(
+        status_code=503,
+        content=state,
+        headers={"Retry-After": str(max(1, math.ceil(state["eta_s"])))} if not startup.failed else None
+    )
+
+
 @app.get("/api/health", response_model=HealthResponse)
 async def health():
     """
@@ -253,34 +520,86 @@ async def health():
     - status: État général du serveur
     - rag_ready: Si le système RAG est initialisé
     - llm_available: Si le modèle LLM est disponible
+    - llm_backend: Moteur d'inférence chargé (LLM_BACKEND)
     """
     return HealthResponse(
         status="ok",
         rag_ready=qa_system is not None,
-        llm_available=qa_system.llm.is_available() if qa_system else False
+        llm_available=qa_system.llm.is_available() if qa_system else False,
+        llm_backend=getattr(qa_system.llm, "backend", None) if qa_system else None
+    )
+
+
+def _extractive_reason(request: QuestionRequest, question: str):
+    """
+    Répondre sans LLM ? ("requested", "slo" ou None pour une génération)
+    
+    Mode dégradé: l'attente estimée dans la file de génération dépasse
+    EXTRACTIVE_SLO_MS. Une question identique déjà en cours n'attend pas la
+    file : elle rejoint ce calcul. Avec "slo", consulter d'abord le cache de
+    réponses (_cached_result).
+    """
+    if request.extractive:
+        return "requested"
+    if EXTRACTIVE_FALLBACK and 1000 * inference_pool.estimated_wait() > EXTRACTIVE_SLO_MS \
+            and not coalescer.in_flight(question):
+        return "slo"
+    return None
+
+
+async def _cached_result(question: str):
+    """Réponse du cache de réponses (mode dégradé), None si absente"""
+    return await asyncio.to_thread(qa_system.ask_cached, question)
+
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Serveur saturé, veuillez réessayer dans quelques instants",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+async def _extractive_answer(question: str, reason: str) -> AnswerResponse:
+    """Réponse extractive calculée sur le pool dédié (la file du LLM n'est pas touchée)"""
+    try:
+        result = await extractive_pool.run(qa_system.ask_extractive, question, save=True, reason=reason)
+    except QueueFullError as e:
+        raise _queue_full(e)
+    sources = _build_sources(result.chunks)
+    return AnswerResponse(
+        success=True,
+        question=question,
+        answer=result.answer,
+        sources=sources,
+        source_count=len(sources),
+        timings=result.timings,
+        mode="extractive"
     )
 
 
 @app.post("/api/ask", response_model=AnswerResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, response: Response):
     """
     Poser une question au système RAG
     
     Args:
-        request: Objet contenant la question
+        request: Objet contenant la question (extractive=true: passages
+            surlignés sans génération ; fields: champs conservés dans la
+            réponse ; excerpt_chars: extraits des sources tronqués)
         
     Returns:
-        AnswerResponse avec la réponse et les sources
+        AnswerResponse avec la réponse et les sources ; mode="extractive"
+        (en-tête X-Answer-Mode) si la réponse ne vient pas du LLM : sur
+        demande, ou quand l'attente dépasse EXTRACTIVE_SLO_MS ou que la
+        file d'inférence est pleine
         
     Raises:
-        HTTPException 503: Si le système RAG n'est pas initialisé
+        HTTPException 503: Si le système RAG démarre ou n'est pas initialisé,
+            ou si la file est pleine sans repli extractif (en-tête Retry-After)
         HTTPException 400: Si la question est vide
     """
-    if not qa_system:
-        raise HTTPException(
-            status_code=503,
-            detail="Système RAG non initialisé"
-        )
+    _require_rag()
     
     question = request.question.strip()
     if not question:
@@ -288,71 +607,37 @@ async def ask_question(request: QuestionRequest):
             status_code=400,
             detail="Veuillez poser une question"
         )
+    if request.excerpt_chars is not None and request.excerpt_chars < 0:
+        raise HTTPException(status_code=400, detail="excerpt_chars doit être positif")
+    
+    reason = _extractive_reason(request, question)
+    if reason == "slo":
+        cached = await _cached_result(question)
+        if cached is not None:
+            return _slim_answer(_generated_answer(question, cached), request)
+    if reason is not None:
+        response.headers["X-Answer-Mode"] = "extractive"
+        return _slim_answer(await _extractive_answer(question, reason), request)
     
     try:
-        # Récupérer réponse
-        answer = qa_system.ask(
-            question=question,
-            verbose=False,
-            debug=False,
-            save=True
-        )
-        
-        # Debug: log la réponse
-        print(f"[DEBUG] Question: {question}")
-        print(f"[DEBUG] Answer type: {type(answer)}")
-        print(f"[DEBUG] Answer value: '{answer}'")
-        
-        # Vérifier que la réponse n'est pas vide
-        if not answer or answer is None:
-            answer = f"Je n'ai pas pu générer une réponse pour: '{question}'. Veuillez reformuler votre question ou consulter un professionnel."
-        
-        # Récupérer les sources
-        relevant_docs = qa_system.vector_store.retrieve(question)
-        sources = []
-        article_names = []
-        
-        for i, doc in enumerate(relevant_docs, 1):
-            # Gérer les deux formats: objets Langchain et dictionnaires
-            if isinstance(doc, dict):
-                # Extraire le nom de la source depuis le dictionnaire
-                source_name = doc.get('source') or doc.get('metadata', {}).get('source') or 'Code du travail'
-                content = doc.get('page_content') or doc.get('content', '')
-                sources.append({
-                    "id": i,
-                    "name": source_name,
-                    "excerpt": content,  # Contenu COMPLET sans troncature
-                    "relevance": "Haut"
-                })
-                article_names.append(source_name)
-            else:
-                # Format Langchain Document
-                metadata = getattr(doc, 'metadata', {})
-                source_name = metadata.get('source') or 'Code du travail'
-                content = getattr(doc, 'page_content', '')
-                sources.append({
-                    "id": i,
-                    "name": source_name,
-                    "excerpt": content,  # Contenu COMPLET sans troncature
-                    "relevance": "Haut"
-                })
-                article_names.append(source_name)
-        
-        # Ajouter le nom des articles entre parenthèses à la réponse
-        if article_names:
-            articles_str = ", ".join(set(article_names))  # Supprimer les doublons
-            answer_with_articles = f"{answer}\n\n(Source: {articles_str})"
-        else:
-            answer_with_articles = answer
-        
-        return AnswerResponse(
-            success=True,
-            question=question,
-            answer=answer_with_articles,
-            sources=sources,
-            source_count=len(sources)
+        # Une seule passe de récupération: les sources sont celles vues par le LLM.
+        # Une question identique déjà en cours rejoint son inférence
+        flight, leader = coalescer.join(
+            question, lambda context: inference_pool.submit(_shared_answer, question, context)
         )
+        try:
+            result = await coalescer.result(flight)
+        finally:
+            coalescer.leave(flight)
+        if not leader:
+            result = await _coalesced_result(question, result)
+        return _slim_answer(_generated_answer(question, result), request)
     
+    except QueueFullError as e:
+        if not EXTRACTIVE_FALLBACK:
+            raise _queue_full(e)
+        response.headers["X-Answer-Mode"] = "extractive"
+        return _slim_answer(await _extractive_answer(question, "queue_full"), request)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -360,42 +645,558 @@ async def ask_question(request: QuestionRequest):
         )
 
 
+def _generated_answer(question: str, result) -> AnswerResponse:
+    """AnswerResponse d'une réponse du LLM (calculée, regroupée ou en cache)"""
+    answer = result.answer
+    
+    logger.debug("Question: %s | réponse (%s): %r", question, type(answer).__name__, answer)
+    
+    # Vérifier que la réponse n'est pas vide
+    if not answer or answer is None:
+        answer = f"Je n'ai pas pu générer une réponse pour: '{question}'. Veuillez reformuler votre question ou consulter un professionnel."
+    
+    sources = _build_sources(result.chunks)
+    
+    return AnswerResponse(
+        success=True,
+        question=question,
+        answer=_answer_with_sources(answer, sources),
+        sources=sources,
+        source_count=len(sources),
+        timings=result.timings
+    )
+
+
+def _sse(event: str, data) -> str:
+    """Formater un événement server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    Réponse en flux qui exécute on_close une fois l'envoi terminé
+    
+    Contrairement au finally du générateur, on_close s'exécute aussi quand le
+    client se déconnecte avant que Starlette ait commencé à itérer le corps.
+    """
+    
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Une seule libération, même si la réponse est rappelée
+            on_close, self.on_close = self.on_close, None
+            if on_close is not None:
+                on_close()
+
+
+def _shared_answer(question: str, context: GenerationContext):
+    """Inférence exécutée sur le pool, partagée par les requêtes regroupées"""
+    if context.cancelled.is_set():
+        raise GenerationCancelled()
+    return qa_system.ask_detailed(question, save=True, context=context)
+
+
+async def _coalesced_result(question: str, result):
+    """Résultat partagé pour une requête regroupée: son historique est enregistré à part"""
+    await asyncio.to_thread(qa_system.save_history, question, result.answer)
+    return replace(result, question=question, timings=dict(result.timings, coalesced=True))
+
+
+def _done_event(question: str, result) -> dict:
+    """Événement done du flux SSE: réponse finale avec sources et temps"""
+    answer = result.answer or f"Je n'ai pas pu générer une réponse pour: '{question}'. Veuillez reformuler votre question ou consulter un professionnel."
+    sources = _build_sources(result.chunks)
+    return {
+        "success": True,
+        "question": question,
+        "answer": _answer_with_sources(answer, sources),
+        "source_count": len(sources),
+        "timings": result.timings
+    }
+
+
+def _extractive_stream(answer: AnswerResponse, excerpt_chars: int | None = None) -> StreamingResponse:
+    """Réponse extractive au format du flux SSE (sources puis done)"""
+    done = answer.model_dump()
+    sources = [slim_source(source, excerpt_chars) for source in done.pop("sources")]
+    
+    async def event_stream():
+        yield _sse("sources", {"sources": sources})
+        yield _sse("done", done)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Answer-Mode": "extractive"}
+    )
+
+
+def _cached_stream(question: str, result, excerpt_chars: int | None = None) -> StreamingResponse:
+    """Réponse du cache au format du flux SSE (sources, token puis done)"""
+    sources = [slim_source(source, excerpt_chars) for source in _build_sources(result.chunks)]
+    
+    async def event_stream():
+        yield _sse("sources", {"sources": sources})
+        if result.answer:
+            yield _sse("token", {"text": result.answer})
+        yield _sse("done", _done_event(question, result))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Poser une question avec réponse en streaming (server-sent events)
+    
+    Événements émis:
+    - sources: sources récupérées, envoyées avant la génération
+    - token: fragment de texte généré
+    - done: réponse finale avec sources et temps (TTFT, tokens/s)
+    - error: erreur de traitement
+    
+    La génération est interrompue si le client se déconnecte. Une réponse
+    extractive (sur demande ou en mode dégradé) émet directement sources
+    puis done, avec "mode": "extractive". excerpt_chars tronque les extraits
+    de l'événement sources.
+    
+    Raises:
+        HTTPException 503: Si le système RAG démarre ou n'est pas initialisé,
+            ou si la file est pleine sans repli extractif (en-tête Retry-After)
+        HTTPException 400: Si la question est vide
+    """
+    _require_rag()
+    
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(
+            status_code=400,
+            detail="Veuillez poser une question"
+        )
+    
+    reason = _extractive_reason(request, question)
+    if reason == "slo":
+        cached = await _cached_result(question)
+        if cached is not None:
+            return _cached_stream(question, cached, request.excerpt_chars)
+    if reason is None:
+        try:
+            # Une question identique déjà en cours partage son flux de tokens
+            flight, leader = coalescer.join(
+                question, lambda context: inference_pool.submit(_shared_answer, question, context),
+                streaming=True
+            )
+        except QueueFullError as e:
+            if not EXTRACTIVE_FALLBACK:
+                raise _queue_full(e)
+            reason = "queue_full"
+    if reason is not None:
+        return _extractive_stream(await _extractive_answer(question, reason), request.excerpt_chars)
+    
+    async def event_stream():
+        events = flight.subscribe()
+        sent_sources = streamed = False
+        while True:
+            kind, data = await events.get()
+            if kind == "sources":
+                sent_sources = True
+                yield _sse(kind, {"sources": [slim_source(source, request.excerpt_chars) for source in _build_sources(data)]})
+            elif kind == "token":
+                streamed = True
+                yield _sse(kind, {"text": data})
+            elif kind == "result":
+                if not leader:
+                    data = await _coalesced_result(question, data)
+                # Inférence partagée avec /api/ask (sans streaming): réponse en un fragment
+                if not sent_sources:
+                    yield _sse("sources", {"sources": [slim_source(source, request.excerpt_chars) for source in _build_sources(data.chunks)]})
+                if not streamed and data.answer:
+                    yield _sse("token", {"text": data.answer})
+                yield _sse("done", _done_event(question, data))
+                break
+            else:
+                yield _sse("error", {"success": False, "error": f"Erreur lors du traitement: {str(data)}"})
+                break
+    
+    # Client déconnecté (même avant le premier octet) ou réponse terminée:
+    # le dernier parti libère le worker
+    return ReleasingStreamingResponse(
+        event_stream(),
+        lambda: coalescer.leave(flight),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Un lot à la fois par worker: les questions en masse ne monopolisent pas le LLM
+batch_slot = threading.Semaphore(1)
+
+
+
+@app.post("/api/ask/batch")
+async def ask_batch(request: Request, save: bool = False, use_cache: bool = True):
+    """
+    Répondre à un lot de questions (corps JSONL, réponse JSONL en flux)
+    
+    Chaque ligne du corps: {"id": ..., "question": ...} ou une chaîne JSON.
+    Chaque ligne de la réponse: id, question, answer, sources, timings
+    (duplicate_of pour une question identique) ou error. Les lignes arrivent
+    dans l'ordre d'achèvement ; pour reprendre après une coupure, renvoyer
+    les questions dont l'id n'a pas été reçu.
+    
+    Args:
+        save: Enregistrer les réponses dans l'historique
+        use_cache: Consulter le cache de réponses
+    
+    Raises:
+        HTTPException 400: Corps invalide ou trop de questions (BATCH_MAX_QUESTIONS)
+        HTTPException 429: Un lot est déjà en cours sur ce worker
+        HTTPException 503: Si le système RAG démarre ou n'est pas initialisé
+    """
+    _require_rag()
+    
+    try:
+        items = parse_questions((await request.body()).decode("utf-8").splitlines())
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    max_questions = getattr(qa_system.config, "BATCH_MAX_QUESTIONS", 2000)
+    if not items or len(items) > max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Le lot doit contenir entre 1 et {max_questions} questions"
+        )
+    if not batch_slot.acquire(blocking=False):
+        raise HTTPException(
+            status_code=429,
+            detail="Un lot de questions est déjà en cours",
+            headers={"Retry-After": "30"}
+        )
+    
+    try:
+        job = BatchRunner.from_config(qa_system, qa_system.config, save=save, use_cache=use_cache).start(items)
+    except Exception:
+        batch_slot.release()
+        raise
+    
+    async def result_stream():
+        async for record in iterate_in_threadpool(job.results()):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        logger.info("Lot de questions: %s", job.summary())
+    
+    def release():
+        # Client déconnecté (même avant le premier octet) ou lot terminé:
+        # libérer les threads et le créneau
+        job.cancel()
+        batch_slot.release()
+    
+    return ReleasingStreamingResponse(
+        result_stream(),
+        release,
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Batch-Questions": str(job.total),
+            "X-Batch-Unique": str(job.unique)
+        }
+    )
+
+
+@app.post("/api/analyze")
+async def analyze_contract(request: AnalysisRequest):
+    """
+    Analyser un contrat clause par clause (server-sent events)
+    
+    Le texte est découpé en clauses ; les articles de loi de toutes les
+    clauses sont récupérés en une passe, puis chaque clause est analysée
+    sur le pool d'inférence partagé avec /api/ask (ANALYSIS_CONCURRENCY
+    clauses à la fois).
+    
+    Événements émis:
+    - clauses: découpage (id, title, excerpt, start, chars)
+    - clause: analyse d'une clause dès qu'elle est terminée (risk: safe,
+      warning ou danger, explanation, recommendation, articles, sources ;
+      error si la clause a échoué)
+    - done: synthèse (risk_counts, overall_risk, review, articles, timings)
+    - error: erreur de traitement
+    
+    L'analyse est interrompue si le client se déconnecte. excerpt_chars
+    tronque les extraits des sources.
+    
+    Raises:
+        HTTPException 400: Texte vide, trop long (ANALYSIS_MAX_CHARS) ou trop
+            de clauses (ANALYSIS_MAX_CLAUSES)
+        HTTPException 503: Si le système RAG démarre ou n'est pas initialisé
+    """
+    _require_rag()
+    
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Veuillez fournir le texte du contrat")
+    max_chars = getattr(qa_system.config, "ANALYSIS_MAX_CHARS", 100000)
+    if len(request.text) > max_chars:
+        raise HTTPException(status_code=400, detail=f"Le contrat dépasse {max_chars} caractères")
+    if request.excerpt_chars is not None and request.excerpt_chars < 0:
+        raise HTTPException(status_code=400, detail="excerpt_chars doit être positif")
+    
+    clauses = qa_system.analyzer.split_clauses(request.text)
+    max_clauses = getattr(qa_system.config, "ANALYSIS_MAX_CLAUSES", 80)
+    if not clauses or len(clauses) > max_clauses:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Le contrat doit contenir entre 1 et {max_clauses} clauses (trouvées: {len(clauses)})"
+        )
+    
+    concurrency = getattr(qa_system.config, "ANALYSIS_CONCURRENCY", 0) or inference_pool.workers
+    job = AnalysisJob(qa_system.analyzer, clauses, inference_pool, concurrency=concurrency)
+    
+    async def event_stream():
+        try:
+            async for kind, data in job.events():
+                if kind == "clause":
+                    data = dict(data, sources=[slim_source(source, request.excerpt_chars) for source in data["sources"]])
+                yield _sse(kind, data)
+        except GenerationCancelled:
+            pass
+        except Exception as e:
+            yield _sse("error", {"success": False, "error": f"Erreur lors de l'analyse: {str(e)}"})
+        finally:
+            # Client déconnecté ou analyse terminée: libérer les workers
+            job.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Analysis-Clauses": str(len(clauses))}
+    )
+
+
+@app.get("/api/stats", response_model=StatsResponse)
+async def stats():
+    """
+    Statistiques de service
+    
+    Retourne:
+    - inference: profondeur de file, temps d'attente et de service du pool
+    - generation: time-to-first-token et tokens/s
+    - answer_cache: hits exact/sémantique, misses, taille du cache de réponses
+    - batching: nombre et taille des lots de génération
+    - prefix_cache: préfixes de prompt réutilisés, mémoire et préremplissage économisé
+    - extractive: réponses sans LLM par origine (requested, slo, queue_full) et leur pool
+    - embeddings: latence, regroupement et cache des embeddings de requêtes
+    - retrieval: index BM25 de la recherche hybride et hits par numéro d'article
+    - vector_index: index compact (VECTOR_BACKEND=compact): taille, latence de recherche
+    - coalescing: inférences partagées par les requêtes identiques simultanées
+    - analysis: contrats et clauses analysés, durée et parallélisme obtenu
+    - context: tokens de contexte avant/après packing, fusions et doublons
+    - history: écritures d'historique en file, par lot, purgées par la rétention
+    - http: octets avant/après compression, réponses 304 (ETag)
+    """
+    answer_cache = getattr(qa_system, "answer_cache", None)
+    batcher = getattr(qa_system, "batcher", None)
+    prefix_cache = getattr(qa_system, "prefix_cache", None)
+    extractive = getattr(qa_system, "extractive", None)
+    query_embedder = getattr(qa_system, "query_embedder", None)
+    hybrid = getattr(qa_system, "hybrid", None)
+    compact_index = getattr(qa_system, "compact_index", None)
+    analyzer = getattr(qa_system, "analyzer", None)
+    packer = getattr(qa_system, "packer", None)
+    history_store = _history_store()
+    return StatsResponse(
+        inference=inference_pool.stats(),
+        generation=generation_stats.stats(),
+        answer_cache=answer_cache.stats() if answer_cache else None,
+        batching=batcher.stats() if batcher else None,
+        prefix_cache=prefix_cache.stats() if prefix_cache else None,
+        extractive=dict(extractive.stats(), pool=extractive_pool.stats()) if extractive else None,
+        embeddings=query_embedder.stats() if query_embedder else None,
+        retrieval=hybrid.stats() if hybrid else None,
+        vector_index=compact_index.stats() if compact_index else None,
+        coalescing=coalescer.stats(),
+        analysis=analyzer.stats() if analyzer else None,
+        context=packer.stats() if packer else None,
+        history=history_store.stats() if history_store else None,
+        http=payload_stats.stats()
+    )
+
+
+def _component_stats(name: str):
+    component = getattr(qa_system, name, None)
+    return component.stats() if component else {}
+
+
+def _prefill_saved_seconds():
+    saved_ms = _component_stats("prefix_cache").get("prefill_saved_ms")
+    return saved_ms / 1000 if saved_ms is not None else None
+
+
+def _register_metrics():
+    """Compteurs et jauges lus au scrape dans les stats des composants"""
+    metrics.gauge("rag_ready", "Système RAG prêt (1) ou en démarrage (0)",
+                  lambda: 1 if qa_system else 0)
+    metrics.gauge("rag_model_loaded", "LLM chargé et disponible",
+                  lambda: 1 if qa_system and qa_system.llm.is_available() else 0)
+    metrics.gauge("rag_inference_queue_depth", "Requêtes en attente d'un worker d'inférence",
+                  lambda: inference_pool.stats()["queue_depth"])
+    metrics.gauge("rag_inference_running", "Inférences en cours",
+                  lambda: inference_pool.stats()["running"])
+    metrics.observed_counter("rag_inference_rejected_total", "Requêtes refusées (file pleine)",
+                             lambda: inference_pool.stats()["rejected"])
+    metrics.observed_counter("rag_inference_failed_total", "Inférences terminées en erreur",
+                             lambda: inference_pool.stats()["failed"])
+    metrics.observed_counter("rag_generations_total", "Générations du LLM",
+                             lambda: generation_stats.stats()["requests"])
+    metrics.observed_counter("rag_generations_cancelled_total", "Générations interrompues (client déconnecté)",
+                             lambda: generation_stats.stats()["cancelled"])
+    metrics.observed_counter("rag_generated_tokens_total", "Tokens générés",
+                             lambda: generation_stats.stats()["tokens"])
+    metrics.observed_counter("rag_answer_cache_hits_total", "Réponses servies par le cache", lambda: {
+        tier: _component_stats("answer_cache").get(f"hits_{tier}") for tier in ("exact", "semantic")
+    }, labels=("tier",))
+    metrics.observed_counter("rag_answer_cache_misses_total", "Questions absentes du cache de réponses",
+                             lambda: _component_stats("answer_cache").get("misses"))
+    metrics.gauge("rag_answer_cache_entries", "Entrées du cache de réponses",
+                  lambda: _component_stats("answer_cache").get("entries"))
+    metrics.observed_counter("rag_prefix_cache_hits_total", "Générations parties d'un préfixe en cache",
+                             lambda: _component_stats("prefix_cache").get("hits"))
+    metrics.observed_counter("rag_prefix_cache_misses_total", "Générations sans préfixe en cache",
+                             lambda: _component_stats("prefix_cache").get("misses"))
+    metrics.gauge("rag_prefix_cache_bytes", "Mémoire des états KV de préfixes",
+                  lambda: _component_stats("prefix_cache").get("bytes"))
+    metrics.observed_counter("rag_prefill_saved_seconds_total", "Préremplissage économisé (estimation)",
+                             _prefill_saved_seconds)
+    metrics.observed_counter("rag_extractive_answers_total", "Réponses extractives (sans LLM) par origine",
+                             lambda: _component_stats("extractive").get("answers"), labels=("reason",))
+    metrics.observed_counter("rag_coalesced_requests_total", "Requêtes servies par une inférence déjà en cours",
+                             lambda: coalescer.stats()["coalesced_by_endpoint"], labels=("endpoint",))
+    metrics.gauge("rag_coalescing_in_flight", "Inférences partageables en cours",
+                  lambda: coalescer.stats()["in_flight"])
+    metrics.observed_counter("rag_analysis_clauses_total", "Clauses de contrats analysées par niveau de risque",
+                             lambda: _component_stats("analyzer").get("risks"), labels=("risk",))
+    metrics.observed_counter("rag_embedding_queries_total", "Embeddings de requêtes demandés",
+                             lambda: _component_stats("query_embedder").get("queries"))
+    metrics.observed_counter("rag_embedding_cache_hits_total", "Embeddings servis par le cache LRU",
+                             lambda: _component_stats("query_embedder").get("cache_hits"))
+    metrics.observed_counter("rag_http_body_bytes_total", "Octets des réponses compressées, avant (in) et après (out)",
+                             lambda: {"in": payload_stats.stats()["bytes_in"], "out": payload_stats.stats()["bytes_out"]},
+                             labels=("stage",))
+    metrics.observed_counter("rag_http_not_modified_total", "Réponses 304 (ETag inchangé)",
+                             lambda: payload_stats.stats()["not_modified"])
+    metrics.gauge("rag_history_pending_writes", "Conversations en attente d'écriture",
+                  lambda: _history_store().stats()["pending"])
+    metrics.observed_counter("rag_history_written_total", "Conversations enregistrées dans l'historique",
+                             lambda: _history_store().stats()["written"])
+    metrics.observed_counter("rag_history_write_failures_total", "Conversations perdues (erreur SQLite)",
+                             lambda: _history_store().stats()["failed"])
+
+
+_register_metrics()
+
+
+@app.get("/api/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Métriques au format texte Prometheus
+    
+    - rag_http_request_duration_seconds, rag_stage_duration_seconds: histogrammes
+    - rag_http_requests_total, rag_http_errors_total, rag_generated_tokens_total,
+      rag_answer_cache_hits_total...: compteurs
+    - rag_inference_queue_depth, rag_model_loaded, rag_ready: jauges
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/traces/{request_id}")
+async def get_trace(request_id: str):
+    """
+    Trace d'une requête récente (valeur de l'en-tête X-Request-ID)
+    
+    Returns:
+        Spans de la requête: nom, début relatif et durée (ms)
+    """
+    trace = traces.get(request_id)
+    if trace is None:
+        return JSONResponse(
+            status_code=404,
+            content={"success": False, "error": f"Trace inconnue ou expirée: {request_id}"}
+        )
+    return trace
+
+
+def _history_store():
+    """HistoryStore de la base d'historique (None avec un DatabaseManager seul)"""
+    return getattr(getattr(qa_system, "db", None), "store", None)
+
+
+# Handlers synchrones: FastAPI les exécute sur son pool de threads, les
+# lectures SQLite ne bloquent pas la boucle asyncio
 @app.get("/api/history", response_model=HistoryResponse)
-async def get_history(limit: int = 10):
+def get_history(limit: int = 10, cursor: str | None = None, q: str | None = None,
+                fields: str | None = None, answer_chars: int | None = None):
     """
-    Récupérer l'historique des conversations
+    Récupérer l'historique des conversations, plus récentes d'abord
     
     Args:
-        limit: Nombre maximum de résultats (défaut: 10)
+        limit: Taille de la page (défaut: 10, max: 200)
+        cursor: next_cursor de la page précédente
+        q: Recherche plein texte dans les questions et les réponses
+        fields: Champs conservés par conversation ("id,question,timestamp")
+        answer_chars: Longueur maximale des réponses (aperçu)
         
     Returns:
-        HistoryResponse avec l'historique des conversations
+        HistoryResponse avec une page de conversations et le curseur de la
+        page suivante (null sur la dernière page) ; ETag (304 si la page
+        n'a pas changé)
         
     Raises:
+        HTTPException 400: Curseur ou answer_chars invalide, ou cursor/q sans
+            HistoryStore (DatabaseManager seul)
         HTTPException 503: Si le système RAG n'est pas initialisé
     """
-    if not qa_system:
-        raise HTTPException(
-            status_code=503,
-            detail="Système RAG non initialisé"
-        )
+    _require_rag()
+    if answer_chars is not None and answer_chars < 0:
+        raise HTTPException(status_code=400, detail="answer_chars doit être positif")
     
     try:
-        history = qa_system.db.get_history(limit=limit)
+        store = _history_store()
+        if store is None:
+            # DatabaseManager seul: dernière page uniquement, sans pagination ni recherche
+            if cursor is not None or q is not None:
+                raise ValueError("Pagination (cursor) et recherche (q) indisponibles sans HistoryStore")
+            rows = qa_system.db.get_history(limit=max(1, min(limit, MAX_PAGE_SIZE)))
+            page = {
+                "items": [
+                    {"id": row[0], "question": row[1], "answer": row[2], "timestamp": row[3]}
+                    for row in rows
+                ],
+                "next_cursor": None
+            }
+        else:
+            page = store.page(limit=limit, cursor=cursor, query=q)
+        
+        if fields is not None or answer_chars is not None:
+            items = [
+                slim_payload(dict(item, answer=truncate_text(item["answer"], answer_chars)), fields)
+                for item in page["items"]
+            ]
+            return JSONResponse({"success": True, "history": items, "next_cursor": page["next_cursor"]})
         
         return HistoryResponse(
             success=True,
-            history=[
-                HistoryItem(
-                    id=row[0],
-                    question=row[1],
-                    answer=row[2],
-                    timestamp=row[3]
-                )
-                for row in history
-            ]
+            history=[HistoryItem(**item) for item in page["items"]],
+            next_cursor=page["next_cursor"]
         )
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -403,8 +1204,124 @@ async def get_history(limit: int = 10):
         )
 
 
+# ============ DOCUMENTS (INGESTION À CHAUD) ============
+
+def _document_manager():
+    """DocumentManager du système RAG (503 pendant le démarrage)"""
+    _require_rag()
+    manager = getattr(qa_system, "documents", None)
+    if manager is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion de documents indisponible dans ce mode"
+        )
+    return manager
+
+
+def _writable_document_manager():
+    """DocumentManager pour une modification (409 sur un réplica en lecture seule ou multi-worker)"""
+    manager = _document_manager()
+    if getattr(qa_system.config, "INDEX_SNAPSHOT", ""):
+        raise HTTPException(
+            status_code=409,
+            detail="Index en lecture seule: réplica démarré depuis un instantané (INDEX_SNAPSHOT)"
+        )
+    if forked_worker:
+        # BM25, index compact, cache et client Chroma propres à chaque worker:
+        # une modification ne serait vue que par le worker qui l'a reçue
+        raise HTTPException(
+            status_code=409,
+            detail="Ingestion à chaud indisponible avec WORKERS > 1: déposer le fichier dans le corpus puis redémarrer"
+        )
+    return manager
+
+
+@app.get("/api/documents", response_model=DocumentsResponse)
+async def list_documents():
+    """
+    Lister les documents indexés et les imports en cours
+    
+    Returns:
+        DocumentsResponse: nom, taille, date et statut (indexed, processing,
+        failed) de chaque document, et les derniers jobs d'ingestion
+    """
+    manager = _document_manager()
+    return DocumentsResponse(success=True, documents=manager.list_documents(), jobs=manager.jobs())
+
+
+@app.put("/api/documents/{name:path}", response_model=IngestionJobResponse, status_code=202)
+async def upload_document(name: str, request: Request):
+    """
+    Ajouter ou remplacer un document (corps de la requête = fichier brut)
+    
+    Formats: .pdf, .txt, .md. L'indexation se fait en arrière-plan : suivre
+    la progression avec /api/documents/jobs/{job_id}.
+    
+    Raises:
+        HTTPException 400: Nom invalide, format non pris en charge ou fichier vide
+        HTTPException 409: Réplica en lecture seule (INDEX_SNAPSHOT) ou WORKERS > 1
+        HTTPException 413: Fichier trop volumineux (INGEST_MAX_MB)
+        HTTPException 503: Si le système RAG démarre ou n'est pas initialisé
+    """
+    manager = _writable_document_manager()
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > manager.max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Fichier trop volumineux (max {manager.max_bytes // (1024 * 1024)} Mo)"
+        )
+    data = await request.body()
+    try:
+        job = manager.submit_upsert(name, data)
+    except ValueError as e:
+        status = 413 if len(data) > manager.max_bytes else 400
+        raise HTTPException(status_code=status, detail=str(e))
+    return IngestionJobResponse(**job.to_dict())
+
+
+@app.delete("/api/documents/{name:path}", response_model=IngestionJobResponse, status_code=202)
+async def delete_document(name: str):
+    """
+    Supprimer un document de l'index (et son texte du corpus)
+    
+    Raises:
+        HTTPException 400: Nom invalide
+        HTTPException 404: Document inconnu
+        HTTPException 409: Réplica en lecture seule (INDEX_SNAPSHOT) ou WORKERS > 1
+        HTTPException 503: Si le système RAG démarre ou n'est pas initialisé
+    """
+    manager = _writable_document_manager()
+    try:
+        job = manager.submit_delete(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"success": False, "error": f"Document inconnu: {name}"}
+        )
+    return IngestionJobResponse(**job.to_dict())
+
+
+@app.get("/api/documents/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(job_id: str):
+    """
+    Progression d'un job d'ingestion
+    
+    Étapes: queued, extracting, embedding, saving, refreshing, done (ou
+    deleting pour une suppression, failed en cas d'erreur)
+    """
+    job = _document_manager().job(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"success": False, "error": f"Job inconnu: {job_id}"}
+        )
+    return IngestionJobResponse(**job)
+
+
 @app.post("/api/clear-history")
-async def clear_history():
+def clear_history():
     """
     Effacer l'historique des conversations
     
@@ -414,11 +1331,7 @@ async def clear_history():
     Raises:
         HTTPException 503: Si le système RAG n'est pas initialisé
     """
-    if not qa_system:
-        raise HTTPException(
-            status_code=503,
-            detail="Système RAG non initialisé"
-        )
+    _require_rag()
     
     try:
         qa_system.db.clear_history()
@@ -500,11 +1413,18 @@ if __name__ == "__main__":
     print("=" * 80)
     print("[INFO] Appuyez sur CTRL+C pour arreter\n")
     
-    # Lancer avec Uvicorn
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=port,
-        log_level="info"
-    )
+    # Plusieurs workers: chargement unique puis fork (modèles partagés en copy-on-write)
+    workers = int(os.environ.get("WORKERS", 1))
+    if workers > 1:
+        from multiworker import serve_prefork
+        serve_prefork(app, start_rag_system, workers, host="0.0.0.0", port=port,
+                      after_fork=after_worker_fork)
+    else:
+        # Lancer avec Uvicorn
+        uvicorn.run(
+            app,
+            host="0.0.0.0",
+            port=port,
+            log_level="info"
+        )
 
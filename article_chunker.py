@@ -0,0 +1,216 @@
+"""
+Module Article Chunker - Découpage des codes selon leur structure
+
+Le découpage par fenêtres fixes (CHUNK_SIZE / CHUNK_OVERLAP) coupe les
+articles au milieu d'une phrase et recopie le chevauchement dans l'index ;
+il faut ensuite récupérer plusieurs chunks pour reconstituer un article.
+Avec CHUNKER=article, le texte est découpé selon sa structure :
+- un chunk par article, titre « Article L1234-5 » compris
+- un article plus long que ARTICLE_MAX_CHARS est découpé entre alinéas,
+  puis entre phrases, sans chevauchement
+- numéro d'article et hiérarchie (partie, livre, titre, chapitre, section...)
+  dans les métadonnées de chaque chunk
+- une seule passe sur les lignes (temps linéaire, un article en mémoire)
+
+Un texte sans titres d'articles (décret, note) est découpé de la même façon
+par section.
+"""
+import re
+
+from extractive import split_sentences
+from hybrid_retrieval import article_ref
+
+# Niveaux de la hiérarchie, du plus haut au plus bas (nature: partie législative ou réglementaire)
+LEVELS = ("nature", "partie", "livre", "titre", "chapitre", "section", "sous_section", "paragraphe")
+
+_ORDINAL = r"(?:[IVXLC]+|\d+|premier|première|préliminaire|unique)(?:er|ère)?"
+# Fin d'une ligne de titre: rien, ou un séparateur suivi de l'intitulé ("Titre II : Contrat").
+# Une ligne de texte repliée ("titre II du livre Ier sont applicables") n'est pas un titre
+_HEADING_END = r"[ \t]*(?:[:\u2013\u2014-].*)?$"
+_HEADING_RES = (
+    ("nature", re.compile(rf"^Partie\s+(?:législative|réglementaire){_HEADING_END}")),
+    ("partie", re.compile(
+        rf"^(?:Partie\s+{_ORDINAL}"
+        rf"|(?:Première|Deuxième|Troisième|Quatrième|Cinquième|Sixième|Septième|Huitième)\s+partie){_HEADING_END}")),
+    ("livre", re.compile(rf"^Livre\s+{_ORDINAL}{_HEADING_END}")),
+    ("titre", re.compile(rf"^Titre\s+{_ORDINAL}{_HEADING_END}")),
+    ("chapitre", re.compile(rf"^Chapitre\s+{_ORDINAL}{_HEADING_END}")),
+    ("section", re.compile(rf"^Section\s+{_ORDINAL}{_HEADING_END}")),
+    ("sous_section", re.compile(rf"^Sous-section\s+{_ORDINAL}{_HEADING_END}")),
+    ("paragraphe", re.compile(rf"^Paragraphe\s+{_ORDINAL}{_HEADING_END}")),
+)
+# Ligne de titre d'article: "Article L1234-5", "Art. R. 4121-1 : ...", "Article 1er" (casse respectée)
+_ARTICLE_LINE_RE = re.compile(
+    r"^Art(?:icle|\.)\s+(?:([LRD])\s?\*?\s?\.?\s?(\d{1,4}(?:-\d+)+)|(\d+)\s?(?:er)?|(premier|unique))"
+    + _HEADING_END
+)
+
+# Au-delà, une ligne n'est pas un titre de partie/livre/titre/chapitre
+HEADING_MAX_CHARS = 200
+# Longueur conservée d'un titre dans les métadonnées
+HEADING_METADATA_CHARS = 120
+
+
+def match_article(line: str):
+    """Référence de l'article qui commence à cette ligne (None sinon)"""
+    match = _ARTICLE_LINE_RE.match(line)
+    if match is None:
+        return None
+    letter, number, plain, word = match.groups()
+    if letter:
+        return article_ref(letter, number)
+    return plain or ("1" if word.lower() == "premier" else word.lower())
+
+
+def match_heading(line: str):
+    """Niveau de hiérarchie d'une ligne de titre (None sinon)"""
+    if len(line) > HEADING_MAX_CHARS:
+        return None
+    for level, pattern in _HEADING_RES:
+        if pattern.match(line):
+            return level
+    return None
+
+
+def iter_lines(text: str):
+    """(position, ligne) de chaque ligne d'un texte, sans copie du texte"""
+    start = 0
+    while start <= len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        yield start, text[start:end]
+        start = end + 1
+
+
+class ArticleChunker:
+    """
+    Découpage en articles (ou sections) avec hiérarchie en métadonnées
+
+    Args:
+        max_chars: Taille maximale d'un chunk ; un article plus long est
+            découpé en parties (part / parts dans les métadonnées)
+    """
+
+    def __init__(self, max_chars: int = 1500):
+        self.max_chars = max(200, max_chars)
+
+    @classmethod
+    def from_config(cls, config) -> "ArticleChunker":
+        return cls(max_chars=getattr(config, "ARTICLE_MAX_CHARS", 1500))
+
+    def split_text(self, text: str) -> list:
+        """Chunks d'un texte: [(texte, métadonnées avec start_index)]"""
+        return list(self.iter_chunks(iter_lines(text)))
+
+    def iter_chunks(self, lines):
+        """
+        Découper un flux de lignes en une passe
+
+        Args:
+            lines: Itérable de (position dans le texte, ligne sans "\\n"),
+                lignes consécutives du texte
+
+        Yields:
+            (texte, métadonnées) ; le texte est exactement text[start_index:start_index + len]
+        """
+        hierarchy = {}
+        unit, article, unit_hierarchy = [], None, {}
+        for offset, line in lines:
+            stripped = line.strip()
+            ref = match_article(stripped) if stripped else None
+            level = match_heading(stripped) if stripped and ref is None else None
+            if ref is None and level is None:
+                unit.append((offset, line))
+                continue
+            yield from self._flush(unit, article, unit_hierarchy)
+            if ref is not None:
+                unit, article, unit_hierarchy = [(offset, line)], ref, dict(hierarchy)
+                continue
+            # Nouveau titre: les niveaux inférieurs ne s'appliquent plus
+            for deeper in LEVELS[LEVELS.index(level):]:
+                hierarchy.pop(deeper, None)
+            hierarchy[level] = stripped[:HEADING_METADATA_CHARS]
+            unit, article, unit_hierarchy = [], None, dict(hierarchy)
+        yield from self._flush(unit, article, unit_hierarchy)
+
+    def _flush(self, unit: list, article, hierarchy: dict):
+        """Chunks d'un article ou d'une section (lignes consécutives)"""
+        if not unit:
+            return
+        base = unit[0][0]
+        text = "\n".join(line for _, line in unit)
+        spans = self._pieces(text)
+        if not spans:
+            return
+        parts = self._pack(spans)
+        for number, (start, end) in enumerate(parts, 1):
+            metadata = {"start_index": base + start}
+            if article is not None:
+                metadata["article"] = article
+            metadata.update(hierarchy)
+            if len(parts) > 1:
+                metadata["part"], metadata["parts"] = number, len(parts)
+            yield text[start:end], metadata
+
+    def _pieces(self, text: str) -> list:
+        """(début, fin) des alinéas ; phrases d'un alinéa trop long, coupure dure en dernier recours"""
+        pieces = []
+        for start, end in _paragraphs(text):
+            if end - start <= self.max_chars:
+                pieces.append((start, end))
+                continue
+            for s_start, s_end in split_sentences(text[start:end]):
+                s_start, s_end = start + s_start, start + s_end
+                while s_end - s_start > self.max_chars:
+                    cut = text.rfind(" ", s_start, s_start + self.max_chars)
+                    cut = cut if cut > s_start else s_start + self.max_chars
+                    pieces.append((s_start, cut))
+                    s_start = cut + 1 if text[cut:cut + 1] == " " else cut
+                pieces.append((s_start, s_end))
+        return pieces
+
+    def _pack(self, pieces: list) -> list:
+        """Regrouper les morceaux consécutifs tant que le chunk tient dans max_chars"""
+        parts = []
+        start, end = pieces[0]
+        for p_start, p_end in pieces[1:]:
+            if p_end - start <= self.max_chars:
+                end = p_end
+            else:
+                parts.append((start, end))
+                start, end = p_start, p_end
+        parts.append((start, end))
+        return parts
+
+
+def _paragraphs(text: str) -> list:
+    """(début, fin) des alinéas non vides (séparés par une ligne vide)"""
+    spans, start = [], None
+    for offset, line in iter_lines(text):
+        if line.strip():
+            if start is None:
+                start = offset + len(line) - len(line.lstrip())
+            end = offset + len(line.rstrip())
+        elif start is not None:
+            spans.append((start, end))
+            start = None
+    if start is not None:
+        spans.append((start, end))
+    return spans
+
+
+def chunk_documents(documents: list, chunker: ArticleChunker) -> list:
+    """
+    Découper des Documents langchain (chargement en bloc, INGEST_STREAMING=false)
+
+    Returns:
+        Documents des chunks, métadonnées du document d'origine complétées
+    """
+    from langchain_core.documents import Document
+
+    chunks = []
+    for doc in documents:
+        for text, metadata in chunker.split_text(doc.page_content):
+            chunks.append(Document(page_content=text, metadata=dict(doc.metadata, **metadata)))
+    return chunks
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Module Batch Ask - Questions en masse (API /api/ask/batch et ligne de commande)
+
+Un jeu d'évaluation ou une FAQ de plusieurs centaines de questions passe en
+une fois au lieu d'autant d'appels /api/ask séquentiels :
+- questions identiques (après normalisation) traitées une seule fois
+- embeddings de toutes les questions calculés par lots avant la
+  récupération (cache du QueryEmbedder)
+- questions réparties sur plusieurs threads : le micro-batching regroupe
+  les générations concurrentes (LLM_BATCH_SIZE)
+- résultats émis en JSONL au fil de l'eau (ordre d'achèvement), avec
+  sources et temps par étape
+
+Entrée JSONL, une question par ligne :
+    {"id": "q1", "question": "Quelle est la durée du préavis ?"}
+    "Combien de jours de congés payés ?"          (id = numéro de ligne)
+
+Usage:
+    python batch_ask.py questions.jsonl --output answers.jsonl
+    # Après un crash: même commande, les id déjà présents dans la sortie sont sautés
+    python batch_ask.py questions.jsonl --output answers.jsonl
+    # Référence: boucle séquentielle sur ask_detailed
+    python batch_ask.py questions.jsonl --output seq.jsonl --sequential
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from llm_runtime import GenerationCancelled, GenerationContext
+from query_embedder import normalize_text
+
+# Lignes écrites entre deux fsync de la sortie (reprise après crash)
+FSYNC_EVERY = 20
+
+
+def parse_questions(lines) -> list:
+    """
+    Lire des questions JSONL
+
+    Args:
+        lines: Itérable de lignes ({"id", "question"} ou chaîne JSON)
+
+    Returns:
+        Liste de (id, question)
+
+    Raises:
+        ValueError: Ligne invalide, question vide ou id en double
+    """
+    items, seen = [], set()
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ligne {number}: JSON invalide ({e.msg})")
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not str(record.get("question") or "").strip():
+            raise ValueError(f"Ligne {number}: question manquante")
+        item_id = str(record.get("id", number))
+        if item_id in seen:
+            raise ValueError(f"Ligne {number}: id en double ({item_id})")
+        seen.add(item_id)
+        items.append((item_id, record["question"].strip()))
+    return items
+
+
+def chunk_sources(chunks) -> list:
+    """Sources d'un AskResult (chunks vus par le LLM)"""
+    return [
+        {"id": chunk.rank, "name": chunk.source, "excerpt": chunk.content, "score": chunk.score}
+        for chunk in chunks
+    ]
+
+
+class BatchJob:
+    """
+    Exécution d'un lot de questions (résultats via results())
+
+    Args:
+        runner: BatchRunner
+        items: Liste de (id, question)
+    """
+
+    def __init__(self, runner, items: list):
+        self.runner = runner
+        # Questions identiques regroupées: une seule réponse calculée par clé
+        self.groups = OrderedDict()
+        for item_id, question in items:
+            self.groups.setdefault(normalize_text(question), []).append((item_id, question))
+        self.total = len(items)
+        self.unique = len(self.groups)
+        self.completed = 0
+        self.errors = 0
+        self.embed_ms = 0.0
+        self.elapsed = 0.0
+        self._contexts = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = {}
+        self._cancelled = threading.Event()
+
+    def _answer(self, question: str, submitted_at: float):
+        if self._cancelled.is_set():
+            raise GenerationCancelled()
+        started_at = time.perf_counter()
+        context = GenerationContext()
+        with self._lock:
+            self._contexts.add(context)
+        try:
+            result = self.runner.qa_system.ask_detailed(
+                question, save=self.runner.save, context=context, use_cache=self.runner.use_cache
+            )
+        finally:
+            with self._lock:
+                self._contexts.discard(context)
+        result.timings["wait_ms"] = round(1000 * (started_at - submitted_at), 2)
+        return result
+
+    def results(self):
+        """
+        Répondre à toutes les questions
+
+        Yields:
+            Un dict par question d'entrée, dans l'ordre d'achèvement :
+            id, question, answer, sources, timings (duplicate_of pour une
+            question identique à une autre) ou error
+        """
+        start = time.perf_counter()
+        embedder = self.runner.qa_system.query_embedder
+        if embedder is not None:
+            embed_start = time.perf_counter()
+            embedder.prefetch([group[0][1] for group in self.groups.values()], self.runner.embed_batch_size)
+            self.embed_ms = round(1000 * (time.perf_counter() - embed_start), 2)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.runner.concurrency, thread_name_prefix="batch-ask")
+        try:
+            submitted_at = time.perf_counter()
+            for key, group in self.groups.items():
+                future = self._executor.submit(self._answer, group[0][1], submitted_at)
+                self._futures[future] = key
+            for future in as_completed(self._futures):
+                group = self.groups[self._futures[future]]
+                try:
+                    result = future.result()
+                    error = None
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+                first_id = group[0][0]
+                for item_id, question in group:
+                    with self._lock:
+                        self.completed += 1
+                        self.errors += error is not None
+                    if error is not None:
+                        yield {"id": item_id, "question": question, "error": error}
+                        continue
+                    record = {
+                        "id": item_id,
+                        "question": question,
+                        "answer": result.answer,
+                        "sources": chunk_sources(result.chunks),
+                        "timings": result.timings,
+                    }
+                    if item_id != first_id:
+                        record["duplicate_of"] = first_id
+                    yield record
+        finally:
+            self.cancel()
+            self.elapsed = time.perf_counter() - start
+
+    def cancel(self):
+        """Abandonner les questions restantes (client déconnecté, arrêt)"""
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
+        with self._lock:
+            for context in self._contexts:
+                context.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def summary(self) -> dict:
+        elapsed = self.elapsed
+        return {
+            "questions": self.total,
+            "unique": self.unique,
+            "duplicates": self.total - self.unique,
+            "completed": self.completed,
+            "errors": self.errors,
+            "embed_ms": self.embed_ms,
+            "elapsed_s": round(elapsed, 2),
+            "questions_per_s": round(self.completed / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class BatchRunner:
+    """
+    Questions en masse sur un SimpleQASystem
+
+    Args:
+        qa_system: SimpleQASystem
+        concurrency: Questions traitées en parallèle (>= LLM_BATCH_SIZE pour
+            remplir les lots de génération)
+        embed_batch_size: Questions encodées par passe du modèle d'embedding
+        save: Enregistrer les réponses dans l'historique
+        use_cache: Consulter le cache de réponses
+    """
+
+    def __init__(self, qa_system, concurrency: int = 4, embed_batch_size: int = 64,
+                 save: bool = False, use_cache: bool = True):
+        self.qa_system = qa_system
+        self.concurrency = max(1, concurrency)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.save = save
+        self.use_cache = use_cache
+
+    @classmethod
+    def from_config(cls, qa_system, config, **kwargs) -> "BatchRunner":
+        concurrency = getattr(config, "BATCH_CONCURRENCY", 0) or getattr(config, "LLM_BATCH_SIZE", 1)
+        kwargs.setdefault("concurrency", concurrency)
+        kwargs.setdefault("embed_batch_size", getattr(config, "EMBEDDING_BATCH_SIZE", 64))
+        return cls(qa_system, **kwargs)
+
+    def start(self, items: list) -> BatchJob:
+        return BatchJob(self, items)
+
+
+# ============ LIGNE DE COMMANDE ============
+
+def load_done_ids(output: Path) -> set:
+    """
+    id déjà répondus dans une sortie existante
+
+    Une dernière ligne incomplète (crash pendant l'écriture) est tronquée ;
+    les questions en erreur sont reposées.
+    """
+    done = set()
+    if not output.exists():
+        return done
+    valid_size = 0
+    with open(output, "rb") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            if not raw.endswith(b"\n"):
+                break
+            valid_size += len(raw)
+            if "error" not in record:
+                done.add(str(record.get("id")))
+    if valid_size < output.stat().st_size:
+        print(f"[WARNING] Dernière ligne incomplète de {output} supprimée")
+        with open(output, "r+b") as f:
+            f.truncate(valid_size)
+    return done
+
+
+def run_sequential(qa_system, items: list, use_cache: bool):
+    """Référence: une question après l'autre, sans regroupement"""
+    for item_id, question in items:
+        try:
+            result = qa_system.ask_detailed(question, save=False, use_cache=use_cache)
+            yield {
+                "id": item_id,
+                "question": question,
+                "answer": result.answer,
+                "sources": chunk_sources(result.chunks),
+                "timings": result.timings,
+            }
+        except Exception as e:
+            yield {"id": item_id, "question": question, "error": f"{type(e).__name__}: {e}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Répondre à un fichier JSONL de questions")
+    parser.add_argument("questions", type=Path, help="Fichier JSONL de questions")
+    parser.add_argument("--output", "-o", type=Path, required=True, help="Fichier JSONL des réponses (reprise)")
+    parser.add_argument("--llm-batch-size", type=int, default=8, help="Taille des lots de génération")
+    parser.add_argument("--concurrency", type=int, default=0, help="Questions en parallèle (défaut: taille de lot)")
+    parser.add_argument("--save", action="store_true", help="Enregistrer les réponses dans l'historique")
+    parser.add_argument("--no-cache", action="store_true", help="Ne pas consulter le cache de réponses")
+    parser.add_argument("--limit", type=int, default=0, help="Nombre maximal de questions")
+    parser.add_argument("--sequential", action="store_true", help="Boucle séquentielle (mesure de référence)")
+    parser.add_argument("--stub", action="store_true", help="Modèles factices (RAG_STUB_MODELS)")
+    args = parser.parse_args()
+
+    if args.stub:
+        os.environ["RAG_STUB_MODELS"] = "true"
+    # Lu par RAGConfig à l'import de simple_rag
+    os.environ["LLM_BATCH_SIZE"] = str(1 if args.sequential else args.llm_batch_size)
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        items = parse_questions(f)
+    if args.limit:
+        items = items[:args.limit]
+    done = load_done_ids(args.output)
+    remaining = [item for item in items if item[0] not in done]
+    print(f"[INFO] {len(items)} questions, {len(items) - len(remaining)} déjà répondues, {len(remaining)} à traiter")
+    if not remaining:
+        return
+
+    from simple_rag import SimpleQASystem
+
+    qa_system = SimpleQASystem()
+    use_cache = not args.no_cache
+    job = None
+    if args.sequential:
+        results = run_sequential(qa_system, remaining, use_cache)
+    else:
+        runner = BatchRunner.from_config(
+            qa_system, qa_system.config,
+            concurrency=args.concurrency or args.llm_batch_size, save=args.save, use_cache=use_cache
+        )
+        job = runner.start(remaining)
+        results = job.results()
+
+    start = time.perf_counter()
+    count = errors = 0
+    with open(args.output, "a", encoding="utf-8") as out:
+        try:
+            for record in results:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                count += 1
+                errors += "error" in record
+                if count % FSYNC_EVERY == 0:
+                    os.fsync(out.fileno())
+                    rate = count / (time.perf_counter() - start)
+                    print(f"[INFO] {count}/{len(remaining)} réponses ({rate:.2f} q/s)")
+        finally:
+            out.flush()
+            os.fsync(out.fileno())
+
+    store = getattr(qa_system.db, "store", None)
+    if store is not None:
+        store.close()
+
+    elapsed = time.perf_counter() - start
+    summary = job.summary() if job else {
+        "questions": len(remaining), "completed": count, "errors": errors,
+        "elapsed_s": round(elapsed, 2), "questions_per_s": round(count / elapsed, 2) if elapsed else 0.0,
+    }
+    summary["mode"] = "sequential" if args.sequential else "batch"
+    print(json.dumps(summary, ensure_ascii=False))
+    if errors:
+        print(f"[WARNING] {errors} questions en erreur: relancer la commande pour les reposer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark des backends d'inférence du LLM (LLM_BACKEND)
+
+Pour chaque backend (transformers, transformers-int8, gguf), dans un
+processus séparé : tokens/s, time-to-first-token, latence par question et
+mémoire résidente. Les réponses sont comparées à celles du premier backend
+(référence) : taux de réponses identiques et similarité mot à mot.
+
+Usage:
+    python benchmarks/backend_benchmark.py
+    LLM_GGUF_PATH=models/llama-3.2-1b-q4_k_m.gguf \\
+        python benchmarks/backend_benchmark.py --backends transformers transformers-int8 gguf \\
+        --questions benchmarks/questions.jsonl --output bench_backends.json
+    # Hors ligne (LLM factice, gguf ignoré)
+    python benchmarks/backend_benchmark.py --stub --backends transformers transformers-int8
+"""
+import argparse
+import difflib
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "benchmarks"))
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def run_worker(args):
+    """Répondre à toutes les questions avec le backend de l'environnement"""
+    from memory_benchmark import read_memory
+    from simple_rag import SimpleQASystem
+
+    qa = SimpleQASystem()
+    questions = load_questions(args.questions)[:args.limit or None]
+    loaded_memory = read_memory(os.getpid())
+
+    answers, latencies, ttfts, rates, tokens = [], [], [], [], 0
+    start = time.perf_counter()
+    for question in questions:
+        result = qa.ask_detailed(question, save=False, use_cache=False)
+        answers.append(result.answer)
+        latencies.append(result.timings["total_ms"] / 1000)
+        tokens += result.timings.get("tokens", 0)
+        if "ttft_ms" in result.timings:
+            ttfts.append(result.timings["ttft_ms"])
+        if "tokens_per_s" in result.timings:
+            rates.append(result.timings["tokens_per_s"])
+    wall = time.perf_counter() - start
+
+    print(json.dumps({
+        "backend": getattr(qa.llm, "backend", args.backend),
+        "questions": len(questions),
+        "tokens": tokens,
+        "tokens_per_s": round(sum(rates) / len(rates), 2) if rates else 0.0,
+        "ttft_ms_p50": round(percentile(ttfts, 0.50), 2),
+        "latency_p50_s": round(percentile(latencies, 0.50), 3),
+        "latency_p95_s": round(percentile(latencies, 0.95), 3),
+        "wall_s": round(wall, 2),
+        "memory_loaded": loaded_memory,
+        "memory_end": read_memory(os.getpid()),
+        "answers": answers,
+    }, ensure_ascii=False))
+
+
+def agreement(reference: list, answers: list) -> dict:
+    """Réponses identiques et similarité mot à mot moyenne par rapport à la référence"""
+    pairs = list(zip(reference, answers))
+    if not pairs:
+        return {"exact_match": 0.0, "word_similarity": 0.0}
+    exact = sum(a.strip() == b.strip() for a, b in pairs)
+    similarity = sum(difflib.SequenceMatcher(None, a.split(), b.split()).ratio() for a, b in pairs)
+    return {
+        "exact_match": round(exact / len(pairs), 3),
+        "word_similarity": round(similarity / len(pairs), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des backends d'inférence du LLM")
+    parser.add_argument("--backends", nargs="+", default=["transformers", "transformers-int8"],
+                        help="Backends comparés (le premier sert de référence)")
+    parser.add_argument("--questions", type=Path, default=BASE_DIR / "benchmarks" / "questions.jsonl")
+    parser.add_argument("--limit", type=int, default=0, help="Nombre maximal de questions")
+    parser.add_argument("--stub", action="store_true", help="Modèles factices (RAG_STUB_MODELS)")
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", default="transformers", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = []
+    for backend in args.backends:
+        env = dict(
+            os.environ,
+            LLM_BACKEND=backend,
+            LLM_BATCH_SIZE="1",
+            ANSWER_CACHE_ENABLED="false",
+        )
+        if args.stub:
+            env["RAG_STUB_MODELS"] = "true"
+        command = [
+            sys.executable, __file__, "--worker", "--backend", backend,
+            "--questions", str(args.questions), "--limit", str(args.limit),
+        ]
+        print(f"[BENCH] backend={backend} ...")
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        # La dernière ligne contient les résultats (le reste = logs d'initialisation)
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = results[0]["answers"]
+    for row in results:
+        row.update(agreement(reference, row["answers"]))
+
+    print(f"\n{'backend':>18} {'tokens/s':>9} {'ttft p50':>9} {'p50 (s)':>8} {'RSS (Mo)':>9} "
+          f"{'identiques':>11} {'similarité':>11}")
+    for row in results:
+        print(f"{row['backend']:>18} {row['tokens_per_s']:>9} {row['ttft_ms_p50']:>9} {row['latency_p50_s']:>8} "
+              f"{row['memory_loaded']['rss_mb']:>9} {row['exact_match']:>11} {row['word_similarity']:>11}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
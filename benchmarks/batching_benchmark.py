@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark du micro-batching des générations
+
+Mesure le débit (réponses/minute) et la latence p50/p95 à 1, 4 et 16
+clients concurrents, avec et sans micro-batching. Chaque mode tourne dans
+un processus séparé (le hook de génération est installé une fois par modèle).
+
+Usage:
+    python benchmarks/batching_benchmark.py
+    python benchmarks/batching_benchmark.py --batch-sizes 1 4 8 --concurrency 1 4 16 \\
+        --questions benchmarks/questions.jsonl --output bench_batching.json
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def run_worker(args):
+    """Exécuter toutes les concurrences pour une taille de lot donnée"""
+    from simple_rag import SimpleQASystem
+
+    qa = SimpleQASystem()
+    questions = load_questions(args.questions)
+    results = []
+
+    for concurrency in args.concurrency:
+        # Assez de requêtes pour occuper tous les clients plusieurs fois
+        batch = (questions * math.ceil(args.requests_per_client * concurrency / len(questions)))
+        batch = batch[:args.requests_per_client * concurrency]
+
+        def timed(question):
+            start = time.perf_counter()
+            qa.ask_detailed(question, save=False, use_cache=False)
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, batch))
+        wall = time.perf_counter() - start
+
+        results.append({
+            "batch_size": args.batch_size,
+            "concurrency": concurrency,
+            "requests": len(batch),
+            "answers_per_minute": round(60 * len(batch) / wall, 2),
+            "latency_p50_s": round(percentile(latencies, 0.50), 3),
+            "latency_p95_s": round(percentile(latencies, 0.95), 3),
+            "batching": qa.batcher.stats() if qa.batcher else None,
+        })
+
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du micro-batching LLM")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4],
+                        help="Tailles de lot comparées (1 = sans batching)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-client", type=int, default=2)
+    parser.add_argument("--wait-ms", type=float, default=20)
+    parser.add_argument("--questions", type=Path, default=BASE_DIR / "benchmarks" / "questions.jsonl")
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--batch-size", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    all_results = []
+    for batch_size in args.batch_sizes:
+        env = dict(
+            os.environ,
+            LLM_BATCH_SIZE=str(batch_size),
+            LLM_BATCH_WAIT_MS=str(args.wait_ms),
+            ANSWER_CACHE_ENABLED="false",
+        )
+        command = [
+            sys.executable, __file__, "--worker", "--batch-size", str(batch_size),
+            "--questions", str(args.questions),
+            "--requests-per-client", str(args.requests_per_client),
+            "--concurrency", *map(str, args.concurrency),
+        ]
+        print(f"[BENCH] batch_size={batch_size} ...")
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        # La dernière ligne contient les résultats (le reste = logs d'initialisation)
+        all_results.extend(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"\n{'batch':>6} {'clients':>8} {'rép/min':>10} {'p50 (s)':>9} {'p95 (s)':>9}")
+    for row in all_results:
+        print(f"{row['batch_size']:>6} {row['concurrency']:>8} {row['answers_per_minute']:>10} "
+              f"{row['latency_p50_s']:>9} {row['latency_p95_s']:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
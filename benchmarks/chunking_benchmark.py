@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark du découpage en chunks (CHUNKER)
+
+Découpe le corpus avec les fenêtres fixes (CHUNK_SIZE / CHUNK_OVERLAP) et
+avec le découpage par articles (ARTICLE_MAX_CHARS), indexe chaque variante
+dans une collection Chroma temporaire et compare :
+- nombre de chunks, taille moyenne / maximale, texte indexé par rapport au
+  corpus (chevauchement recopié)
+- articles coupés (répartis sur plusieurs chunks) et chunks par article
+- taille de l'index sur disque et temps d'indexation
+- latence de recherche (p50 / p95) et taille du contexte récupéré (top-k)
+
+Usage:
+    python benchmarks/chunking_benchmark.py
+    python benchmarks/chunking_benchmark.py --corpus data/cleaned --k 5 --output bench_chunking.json
+    # Hors ligne (embeddings factices)
+    python benchmarks/chunking_benchmark.py --stub
+"""
+import argparse
+import bisect
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def article_spans(text: str) -> list:
+    """(début, fin) de chaque article du texte (jusqu'au titre suivant)"""
+    from article_chunker import iter_lines, match_article, match_heading
+
+    starts, ends = [], []
+    for offset, line in iter_lines(text):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if match_article(stripped) is not None:
+            if len(ends) < len(starts):
+                ends.append(offset)
+            starts.append(offset)
+        elif match_heading(stripped) is not None and len(ends) < len(starts):
+            ends.append(offset)
+    if len(ends) < len(starts):
+        ends.append(len(text))
+    return [(start, len(text[start:end].rstrip()) + start) for start, end in zip(starts, ends)]
+
+
+def split_articles(prepared: dict) -> tuple:
+    """(articles, articles coupés, chunks qui recouvrent un article) pour un fichier"""
+    chunks = sorted((m["start_index"], m["start_index"] + len(t)) for t, m in prepared["chunks"] if m["start_index"] >= 0)
+    starts = [start for start, _ in chunks]
+    articles = article_spans(prepared["text"])
+    cut, covering = 0, 0
+    for a_start, a_end in articles:
+        # Chunks qui chevauchent l'article
+        first = max(0, bisect.bisect_right(starts, a_start) - 1)
+        overlapping = [c for c in chunks[first:bisect.bisect_left(starts, a_end)] if c[1] > a_start]
+        covering += len(overlapping)
+        if not any(start <= a_start and end >= a_end for start, end in overlapping):
+            cut += 1
+    return len(articles), cut, covering
+
+
+def embeddings_model(args, config):
+    if args.stub:
+        from stub_models import StubEmbeddings
+
+        return StubEmbeddings(getattr(config, "STUB_EMBEDDING_DIM", 384))
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(str(getattr(config, "EMBEDDING_MODEL", "")).split("+")[0])
+
+    class _Embeddings:
+        def embed_documents(self, texts):
+            return model.encode(texts, batch_size=32).tolist()
+
+    return _Embeddings()
+
+
+def run_variant(name: str, files: list, article_max_chars: int, args, config, embeddings, queries: list) -> dict:
+    import chromadb
+
+    from ingestion import prepare_file
+
+    chunk_size = getattr(config, "CHUNK_SIZE", 1000)
+    chunk_overlap = getattr(config, "CHUNK_OVERLAP", 200)
+    start = time.perf_counter()
+    prepared = [prepare_file(key, str(path), source, chunk_size, chunk_overlap, article_max_chars)
+                for key, path, source in files]
+    chunk_s = time.perf_counter() - start
+
+    lengths = [len(text) for p in prepared for text, _ in p["chunks"]]
+    corpus_chars = sum(len(p["text"]) for p in prepared)
+    articles = cut = covering = 0
+    for p in prepared:
+        a, c, n = split_articles(p)
+        articles, cut, covering = articles + a, cut + c, covering + n
+
+    index_dir = Path(tempfile.mkdtemp(prefix=f"chunking_{name}_"))
+    try:
+        collection = chromadb.PersistentClient(path=str(index_dir)).create_collection(
+            "bench", metadata={"hnsw:space": "cosine"}
+        )
+        start = time.perf_counter()
+        for p in prepared:
+            for offset in range(0, len(p["chunks"]), args.batch_size):
+                batch = p["chunks"][offset:offset + args.batch_size]
+                texts = [text for text, _ in batch]
+                collection.add(
+                    ids=[f"{p['key']}#{offset + i}" for i in range(len(batch))],
+                    embeddings=embeddings.embed_documents(texts),
+                    documents=texts,
+                    metadatas=[metadata for _, metadata in batch],
+                )
+        index_s = time.perf_counter() - start
+        disk_mb = sum(f.stat().st_size for f in index_dir.rglob("*") if f.is_file()) / 1e6
+
+        latencies, context_chars = [], []
+        for query in queries:
+            started = time.perf_counter()
+            result = collection.query(query_embeddings=[query], n_results=args.k, include=["documents"])
+            latencies.append(1000 * (time.perf_counter() - started))
+            context_chars.append(sum(len(doc) for doc in result["documents"][0]))
+    finally:
+        shutil.rmtree(index_dir, ignore_errors=True)
+
+    return {
+        "chunker": name,
+        "chunks": len(lengths),
+        "avg_chars": round(sum(lengths) / len(lengths), 1) if lengths else 0.0,
+        "max_chars": max(lengths, default=0),
+        "indexed_ratio": round(sum(lengths) / corpus_chars, 3) if corpus_chars else 0.0,
+        "articles": articles,
+        "articles_cut": cut,
+        "chunks_per_article": round(covering / articles, 2) if articles else 0.0,
+        "chunk_s": round(chunk_s, 2),
+        "index_s": round(index_s, 2),
+        "disk_mb": round(disk_mb, 2),
+        "search_p50_ms": round(percentile(latencies, 0.50), 3),
+        "search_p95_ms": round(percentile(latencies, 0.95), 3),
+        "context_chars": round(sum(context_chars) / len(context_chars), 1) if context_chars else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du découpage en chunks")
+    parser.add_argument("--corpus", type=Path, default=None, help="Répertoire du corpus (défaut: CLEANED_DIR)")
+    parser.add_argument("--questions", type=Path, default=BASE_DIR / "benchmarks" / "questions.jsonl")
+    parser.add_argument("--k", type=int, default=0, help="Chunks par recherche (défaut: RETRIEVAL_K)")
+    parser.add_argument("--article-max-chars", type=int, default=0, help="Défaut: ARTICLE_MAX_CHARS")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks encodés par lot")
+    parser.add_argument("--stub", action="store_true", help="Embeddings factices")
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    from index_manifest import scan_corpus
+    from ingestion import corpus_files
+    from simple_rag import RAGConfig
+
+    config = RAGConfig()
+    corpus = args.corpus or Path(config.CLEANED_DIR)
+    files = corpus_files(corpus, sorted(scan_corpus(corpus)))
+    args.k = args.k or getattr(config, "RETRIEVAL_K", 4)
+    article_max_chars = args.article_max_chars or getattr(config, "ARTICLE_MAX_CHARS", 1500)
+
+    embeddings = embeddings_model(args, config)
+    queries = embeddings.embed_documents(load_questions(args.questions))
+    print(f"[BENCH] {len(files)} fichiers, {len(queries)} questions, k={args.k}")
+
+    results = []
+    for name, max_chars in (("recursive", 0), ("article", article_max_chars)):
+        print(f"[BENCH] {name} ...")
+        results.append(run_variant(name, files, max_chars, args, config, embeddings, queries))
+
+    print(f"\n{'découpage':>10} {'chunks':>7} {'moy.':>7} {'max':>6} {'indexé':>7} {'coupés':>7} "
+          f"{'chunks/art.':>11} {'disque (Mo)':>12} {'index (s)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'contexte':>9}")
+    for row in results:
+        print(f"{row['chunker']:>10} {row['chunks']:>7} {row['avg_chars']:>7} {row['max_chars']:>6} "
+              f"{row['indexed_ratio']:>7} {row['articles_cut']:>7} {row['chunks_per_article']:>11} "
+              f"{row['disk_mb']:>12} {row['index_s']:>10} {row['search_p50_ms']:>9} {row['search_p95_ms']:>9} "
+              f"{row['context_chars']:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"files": len(files), "k": args.k, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Benchmark de charge de l'API (/api/ask, /api/history, /api/health)
+
+Rejoue un corpus de questions (JSONL) à concurrence fixe (boucle fermée)
+ou à débit d'arrivée fixe (boucle ouverte, arrivées de Poisson), et
+mesure par endpoint : débit, latence p50/p95/p99, time-to-first-token et
+répartition par étape côté serveur (embed, search, prompt, llm, db).
+
+Le serveur est lancé par le benchmark (modèles réels, ou factices avec
+--stub : aucun téléchargement, index et historique isolés) ou visé par --url.
+Les résultats JSON se comparent à une exécution précédente (--baseline) :
+le code de sortie vaut 1 si le p95 se dégrade au-delà de --max-regression.
+
+Taille des réponses : octets transférés par endpoint pendant la charge
+(--compress pour accepter gzip), puis comparaison avant/après des
+variantes d'une même réponse (complète, gzip, brotli, allégée, 304 sur
+ETag inchangé).
+
+Usage:
+    python benchmarks/load_benchmark.py --stub --concurrency 1 4 16 --output bench_load.json
+    python benchmarks/load_benchmark.py --stub --rate 2 --duration 60 --stream
+    python benchmarks/load_benchmark.py --stub --concurrency 4 --compress
+    python benchmarks/load_benchmark.py --url http://localhost:8001 --baseline bench_load.json
+"""
+import argparse
+import gzip
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from memory_benchmark import free_port, wait_ready
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Étapes rapportées par le serveur dans "timings"
+STAGES = ("embed_ms", "search_ms", "pack_ms", "prompt_ms", "llm_ms", "db_ms", "retrieve_ms", "total_ms")
+
+# Réponses allégées comparées aux réponses complètes
+SLIM_ASK = {"fields": ["answer", "sources"], "excerpt_chars": 300}
+SLIM_HISTORY = "&fields=id,question,timestamp&answer_chars=120"
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def parse_mix(items: list) -> dict:
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ============ CLIENT ============
+
+def decode_body(raw: bytes, encoding: str) -> bytes:
+    """Corps décompressé selon Content-Encoding"""
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(raw)
+    return raw
+
+
+class Client:
+    """Client HTTP (urllib, sans dépendance) partagé par les threads du scénario"""
+
+    def __init__(self, base_url: str, stream: bool, timeout: float, accept_encoding: str = "identity"):
+        self.base_url = base_url
+        self.stream = stream
+        self.timeout = timeout
+        self.accept_encoding = accept_encoding
+
+    def _open(self, path: str, payload: dict = None, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = dict({"Content-Type": "application/json", "Accept-Encoding": self.accept_encoding}, **(headers or {}))
+        req = urllib.request.Request(f"{self.base_url}{path}", data=data, headers=headers)
+        return urllib.request.urlopen(req, timeout=self.timeout)
+
+    def fetch(self, path: str, payload: dict = None, headers: dict = None) -> dict:
+        """Une requête: statut, octets transférés, encodage, ETag et corps décodé"""
+        try:
+            with self._open(path, payload, headers) as response:
+                raw = response.read()
+                status, response_headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            # 304 (ETag inchangé) levé comme HTTPError par urllib
+            raw, status, response_headers = e.read(), e.code, e.headers
+        encoding = response_headers.get("Content-Encoding") or "identity"
+        return {
+            "status": status,
+            "bytes": len(raw),
+            "encoding": encoding,
+            "etag": response_headers.get("ETag"),
+            "body": decode_body(raw, encoding) if raw else b"",
+        }
+
+    def call(self, endpoint: str, question: str) -> dict:
+        """Exécuter une requête; retourne statut, latence, ttft et temps serveur"""
+        start = time.perf_counter()
+        result = {"endpoint": endpoint, "status": 0, "ttft_s": None, "timings": {}}
+        try:
+            if endpoint == "ask" and self.stream:
+                self._ask_stream(question, start, result)
+            elif endpoint == "ask":
+                with self._open("/api/ask", {"question": question}) as response:
+                    result["status"] = response.status
+                    raw = response.read()
+                    result["bytes"] = len(raw)
+                    body = decode_body(raw, response.headers.get("Content-Encoding"))
+                    result["timings"] = json.loads(body).get("timings") or {}
+            else:
+                path = "/api/history?limit=10" if endpoint == "history" else "/api/health"
+                with self._open(path) as response:
+                    result["bytes"] = len(response.read())
+                    result["status"] = response.status
+        except urllib.error.HTTPError as e:
+            result["status"] = e.code
+        except (urllib.error.URLError, OSError) as e:
+            result["error"] = type(e).__name__
+        result["latency_s"] = time.perf_counter() - start
+        if result["ttft_s"] is None and result["timings"].get("ttft_ms") is not None:
+            result["ttft_s"] = result["timings"]["ttft_ms"] / 1000
+        return result
+
+    def _ask_stream(self, question: str, start: float, result: dict):
+        with self._open("/api/ask/stream", {"question": question}) as response:
+            result["status"] = response.status
+            event = None
+            for raw in response:
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: "):
+                    if event == "token" and result["ttft_s"] is None:
+                        result["ttft_s"] = time.perf_counter() - start
+                    elif event == "done":
+                        result["timings"] = json.loads(line[6:]).get("timings") or {}
+                    elif event == "error":
+                        result["status"] = 500
+                    if event in ("done", "error"):
+                        return
+
+
+# ============ SCÉNARIOS ============
+
+def run_scenario(client: Client, questions: list, mix: dict, concurrency: int,
+                 rate: float, requests_count: int, duration: float, seed: int) -> list:
+    """
+    Boucle fermée (rate = 0): `concurrency` clients enchaînent les requêtes.
+    Boucle ouverte (rate > 0): arrivées de Poisson, latence mesurée depuis
+    l'arrivée prévue (l'attente côté client est comptée).
+    """
+    rng = random.Random(seed)
+    endpoints, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + duration if duration else None
+    # Plan rejouable: même suite d'endpoints et de questions à graine égale
+    plan = ((rng.choices(endpoints, weights)[0], questions[i % len(questions)])
+            for i in itertools.count())
+    if not duration:
+        plan = itertools.islice(plan, requests_count)
+
+    results = []
+    lock = threading.Lock()
+
+    def record(result):
+        with lock:
+            results.append(result)
+
+    if rate <= 0:
+        def worker():
+            while deadline is None or time.perf_counter() < deadline:
+                with lock:
+                    item = next(plan, None)
+                if item is None:
+                    return
+                record(client.call(*item))
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def timed(item, scheduled):
+        result = client.call(*item)
+        # Latence depuis l'arrivée prévue (évite l'omission coordonnée)
+        result["latency_s"] = time.perf_counter() - scheduled
+        record(result)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        next_arrival = time.perf_counter()
+        for item in plan:
+            next_arrival += rng.expovariate(rate)
+            if deadline is not None and next_arrival > deadline:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(timed, item, next_arrival)
+    return results
+
+
+def summarize(results: list, wall: float) -> dict:
+    by_endpoint = defaultdict(list)
+    for result in results:
+        by_endpoint[result["endpoint"]].append(result)
+
+    summary = {}
+    for endpoint, rows in by_endpoint.items():
+        ok = [r for r in rows if r["status"] == 200]
+        latencies = [r["latency_s"] for r in ok]
+        ttfts = [r["ttft_s"] for r in ok if r["ttft_s"] is not None]
+        statuses = defaultdict(int)
+        for r in rows:
+            statuses[str(r["status"] or r.get("error", "error"))] += 1
+        entry = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "status": dict(statuses),
+            "throughput_rps": round(len(ok) / wall, 3) if wall else 0.0,
+            "latency_s": {q: round(percentile(latencies, p), 4)
+                          for q, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))},
+        }
+        sizes = [r["bytes"] for r in ok if "bytes" in r]
+        if sizes:
+            entry["bytes_avg"] = round(sum(sizes) / len(sizes))
+        if ttfts:
+            entry["ttft_s"] = {q: round(percentile(ttfts, p), 4)
+                               for q, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))}
+        stages = {}
+        for stage in STAGES:
+            values = [r["timings"][stage] for r in ok if isinstance(r["timings"].get(stage), (int, float))]
+            if values:
+                stages[stage] = {"p50": round(percentile(values, 0.50), 2),
+                                 "p95": round(percentile(values, 0.95), 2)}
+        if stages:
+            entry["stages_ms"] = stages
+        summary[endpoint] = entry
+    return summary
+
+
+def compare(results: list, baseline_path: Path, max_regression: float) -> list:
+    """Régressions de p95 par rapport à une exécution précédente"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(s["concurrency"], s["rate"], s["stream"]): s for s in json.load(f)["scenarios"]}
+    regressions = []
+    for scenario in results:
+        previous = baseline.get((scenario["concurrency"], scenario["rate"], scenario["stream"]))
+        if previous is None:
+            continue
+        for endpoint, entry in scenario["endpoints"].items():
+            old = previous["endpoints"].get(endpoint, {}).get("latency_s", {}).get("p95")
+            new = entry["latency_s"]["p95"]
+            if old and new > old * (1 + max_regression):
+                regressions.append(
+                    f"{endpoint} c={scenario['concurrency']} rate={scenario['rate']}: "
+                    f"p95 {old:.3f}s -> {new:.3f}s (+{100 * (new / old - 1):.0f}%)"
+                )
+    return regressions
+
+
+# ============ TAILLE DES RÉPONSES ============
+
+def measure_payloads(client: Client, question: str) -> list:
+    """
+    Octets transférés par variante d'une même réponse (avant/après)
+
+    Returns:
+        Liste de {endpoint, variant, status, encoding, bytes, ratio} ; ratio
+        par rapport à la réponse complète non compressée de l'endpoint
+    """
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+    history = "/api/history?limit=50"
+    variants = [("ask", "complète", "/api/ask", {"question": question}, "identity", None)]
+    variants += [("ask", e, "/api/ask", {"question": question}, e, None) for e in encodings]
+    variants.append(("ask", "allégée+gzip", "/api/ask", dict(SLIM_ASK, question=question), "gzip", None))
+    variants.append(("history", "complète", history, None, "identity", None))
+    variants += [("history", e, history, None, e, None) for e in encodings]
+    variants.append(("history", "allégée+gzip", history + SLIM_HISTORY, None, "gzip", None))
+    variants.append(("history", "304 (ETag)", history, None, "gzip", "etag"))
+    variants.append(("frontend", "complète", "/", None, "identity", None))
+    variants += [("frontend", e, "/", None, e, None) for e in encodings]
+    variants.append(("frontend", "304 (ETag)", "/", None, "gzip", "etag"))
+
+    rows, full, etags = [], {}, {}
+    for endpoint, variant, path, payload, encoding, conditional in variants:
+        headers = {"Accept-Encoding": encoding}
+        if conditional:
+            headers["If-None-Match"] = etags.get(path) or '""'
+        result = client.fetch(path, payload, headers)
+        if result["etag"] and encoding == "gzip":
+            etags[path] = result["etag"]
+        full.setdefault(endpoint, result["bytes"])
+        rows.append({
+            "endpoint": endpoint,
+            "variant": variant,
+            "status": result["status"],
+            "encoding": result["encoding"],
+            "bytes": result["bytes"],
+            "ratio": round(result["bytes"] / full[endpoint], 3) if full[endpoint] else 0.0,
+        })
+    return rows
+
+
+# ============ SERVEUR ============
+
+def start_server(args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port),
+               ANSWER_CACHE_ENABLED="true" if args.cache else "false")
+    if args.stub:
+        env["RAG_STUB_MODELS"] = "true"
+    process = subprocess.Popen(
+        [sys.executable, str(BASE_DIR / "app.py")], env=env, cwd=str(BASE_DIR),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    if not wait_ready(base_url, process, args.timeout):
+        process.terminate()
+        sys.exit("[ERROR] Serveur non prêt (voir les logs de app.py)")
+    return process, base_url
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(BASE_DIR),
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de charge de l'API")
+    parser.add_argument("--url", default=None, help="Serveur existant (sinon app.py est lancé)")
+    parser.add_argument("--stub", action="store_true", help="Modèles factices (hors ligne)")
+    parser.add_argument("--cache", action="store_true", help="Garder le cache de réponses actif")
+    parser.add_argument("--questions", type=Path, default=BASE_DIR / "benchmarks" / "questions.jsonl")
+    parser.add_argument("--mix", nargs="+", default=["ask=8", "history=1", "health=1"],
+                        help="Poids des endpoints (ask, history, health)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rate", type=float, default=0, help="Arrivées/s (0 = boucle fermée)")
+    parser.add_argument("--requests", type=int, default=40, help="Requêtes par scénario")
+    parser.add_argument("--duration", type=float, default=0, help="Durée par scénario (s), remplace --requests")
+    parser.add_argument("--stream", action="store_true", help="/api/ask/stream (TTFT côté client)")
+    parser.add_argument("--compress", action="store_true", help="Accepter gzip pendant la charge")
+    parser.add_argument("--no-payloads", action="store_true", help="Ne pas comparer la taille des réponses")
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--timeout", type=float, default=900, help="Attente maximale de /api/ready (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    parser.add_argument("--baseline", type=Path, default=None, help="Résultats JSON de référence")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Dégradation p95 tolérée (0.2 = +20%%)")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    mix = parse_mix(args.mix)
+    process = None
+    base_url = args.url
+    if base_url is None:
+        print(f"[BENCH] Lancement de app.py ({'modèles factices' if args.stub else 'modèles réels'}) ...")
+        process, base_url = start_server(args)
+
+    client = Client(base_url, args.stream, args.request_timeout,
+                    accept_encoding="gzip" if args.compress else "identity")
+    scenarios = []
+    payloads = []
+    try:
+        for concurrency in args.concurrency:
+            print(f"[BENCH] concurrence={concurrency} débit={args.rate or 'max'} ...")
+            start = time.perf_counter()
+            results = run_scenario(client, questions, mix, concurrency, args.rate,
+                                   args.requests, args.duration, args.seed)
+            wall = time.perf_counter() - start
+            scenarios.append({
+                "concurrency": concurrency,
+                "rate": args.rate,
+                "stream": args.stream,
+                "wall_s": round(wall, 2),
+                "endpoints": summarize(results, wall),
+            })
+        if not args.no_payloads:
+            print("[BENCH] taille des réponses ...")
+            payloads = measure_payloads(client, questions[0])
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"\n{'clients':>8} {'endpoint':>9} {'req/s':>8} {'p50 (s)':>9} {'p95 (s)':>9} "
+          f"{'p99 (s)':>9} {'ttft p95':>9} {'erreurs':>8}")
+    for scenario in scenarios:
+        for endpoint, entry in scenario["endpoints"].items():
+            ttft = entry.get("ttft_s", {}).get("p95", "-")
+            print(f"{scenario['concurrency']:>8} {endpoint:>9} {entry['throughput_rps']:>8} "
+                  f"{entry['latency_s']['p50']:>9} {entry['latency_s']['p95']:>9} "
+                  f"{entry['latency_s']['p99']:>9} {ttft:>9} {entry['errors']:>8}")
+
+    if payloads:
+        print(f"\n{'endpoint':>9} {'variante':>14} {'statut':>7} {'encodage':>9} {'octets':>9} {'ratio':>7}")
+        for row in payloads:
+            print(f"{row['endpoint']:>9} {row['variant']:>14} {row['status']:>7} {row['encoding']:>9} "
+                  f"{row['bytes']:>9} {row['ratio']:>7}")
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "stub": args.stub,
+            "compress": args.compress,
+            "url": args.url,
+            "mix": mix,
+            "questions": str(args.questions),
+        },
+        "scenarios": scenarios,
+        "payloads": payloads,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+    if args.baseline:
+        regressions = compare(scenarios, args.baseline, args.max_regression)
+        for line in regressions:
+            print(f"[REGRESSION] {line}")
+        if regressions:
+            sys.exit(1)
+        print("[OK] Pas de régression de p95")
+
+
+if __name__ == "__main__":
+    main()
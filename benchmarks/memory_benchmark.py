@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark mémoire du mode multi-worker (RSS / PSS par worker)
+
+Lance app.py avec WORKERS=1, 2, 4..., attend /api/ready, envoie quelques
+questions pour que chaque worker touche ses pages, puis relève la mémoire
+de chaque processus dans /proc/<pid>/smaps_rollup (Linux) :
+- RSS : pages résidentes, pages partagées comptées dans chaque processus
+- PSS : pages partagées réparties entre les processus (somme = coût réel)
+- USS : pages privées au processus
+
+Usage:
+    python benchmarks/memory_benchmark.py
+    python benchmarks/memory_benchmark.py --workers 1 2 4 --output bench_memory.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_memory(pid: int) -> dict:
+    """RSS / PSS / USS (Mo) d'un processus"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    uss = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(values.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+    }
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        try:
+            children.extend(int(p) for p in (task / "children").read_text().split())
+        except OSError:
+            pass
+    return children
+
+
+def request(url: str, payload: dict = None, timeout: float = 600):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.status
+
+
+def wait_ready(base_url: str, process, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            if request(f"{base_url}/api/ready", timeout=5) == 200:
+                return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(1)
+    return False
+
+
+def measure(workers: int, args) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, WORKERS=str(workers), PORT=str(port), ANSWER_CACHE_ENABLED="false")
+    process = subprocess.Popen(
+        [sys.executable, str(BASE_DIR / "app.py")], env=env, cwd=str(BASE_DIR),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    start = time.perf_counter()
+    try:
+        if not wait_ready(base_url, process, args.timeout):
+            raise RuntimeError(f"Serveur non prêt (WORKERS={workers})")
+        ready_s = round(time.perf_counter() - start, 1)
+
+        # Chaque worker doit servir des requêtes (pages copiées à l'écriture)
+        for i in range(args.warmup * workers):
+            request(f"{base_url}/api/ask", {"question": f"Quelle est la durée du préavis ? ({i})"})
+
+        master = read_memory(process.pid)
+        workers_memory = [read_memory(pid) for pid in child_pids(process.pid)]
+        # WORKERS=1: le processus unique sert lui-même les requêtes
+        processes = [master] + workers_memory
+        workers_memory = workers_memory or [master]
+        return {
+            "workers": workers,
+            "ready_s": ready_s,
+            "master": master,
+            "per_worker": workers_memory,
+            "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+            "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+            "avg_worker_uss_mb": round(
+                sum(p["uss_mb"] for p in workers_memory) / len(workers_memory), 1
+            ) if workers_memory else 0.0,
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mémoire multi-worker")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--warmup", type=int, default=2, help="Questions par worker avant la mesure")
+    parser.add_argument("--timeout", type=float, default=900, help="Attente maximale de /api/ready (s)")
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        sys.exit("[ERROR] /proc/<pid>/smaps_rollup requis (Linux)")
+
+    results = []
+    for workers in args.workers:
+        print(f"[BENCH] WORKERS={workers} ...")
+        results.append(measure(workers, args))
+
+    print(f"\n{'workers':>8} {'prêt (s)':>9} {'RSS total':>10} {'PSS total':>10} {'USS/worker':>11}")
+    for row in results:
+        print(f"{row['workers']:>8} {row['ready_s']:>9} {row['total_rss_mb']:>10} "
+              f"{row['total_pss_mb']:>10} {row['avg_worker_uss_mb']:>11}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Benchmark des backends de recherche dense (VECTOR_BACKEND)
+
+Compare la collection Chroma et l'index compact (float16 / int8, recherche
+exacte ou HNSW) sur les mêmes vecteurs et les mêmes requêtes. Chaque
+variante est construite puis interrogée dans deux processus séparés (la
+mémoire mesurée est celle d'un worker qui ouvre un index existant) :
+- recall@k par rapport à la recherche exacte en float32
+- latence par requête (p50 / p95), avec et sans filtre de métadonnées
+- mémoire résidente (RSS / PSS / USS) après ouverture et après les requêtes
+
+Vecteurs : ceux de l'index du projet (collection Chroma), ou un corpus
+synthétique de taille choisie. Requêtes : questions du jeu de benchmark
+encodées par le modèle d'embedding (ou les embeddings factices), ou points
+du corpus bruités en mode synthétique.
+
+Usage:
+    python benchmarks/vector_benchmark.py
+    python benchmarks/vector_benchmark.py --synthetic 100000 --dim 384 --k 10 --output bench_vectors.json
+    python benchmarks/vector_benchmark.py --variants compact-float16 compact-int8 compact-hnsw --synthetic 30000
+    # Hors ligne (embeddings factices, index du mode factice)
+    python benchmarks/vector_benchmark.py --stub
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "benchmarks"))
+
+VARIANTS = {
+    "chroma": None,
+    "compact-float16": ("float16", "exact"),
+    "compact-int8": ("int8", "exact"),
+    "compact-hnsw": ("float16", "hnsw"),
+}
+FILTER_KEY = "index_file"
+
+
+def load_questions(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+# ============ JEU DE DONNÉES ============
+
+def export_index(args):
+    """Vecteurs, textes et fichiers sources de la collection Chroma du projet"""
+    import chromadb
+    from index_manifest import MANIFEST_FILENAME, IndexManifest, get_persist_dir
+    from simple_rag import RAGConfig
+    from stub_models import apply_stub_config
+
+    config = RAGConfig()
+    if args.stub:
+        apply_stub_config(config)
+    persist_dir = get_persist_dir(config)
+    manifest = IndexManifest.load(persist_dir / MANIFEST_FILENAME)
+    if manifest is None or not manifest.collection_name:
+        raise SystemExit(f"[ERROR] Aucun index dans {persist_dir} (lancer l'application une première fois)")
+    collection = chromadb.PersistentClient(path=str(persist_dir)).get_collection(manifest.collection_name)
+    vectors, texts, files = [], [], []
+    offset = 0
+    while True:
+        data = collection.get(include=["embeddings", "documents", "metadatas"], limit=5000, offset=offset)
+        if not data["ids"]:
+            break
+        vectors.append(np.asarray(data["embeddings"], dtype=np.float32))
+        texts.extend(data["documents"])
+        files.extend((metadata or {}).get(FILTER_KEY) for metadata in data["metadatas"])
+        offset += len(data["ids"])
+
+    questions = load_questions(args.questions)
+    if args.stub:
+        from stub_models import StubEmbeddings
+
+        queries = StubEmbeddings(getattr(config, "STUB_EMBEDDING_DIM", 384)).embed_documents(questions)
+    else:
+        from sentence_transformers import SentenceTransformer
+
+        model_name = str(getattr(config, "EMBEDDING_MODEL", "")).split("+")[0]
+        queries = SentenceTransformer(model_name).encode(questions)
+    return np.concatenate(vectors), texts, files, np.asarray(queries, dtype=np.float32)
+
+
+def synthetic_corpus(args):
+    """Vecteurs groupés autour de centres (comme des chunks de mêmes thèmes)"""
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(max(1, args.synthetic // 50), args.dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), args.synthetic)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(args.synthetic, args.dim)).astype(np.float32)
+    texts = [f"Article L{label}-{row} : texte synthétique du chunk {row}." for row, label in enumerate(labels)]
+    files = [f"code_{label % 8}.txt" for label in labels]
+    picked = rng.choice(args.synthetic, size=min(args.queries, args.synthetic), replace=False)
+    queries = vectors[picked] + 0.4 * rng.normal(size=(len(picked), args.dim)).astype(np.float32)
+    return vectors, texts, files, queries
+
+
+def prepare(args, data_dir: Path) -> dict:
+    if args.synthetic:
+        vectors, texts, files, queries = synthetic_corpus(args)
+    else:
+        vectors, texts, files, queries = export_index(args)
+    np.save(data_dir / "vectors.npy", vectors)
+    np.save(data_dir / "queries.npy", queries)
+    with open(data_dir / "chunks.json", "w", encoding="utf-8") as f:
+        json.dump({"texts": texts, "files": files}, f, ensure_ascii=False)
+
+    # Référence: recherche exacte en float32, par blocs de requêtes
+    corpus = normalize(vectors)
+    truth = [np.argsort(-(normalize(block) @ corpus.T), axis=1)[:, :args.k]
+             for block in np.array_split(queries, max(1, len(queries) // 64))]
+    present = [f for f in files if f]
+    return {
+        "chunks": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "queries": len(queries),
+        "truth": np.concatenate(truth).tolist(),
+        "filter_value": max(set(present), key=present.count) if present else None,
+    }
+
+
+class ArrayCollection:
+    """Collection au contrat de Chroma.get() sur les fichiers du jeu de données"""
+
+    def __init__(self, data_dir: Path):
+        self.vectors = np.load(data_dir / "vectors.npy", mmap_mode="r")
+        with open(data_dir / "chunks.json", "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        self.texts, self.files = chunks["texts"], chunks["files"]
+
+    def get(self, include=None, limit=None, offset=0):
+        rows = range(offset, min(len(self.texts), offset + (limit or len(self.texts))))
+        return {
+            "ids": [str(row) for row in rows],
+            "embeddings": np.asarray(self.vectors[rows.start:rows.stop]),
+            "documents": [self.texts[row] for row in rows],
+            "metadatas": [{FILTER_KEY: self.files[row], "row": row} if self.files[row] else {"row": row}
+                          for row in rows],
+        }
+
+
+# ============ WORKERS ============
+
+def build_worker(args):
+    """Construire l'index d'une variante dans le répertoire de travail"""
+    from memory_benchmark import read_memory
+
+    data_dir = args.data
+    source = ArrayCollection(data_dir)
+    start = time.perf_counter()
+    if args.variant == "chroma":
+        import chromadb
+
+        client = chromadb.PersistentClient(path=str(data_dir / "chroma"))
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        for offset in range(0, len(source.texts), 5000):
+            batch = source.get(limit=5000, offset=offset)
+            collection.add(ids=batch["ids"], embeddings=batch["embeddings"].tolist(),
+                           documents=batch["documents"], metadatas=batch["metadatas"])
+    else:
+        from compact_index import CompactIndex
+
+        dtype, search = VARIANTS[args.variant]
+        CompactIndex.write(data_dir / args.variant, source, dtype, search, args.hnsw_m, args.hnsw_ef_construction)
+    print(json.dumps({"build_s": round(time.perf_counter() - start, 2), "memory_build": read_memory(os.getpid())}))
+
+
+def query_worker(args):
+    """Ouvrir l'index existant et l'interroger (requêtes une par une)"""
+    from memory_benchmark import read_memory
+
+    data_dir = args.data
+    queries = np.load(data_dir / "queries.npy")
+    where = {FILTER_KEY: args.filter_value} if args.filter_value else None
+    start = time.perf_counter()
+    if args.variant == "chroma":
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=str(data_dir / "chroma")).get_collection("bench")
+
+        def search(query, where=None):
+            result = collection.query(query_embeddings=[query.tolist()], n_results=args.k, where=where,
+                                      include=["documents", "metadatas", "distances"])
+            return [int(row) for row in result["ids"][0]]
+    else:
+        from compact_index import CompactIndex
+
+        index = CompactIndex(data_dir / args.variant)
+
+        def search(query, where=None):
+            found = index.search(query, args.k, where=where, ef=args.hnsw_ef)
+            # Documents construits comme pour une vraie requête
+            return [int(index.document(row, score).metadata["row"]) for row, score in found]
+
+    # Première requête: ouverture effective (Chroma charge le segment HNSW à la demande)
+    search(queries[0])
+    load_s = time.perf_counter() - start
+    memory_loaded = read_memory(os.getpid())
+
+    results, latencies, filtered = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append(1000 * (time.perf_counter() - started))
+    if where:
+        for query in queries:
+            started = time.perf_counter()
+            search(query, where)
+            filtered.append(1000 * (time.perf_counter() - started))
+
+    print(json.dumps({
+        "load_s": round(load_s, 3),
+        "latency_p50_ms": round(percentile(latencies, 0.50), 3),
+        "latency_p95_ms": round(percentile(latencies, 0.95), 3),
+        "filtered_p50_ms": round(percentile(filtered, 0.50), 3) if filtered else None,
+        "memory_loaded": memory_loaded,
+        "memory_end": read_memory(os.getpid()),
+        "results": results,
+    }))
+
+
+def run_worker(args, mode: str, variant: str, dataset: dict = None) -> dict:
+    command = [
+        sys.executable, __file__, "--worker", mode, "--variant", variant, "--data", str(args.data),
+        "--k", str(args.k), "--hnsw-m", str(args.hnsw_m), "--hnsw-ef", str(args.hnsw_ef),
+        "--hnsw-ef-construction", str(args.hnsw_ef_construction),
+    ]
+    if dataset and dataset["filter_value"]:
+        command += ["--filter-value", dataset["filter_value"]]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    # La dernière ligne contient les résultats (le reste = logs)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def recall_at_k(truth: list, results: list, k: int) -> float:
+    if not truth:
+        return 0.0
+    hits = sum(len(set(expected[:k]) & set(found[:k])) for expected, found in zip(truth, results))
+    return round(hits / (k * len(truth)), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des backends de recherche dense")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--k", type=int, default=10, help="Chunks par requête (recall@k)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Corpus synthétique de N chunks")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension des vecteurs synthétiques")
+    parser.add_argument("--queries", type=int, default=200, help="Requêtes du mode synthétique")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--questions", type=Path, default=BASE_DIR / "benchmarks" / "questions.jsonl")
+    parser.add_argument("--hnsw-m", type=int, default=int(os.getenv("COMPACT_HNSW_M", 16)))
+    parser.add_argument("--hnsw-ef", type=int, default=int(os.getenv("COMPACT_HNSW_EF", 64)))
+    parser.add_argument("--hnsw-ef-construction", type=int, default=int(os.getenv("COMPACT_HNSW_EF_CONSTRUCTION", 100)))
+    parser.add_argument("--stub", action="store_true", help="Embeddings factices et index du mode factice")
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    parser.add_argument("--worker", choices=["build", "query"], help=argparse.SUPPRESS)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--data", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--filter-value", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == "build":
+        build_worker(args)
+        return
+    if args.worker == "query":
+        query_worker(args)
+        return
+
+    args.data = Path(tempfile.mkdtemp(prefix="vector_bench_"))
+    try:
+        dataset = prepare(args, args.data)
+        print(f"[BENCH] {dataset['chunks']} chunks, dim {dataset['dim']}, {dataset['queries']} requêtes, k={args.k}")
+        results = []
+        for variant in args.variants:
+            print(f"[BENCH] {variant} ...")
+            row = {"variant": variant}
+            row.update(run_worker(args, "build", variant))
+            row.update(run_worker(args, "query", variant, dataset))
+            row["recall_at_k"] = recall_at_k(dataset["truth"], row.pop("results"), args.k)
+            row["disk_mb"] = round(sum(f.stat().st_size for f in (args.data / (
+                "chroma" if variant == "chroma" else variant)).rglob("*") if f.is_file()) / 1e6, 1)
+            results.append(row)
+    finally:
+        shutil.rmtree(args.data, ignore_errors=True)
+
+    print(f"\n{'variante':>16} {'recall@' + str(args.k):>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'filtre p50':>11} "
+          f"{'RSS (Mo)':>9} {'PSS (Mo)':>9} {'disque (Mo)':>12} {'build (s)':>10}")
+    for row in results:
+        filtered = row["filtered_p50_ms"] if row["filtered_p50_ms"] is not None else "-"
+        print(f"{row['variant']:>16} {row['recall_at_k']:>9} {row['latency_p50_ms']:>9} {row['latency_p95_ms']:>9} "
+              f"{filtered:>11} {row['memory_end']['rss_mb']:>9} {row['memory_end']['pss_mb']:>9} "
+              f"{row['disk_mb']:>12} {row['build_s']:>10}")
+
+    if args.output:
+        report = {"chunks": dataset["chunks"], "dim": dataset["dim"], "queries": dataset["queries"],
+                  "k": args.k, "results": results}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Module Coalescing - Une seule inférence par question en cours
+
+Aux heures de pointe, beaucoup d'utilisateurs posent la même question à
+quelques secondes d'intervalle ; chaque requête relançait sa récupération
+et sa génération sur un CPU déjà saturé. Le RequestCoalescer regroupe les
+requêtes concurrentes de même question normalisée (normalize_question du
+cache de réponses) :
+- la première (leader) soumet l'inférence au pool et possède le contexte de
+  génération
+- les suivantes s'attachent au calcul en cours : même résultat, ou même flux
+  de tokens (les événements déjà émis sont rejoués aux abonnés tardifs)
+- la génération n'est interrompue que lorsque tous les appelants sont partis
+- le calcul terminé, la question suivante relance une inférence (servie par
+  le cache de réponses le cas échéant)
+
+Toutes les méthodes s'exécutent sur la boucle asyncio ; seuls les événements
+du worker d'inférence y sont renvoyés avec call_soon_threadsafe.
+"""
+import asyncio
+
+from answer_cache import normalize_question
+from llm_runtime import GenerationContext
+
+
+class Flight:
+    """
+    Calcul partagé par les requêtes d'une même question
+
+    Args:
+        key: Question normalisée
+        question: Question du leader
+        streaming: Tokens émis pendant la génération (flux SSE du leader)
+    """
+
+    def __init__(self, key: str, question: str, streaming: bool):
+        self.key = key
+        self.question = question
+        self.streaming = streaming
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.context = GenerationContext(emit=self._emit if streaming else None)
+        self.events = []
+        self.subscribers = []
+        self.callers = 0
+        self.followers = 0
+
+    def _emit(self, kind: str, data):
+        """Événement du worker d'inférence (thread) renvoyé sur la boucle"""
+        self.loop.call_soon_threadsafe(self._publish, kind, data)
+
+    def _publish(self, kind: str, data):
+        self.events.append((kind, data))
+        for queue in self.subscribers:
+            queue.put_nowait((kind, data))
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        S'abonner aux événements du calcul
+
+        Returns:
+            File des événements (sources, token), déjà émis puis à venir,
+            terminée par ("result", AskResult) ou ("error", exception)
+        """
+        queue = asyncio.Queue()
+        for event in self.events:
+            queue.put_nowait(event)
+        if self.future.done():
+            error = self.future.exception()
+            queue.put_nowait(("error", error) if error else ("result", self.future.result()))
+        else:
+            self.subscribers.append(queue)
+        return queue
+
+    def _finish(self, future):
+        """Résultat du worker: transmis à la future partagée et aux abonnés"""
+        if future.cancelled():
+            error = asyncio.CancelledError()
+        else:
+            error = future.exception()
+        if error is not None:
+            self.future.set_exception(error)
+            # Exception lue par les abonnés: pas d'avertissement "never retrieved"
+            self.future.exception()
+            self._publish("error", error)
+        else:
+            self.future.set_result(future.result())
+            self._publish("result", future.result())
+        self.subscribers.clear()
+
+
+class RequestCoalescer:
+    """
+    Regroupement des requêtes identiques en cours (single-flight)
+
+    Args:
+        enabled: False pour lancer une inférence par requête (COALESCE_REQUESTS=false)
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights = {}
+        self._leaders = 0
+        self._coalesced = {}
+        self._cancelled = 0
+        self._max_followers = 0
+
+    def join(self, question: str, start, streaming: bool = False) -> tuple:
+        """
+        Rejoindre le calcul en cours pour cette question, ou le démarrer
+
+        Args:
+            question: Question posée
+            start: start(context) soumet l'inférence du leader et retourne
+                une concurrent.futures.Future (AskResult)
+            streaming: Appelant en streaming (endpoint /api/ask/stream)
+
+        Returns:
+            (flight, leader) ; leader=False pour une requête regroupée (son
+            historique n'est pas enregistré par le calcul partagé). Appeler
+            leave(flight) quand l'appelant a fini
+
+        Raises:
+            Les exceptions de start (QueueFullError) : aucun calcul n'est enregistré
+        """
+        key = normalize_question(question)
+        flight = self._flights.get(key) if self.enabled else None
+        if flight is not None:
+            flight.callers += 1
+            flight.followers += 1
+            endpoint = "stream" if streaming else "ask"
+            self._coalesced[endpoint] = self._coalesced.get(endpoint, 0) + 1
+            self._max_followers = max(self._max_followers, flight.followers)
+            return flight, False
+
+        flight = Flight(key, question, streaming)
+        future = start(flight.context)
+        asyncio.wrap_future(future, loop=flight.loop).add_done_callback(
+            lambda done: self._complete(flight, done)
+        )
+        flight.callers = 1
+        self._leaders += 1
+        if self.enabled:
+            self._flights[key] = flight
+        return flight, True
+
+    def in_flight(self, question: str) -> bool:
+        """Vrai si une question identique est en cours de calcul (join la rejoindrait)"""
+        return self.enabled and normalize_question(question) in self._flights
+
+    def _complete(self, flight: Flight, future):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        flight._finish(future)
+
+    def leave(self, flight: Flight):
+        """
+        Fin d'un appelant (réponse envoyée ou client déconnecté) ; le dernier
+        parti interrompt la génération si elle est encore en cours
+        """
+        flight.callers -= 1
+        if flight.callers > 0 or flight.future.done():
+            return
+        flight.context.cancel()
+        self._cancelled += 1
+        # Les requêtes suivantes ne rejoignent pas un calcul interrompu
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    async def result(self, flight: Flight):
+        """Résultat du calcul (AskResult) sans l'annuler si l'appelant part"""
+        return await asyncio.shield(flight.future)
+
+    def stats(self) -> dict:
+        """Calculs lancés, requêtes regroupées par endpoint, calculs en cours"""
+        coalesced = sum(self._coalesced.values())
+        requests = self._leaders + coalesced
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "flights": self._leaders,
+            "coalesced": coalesced,
+            "coalesced_by_endpoint": {
+                "ask": self._coalesced.get("ask", 0),
+                "stream": self._coalesced.get("stream", 0),
+            },
+            "coalesced_ratio": round(coalesced / requests, 3) if requests else 0.0,
+            "max_followers": self._max_followers,
+            "cancelled": self._cancelled,
+        }
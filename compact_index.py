@@ -0,0 +1,791 @@
+"""
+Module Compact Index - Index vectoriel compact en mmap (alternative à Chroma)
+
+Pour un corpus de cette taille (un code, quelques dizaines de milliers de
+chunks), chaque recherche Chroma ajoute le coût du client et de la
+sérialisation, et garde des vecteurs float32 avec beaucoup de métadonnées
+en objets Python. Avec VECTOR_BACKEND=compact, la recherche dense de
+VectorStoreManager passe par un index en lecture seule :
+- vecteurs normalisés dans une matrice contiguë float16 ou int8 (échelle
+  par ligne), mappée en mémoire depuis le disque : les pages sont partagées
+  entre workers
+- recherche exacte (produit scalaire vectorisé, par blocs) ou graphe HNSW
+- textes et identifiants dans des blobs UTF-8 indexés par offsets,
+  métadonnées en colonnes (codes de catégories, entiers) : un filtre
+  sélectionne les lignes avant tout calcul de score
+
+Chroma reste la source de vérité (ingestion, suppression) : l'index compact
+est reconstruit depuis la collection, sans ré-encodage, quand le manifeste
+change.
+"""
+import heapq
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from index_manifest import get_persist_dir, index_writer_lock
+from observability import record_span
+
+COMPACT_DIRNAME = "compact_index"
+CURRENT_FILENAME = "current.json"
+FORMAT_VERSION = 1
+
+DTYPES = ("float16", "int8")
+SEARCH_MODES = ("exact", "hnsw")
+
+# Chunks lus par appel à Chroma pendant la construction
+READ_BATCH_SIZE = 2048
+# Lignes converties en float32 à la fois pendant un calcul de scores (bloc tenant en cache)
+SCORE_BLOCK_ROWS = 1024
+# Valeur absente d'une colonne d'entiers
+INT_MISSING = np.iinfo(np.int64).min
+
+STATS_WINDOW = 512
+
+
+def _make_document(text: str, metadata: dict):
+    from langchain_core.documents import Document
+
+    return Document(page_content=text, metadata=metadata)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions des k meilleurs scores, par score décroissant"""
+    if scores.size <= k:
+        return np.argsort(-scores, kind="stable")
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+# ============ STOCKAGE EN COLONNES ============
+
+class _Files:
+    """
+    Tableaux d'une version sur disque, un fichier par tableau
+
+    Même interface que l'instantané d'index_snapshot.py (un seul fichier) :
+    array / blob mappés en mémoire, json, arrays (groupe chargé en mémoire).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def array(self, name: str) -> np.ndarray:
+        return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+    def blob(self, name: str) -> np.ndarray:
+        blob = self.path / f"{name}.bin"
+        return np.memmap(blob, dtype=np.uint8, mode="r") if blob.stat().st_size else np.zeros(0, np.uint8)
+
+    def json(self, name: str):
+        with open(self.path / f"{name}.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def arrays(self, name: str) -> dict:
+        with np.load(self.path / f"{name}.npz") as group:
+            return {key: group[key] for key in group.files}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(f.stat().st_size for f in self.path.iterdir() if f.is_file())
+
+
+class _Strings:
+    """Chaînes UTF-8 concaténées dans un blob, lues par offsets (mmap)"""
+
+    def __init__(self, files, name: str):
+        self.offsets = files.array(f"{name}_offsets")
+        self._blob = files.blob(name)
+
+    @staticmethod
+    def write(path: Path, name: str, strings: list):
+        encoded = [(value or "").encode("utf-8") for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        with open(path / f"{name}.bin", "wb") as f:
+            for value in encoded:
+                f.write(value)
+        np.save(path / f"{name}_offsets.npy", offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return bytes(self._blob[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+
+class _Columns:
+    """
+    Métadonnées en colonnes : une colonne par clé
+
+    - category : codes int32 vers une liste de valeurs (-1 = absente)
+    - int : entiers int64 (INT_MISSING = absente)
+    - float : float64 (NaN = absente)
+    """
+
+    def __init__(self, files):
+        self.schema = files.json("columns")
+        self.arrays = {column["key"]: files.array(f"column_{i}") for i, column in enumerate(self.schema)}
+        self.kinds = {column["key"]: column["kind"] for column in self.schema}
+        self.values = {column["key"]: column.get("values") for column in self.schema}
+        self._codes = {
+            key: {json.dumps(value): code for code, value in enumerate(values)}
+            for key, values in self.values.items() if values is not None
+        }
+
+    @staticmethod
+    def write(path: Path, metadatas: list):
+        keys = {}
+        for metadata in metadatas:
+            for key, value in (metadata or {}).items():
+                if value is not None:
+                    keys.setdefault(key, []).append(value)
+        schema = []
+        for i, (key, present) in enumerate(keys.items()):
+            column = [(metadata or {}).get(key) for metadata in metadatas]
+            if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+                array = np.array([INT_MISSING if v is None else v for v in column], dtype=np.int64)
+                schema.append({"key": key, "kind": "int"})
+            elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+                array = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+                schema.append({"key": key, "kind": "float"})
+            else:
+                values, codes = [], {}
+                array = np.full(len(column), -1, dtype=np.int32)
+                for row, value in enumerate(column):
+                    if value is None:
+                        continue
+                    code = codes.get(json.dumps(value))
+                    if code is None:
+                        code = codes[json.dumps(value)] = len(values)
+                        values.append(value)
+                    array[row] = code
+                schema.append({"key": key, "kind": "category", "values": values})
+            np.save(path / f"column_{i}.npy", array)
+        with open(path / "columns.json", "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False)
+
+    def metadata(self, row: int) -> dict:
+        metadata = {}
+        for key, array in self.arrays.items():
+            value = array[row]
+            kind = self.kinds[key]
+            if kind == "category":
+                if value >= 0:
+                    metadata[key] = self.values[key][value]
+            elif kind == "int":
+                if value != INT_MISSING:
+                    metadata[key] = int(value)
+            elif not np.isnan(value):
+                metadata[key] = float(value)
+        return metadata
+
+    def mask(self, where: dict) -> np.ndarray:
+        """
+        Lignes qui satisfont un filtre {clé: valeur ou liste de valeurs}
+
+        Chaque condition porte sur une colonne entière (comparaison
+        vectorisée), avant tout calcul de score.
+
+        Raises:
+            ValueError: Filtre à opérateurs Chroma ($and, $in, ...)
+        """
+        if has_operators(where):
+            raise ValueError(f"Filtre non pris en charge par l'index compact (opérateurs $): {where}")
+        mask = None
+        for key, wanted in where.items():
+            wanted = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+            array = self.arrays.get(key)
+            if array is None:
+                return np.zeros(len(next(iter(self.arrays.values()), [])), dtype=bool)
+            if self.kinds[key] == "category":
+                codes = [self._codes[key][json.dumps(v)] for v in wanted if json.dumps(v) in self._codes[key]]
+                condition = np.isin(array, codes)
+            else:
+                condition = np.isin(array, wanted)
+            mask = condition if mask is None else mask & condition
+        return mask
+
+
+def has_operators(where: dict) -> bool:
+    """Filtre à opérateurs Chroma ({"$and": [...]}, {"source": {"$in": [...]}})"""
+    return any(str(key).startswith("$") or isinstance(value, dict) for key, value in where.items())
+
+
+# ============ GRAPHE HNSW ============
+
+class HNSWGraph:
+    """
+    Graphe HNSW (Hierarchical Navigable Small World) sur les lignes de l'index
+
+    Couche 0 : matrice [lignes, 2m] de voisins (-1 = vide), mappée en mémoire ;
+    couches supérieures (une ligne sur m en moyenne) chargées en mémoire.
+    Les scores sont calculés par l'appelant (score_fn(lignes) -> scores).
+
+    Args:
+        m: Voisins par nœud dans les couches supérieures (2m en couche 0)
+        ef_construction: Largeur de la recherche à l'insertion
+        seed: Graine du tirage des niveaux
+    """
+
+    def __init__(self, m: int = 16, ef_construction: int = 100, seed: int = 0):
+        self.m = max(2, m)
+        self.ef_construction = max(self.m, ef_construction)
+        self.seed = seed
+        self.entry = 0
+        self.max_level = 0
+        self.layer0 = None
+        self.upper = {}
+
+    def _neighbors(self, level: int, node: int) -> np.ndarray:
+        links = self.layer0[node] if level == 0 else self.upper[level][node]
+        return links[links >= 0]
+
+    def _search_layer(self, score_fn, entry: list, ef: int, level: int, visited: np.ndarray) -> list:
+        """Recherche en largeur bornée (ef) dans une couche ; entry = [(score, nœud)]"""
+        candidates = [(-score, node) for score, node in entry]
+        heapq.heapify(candidates)
+        results = list(entry)
+        heapq.heapify(results)
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative < results[0][0]:
+                break
+            neighbors = self._neighbors(level, node)
+            neighbors = neighbors[~visited[neighbors]]
+            if not neighbors.size:
+                continue
+            visited[neighbors] = True
+            for score, neighbor in zip(score_fn(neighbors).tolist(), neighbors.tolist()):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbor))
+                    heapq.heappush(results, (score, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results
+
+    def search(self, score_fn, count: int, k: int, ef: int) -> list:
+        """
+        k plus proches voisins approchés
+
+        Returns:
+            Liste de (score, ligne) par score décroissant
+        """
+        if self.layer0 is None or not count:
+            return []
+        current = [(float(score_fn(np.array([self.entry]))[0]), self.entry)]
+        for level in range(self.max_level, 0, -1):
+            visited = np.zeros(count, dtype=bool)
+            visited[current[0][1]] = True
+            current = [max(self._search_layer(score_fn, current, 1, level, visited))]
+        visited = np.zeros(count, dtype=bool)
+        visited[current[0][1]] = True
+        return heapq.nlargest(k, self._search_layer(score_fn, current, max(ef, k), 0, visited))
+
+    # ---------- construction ----------
+
+    @staticmethod
+    def _select(vectors: np.ndarray, found: list, count: int) -> list:
+        """
+        Voisins retenus parmi des candidats [(score, nœud)] (heuristique HNSW) :
+        un candidat est gardé s'il est plus proche du nœud que de tous les
+        voisins déjà retenus, ce qui garde des liens vers chaque direction
+        """
+        ordered = sorted(found, reverse=True)
+        if len(ordered) <= count:
+            return [node for _, node in ordered]
+        rows = np.array([node for _, node in ordered], dtype=np.int64)
+        scores = np.array([score for score, _ in ordered], dtype=np.float32)
+        between = vectors[rows] @ vectors[rows].T
+        selected = []
+        for i in range(len(rows)):
+            if not selected or scores[i] > between[i, selected].max():
+                selected.append(i)
+                if len(selected) == count:
+                    break
+        return rows[selected].tolist()
+
+    def _link(self, vectors: np.ndarray, level: int, node: int, new: int):
+        """Ajouter un lien ; au-delà du maximum, resélectionner les voisins"""
+        links = self.layer0[node] if level == 0 else self.upper[level][node]
+        links = links[links >= 0]
+        limit = 2 * self.m if level == 0 else self.m
+        if len(links) < limit:
+            kept = np.append(links, new)
+        else:
+            candidates = np.append(links, new)
+            scores = vectors[candidates] @ vectors[node]
+            kept = np.array(self._select(vectors, list(zip(scores.tolist(), candidates.tolist())), limit))
+        if level == 0:
+            self.layer0[node] = -1
+            self.layer0[node, :len(kept)] = kept
+        else:
+            self.upper[level][node] = kept.astype(np.int32)
+
+    def build(self, vectors: np.ndarray, progress=None) -> "HNSWGraph":
+        """
+        Construire le graphe sur des vecteurs float32 normalisés
+
+        Args:
+            vectors: Matrice [lignes, dim] (copie en mémoire, le temps de la construction)
+            progress: Fonction appelée avec le nombre de lignes insérées
+        """
+        count = len(vectors)
+        rng = np.random.default_rng(self.seed)
+        level_factor = 1 / math.log(self.m)
+        levels = np.minimum((-np.log(1 - rng.random(count)) * level_factor).astype(int), 16)
+        self.layer0 = np.full((count, 2 * self.m), -1, dtype=np.int32)
+        self.upper = {}
+        self.entry, self.max_level = 0, int(levels[0]) if count else 0
+        for level in range(1, self.max_level + 1):
+            self.upper.setdefault(level, {})[0] = np.zeros(0, dtype=np.int32)
+
+        for node in range(1, count):
+            query = vectors[node]
+
+            def score_fn(rows):
+                return vectors[rows] @ query
+
+            node_level = int(levels[node])
+            current = [(float(score_fn(np.array([self.entry]))[0]), self.entry)]
+            for level in range(self.max_level, node_level, -1):
+                visited = np.zeros(count, dtype=bool)
+                visited[current[0][1]] = True
+                current = [max(self._search_layer(score_fn, current, 1, level, visited))]
+            for level in range(min(node_level, self.max_level), -1, -1):
+                visited = np.zeros(count, dtype=bool)
+                visited[[n for _, n in current]] = True
+                found = self._search_layer(score_fn, current, self.ef_construction, level, visited)
+                selected = self._select(vectors, found, self.m)
+                if level == 0:
+                    self.layer0[node, :len(selected)] = selected
+                else:
+                    self.upper[level][node] = np.array(selected, dtype=np.int32)
+                for neighbor in selected:
+                    self._link(vectors, level, neighbor, node)
+                current = found
+            for level in range(self.max_level + 1, node_level + 1):
+                self.upper.setdefault(level, {})[node] = np.zeros(0, dtype=np.int32)
+            if node_level > self.max_level:
+                self.entry, self.max_level = node, node_level
+            if progress is not None and node % 1000 == 0:
+                progress(node)
+        return self
+
+    # ---------- persistance ----------
+
+    def save(self, path: Path):
+        np.save(path / "hnsw_layer0.npy", self.layer0)
+        upper = {}
+        for level, nodes in self.upper.items():
+            ids = np.array(sorted(nodes), dtype=np.int32)
+            links = np.full((len(ids), self.m), -1, dtype=np.int32)
+            for row, node in enumerate(ids.tolist()):
+                links[row, :len(nodes[node])] = nodes[node]
+            upper[f"nodes_{level}"], upper[f"links_{level}"] = ids, links
+        np.savez(path / "hnsw_upper.npz", **upper)
+        with open(path / "hnsw.json", "w", encoding="utf-8") as f:
+            json.dump({"m": self.m, "ef_construction": self.ef_construction, "entry": self.entry,
+                       "max_level": self.max_level}, f)
+
+    @classmethod
+    def load(cls, files) -> "HNSWGraph":
+        meta = files.json("hnsw")
+        graph = cls(meta["m"], meta["ef_construction"])
+        graph.entry, graph.max_level = meta["entry"], meta["max_level"]
+        graph.layer0 = files.array("hnsw_layer0")
+        upper = files.arrays("hnsw_upper")
+        for level in range(1, graph.max_level + 1):
+            ids, links = upper[f"nodes_{level}"], upper[f"links_{level}"]
+            graph.upper[level] = dict(zip(ids.tolist(), links))
+        return graph
+
+
+# ============ INDEX ============
+
+class CompactIndex:
+    """
+    Index en lecture seule d'une version construite sur disque
+
+    Args:
+        path: Répertoire de la version (vectors.npy, textes, colonnes, graphe)
+        files: Autre source des mêmes tableaux (IndexSnapshot), à la place de path
+    """
+
+    def __init__(self, path: Path = None, files=None):
+        self.files = files if files is not None else _Files(path)
+        self.meta = self.files.json("meta")
+        self.vectors = self.files.array("vectors")
+        self.scales = self.files.array("scales") if self.meta["dtype"] == "int8" else None
+        self.ids = _Strings(self.files, "ids")
+        self.texts = _Strings(self.files, "texts")
+        self.columns = _Columns(self.files)
+        self.graph = HNSWGraph.load(self.files) if self.meta["search"] == "hnsw" else None
+
+    def __len__(self):
+        return self.meta["count"]
+
+    @property
+    def nbytes(self) -> int:
+        return self.files.nbytes
+
+    @staticmethod
+    def write(path: Path, collection, dtype: str = "float16", search: str = "exact",
+              hnsw_m: int = 16, hnsw_ef_construction: int = 100) -> int:
+        """
+        Écrire une version de l'index depuis une collection Chroma (sans ré-encodage)
+
+        Args:
+            path: Répertoire de la version (créé)
+            collection: Collection Chroma (langchain Chroma: get avec include/limit/offset)
+            dtype: float16 ou int8 (échelle par ligne)
+            search: exact ou hnsw (graphe construit sur les vecteurs stockés)
+
+        Returns:
+            Nombre de chunks écrits
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"COMPACT_DTYPE inconnu: {dtype} ({', '.join(DTYPES)})")
+        if search not in SEARCH_MODES:
+            raise ValueError(f"COMPACT_SEARCH inconnu: {search} ({', '.join(SEARCH_MODES)})")
+        path.mkdir(parents=True, exist_ok=True)
+        batches, ids, texts, metadatas = [], [], [], []
+        offset = 0
+        while True:
+            data = collection.get(include=["embeddings", "documents", "metadatas"],
+                                  limit=READ_BATCH_SIZE, offset=offset)
+            if not data["ids"]:
+                break
+            embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+            batches.append(_quantize(_normalize(embeddings), dtype))
+            ids.extend(data["ids"])
+            texts.extend(data["documents"])
+            metadatas.extend(data["metadatas"])
+            offset += len(data["ids"])
+            if len(data["ids"]) < READ_BATCH_SIZE:
+                break
+
+        dim = batches[0][0].shape[1] if batches else 0
+        vectors = np.concatenate([b[0] for b in batches]) if batches else np.zeros((0, dim), dtype=dtype)
+        np.save(path / "vectors.npy", vectors)
+        if dtype == "int8":
+            np.save(path / "scales.npy", np.concatenate([b[1] for b in batches]) if batches else np.zeros(0, np.float32))
+        _Strings.write(path, "ids", ids)
+        _Strings.write(path, "texts", texts)
+        _Columns.write(path, metadatas)
+        if search == "hnsw":
+            restored = _dequantize(vectors, np.load(path / "scales.npy") if dtype == "int8" else None)
+            HNSWGraph(hnsw_m, hnsw_ef_construction).build(
+                restored, progress=lambda n: print(f"[INFO] Graphe HNSW: {n}/{len(restored)} chunks")
+            ).save(path)
+        with open(path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "count": len(ids), "dim": int(dim),
+                       "dtype": dtype, "search": search}, f)
+        return len(ids)
+
+    def scores(self, query: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Similarité cosinus de la requête (normalisée) avec toutes les lignes ou les lignes données"""
+        count = len(self) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(count, start + SCORE_BLOCK_ROWS)
+            block_rows = slice(start, end) if rows is None else rows[start:end]
+            block = np.asarray(self.vectors[block_rows], dtype=np.float32)
+            scores[start:end] = block @ query
+            if self.scales is not None:
+                scores[start:end] *= self.scales[block_rows]
+        return scores
+
+    def search(self, query, k: int = 4, where: dict = None, ef: int = 64) -> list:
+        """
+        k chunks les plus proches
+
+        Args:
+            query: Embedding de la requête
+            k: Nombre de résultats
+            where: Filtre de métadonnées {clé: valeur ou liste} appliqué
+                avant le calcul des scores (recherche exacte sur les lignes retenues)
+            ef: Largeur de recherche du graphe HNSW
+
+        Returns:
+            Liste de (ligne, score) par score décroissant
+        """
+        if not len(self) or k <= 0:
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        if where:
+            rows = np.flatnonzero(self.columns.mask(where))
+            if not rows.size:
+                return []
+            scores = self.scores(query, rows)
+            return [(int(rows[i]), float(scores[i])) for i in _top_k(scores, k)]
+        if self.graph is not None:
+            found = self.graph.search(lambda rows: self.scores(query, rows), len(self), k, ef)
+            return [(row, score) for score, row in found]
+        scores = self.scores(query)
+        return [(int(i), float(scores[i])) for i in _top_k(scores, k)]
+
+    def document(self, row: int, score: float):
+        return _make_document(self.texts[row], dict(self.columns.metadata(row), score=round(score, 6)))
+
+
+def _quantize(vectors: np.ndarray, dtype: str):
+    """(matrice stockée, échelles par ligne ou None)"""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+
+def _dequantize(vectors: np.ndarray, scales: np.ndarray = None) -> np.ndarray:
+    restored = np.asarray(vectors, dtype=np.float32)
+    return restored * scales[:, None] if scales is not None else restored
+
+
+# ============ BACKEND DE VECTORSTOREMANAGER ============
+
+class CompactVectorStore:
+    """
+    Recherche dense de VectorStoreManager sur l'index compact
+
+    L'index est reconstruit depuis la collection Chroma quand le manifeste
+    change ; tant qu'il n'est pas prêt, la recherche Chroma d'origine répond.
+    Démarré depuis un instantané (INDEX_SNAPSHOT), l'index est celui de
+    l'instantané et n'est jamais reconstruit.
+
+    Args:
+        vector_store: VectorStoreManager (embeddings, collection Chroma)
+        root: Répertoire des versions de l'index
+        dtype: float16 ou int8
+        search: exact ou hnsw
+        k: Chunks retournés par défaut (RETRIEVAL_K)
+        hnsw_m, hnsw_ef, hnsw_ef_construction: Paramètres du graphe HNSW
+    """
+
+    def __init__(self, vector_store, root: Path, dtype: str = "float16", search: str = "exact", k: int = 4,
+                 hnsw_m: int = 16, hnsw_ef: int = 64, hnsw_ef_construction: int = 100):
+        if dtype not in DTYPES:
+            raise ValueError(f"COMPACT_DTYPE inconnu: {dtype} ({', '.join(DTYPES)})")
+        if search not in SEARCH_MODES:
+            raise ValueError(f"COMPACT_SEARCH inconnu: {search} ({', '.join(SEARCH_MODES)})")
+        self.vector_store = vector_store
+        self.fallback = vector_store.retrieve
+        self.root = Path(root)
+        self.dtype = dtype
+        self.search = search
+        self.k = k
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef = hnsw_ef
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.index = None
+        self.layout = None
+        self.snapshot = None
+        self.builds = 0
+        self.last_build_s = None
+        self.fallbacks = 0
+        self.filtered = 0
+        self._lock = threading.Lock()
+        self._pending = None                # manifeste à construire en arrière-plan (hnsw)
+        self._building = False
+        self._latencies = deque(maxlen=STATS_WINDOW)
+
+    @classmethod
+    def from_config(cls, vector_store, config) -> "CompactVectorStore":
+        return cls(
+            vector_store,
+            get_persist_dir(config) / COMPACT_DIRNAME,
+            dtype=getattr(config, "COMPACT_DTYPE", "float16"),
+            search=getattr(config, "COMPACT_SEARCH", "exact"),
+            k=getattr(config, "RETRIEVAL_K", 4),
+            hnsw_m=getattr(config, "COMPACT_HNSW_M", 16),
+            hnsw_ef=getattr(config, "COMPACT_HNSW_EF", 64),
+            hnsw_ef_construction=getattr(config, "COMPACT_HNSW_EF_CONSTRUCTION", 100),
+        )
+
+    @classmethod
+    def from_snapshot(cls, vector_store, snapshot, config) -> "CompactVectorStore":
+        """Recherche sur l'index d'un instantané (IndexSnapshot déjà vérifié)"""
+        store = cls(
+            vector_store,
+            get_persist_dir(config) / COMPACT_DIRNAME,
+            dtype=snapshot.index.meta["dtype"],
+            search=snapshot.index.meta["search"],
+            k=getattr(config, "RETRIEVAL_K", 4),
+            hnsw_ef=getattr(config, "COMPACT_HNSW_EF", 64),
+        )
+        store.snapshot, store.index = snapshot, snapshot.index
+        return store
+
+    def _layout(self, manifest) -> list:
+        layout = [FORMAT_VERSION, manifest.fingerprint(), manifest.collection_name, self.dtype, self.search]
+        return layout + [self.hnsw_m, self.hnsw_ef_construction] if self.search == "hnsw" else layout
+
+    def _current(self) -> dict:
+        try:
+            with open(self.root / CURRENT_FILENAME, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def update(self, manifest):
+        """
+        Aligner l'index compact sur le manifeste de l'index vectoriel
+
+        Une version déjà construite (autre worker, redémarrage) est rouverte ;
+        sinon elle est écrite depuis la collection Chroma, puis désignée par
+        current.json. Les versions précédentes sont supprimées (les workers
+        qui les ont encore mappées gardent leurs pages).
+
+        Le graphe HNSW (Python pur, plusieurs minutes pour des dizaines de
+        milliers de chunks) est construit sur un thread : la recherche passe
+        par Chroma en attendant.
+        """
+        if self.snapshot is not None:
+            # Index figé: le réplica ne modifie pas l'instantané
+            return
+        vectorstore = getattr(self.vector_store, "vectorstore", None)
+        if vectorstore is None or manifest is None:
+            self.index, self.layout = None, None
+            return
+        layout = self._layout(manifest)
+        if layout == self.layout:
+            return
+        if self.search == "hnsw" and self._current().get("layout") != layout:
+            # L'ancienne version ne reflète plus la collection: Chroma pendant la construction
+            self.index, self.layout = None, None
+            self._schedule(manifest)
+            return
+        self.index, self.layout = self._open_or_build(vectorstore, manifest, layout), layout
+
+    def _schedule(self, manifest):
+        with self._lock:
+            self._pending = manifest
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build_pending, name="compact-hnsw", daemon=True).start()
+
+    def _build_pending(self):
+        """Construire le dernier manifeste demandé (les demandes intermédiaires sont sautées)"""
+        while True:
+            with self._lock:
+                manifest, self._pending = self._pending, None
+                if manifest is None:
+                    self._building = False
+                    return
+            layout = self._layout(manifest)
+            try:
+                index = self._open_or_build(self.vector_store.vectorstore, manifest, layout)
+            except Exception as e:
+                print(f"[ERROR] Index compact HNSW: construction impossible ({e}), recherche via Chroma")
+                continue
+            with self._lock:
+                # Un manifeste plus récent attend: cette version est déjà périmée
+                if self._pending is None:
+                    self.index, self.layout = index, layout
+
+    def _open_or_build(self, vectorstore, manifest, layout: list) -> "CompactIndex":
+        with index_writer_lock(self.root.parent):
+            current = self._current()
+            if current.get("layout") != layout:
+                start = time.perf_counter()
+                name = f"{manifest.fingerprint()}-{self.dtype}-{self.search}-{int(time.time())}"
+                count = CompactIndex.write(self.root / name, vectorstore, self.dtype, self.search,
+                                           self.hnsw_m, self.hnsw_ef_construction)
+                current = {"name": name, "layout": layout}
+                tmp_path = self.root / (CURRENT_FILENAME + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(current, f)
+                os.replace(tmp_path, self.root / CURRENT_FILENAME)
+                for old in self.root.iterdir():
+                    if old.is_dir() and old.name != name:
+                        shutil.rmtree(old, ignore_errors=True)
+                self.builds += 1
+                self.last_build_s = round(time.perf_counter() - start, 2)
+                print(f"[OK] Index compact ({self.dtype}, {self.search}) construit: "
+                      f"{count} chunks en {self.last_build_s}s")
+            return CompactIndex(self.root / current["name"])
+
+    def retrieve(self, question: str, *args, k: int = None, filter: dict = None, **kwargs) -> list:
+        """
+        Même contrat que VectorStoreManager.retrieve()
+
+        Args:
+            question: Question (encodée par le service d'embedding partagé)
+            k: Nombre de chunks (défaut: RETRIEVAL_K)
+            filter: Métadonnées exigées, par ex. {"index_file": "code_travail.txt"} ;
+                un filtre à opérateurs Chroma passe par Chroma (ValueError sur un
+                instantané, sans Chroma)
+        """
+        index = self.index
+        operators = bool(filter) and has_operators(filter) and self.snapshot is None
+        if index is None or operators:
+            # Index pas encore construit, ou filtre à opérateurs ($and, $in) que seul
+            # Chroma applique: VectorStoreManager, avec les mêmes k et filtre
+            self.fallbacks += 1
+            if k is not None:
+                kwargs["k"] = k
+            if filter is not None:
+                kwargs["filter"] = filter
+            return self.fallback(question, *args, **kwargs)
+        query = self.vector_store.embeddings.embed_query(question)
+        start = time.perf_counter()
+        found = index.search(query, k or self.k, where=filter, ef=self.hnsw_ef)
+        elapsed = time.perf_counter() - start
+        record_span("vector_search", start, elapsed, backend="compact", filtered=bool(filter))
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.filtered += bool(filter)
+        return [index.document(row, score) for row, score in found]
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+        index = self.index
+        return {
+            "backend": "compact",
+            "dtype": self.dtype,
+            "search": self.search,
+            "chunks": len(index) if index is not None else 0,
+            "dim": index.meta["dim"] if index is not None else 0,
+            "bytes": index.nbytes if index is not None else 0,
+            "builds": self.builds,
+            "building": self._building,
+            "last_build_s": self.last_build_s,
+            "fallbacks": self.fallbacks,
+            "filtered_queries": self.filtered,
+            "search_ms": {
+                "avg": round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "max": round(1000 * max(latencies), 3) if latencies else 0.0,
+            },
+            "snapshot": self.snapshot.info() if self.snapshot is not None else None,
+        }
+
+
+def install_compact_backend(vector_store, config, snapshot=None) -> CompactVectorStore:
+    """
+    Remplacer la recherche dense de VectorStoreManager par l'index compact
+    (VECTOR_BACKEND=compact, ou index d'un instantané INDEX_SNAPSHOT)
+
+    Les appelants de vector_store.retrieve (QASystem, recherche hybride,
+    réponses extractives) passent par l'index compact sans changement.
+    """
+    if snapshot is not None:
+        compact = CompactVectorStore.from_snapshot(vector_store, snapshot, config)
+    else:
+        compact = CompactVectorStore.from_config(vector_store, config)
+    vector_store.retrieve = compact.retrieve
+    return compact
@@ -0,0 +1,256 @@
+"""
+Module Context Packer - Budget de tokens du contexte avant génération
+
+Entre la récupération et QASystem, les chunks récupérés sont :
+1. fusionnés quand ils sont adjacents ou se chevauchent (même source,
+   CHUNK_OVERLAP recopie la fin d'un chunk au début du suivant ; les
+   parties d'un même article se suivent à un séparateur près)
+2. dédupliqués (quasi-doublons, ex: même article dans deux fichiers)
+3. classés (score de la recherche, sinon rang d'origine)
+4. ajustés à un budget de tokens mesuré avec le tokenizer du LLM
+
+Le préremplissage du prompt domine le temps CPU : chaque token évité
+raccourcit la génération.
+"""
+import re
+import threading
+
+MIN_OVERLAP_CHARS = 20
+# Écart (espaces, saut d'alinéa) entre deux chunks consécutifs retirés par le découpage
+MAX_GAP_CHARS = 2
+MIN_TRIM_TOKENS = 48
+
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_END_RE = re.compile(r"[.;:!?]\s")
+
+
+def _content(doc) -> str:
+    if isinstance(doc, dict):
+        return doc.get("page_content") or doc.get("content", "")
+    return getattr(doc, "page_content", "")
+
+
+def _metadata(doc) -> dict:
+    if isinstance(doc, dict):
+        return doc.get("metadata") or {}
+    return getattr(doc, "metadata", None) or {}
+
+
+def _with_content(doc, text: str, **metadata):
+    """Copie du document avec un nouveau texte (le document d'origine n'est pas modifié)"""
+    if isinstance(doc, dict):
+        copy = dict(doc)
+        copy["page_content" if "page_content" in doc else "content"] = text
+        copy["metadata"] = dict(_metadata(doc), **metadata)
+        return copy
+    return type(doc)(page_content=text, metadata=dict(_metadata(doc), **metadata))
+
+
+def _overlap(a: str, b: str) -> int:
+    """Longueur du plus long suffixe de a qui est un préfixe de b"""
+    head = b[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(a) - len(b))
+    while True:
+        position = a.find(head, start)
+        if position < 0:
+            return 0
+        if b.startswith(a[position:]):
+            return len(a) - position
+        start = position + 1
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Item:
+    __slots__ = ("doc", "text", "source", "start", "rank", "score")
+
+    def __init__(self, doc, rank):
+        metadata = _metadata(doc)
+        self.doc = doc
+        self.text = _content(doc)
+        self.source = metadata.get("source")
+        self.start = metadata.get("start_index")
+        self.rank = rank
+        score = metadata.get("score", metadata.get("relevance_score"))
+        self.score = score if isinstance(score, (int, float)) else None
+
+
+class ContextPacker:
+    """
+    Préparation du contexte transmis au LLM
+
+    Args:
+        tokenizer: Tokenizer du LLM (None = estimation 4 caractères/token)
+        max_tokens: Budget de tokens du contexte (0 = pas de limite)
+        dedup_similarity: Similarité (Jaccard sur trigrammes de mots) au-delà
+            de laquelle un chunk est considéré comme doublon
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: int = 1500, dedup_similarity: float = 0.9):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.dedup_similarity = dedup_similarity
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.merged = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.trimmed = 0
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is None:
+            return (len(text) + 3) // 4
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    # ---------- étapes ----------
+
+    def _merge(self, items: list) -> tuple:
+        """Fusionner les chunks adjacents ou chevauchants d'une même source"""
+        merged = 0
+        by_source = {}
+        for item in items:
+            by_source.setdefault(item.source, []).append(item)
+
+        result = []
+        for source, group in by_source.items():
+            if source is None:
+                result.extend(group)
+                continue
+            # Ordre du document si start_index est connu, sinon ordre de récupération
+            if all(item.start is not None for item in group):
+                group.sort(key=lambda item: item.start)
+            current = group[0]
+            for item in group[1:]:
+                if item.text in current.text:
+                    joined = current.text
+                elif current.text in item.text:
+                    joined = item.text
+                else:
+                    overlap = _overlap(current.text, item.text)
+                    gap = (
+                        item.start - (current.start + len(current.text))
+                        if current.start is not None and item.start is not None else -1
+                    )
+                    if not overlap and not 0 <= gap <= MAX_GAP_CHARS:
+                        result.append(current)
+                        current = item
+                        continue
+                    joined = current.text + ("\n" if gap > 0 and not overlap else "") + item.text[overlap:]
+                merged += 1
+                best = current if current.rank <= item.rank else item
+                scores = [s for s in (current.score, item.score) if s is not None]
+                combined = _Item(_with_content(best.doc, joined), min(current.rank, item.rank))
+                combined.start = current.start
+                combined.score = max(scores) if scores else None
+                current = combined
+            result.append(current)
+        return result, merged
+
+    def _dedupe(self, items: list) -> tuple:
+        kept, shingles, duplicates = [], [], 0
+        for item in items:
+            item_shingles = _shingles(item.text)
+            if any(_similarity(item_shingles, other) >= self.dedup_similarity for other in shingles):
+                duplicates += 1
+                continue
+            kept.append(item)
+            shingles.append(item_shingles)
+        return kept, duplicates
+
+    @staticmethod
+    def _rank(items: list) -> list:
+        if all(item.score is not None for item in items):
+            return sorted(items, key=lambda item: (-item.score, item.rank))
+        return sorted(items, key=lambda item: item.rank)
+
+    def _trim(self, text: str, budget: int) -> str:
+        """Couper un texte au budget, de préférence en fin de phrase"""
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)[:budget]
+            cut = self.tokenizer.decode(ids, skip_special_tokens=True)
+        else:
+            cut = text[:4 * budget]
+        ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut)]
+        if ends and ends[-1] > len(cut) // 2:
+            cut = cut[:ends[-1]]
+        return cut.rstrip()
+
+    # ---------- API ----------
+
+    def pack(self, docs: list):
+        """
+        Préparer les documents récupérés pour le prompt
+
+        Returns:
+            Tuple (documents, statistiques: tokens avant/après, fusions,
+            doublons, chunks écartés)
+        """
+        docs = list(docs or [])
+        items = [_Item(doc, rank) for rank, doc in enumerate(docs)]
+        before = sum(self.count_tokens(item.text) for item in items)
+
+        items, merged = self._merge(items)
+        items, duplicates = self._dedupe(self._rank(items))
+
+        packed, used, dropped, trimmed = [], 0, 0, 0
+        for item in items:
+            tokens = self.count_tokens(item.text)
+            if not self.max_tokens or used + tokens <= self.max_tokens:
+                packed.append(item.doc if item.text == _content(item.doc) else _with_content(item.doc, item.text))
+                used += tokens
+                continue
+            remaining = self.max_tokens - used
+            # Le premier chunk est toujours transmis, au besoin tronqué
+            if remaining >= MIN_TRIM_TOKENS or not packed:
+                text = self._trim(item.text, max(remaining, 1))
+                packed.append(_with_content(item.doc, text, trimmed=True))
+                used += self.count_tokens(text)
+                trimmed += 1
+                continue
+            dropped += 1
+
+        stats = {
+            "context_tokens_before": before,
+            "context_tokens_after": used,
+            "chunks_merged": merged,
+            "chunks_deduplicated": duplicates,
+            "chunks_dropped": dropped,
+        }
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += before
+            self.tokens_after += used
+            self.merged += merged
+            self.duplicates += duplicates
+            self.dropped += dropped
+            self.trimmed += trimmed
+        return packed, stats
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "requests": self.requests,
+                "avg_tokens_before": round(self.tokens_before / self.requests, 1) if self.requests else 0.0,
+                "avg_tokens_after": round(self.tokens_after / self.requests, 1) if self.requests else 0.0,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+                "merged": self.merged,
+                "deduplicated": self.duplicates,
+                "dropped": self.dropped,
+                "trimmed": self.trimmed,
+            }
@@ -0,0 +1,545 @@
+"""
+Module Contract Analysis - Analyse d'un contrat clause par clause (map-reduce)
+
+Un contrat de travail collé dans /api/ask devient un prompt unique qui
+dépasse la fenêtre de contexte et prend plusieurs minutes sur CPU. Ici :
+- le texte est découpé en clauses (Article 3, 4., IV., titres en
+  majuscules ; une clause trop longue est coupée entre alinéas)
+- récupération des articles de loi pour toutes les clauses en une passe
+  (embeddings calculés par lots, puis une recherche par clause)
+- map : chaque clause est analysée par le LLM avec ses articles (prompt
+  borné), en parallèle sur le pool d'inférence partagé avec /api/ask
+- reduce : niveaux de risque, clauses à revoir et articles cités
+- résultats émis clause par clause, dans l'ordre d'achèvement
+
+Le prompt de chaque clause est borné (ANALYSIS_CLAUSE_MAX_CHARS, sources,
+ANALYSIS_MAX_NEW_TOKENS) : la durée totale dépend du nombre de clauses
+divisé par le nombre de workers, pas de la longueur d'un prompt unique.
+"""
+import asyncio
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from article_chunker import ArticleChunker, iter_lines
+from hybrid_retrieval import find_article_refs
+from inference_pool import QueueFullError
+from llm_runtime import GenerationCancelled, GenerationContext, generation_context, generation_stats
+from observability import span
+
+# Niveaux de risque (ordre croissant), mêmes valeurs que la page LegalAnalysis
+RISK_LEVELS = ("safe", "warning", "danger")
+
+# Début de clause: "Article 3", "Art. 4", "Clause de ...", "4. Durée", "IV - Résiliation"
+_CLAUSE_HEADING_RE = re.compile(
+    r"^(?:(?i:art(?:icle|\.)\s*\d+(?:er)?\b|clause\s+\w)"
+    r"|\d{1,2}\s*[.)°\-–:]\s*[A-ZÀ-Ý]"
+    r"|[IVX]{1,6}\s*[.)\-–:]\s*[A-ZÀ-Ý])"
+)
+# Ligne de titre en majuscules ("DURÉE DU CONTRAT")
+CAPS_HEADING_MAX_CHARS = 80
+# Longueur des titres de clauses et des extraits renvoyés
+TITLE_MAX_CHARS = 80
+EXCERPT_CHARS = 300
+# Fragment trop court pour être analysé seul (signature, mention)
+MIN_CLAUSE_CHARS = 30
+# Texte de la clause utilisé comme requête de recherche
+QUERY_MAX_CHARS = 1000
+# Texte d'un article dans le prompt (sans ContextPacker)
+SOURCE_PROMPT_CHARS = 1200
+# Attente avant de resoumettre quand la file d'inférence est pleine
+QUEUE_RETRY_S = 0.5
+STATS_WINDOW = 512
+
+_FIELD_RE = re.compile(r"^\s*\**\s*(RISQUE|ANALYSE|RECOMMANDATION)\s*\**\s*:\s*", re.IGNORECASE | re.MULTILINE)
+
+ANALYSIS_PROMPT = (
+    "Tu es juriste en droit du travail français. Analyse la clause de contrat "
+    "ci-dessous au regard des articles de loi fournis.\n"
+    "Réponds exactement au format suivant :\n"
+    "RISQUE: standard, sensible ou à risque\n"
+    "ANALYSE: deux phrases au plus, en citant les articles utiles\n"
+    "RECOMMANDATION: une phrase\n\n"
+    "Articles de loi :\n{sources}\n\n"
+    "Clause « {title} » :\n{text}\n"
+)
+
+
+@dataclass
+class Clause:
+    """Clause d'un contrat (start: position dans le texte soumis)"""
+    id: int
+    title: str
+    text: str
+    start: int
+
+    def describe(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "excerpt": _excerpt(self.text),
+            "start": self.start,
+            "chars": len(self.text),
+        }
+
+
+def _excerpt(text: str, limit: int = EXCERPT_CHARS) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit] + "…"
+
+
+def _title(line: str) -> str:
+    line = line.strip()
+    # "Clause de mobilité : le salarié accepte..." -> "Clause de mobilité"
+    colon = line.find(":", 0, TITLE_MAX_CHARS)
+    if len(line) > TITLE_MAX_CHARS and colon > 0:
+        line = line[:colon]
+    return _excerpt(line.rstrip(" :"), TITLE_MAX_CHARS)
+
+
+def is_clause_heading(line: str) -> bool:
+    """Ligne qui ouvre une nouvelle clause"""
+    if _CLAUSE_HEADING_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(line) <= CAPS_HEADING_MAX_CHARS and len(letters) >= 4 and line.isupper()
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def risk_level(label: str):
+    """Niveau de risque (safe, warning, danger) d'un libellé du LLM (None si inconnu)"""
+    label = _strip_accents(label)
+    if re.search(r"\ba risque\b|abusi|illicite|\bnulle?\b|eleve", label):
+        return "danger"
+    if re.search(r"sensible|modere|moyen", label):
+        return "warning"
+    if re.search(r"standard|conforme|faible|aucun", label):
+        return "safe"
+    return None
+
+
+def parse_analysis(text: str) -> dict:
+    """
+    Lire la réponse du LLM (RISQUE / ANALYSE / RECOMMANDATION)
+
+    Returns:
+        risk, explanation, recommendation, parsed (False si le format n'a pas
+        été respecté: risque "warning" par défaut, texte brut en explication)
+    """
+    parts = _FIELD_RE.split(text)
+    fields = {label.lower(): value.strip() for label, value in zip(parts[1::2], parts[2::2])}
+    risk = risk_level(fields.get("risque", ""))
+    return {
+        "risk": risk or "warning",
+        "explanation": fields.get("analyse") or (text.strip() if not fields else ""),
+        "recommendation": fields.get("recommandation", ""),
+        "parsed": risk is not None,
+    }
+
+
+class ContractAnalyzer:
+    """
+    Découpage en clauses, analyse d'une clause (map) et synthèse (reduce)
+
+    Args:
+        retrieve_fn: Recherche de chunks (contrat VectorStoreManager.retrieve)
+        llm: LLMManager (model.generate contrôlé par llm_runtime)
+        query_embedder: QueryEmbedder (embeddings de toutes les clauses par lots)
+        packer: ContextPacker optionnel (articles ajustés au budget de tokens)
+        clause_max_chars: Au-delà, une clause est découpée entre alinéas
+        sources: Articles de loi transmis au LLM par clause
+        max_new_tokens: Longueur maximale d'une analyse
+        embed_batch_size: Clauses encodées par passe du modèle d'embedding
+    """
+
+    def __init__(self, retrieve_fn, llm, query_embedder=None, packer=None, clause_max_chars: int = 2000,
+                 sources: int = 3, max_new_tokens: int = 160, embed_batch_size: int = 32):
+        self.retrieve_fn = retrieve_fn
+        self.llm = llm
+        self.query_embedder = query_embedder
+        self.packer = packer
+        self.chunker = ArticleChunker(max_chars=clause_max_chars)
+        self.sources = max(1, sources)
+        self.max_new_tokens = max(16, max_new_tokens)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self._lock = threading.Lock()
+        self._clause_times = deque(maxlen=STATS_WINDOW)
+        self._elapsed = deque(maxlen=STATS_WINDOW)
+        self._speedups = deque(maxlen=STATS_WINDOW)
+        self.documents = 0
+        self.clauses = 0
+        self.errors = 0
+        self.unparsed = 0
+        self.queue_retries = 0
+        self.risks = Counter()
+
+    @classmethod
+    def from_config(cls, retrieve_fn, llm, config, query_embedder=None, packer=None) -> "ContractAnalyzer":
+        return cls(
+            retrieve_fn, llm,
+            query_embedder=query_embedder,
+            packer=packer,
+            clause_max_chars=getattr(config, "ANALYSIS_CLAUSE_MAX_CHARS", 2000),
+            sources=getattr(config, "ANALYSIS_SOURCES", 3),
+            max_new_tokens=getattr(config, "ANALYSIS_MAX_NEW_TOKENS", 160),
+            embed_batch_size=getattr(config, "EMBEDDING_BATCH_SIZE", 32),
+        )
+
+    # ============ DÉCOUPAGE ============
+
+    def split_clauses(self, text: str) -> list:
+        """
+        Découper un contrat en clauses
+
+        Un titre suivi directement d'un autre titre ("ARTICLE 5" puis
+        "Rémunération") reste dans la même clause. Sans aucun titre, le texte
+        est découpé entre alinéas.
+
+        Returns:
+            Liste de Clause numérotées à partir de 1
+        """
+        units, current = [], None
+        for offset, line in iter_lines(text):
+            stripped = line.strip()
+            if stripped and is_clause_heading(stripped):
+                if current is None or current["body"]:
+                    current = {"title": _title(stripped), "start": offset, "end": offset, "body": False}
+                    units.append(current)
+                else:
+                    current["title"] = _title(f"{current['title']} – {stripped}")
+                # "4. Le salarié percevra..." : titre et contenu sur la même ligne
+                current["body"] = len(stripped) > CAPS_HEADING_MAX_CHARS
+                current["end"] = offset + len(line)
+                continue
+            if current is None:
+                # Préambule: parties, objet du contrat
+                current = {"title": "Préambule", "start": offset, "end": offset, "body": False}
+                units.append(current)
+            if stripped:
+                current["body"] = True
+                current["end"] = offset + len(line)
+
+        if not any(unit["title"] != "Préambule" for unit in units):
+            units = [{"title": None, "start": 0, "end": len(text)}]
+
+        clauses = []
+        for unit in units:
+            body = text[unit["start"]:unit["end"]]
+            if len(body.strip()) < MIN_CLAUSE_CHARS:
+                continue
+            parts = self.chunker.split_text(body)
+            for number, (part, metadata) in enumerate(parts, 1):
+                title = unit["title"] or _title(part.split("\n", 1)[0])
+                if unit["title"] and len(parts) > 1:
+                    title = f"{title} ({number}/{len(parts)})"
+                clauses.append(Clause(len(clauses) + 1, title, part, unit["start"] + metadata["start_index"]))
+        return clauses
+
+    # ============ RÉCUPÉRATION ============
+
+    def retrieve_all(self, clauses: list) -> list:
+        """
+        Articles de loi de toutes les clauses (exécuté sur le pool d'inférence)
+
+        Les requêtes sont encodées en une passe par lot (cache du
+        QueryEmbedder) avant les recherches.
+
+        Returns:
+            Liste de documents par clause, dans l'ordre des clauses
+        """
+        queries = [clause.text[:QUERY_MAX_CHARS] for clause in clauses]
+        if self.query_embedder is not None:
+            with span("analysis.embed", clauses=len(queries)):
+                self.query_embedder.prefetch(queries, self.embed_batch_size)
+        results = []
+        with span("analysis.retrieve", clauses=len(queries)):
+            for query in queries:
+                docs = list(self.retrieve_fn(query) or [])[:self.sources]
+                if self.packer is not None and docs:
+                    docs, _ = self.packer.pack(docs)
+                results.append(docs)
+        return results
+
+    # ============ MAP ============
+
+    def build_prompt(self, clause: Clause, docs: list) -> str:
+        sources = []
+        for rank, doc in enumerate(docs, 1):
+            metadata = getattr(doc, "metadata", None) or {}
+            label = metadata.get("article") or Path(str(metadata.get("source") or "Code du travail")).name
+            content = getattr(doc, "page_content", "")
+            if self.packer is None:
+                content = content[:SOURCE_PROMPT_CHARS]
+            sources.append(f"[{rank}] ({label}) {content}")
+        return ANALYSIS_PROMPT.format(
+            sources="\n".join(sources) or "(aucun article trouvé)",
+            title=clause.title,
+            text=clause.text,
+        )
+
+    def _generate(self, prompt: str) -> str:
+        """Génération directe (model.generate), sans le prompt de QASystem"""
+        model = getattr(self.llm, "model", None)
+        tokenizer = getattr(self.llm, "tokenizer", None)
+        if model is None or tokenizer is None:
+            raise RuntimeError("LLM non chargé")
+        options = {}
+        if getattr(tokenizer, "chat_template", None):
+            prompt = tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True
+            )
+            # Le modèle de chat contient déjà les tokens spéciaux
+            options["add_special_tokens"] = False
+        inputs = tokenizer(prompt, return_tensors="pt", **options)
+        pad_token_id = getattr(tokenizer, "pad_token_id", None)
+        if pad_token_id is None:
+            pad_token_id = getattr(tokenizer, "eos_token_id", None)
+        output = model.generate(
+            **inputs, max_new_tokens=self.max_new_tokens, do_sample=False, pad_token_id=pad_token_id
+        )
+        prompt_length = inputs["input_ids"].shape[1]
+        return tokenizer.decode(output[0][prompt_length:], skip_special_tokens=True).strip()
+
+    def analyze(self, clause: Clause, docs: list, context: GenerationContext) -> dict:
+        """
+        Analyser une clause (exécuté sur le pool d'inférence)
+
+        Returns:
+            Résultat de la clause: id, title, excerpt, risk, explanation,
+            recommendation, articles, sources, timings
+
+        Raises:
+            GenerationCancelled: Si le contexte a été annulé
+        """
+        if context.cancelled.is_set():
+            raise GenerationCancelled()
+        start = time.perf_counter()
+        context.retrieved_at = start
+        prompt = self.build_prompt(clause, docs)
+        try:
+            with generation_context(context), span("analysis.clause", clause=clause.id):
+                text = self._generate(prompt)
+        finally:
+            generation_stats.record(context)
+        elapsed = time.perf_counter() - start
+        finding = dict(clause.describe(), **parse_analysis(text))
+        finding["articles"] = list(dict.fromkeys(
+            find_article_refs(text) + [
+                ref for doc in docs
+                for ref in [(getattr(doc, "metadata", None) or {}).get("article")] if ref
+            ]
+        ))
+        finding["sources"] = self._sources(docs)
+        finding["timings"] = dict(context.metrics(), total_ms=round(1000 * elapsed, 2))
+        with self._lock:
+            self._clause_times.append(elapsed)
+            self.unparsed += not finding["parsed"]
+        return finding
+
+    @staticmethod
+    def _sources(docs: list) -> list:
+        sources = []
+        for rank, doc in enumerate(docs, 1):
+            metadata = getattr(doc, "metadata", None) or {}
+            source = {
+                "id": rank,
+                "name": metadata.get("source") or "Code du travail",
+                "excerpt": getattr(doc, "page_content", ""),
+                "score": metadata.get("score"),
+            }
+            if metadata.get("article"):
+                source["article"] = metadata["article"]
+            sources.append(source)
+        return sources
+
+    def failed(self, clause: Clause, docs: list, error: Exception) -> dict:
+        """Résultat d'une clause en erreur (les autres clauses continuent)"""
+        return dict(clause.describe(), error=f"{type(error).__name__}: {error}", sources=self._sources(docs))
+
+    # ============ REDUCE ============
+
+    def reduce(self, findings: list, timings: dict) -> dict:
+        """
+        Synthèse de l'analyse
+
+        Returns:
+            clauses, risk_counts, overall_risk (le plus élevé), review (id des
+            clauses à revoir, les plus risquées d'abord), articles cités,
+            errors, timings
+        """
+        analyzed = [f for f in findings if "error" not in f]
+        counts = Counter(f["risk"] for f in analyzed)
+        ranked = sorted(
+            (f for f in analyzed if f["risk"] != "safe"),
+            key=lambda f: (-RISK_LEVELS.index(f["risk"]), f["id"])
+        )
+        overall = max((RISK_LEVELS.index(f["risk"]) for f in analyzed), default=None)
+        articles = Counter(ref for f in analyzed for ref in f.get("articles", []))
+        with self._lock:
+            self.documents += 1
+            self.clauses += len(findings)
+            self.errors += len(findings) - len(analyzed)
+            self.risks.update(counts)
+            self._elapsed.append(timings.get("total_ms", 0.0) / 1000)
+            if timings.get("speedup"):
+                self._speedups.append(timings["speedup"])
+        return {
+            "clauses": len(findings),
+            "analyzed": len(analyzed),
+            "errors": len(findings) - len(analyzed),
+            "risk_counts": {level: counts.get(level, 0) for level in RISK_LEVELS},
+            "overall_risk": RISK_LEVELS[overall] if overall is not None else None,
+            "review": [f["id"] for f in ranked],
+            "articles": [ref for ref, _ in articles.most_common()],
+            "timings": timings,
+        }
+
+    def stats(self) -> dict:
+        """Contrats et clauses analysés, durées et parallélisme obtenu"""
+        with self._lock:
+            clause_times = list(self._clause_times)
+            elapsed = list(self._elapsed)
+            speedups = list(self._speedups)
+            return {
+                "documents": self.documents,
+                "clauses": self.clauses,
+                "errors": self.errors,
+                "unparsed": self.unparsed,
+                "queue_retries": self.queue_retries,
+                "risks": {level: self.risks.get(level, 0) for level in RISK_LEVELS},
+                "clause_ms": {
+                    "avg": round(1000 * sum(clause_times) / len(clause_times), 2) if clause_times else 0.0,
+                    "max": round(1000 * max(clause_times), 2) if clause_times else 0.0,
+                },
+                "document_s": {
+                    "avg": round(sum(elapsed) / len(elapsed), 2) if elapsed else 0.0,
+                    "max": round(max(elapsed), 2) if elapsed else 0.0,
+                },
+                "avg_speedup": round(sum(speedups) / len(speedups), 2) if speedups else 0.0,
+            }
+
+
+class AnalysisJob:
+    """
+    Analyse d'un contrat sur le pool d'inférence partagé (événements via events())
+
+    Au plus `concurrency` clauses sont soumises à la fois : les requêtes de
+    /api/ask s'intercalent entre les clauses au lieu d'attendre tout le
+    contrat. File pleine : la clause est resoumise dès qu'une place se libère.
+
+    Args:
+        analyzer: ContractAnalyzer
+        clauses: Clauses à analyser (split_clauses)
+        pool: InferencePool partagé avec /api/ask
+        concurrency: Clauses soumises en parallèle (>= LLM_BATCH_SIZE pour
+            remplir les lots de génération)
+    """
+
+    def __init__(self, analyzer: ContractAnalyzer, clauses: list, pool, concurrency: int = 1):
+        self.analyzer = analyzer
+        self.clauses = clauses
+        self.pool = pool
+        self.concurrency = max(1, concurrency)
+        self._contexts = set()
+        self._futures = set()
+        self._tasks = set()
+        self._cancelled = False
+
+    async def _run(self, fn, *args):
+        while True:
+            if self._cancelled:
+                raise GenerationCancelled()
+            try:
+                future = self.pool.submit(fn, *args)
+            except QueueFullError:
+                with self.analyzer._lock:
+                    self.analyzer.queue_retries += 1
+                await asyncio.sleep(QUEUE_RETRY_S)
+                continue
+            self._futures.add(future)
+            try:
+                return await asyncio.wrap_future(future)
+            finally:
+                self._futures.discard(future)
+
+    async def _analyze(self, clause: Clause, docs: list) -> dict:
+        context = GenerationContext()
+        self._contexts.add(context)
+        try:
+            return await self._run(self.analyzer.analyze, clause, docs, context)
+        except (GenerationCancelled, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            return self.analyzer.failed(clause, docs, e)
+        finally:
+            self._contexts.discard(context)
+
+    async def events(self):
+        """
+        Analyser le contrat
+
+        Yields:
+            ("clauses", découpage), puis ("clause", résultat) pour chaque
+            clause dans l'ordre d'achèvement, puis ("done", synthèse)
+        """
+        start = time.perf_counter()
+        yield "clauses", [clause.describe() for clause in self.clauses]
+
+        sources = await self._run(self.analyzer.retrieve_all, self.clauses)
+        retrieved_at = time.perf_counter()
+
+        pending = iter(zip(self.clauses, sources))
+        findings = []
+        while True:
+            while len(self._tasks) < self.concurrency:
+                item = next(pending, None)
+                if item is None:
+                    break
+                self._tasks.add(asyncio.ensure_future(self._analyze(*item)))
+            if not self._tasks:
+                break
+            done, self._tasks = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                finding = task.result()
+                findings.append(finding)
+                yield "clause", finding
+
+        end = time.perf_counter()
+        clause_ms = sum(f.get("timings", {}).get("total_ms", 0.0) for f in findings)
+        map_ms = 1000 * (end - retrieved_at)
+        timings = {
+            "retrieve_ms": round(1000 * (retrieved_at - start), 2),
+            "map_ms": round(map_ms, 2),
+            "clause_ms": round(clause_ms, 2),
+            # Temps d'analyse cumulé / durée de la phase map
+            "speedup": round(clause_ms / map_ms, 2) if map_ms else 0.0,
+            "total_ms": round(1000 * (end - start), 2),
+        }
+        yield "done", self.analyzer.reduce(sorted(findings, key=lambda f: f["id"]), timings)
+
+    def cancel(self):
+        """
+        Abandonner les clauses restantes (client déconnecté)
+
+        Les clauses en file sont retirées du pool (leur place est libérée
+        pour /api/ask), les générations en cours s'arrêtent au prochain token.
+        """
+        self._cancelled = True
+        for context in list(self._contexts):
+            context.cancel()
+        for future in list(self._futures):
+            future.cancel()
+        for task in self._tasks:
+            # Tâches non attendues: GenerationCancelled / annulation lues ici
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
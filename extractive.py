@@ -0,0 +1,164 @@
+"""
+Module Extractive - Réponses extractives sans LLM (mode dégradé)
+
+Quand la file de génération est saturée, une question dont l'article le
+mieux classé répond directement n'a pas besoin d'attendre le LLM. Ce module
+répond en quelques millisecondes à partir de la seule récupération :
+- passages les mieux classés par la recherche (dense ou hybride)
+- phrases qui correspondent à la question surlignées dans chaque passage
+  (termes de la question pondérés par l'IDF de l'index BM25, références
+  d'articles prioritaires)
+- réponse marquée comme extractive : aucun texte généré
+"""
+import re
+import threading
+from collections import Counter, deque
+
+from hybrid_retrieval import find_article_refs, tokenize
+
+# Fin de phrase: ponctuation suivie d'un espace, ou saut de ligne
+_BOUNDARY_RE = re.compile(r"[.;!?]+\s+|\n+")
+# Points qui ne terminent pas une phrase: "Art. L. 1234-5", "al. 2", "cf."
+_ABBREVIATION_RE = re.compile(r"\b(?:[LRD]|art|al|cf|ex|n°?)\.\s*$", re.IGNORECASE)
+
+# Poids d'une référence d'article citée dans la question et dans la phrase
+ARTICLE_WEIGHT = 5.0
+
+EXTRACTIVE_NOTICE = "Réponse extractive (extraits des textes, sans génération) :"
+
+STATS_WINDOW = 512
+
+
+def split_sentences(text: str) -> list:
+    """(début, fin) de chaque phrase non vide d'un passage"""
+    spans, start = [], 0
+    for match in _BOUNDARY_RE.finditer(text):
+        if match.group().startswith(".") and _ABBREVIATION_RE.search(text[start:match.start() + 1]):
+            continue
+        spans.append((start, match.start() + len(match.group().rstrip())))
+        start = match.end()
+    spans.append((start, len(text)))
+    result = []
+    for start, end in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end - start > 1:
+            result.append((start, end))
+    return result
+
+
+class ExtractiveAnswerer:
+    """
+    Réponses extractives : passages récupérés et phrases surlignées
+
+    Args:
+        retrieve_fn: Recherche de chunks (contrat VectorStoreManager.retrieve)
+        idf_fn: Poids d'un terme (BM25Index.idf) ; None = poids uniforme
+        max_passages: Passages retenus dans la réponse
+        max_sentences: Phrases surlignées par passage
+    """
+
+    def __init__(self, retrieve_fn, idf_fn=None, max_passages: int = 3, max_sentences: int = 2):
+        self.retrieve_fn = retrieve_fn
+        self.idf_fn = idf_fn
+        self.max_passages = max(1, max_passages)
+        self.max_sentences = max(1, max_sentences)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self.answers = Counter()
+
+    @classmethod
+    def from_config(cls, retrieve_fn, config, idf_fn=None) -> "ExtractiveAnswerer":
+        return cls(
+            retrieve_fn,
+            idf_fn=idf_fn,
+            max_passages=getattr(config, "EXTRACTIVE_MAX_PASSAGES", 3),
+            max_sentences=getattr(config, "EXTRACTIVE_MAX_SENTENCES", 2),
+        )
+
+    def _weights(self, question: str) -> dict:
+        weights = {}
+        for term in set(tokenize(question)):
+            weight = self.idf_fn(term) if self.idf_fn is not None else 1.0
+            weights[term] = weight if weight > 0 else 0.1
+        for ref in find_article_refs(question):
+            weights[ref.lower()] = ARTICLE_WEIGHT
+        return weights
+
+    def highlight(self, question: str, text: str, weights: dict = None) -> list:
+        """
+        Phrases d'un passage qui correspondent le mieux à la question
+
+        Returns:
+            Liste de {"start", "end", "score"} dans l'ordre du texte
+        """
+        weights = self._weights(question) if weights is None else weights
+        scored = []
+        for start, end in split_sentences(text):
+            terms = set(tokenize(text[start:end]))
+            score = sum(weight for term, weight in weights.items() if term in terms)
+            if score > 0:
+                # À score égal, la phrase la plus courte est la plus précise
+                scored.append((score, -(end - start), start, end))
+        best = sorted(scored, reverse=True)[:self.max_sentences]
+        total = sum(weights.values()) or 1.0
+        return [
+            {"start": start, "end": end, "score": round(score / total, 3)}
+            for score, _, start, end in sorted(best, key=lambda item: item[2])
+        ]
+
+    def answer(self, question: str, docs: list = None):
+        """
+        Passages et phrases surlignées pour une question
+
+        Args:
+            question: La question posée
+            docs: Chunks déjà récupérés (sinon retrieve_fn(question))
+
+        Returns:
+            (texte de la réponse, documents retenus, surlignages par document)
+        """
+        if docs is None:
+            docs = self.retrieve_fn(question) or []
+        docs = list(docs)[:self.max_passages]
+        weights = self._weights(question)
+        highlights, lines = [], []
+        for doc in docs:
+            text = getattr(doc, "page_content", None)
+            if text is None and isinstance(doc, dict):
+                text = doc.get("page_content") or doc.get("content", "")
+            text = text or ""
+            spans = self.highlight(question, text, weights)
+            highlights.append(spans)
+            metadata = getattr(doc, "metadata", None) or (doc.get("metadata") if isinstance(doc, dict) else None) or {}
+            source = metadata.get("source") or "Code du travail"
+            if spans:
+                excerpt = " […] ".join(text[span["start"]:span["end"]] for span in spans)
+            else:
+                # Aucun terme commun: début du passage, tel que classé par la recherche
+                first = split_sentences(text)[:1]
+                excerpt = text[first[0][0]:first[0][1]] if first else text[:300]
+            if excerpt:
+                lines.append(f"« {excerpt} » ({source})")
+        if not lines:
+            return "Aucun passage pertinent trouvé dans les textes indexés.", docs, highlights
+        return EXTRACTIVE_NOTICE + "\n\n" + "\n\n".join(lines), docs, highlights
+
+    def record(self, reason: str, elapsed: float):
+        """Compter une réponse extractive (reason: requested, slo, queue_full)"""
+        with self._lock:
+            self.answers[reason] += 1
+            self._latencies.append(elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "answers": dict(self.answers),
+                "latency_ms": {
+                    "avg": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                    "max": round(1000 * max(latencies), 2) if latencies else 0.0,
+                },
+            }
@@ -32,12 +32,44 @@ export interface AnswerResponse {
     excerpt: string;
   }>;
   source_count: number;
+  timings?: Record<string, number | string>;
+  /** "extractive": extraits des textes surlignés, aucun texte généré */
+  mode?: 'generative' | 'extractive';
+}
+
+export interface SourceHighlight {
+  start: number;
+  end: number;
+  score: number;
+}
+
+export interface AnswerSource {
+  id: number;
+  name: string;
+  excerpt: string;
+  relevance?: string;
+  score?: number | null;
+  highlights?: SourceHighlight[];
+  /** true si l'extrait a été tronqué (excerpt_chars) */
+  excerpt_truncated?: boolean;
+}
+
+/** Réponse allégée : champs conservés et longueur maximale des extraits */
+export interface SlimOptions {
+  fields?: string[];
+  excerpt_chars?: number;
+}
+
+export interface StreamHandlers {
+  onSources?: (sources: AnswerSource[]) => void;
+  onToken?: (text: string) => void;
 }
 
 export interface HealthResponse {
   status: string;
   rag_ready: boolean;
   llm_available: boolean;
+  llm_backend?: string | null;
 }
 
 export interface HistoryItem {
@@ -50,6 +82,7 @@ export interface HistoryItem {
 export interface HistoryResponse {
   success: boolean;
   history: HistoryItem[];
+  next_cursor?: string | null;
 }
 
 /**
@@ -100,19 +133,195 @@ export async function checkHealth(): Promise<HealthResponse> {
 
 /**
  * Poser une question au système RAG
+ *
+ * extractive=true : passages surlignés en quelques millisecondes, sans LLM.
+ * Le serveur répond aussi en extractif quand la file de génération est saturée.
+ * slim : réponse allégée (par ex. { excerpt_chars: 300 } sur une connexion lente).
  */
-export async function askQuestion(question: string): Promise<AnswerResponse> {
+export async function askQuestion(
+  question: string,
+  extractive: boolean = false,
+  slim: SlimOptions = {}
+): Promise<AnswerResponse> {
   return apiCall<AnswerResponse>('/ask', {
     method: 'POST',
-    body: JSON.stringify({ question }),
+    body: JSON.stringify({ question, extractive, ...slim }),
   });
 }
 
 /**
- * Récupérer l'historique des conversations
+ * Ouvrir un flux server-sent events (POST JSON)
+ */
+async function postEventStream(
+  endpoint: string,
+  body: unknown,
+  signal?: AbortSignal
+): Promise<Response> {
+  const url = `${API_BASE_URL}${endpoint}`;
+  console.log(`[API] POST ${url}`);
+
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+    signal,
+  });
+
+  if (!response.ok || !response.body) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(
+      errorData.detail ||
+      errorData.error ||
+      `API Error: ${response.status} ${response.statusText}`
+    );
+  }
+  return response;
+}
+
+/**
+ * Lire les événements d'un flux server-sent events au fil de l'eau
+ */
+async function* readServerEvents(
+  response: Response
+): AsyncGenerator<{ event: string; payload: Record<string, unknown> }> {
+  const reader = response.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Les événements SSE sont séparés par une ligne vide
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      yield { event, payload: data ? JSON.parse(data) : {} };
+    }
+  }
+}
+
+/**
+ * Poser une question avec réponse en streaming (server-sent events)
+ *
+ * Les sources arrivent avant la génération, puis les tokens au fil de l'eau.
+ * Annuler le signal interrompt la génération côté serveur.
  */
-export async function getHistory(limit: number = 10): Promise<HistoryResponse> {
-  return apiCall<HistoryResponse>(`/history?limit=${limit}`, {
+export async function askQuestionStream(
+  question: string,
+  handlers: StreamHandlers = {},
+  signal?: AbortSignal,
+  extractive: boolean = false
+): Promise<AnswerResponse> {
+  const response = await postEventStream('/ask/stream', { question, extractive }, signal);
+
+  for await (const { event, payload } of readServerEvents(response)) {
+    if (event === 'sources') handlers.onSources?.(payload.sources as AnswerSource[]);
+    else if (event === 'token') handlers.onToken?.(payload.text as string);
+    else if (event === 'error') throw new Error(payload.error as string);
+    else if (event === 'done') {
+      return { ...payload, sources: [] } as unknown as AnswerResponse;
+    }
+  }
+
+  throw new Error('Flux interrompu avant la fin de la réponse');
+}
+
+export type RiskLevel = 'safe' | 'warning' | 'danger';
+
+/** Clause du contrat (événement clauses) */
+export interface ContractClause {
+  id: number;
+  title: string;
+  excerpt: string;
+  /** Position de la clause dans le texte soumis */
+  start: number;
+  chars: number;
+}
+
+/** Analyse d'une clause (événement clause) */
+export interface ClauseAnalysis extends ContractClause {
+  risk?: RiskLevel;
+  explanation?: string;
+  recommendation?: string;
+  /** false si le LLM n'a pas respecté le format (risque "warning" par défaut) */
+  parsed?: boolean;
+  articles?: string[];
+  sources: Array<AnswerSource & { article?: string }>;
+  timings?: Record<string, number>;
+  /** Clause en échec (les autres clauses continuent) */
+  error?: string;
+}
+
+/** Synthèse de l'analyse (événement done) */
+export interface ContractSummary {
+  clauses: number;
+  analyzed: number;
+  errors: number;
+  risk_counts: Record<RiskLevel, number>;
+  overall_risk: RiskLevel | null;
+  /** id des clauses à revoir, les plus risquées d'abord */
+  review: number[];
+  articles: string[];
+  timings: Record<string, number>;
+}
+
+export interface AnalysisHandlers {
+  onClauses?: (clauses: ContractClause[]) => void;
+  onClause?: (analysis: ClauseAnalysis) => void;
+}
+
+/**
+ * Analyser un contrat clause par clause (server-sent events)
+ *
+ * Le découpage arrive d'abord, puis chaque clause dès qu'elle est analysée
+ * (ordre d'achèvement). Annuler le signal interrompt l'analyse côté serveur.
+ */
+export async function analyzeContract(
+  text: string,
+  handlers: AnalysisHandlers = {},
+  signal?: AbortSignal,
+  excerptChars?: number
+): Promise<ContractSummary> {
+  const response = await postEventStream('/analyze', { text, excerpt_chars: excerptChars }, signal);
+
+  for await (const { event, payload } of readServerEvents(response)) {
+    if (event === 'clauses') handlers.onClauses?.(payload as unknown as ContractClause[]);
+    else if (event === 'clause') handlers.onClause?.(payload as unknown as ClauseAnalysis);
+    else if (event === 'error') throw new Error(payload.error as string);
+    else if (event === 'done') return payload as unknown as ContractSummary;
+  }
+
+  throw new Error("Flux interrompu avant la fin de l'analyse");
+}
+
+/**
+ * Récupérer l'historique des conversations (page suivante via next_cursor)
+ *
+ * answerChars : aperçu des réponses tronquées à answerChars caractères.
+ * Le navigateur revalide la page par ETag (304 si elle n'a pas changé).
+ */
+export async function getHistory(
+  limit: number = 10,
+  cursor?: string | null,
+  query?: string,
+  answerChars?: number
+): Promise<HistoryResponse> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set('cursor', cursor);
+  if (query) params.set('q', query);
+  if (answerChars !== undefined) params.set('answer_chars', String(answerChars));
+  return apiCall<HistoryResponse>(`/history?${params}`, {
     method: 'GET',
   });
 }
@@ -126,6 +335,74 @@ export async function clearHistory(): Promise<ApiResponse<null>> {
   });
 }
 
+export interface IngestionJob {
+  job_id: string;
+  action: 'add' | 'replace' | 'delete';
+  name: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  stage: string;
+  chunks_total: number;
+  chunks_indexed: number;
+  progress: number;
+  error?: string | null;
+  created_at: number;
+  elapsed_s: number;
+}
+
+export interface IndexedDocument {
+  name: string;
+  size: number | null;
+  updated_at: number | null;
+  status: 'indexed' | 'processing' | 'failed';
+  job: IngestionJob | null;
+}
+
+export interface DocumentsResponse {
+  success: boolean;
+  documents: IndexedDocument[];
+  jobs: IngestionJob[];
+}
+
+/**
+ * Lister les documents de l'index et les imports en cours
+ */
+export async function listDocuments(): Promise<DocumentsResponse> {
+  return apiCall<DocumentsResponse>('/documents', {
+    method: 'GET',
+  });
+}
+
+/**
+ * Ajouter ou remplacer un document (.pdf, .txt, .md) dans l'index
+ *
+ * L'indexation continue côté serveur : suivre le job retourné.
+ */
+export async function uploadDocument(file: File): Promise<IngestionJob> {
+  return apiCall<IngestionJob>(`/documents/${encodeURIComponent(file.name)}`, {
+    method: 'PUT',
+    headers: { 'Content-Type': file.type || 'application/octet-stream' },
+    body: file,
+  });
+}
+
+/**
+ * Supprimer un document de l'index
+ */
+export async function deleteDocument(name: string): Promise<IngestionJob> {
+  return apiCall<IngestionJob>(`/documents/${encodeURIComponent(name)}`, {
+    method: 'DELETE',
+  });
+}
+
+/**
+ * Progression d'un job d'ingestion
+ */
+export async function getIngestionJob(jobId: string): Promise<IngestionJob> {
+  return apiCall<IngestionJob>(`/documents/jobs/${jobId}`, {
+    method: 'GET',
+  });
+}
+
 /**
  * Hook personnalisé pour les appels API avec gestion d'erreur
  */
@@ -1,10 +1,12 @@
-import { useState, useRef, useEffect } from "react";
+import { useState, useRef, useEffect, type ReactNode } from "react";
 import { AppLayout } from "@/components/layout/AppLayout";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
-import { Send, Bot, User, Sparkles } from "lucide-react";
+import { Badge } from "@/components/ui/badge";
+import { Switch } from "@/components/ui/switch";
+import { Send, Bot, User, Sparkles, Zap } from "lucide-react";
 import { cn } from "@/lib/utils";
-import { askQuestion } from "@/lib/api";
+import { askQuestionStream, type AnswerSource } from "@/lib/api";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
 
@@ -13,6 +15,30 @@ interface Message {
   role: "user" | "assistant";
   content: string;
   sources?: string[];
+  mode?: "generative" | "extractive";
+  passages?: AnswerSource[];
+}
+
+/** Extrait d'une source avec les phrases surlignées par le serveur */
+function HighlightedExcerpt({ source }: { source: AnswerSource }) {
+  const parts: ReactNode[] = [];
+  let cursor = 0;
+  for (const [index, span] of (source.highlights ?? []).entries()) {
+    if (span.start > cursor) parts.push(<span key={`t${index}`}>{source.excerpt.slice(cursor, span.start)}</span>);
+    parts.push(
+      <mark key={`h${index}`} className="bg-primary/20 text-foreground rounded px-0.5">
+        {source.excerpt.slice(span.start, span.end)}
+      </mark>
+    );
+    cursor = span.end;
+  }
+  if (cursor < source.excerpt.length) parts.push(<span key="end">{source.excerpt.slice(cursor)}</span>);
+  return (
+    <div className="text-xs border-l-2 border-primary/40 pl-3">
+      <p className="font-medium text-muted-foreground mb-1">{source.name}</p>
+      <p className="leading-relaxed">{parts}</p>
+    </div>
+  );
 }
 
 const initialMessages: Message[] = [
@@ -33,6 +59,7 @@ export default function Chatbot() {
   const [messages, setMessages] = useState<Message[]>(initialMessages);
   const [input, setInput] = useState("");
   const [isTyping, setIsTyping] = useState(false);
+  const [extractive, setExtractive] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -57,26 +84,44 @@ export default function Chatbot() {
     setInput("");
     setIsTyping(true);
 
+    const aiMessageId = messages.length + 2;
+    const updateAiMessage = (update: (message: Message) => Message) =>
+      setMessages((prev) => {
+        const exists = prev.some((m) => m.id === aiMessageId);
+        const current = exists
+          ? prev.find((m) => m.id === aiMessageId)!
+          : { id: aiMessageId, role: "assistant" as const, content: "" };
+        const next = update(current);
+        return exists ? prev.map((m) => (m.id === aiMessageId ? next : m)) : [...prev, next];
+      });
+
     try {
-      // Appel à l'API avec le service centralisé
-      const data = await askQuestion(userQuestion);
+      // Appel à l'API en streaming: sources d'abord, puis les tokens
+      // Réponse extractive (sur demande ou serveur saturé): sources surlignées, puis done
+      let passages: AnswerSource[] = [];
+      const data = await askQuestionStream(userQuestion, {
+        onSources: (sources) => {
+          passages = sources;
+          updateAiMessage((m) => ({ ...m, sources: sources.map((s) => s.name) }));
+        },
+        onToken: (text) => {
+          setIsTyping(false);
+          updateAiMessage((m) => ({ ...m, content: m.content + text }));
+        },
+      }, undefined, extractive);
 
-      const aiMessage: Message = {
-        id: messages.length + 2,
-        role: "assistant",
+      updateAiMessage((m) => ({
+        ...m,
         content: data.answer,
-        sources: data.sources?.map((s) => s.name) || [],
-      };
-
-      setMessages((prev) => [...prev, aiMessage]);
+        mode: data.mode,
+        passages: data.mode === "extractive" ? passages : undefined,
+      }));
     } catch (error) {
       console.error("Erreur lors de l'appel API:", error);
-      const errorMessage: Message = {
-        id: messages.length + 2,
-        role: "assistant",
+      updateAiMessage((m) => ({
+        ...m,
         content: `Désolé, une erreur s'est produite: ${error instanceof Error ? error.message : "Veuillez réessayer."}`,
-      };
-      setMessages((prev) => [...prev, errorMessage]);
+      }));
     } finally {
       setIsTyping(false);
     }
@@ -113,9 +158,21 @@ export default function Chatbot() {
                   "prose-headings:text-foreground prose-headings:font-semibold prose-headings:mb-2 prose-headings:mt-4 first:prose-headings:mt-0",
                   "prose-ul:list-disc prose-ul:pl-4 prose-li:mb-1"
                 )}>
-                  <ReactMarkdown remarkPlugins={[remarkGfm]}>
-                    {message.content}
-                  </ReactMarkdown>
+                  {message.mode === "extractive" ? (
+                    <div className="space-y-3 not-prose">
+                      <Badge variant="secondary" className="gap-1">
+                        <Zap className="w-3 h-3" />
+                        Réponse extractive — extraits des textes, sans génération
+                      </Badge>
+                      {message.passages?.map((source) => (
+                        <HighlightedExcerpt key={source.id} source={source} />
+                      ))}
+                    </div>
+                  ) : (
+                    <ReactMarkdown remarkPlugins={[remarkGfm]}>
+                      {message.content}
+                    </ReactMarkdown>
+                  )}
                 </div>
 
               </div>
@@ -186,6 +243,10 @@ export default function Chatbot() {
               <Send className="w-4 h-4" />
             </Button>
           </form>
+          <label className="flex items-center gap-2 text-xs text-muted-foreground mt-3">
+            <Switch checked={extractive} onCheckedChange={setExtractive} />
+            Réponse rapide : passages surlignés, sans génération
+          </label>
           <p className="text-xs text-muted-foreground text-center mt-3">
             Les réponses de l'IA sont indicatives et ne remplacent pas un avis juridique professionnel.
           </p>
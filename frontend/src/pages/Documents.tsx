@@ -1,7 +1,8 @@
-import { useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import { AppLayout } from "@/components/layout/AppLayout";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
+import { Progress } from "@/components/ui/progress";
 import {
   Table,
   TableBody,
@@ -10,7 +11,7 @@ import {
   TableHeader,
   TableRow,
 } from "@/components/ui/table";
-import { Upload, Search, FileText, MoreVertical, Eye, Download, Trash2 } from "lucide-react";
+import { Upload, Search, FileText, MoreVertical, Trash2 } from "lucide-react";
 import {
   DropdownMenu,
   DropdownMenuContent,
@@ -18,47 +19,98 @@ import {
   DropdownMenuTrigger,
 } from "@/components/ui/dropdown-menu";
 import { cn } from "@/lib/utils";
+import {
+  deleteDocument,
+  getIngestionJob,
+  listDocuments,
+  uploadDocument,
+  type IndexedDocument,
+  type IngestionJob,
+} from "@/lib/api";
+
+const POLL_INTERVAL_MS = 1000;
+
+const fileTypes: Record<string, string> = {
+  pdf: "PDF",
+  txt: "Texte",
+  md: "Markdown",
+};
 
-const documents = [
-  {
-    id: 1,
-    name: "Contrat de prestation NDA.pdf",
-    type: "Contrat",
-    date: "2024-01-15",
-    status: "analyzed",
-  },
-  {
-    id: 2,
-    name: "Politique RGPD v2.docx",
-    type: "Politique interne",
-    date: "2024-01-14",
-    status: "analyzed",
-  },
-  {
-    id: 3,
-    name: "Bail commercial 2024.pdf",
-    type: "Contrat",
-    date: "2024-01-13",
-    status: "pending",
-  },
-  {
-    id: 4,
-    name: "CGV Entreprise.pdf",
-    type: "Conditions générales",
-    date: "2024-01-12",
-    status: "analyzed",
-  },
-  {
-    id: 5,
-    name: "Accord de confidentialité.docx",
-    type: "Contrat",
-    date: "2024-01-11",
-    status: "pending",
-  },
-];
+function documentType(name: string) {
+  const extension = name.split(".").pop()?.toLowerCase() ?? "";
+  return fileTypes[extension] ?? "Document";
+}
+
+const statusLabels: Record<IndexedDocument["status"], string> = {
+  indexed: "Indexé",
+  processing: "En cours",
+  failed: "Échec",
+};
 
 export default function Documents() {
   const [searchQuery, setSearchQuery] = useState("");
+  const [documents, setDocuments] = useState<IndexedDocument[]>([]);
+  const [jobs, setJobs] = useState<Record<string, IngestionJob>>({});
+  const [error, setError] = useState<string | null>(null);
+  const fileInput = useRef<HTMLInputElement>(null);
+
+  const refresh = useCallback(async () => {
+    try {
+      const response = await listDocuments();
+      setDocuments(response.documents);
+      setError(null);
+    } catch (e) {
+      setError(e instanceof Error ? e.message : "Impossible de charger les documents");
+    }
+  }, []);
+
+  useEffect(() => {
+    refresh();
+  }, [refresh]);
+
+  // Suivre un job d'ingestion jusqu'à la fin, puis recharger la liste
+  const track = useCallback(
+    async (job: IngestionJob) => {
+      let current = job;
+      while (current.status === "queued" || current.status === "running") {
+        setJobs((previous) => ({ ...previous, [current.name]: current }));
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+        current = await getIngestionJob(current.job_id);
+      }
+      setJobs((previous) => {
+        const { [current.name]: _, ...rest } = previous;
+        return rest;
+      });
+      if (current.status === "failed") {
+        setError(`${current.name} : ${current.error ?? "échec de l'indexation"}`);
+      }
+      await refresh();
+    },
+    [refresh]
+  );
+
+  const handleUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
+    const files = Array.from(event.target.files ?? []);
+    event.target.value = "";
+    for (const file of files) {
+      try {
+        const job = await uploadDocument(file);
+        track(job).catch((e) => setError(e instanceof Error ? e.message : String(e)));
+      } catch (e) {
+        setError(`${file.name} : ${e instanceof Error ? e.message : String(e)}`);
+      }
+    }
+    await refresh();
+  };
+
+  const handleDelete = async (name: string) => {
+    try {
+      const job = await deleteDocument(name);
+      await track(job);
+    } catch (e) {
+      setError(`${name} : ${e instanceof Error ? e.message : String(e)}`);
+    }
+  };
 
   const filteredDocuments = documents.filter((doc) =>
     doc.name.toLowerCase().includes(searchQuery.toLowerCase())
@@ -78,12 +130,22 @@ export default function Documents() {
               className="pl-10"
             />
           </div>
-          <Button className="gap-2">
+          <input
+            ref={fileInput}
+            type="file"
+            accept=".pdf,.txt,.md"
+            multiple
+            className="hidden"
+            onChange={handleUpload}
+          />
+          <Button className="gap-2" onClick={() => fileInput.current?.click()}>
             <Upload className="w-4 h-4" />
             Importer un document
           </Button>
         </div>
 
+        {error && <p className="text-sm text-destructive">{error}</p>}
+
         {/* Documents Table */}
         <div className="stat-card p-0 overflow-hidden">
           <Table>
@@ -97,56 +159,69 @@ export default function Documents() {
               </TableRow>
             </TableHeader>
             <TableBody>
-              {filteredDocuments.map((doc, index) => (
-                <TableRow
-                  key={doc.id}
-                  className="animate-fade-in cursor-pointer hover:bg-muted/30"
-                  style={{ animationDelay: `${index * 50}ms` }}
-                >
-                  <TableCell>
-                    <div className="flex items-center gap-3">
-                      <div className="w-10 h-10 rounded-lg bg-primary/10 flex items-center justify-center">
-                        <FileText className="w-5 h-5 text-primary" />
+              {filteredDocuments.map((doc, index) => {
+                const job = jobs[doc.name] ?? doc.job;
+                const status = jobs[doc.name] ? "processing" : doc.status;
+                return (
+                  <TableRow
+                    key={doc.name}
+                    className="animate-fade-in cursor-pointer hover:bg-muted/30"
+                    style={{ animationDelay: `${index * 50}ms` }}
+                  >
+                    <TableCell>
+                      <div className="flex items-center gap-3">
+                        <div className="w-10 h-10 rounded-lg bg-primary/10 flex items-center justify-center">
+                          <FileText className="w-5 h-5 text-primary" />
+                        </div>
+                        <span className="font-medium">{doc.name}</span>
                       </div>
-                      <span className="font-medium">{doc.name}</span>
-                    </div>
-                  </TableCell>
-                  <TableCell className="text-muted-foreground">{doc.type}</TableCell>
-                  <TableCell className="text-muted-foreground">
-                    {new Date(doc.date).toLocaleDateString("fr-FR")}
-                  </TableCell>
-                  <TableCell>
-                    <span
-                      className={cn(
-                        "risk-badge",
-                        doc.status === "analyzed" ? "risk-safe" : "risk-warning"
+                    </TableCell>
+                    <TableCell className="text-muted-foreground">{documentType(doc.name)}</TableCell>
+                    <TableCell className="text-muted-foreground">
+                      {doc.updated_at
+                        ? new Date(doc.updated_at * 1000).toLocaleDateString("fr-FR")
+                        : "—"}
+                    </TableCell>
+                    <TableCell>
+                      {status === "processing" && job ? (
+                        <div className="flex items-center gap-2 min-w-32">
+                          <Progress value={job.progress * 100} className="h-2" />
+                          <span className="text-xs text-muted-foreground">
+                            {Math.round(job.progress * 100)}%
+                          </span>
+                        </div>
+                      ) : (
+                        <span
+                          className={cn(
+                            "risk-badge",
+                            status === "indexed" ? "risk-safe" : "risk-warning"
+                          )}
+                        >
+                          {statusLabels[status]}
+                        </span>
                       )}
-                    >
-                      {doc.status === "analyzed" ? "Analysé" : "En attente"}
-                    </span>
-                  </TableCell>
-                  <TableCell>
-                    <DropdownMenu>
-                      <DropdownMenuTrigger asChild>
-                        <Button variant="ghost" size="icon">
-                          <MoreVertical className="w-4 h-4" />
-                        </Button>
-                      </DropdownMenuTrigger>
-                      <DropdownMenuContent align="end">
-                        <DropdownMenuItem className="gap-2">
-                          <Eye className="w-4 h-4" /> Voir
-                        </DropdownMenuItem>
-                        <DropdownMenuItem className="gap-2">
-                          <Download className="w-4 h-4" /> Télécharger
-                        </DropdownMenuItem>
-                        <DropdownMenuItem className="gap-2 text-destructive">
-                          <Trash2 className="w-4 h-4" /> Supprimer
-                        </DropdownMenuItem>
-                      </DropdownMenuContent>
-                    </DropdownMenu>
-                  </TableCell>
-                </TableRow>
-              ))}
+                    </TableCell>
+                    <TableCell>
+                      <DropdownMenu>
+                        <DropdownMenuTrigger asChild>
+                          <Button variant="ghost" size="icon">
+                            <MoreVertical className="w-4 h-4" />
+                          </Button>
+                        </DropdownMenuTrigger>
+                        <DropdownMenuContent align="end">
+                          <DropdownMenuItem
+                            className="gap-2 text-destructive"
+                            disabled={status === "processing"}
+                            onClick={() => handleDelete(doc.name)}
+                          >
+                            <Trash2 className="w-4 h-4" /> Supprimer
+                          </DropdownMenuItem>
+                        </DropdownMenuContent>
+                      </DropdownMenu>
+                    </TableCell>
+                  </TableRow>
+                );
+              })}
             </TableBody>
           </Table>
         </div>
@@ -1,62 +1,11 @@
-import { useState } from "react";
+import { useRef, useState } from "react";
 import { AppLayout } from "@/components/layout/AppLayout";
 import { Button } from "@/components/ui/button";
+import { Textarea } from "@/components/ui/textarea";
+import { Progress } from "@/components/ui/progress";
 import { cn } from "@/lib/utils";
-import { AlertCircle, CheckCircle, AlertTriangle, ChevronRight, X } from "lucide-react";
-
-type RiskLevel = "safe" | "warning" | "danger";
-
-interface Clause {
-  id: number;
-  title: string;
-  excerpt: string;
-  riskLevel: RiskLevel;
-  explanation: string;
-  recommendation: string;
-}
-
-const clauses: Clause[] = [
-  {
-    id: 1,
-    title: "Clause de confidentialité",
-    excerpt: "Les parties s'engagent à maintenir la confidentialité des informations...",
-    riskLevel: "safe",
-    explanation: "Cette clause est conforme aux standards du marché et protège adéquatement les deux parties.",
-    recommendation: "Aucune modification nécessaire.",
-  },
-  {
-    id: 2,
-    title: "Clause de non-concurrence",
-    excerpt: "Le prestataire s'interdit, pendant une durée de 5 ans...",
-    riskLevel: "danger",
-    explanation: "La durée de 5 ans est excessive et pourrait être considérée comme abusive par un tribunal.",
-    recommendation: "Réduire la durée à 2 ans maximum et limiter le périmètre géographique.",
-  },
-  {
-    id: 3,
-    title: "Clause de responsabilité",
-    excerpt: "La responsabilité du prestataire est limitée au montant des honoraires...",
-    riskLevel: "warning",
-    explanation: "La limitation de responsabilité est acceptable mais pourrait être plus précise.",
-    recommendation: "Préciser les cas d'exclusion (faute lourde, dol) pour plus de clarté.",
-  },
-  {
-    id: 4,
-    title: "Clause de propriété intellectuelle",
-    excerpt: "Tous les droits de propriété intellectuelle sont transférés au client...",
-    riskLevel: "safe",
-    explanation: "Transfert de propriété clair et conforme aux attentes du contrat.",
-    recommendation: "Aucune modification nécessaire.",
-  },
-  {
-    id: 5,
-    title: "Clause de résiliation",
-    excerpt: "Le contrat peut être résilié sans motif avec un préavis de 7 jours...",
-    riskLevel: "warning",
-    explanation: "Le préavis de 7 jours est très court pour ce type de prestation.",
-    recommendation: "Porter le préavis à 30 jours minimum pour permettre une transition ordonnée.",
-  },
-];
+import { analyzeContract, type ClauseAnalysis, type ContractSummary, type RiskLevel } from "@/lib/api";
+import { AlertCircle, CheckCircle, AlertTriangle, ChevronRight, Loader2, X } from "lucide-react";
 
 const riskConfig = {
   safe: {
@@ -80,17 +29,56 @@ const riskConfig = {
 };
 
 export default function LegalAnalysis() {
-  const [selectedClause, setSelectedClause] = useState<Clause | null>(null);
+  const [text, setText] = useState("");
+  const [clauses, setClauses] = useState<ClauseAnalysis[]>([]);
+  const [summary, setSummary] = useState<ContractSummary | null>(null);
+  const [analyzing, setAnalyzing] = useState(false);
+  const [error, setError] = useState<string | null>(null);
+  const [selectedClause, setSelectedClause] = useState<ClauseAnalysis | null>(null);
   const [filter, setFilter] = useState<RiskLevel | "all">("all");
+  const abortRef = useRef<AbortController | null>(null);
+
+  const handleAnalyze = async () => {
+    if (!text.trim()) return;
+    const controller = new AbortController();
+    abortRef.current = controller;
+    setAnalyzing(true);
+    setError(null);
+    setSummary(null);
+    setSelectedClause(null);
+    setClauses([]);
+
+    try {
+      // Découpage d'abord, puis chaque clause dès que son analyse est terminée
+      const result = await analyzeContract(text, {
+        onClauses: (items) => setClauses(items.map((clause) => ({ ...clause, sources: [] }))),
+        onClause: (analysis) =>
+          setClauses((prev) => prev.map((clause) => (clause.id === analysis.id ? analysis : clause))),
+      }, controller.signal, 500);
+      setSummary(result);
+    } catch (err) {
+      if (!controller.signal.aborted) {
+        setError(err instanceof Error ? err.message : "Erreur lors de l'analyse");
+      }
+    } finally {
+      setAnalyzing(false);
+      abortRef.current = null;
+    }
+  };
+
+  // Annuler interrompt l'analyse côté serveur
+  const handleCancel = () => abortRef.current?.abort();
+
+  const analyzed = clauses.filter((c) => c.risk || c.error).length;
 
   const filteredClauses = filter === "all" 
     ? clauses 
-    : clauses.filter((c) => c.riskLevel === filter);
+    : clauses.filter((c) => c.risk === filter);
 
   const riskCounts = {
-    safe: clauses.filter((c) => c.riskLevel === "safe").length,
-    warning: clauses.filter((c) => c.riskLevel === "warning").length,
-    danger: clauses.filter((c) => c.riskLevel === "danger").length,
+    safe: clauses.filter((c) => c.risk === "safe").length,
+    warning: clauses.filter((c) => c.risk === "warning").length,
+    danger: clauses.filter((c) => c.risk === "danger").length,
   };
 
   return (
@@ -98,6 +86,51 @@ export default function LegalAnalysis() {
       <div className="flex gap-6 h-[calc(100vh-8rem)]">
         {/* Clauses List */}
         <div className="flex-1 flex flex-col">
+          {/* Contract */}
+          <div className="stat-card mb-4 space-y-3">
+            <Textarea
+              value={text}
+              onChange={(e) => setText(e.target.value)}
+              placeholder="Collez le texte du contrat à analyser..."
+              className="min-h-32"
+              disabled={analyzing}
+            />
+            <div className="flex items-center gap-3">
+              {analyzing ? (
+                <Button variant="outline" onClick={handleCancel}>
+                  <X className="w-4 h-4 mr-1" />
+                  Annuler
+                </Button>
+              ) : (
+                <Button onClick={handleAnalyze} disabled={!text.trim()}>
+                  Analyser le contrat
+                </Button>
+              )}
+              {clauses.length > 0 && (
+                <div className="flex-1 flex items-center gap-3">
+                  <Progress value={(100 * analyzed) / clauses.length} className="flex-1" />
+                  <span className="text-sm text-muted-foreground whitespace-nowrap">
+                    {analyzed}/{clauses.length} clauses
+                    {summary && ` · ${(summary.timings.total_ms / 1000).toFixed(1)} s`}
+                  </span>
+                </div>
+              )}
+            </div>
+            {summary?.overall_risk && (
+              <div className="flex items-center gap-3 text-sm">
+                <span className={cn("risk-badge", riskConfig[summary.overall_risk].className)}>
+                  Risque global : {riskConfig[summary.overall_risk].label}
+                </span>
+                {summary.articles.length > 0 && (
+                  <span className="text-muted-foreground truncate">
+                    Articles cités : {summary.articles.join(", ")}
+                  </span>
+                )}
+              </div>
+            )}
+            {error && <p className="text-sm text-risk-danger">{error}</p>}
+          </div>
+
           {/* Filters */}
           <div className="flex gap-2 mb-4">
             <Button
@@ -139,7 +172,23 @@ export default function LegalAnalysis() {
           {/* Clauses */}
           <div className="space-y-3 overflow-y-auto flex-1 pr-2">
             {filteredClauses.map((clause, index) => {
-              const config = riskConfig[clause.riskLevel];
+              if (!clause.risk) {
+                return (
+                  <div key={clause.id} className="stat-card border-l-4 opacity-70">
+                    <div className="flex items-center gap-2 mb-2 text-sm text-muted-foreground">
+                      {clause.error ? (
+                        <AlertCircle className="w-4 h-4" />
+                      ) : (
+                        <Loader2 className="w-4 h-4 animate-spin" />
+                      )}
+                      {clause.error ? "Analyse impossible" : "Analyse en cours..."}
+                    </div>
+                    <h3 className="font-semibold text-foreground mb-1">{clause.title}</h3>
+                    <p className="text-sm text-muted-foreground line-clamp-2">{clause.excerpt}</p>
+                  </div>
+                );
+              }
+              const config = riskConfig[clause.risk];
               const Icon = config.icon;
               return (
                 <div
@@ -155,7 +204,7 @@ export default function LegalAnalysis() {
                   <div className="flex items-start justify-between gap-4">
                     <div className="flex-1">
                       <div className="flex items-center gap-2 mb-2">
-                        <Icon className={cn("w-4 h-4", `text-risk-${clause.riskLevel}`)} />
+                        <Icon className={cn("w-4 h-4", `text-risk-${clause.risk}`)} />
                         <span className={cn("risk-badge", config.className)}>
                           {config.label}
                         </span>
@@ -174,16 +223,16 @@ export default function LegalAnalysis() {
         </div>
 
         {/* Detail Panel */}
-        {selectedClause && (
+        {selectedClause?.risk && (
           <div className="w-96 stat-card animate-slide-in overflow-y-auto">
             <div className="flex items-center justify-between mb-4">
               <span
                 className={cn(
                   "risk-badge",
-                  riskConfig[selectedClause.riskLevel].className
+                  riskConfig[selectedClause.risk].className
                 )}
               >
-                {riskConfig[selectedClause.riskLevel].label}
+                {riskConfig[selectedClause.risk].label}
               </span>
               <Button
                 variant="ghost"
@@ -215,6 +264,11 @@ export default function LegalAnalysis() {
                 <p className="text-sm text-foreground">
                   {selectedClause.explanation}
                 </p>
+                {selectedClause.articles && selectedClause.articles.length > 0 && (
+                  <p className="text-xs text-muted-foreground mt-2">
+                    Articles : {selectedClause.articles.join(", ")}
+                  </p>
+                )}
               </div>
 
               <div>
@@ -226,10 +280,23 @@ export default function LegalAnalysis() {
                 </p>
               </div>
 
+              {selectedClause.sources.length > 0 && (
+                <div>
+                  <h4 className="text-sm font-medium text-muted-foreground mb-2">
+                    Sources
+                  </h4>
+                  <div className="space-y-2">
+                    {selectedClause.sources.map((source) => (
+                      <div key={source.id} className="text-xs border-l-2 border-primary/40 pl-3">
+                        <p className="font-medium text-muted-foreground mb-1">{source.article ?? source.name}</p>
+                        <p className="leading-relaxed line-clamp-4">{source.excerpt}</p>
+                      </div>
+                    ))}
+                  </div>
+                </div>
+              )}
+
               <div className="flex gap-2 pt-4">
-                <Button variant="outline" className="flex-1">
-                  Voir source
-                </Button>
                 <Button className="flex-1">
                   Consulter un avocat
                 </Button>
@@ -0,0 +1,491 @@
+"""
+Module History Store - Accès concurrent à la base d'historique SQLite
+
+Avec plusieurs workers, chaque processus écrit l'historique dans le même
+fichier SQLite. Le mode WAL (persisté dans le fichier) laisse les lectures
+avancer pendant une écriture ; les écritures concurrentes restantes
+("database is locked") sont rejouées avec un délai croissant.
+
+HistoryStore travaille directement sur la table conversations de
+DatabaseManager (id, question, answer, timestamp) :
+- pagination par curseur (id décroissant, sans OFFSET)
+- index sur timestamp et recherche plein texte FTS5 (questions et réponses)
+- écritures de ask(save=True) mises en file et insérées par lots sur un
+  thread dédié : l'enregistrement ne retarde plus la réponse
+- rétention (âge, nombre de lignes) et compaction périodiques
+"""
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from observability import record_span
+
+LOCK_RETRIES = 8
+LOCK_BACKOFF = 0.05
+
+# Méthodes d'enregistrement d'historique connues de DatabaseManager
+HISTORY_SAVE_METHODS = ("save_conversation", "save_qa", "add_conversation", "insert_conversation", "save")
+
+MAX_PAGE_SIZE = 200
+# Lignes supprimées par transaction (effacement, rétention): les écrivains ne patientent pas
+DELETE_BATCH = 5000
+# Horodatage UTC, comme CURRENT_TIMESTAMP (défaut de la table et lignes existantes)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_STOP = object()
+
+
+def enable_wal(db_path) -> bool:
+    """
+    Passer la base en journal WAL (réglage conservé par le fichier)
+
+    Returns:
+        True si la base est en mode WAL
+    """
+    try:
+        connection = sqlite3.connect(str(db_path), timeout=30)
+        try:
+            mode = connection.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            connection.execute("PRAGMA synchronous=NORMAL")
+        finally:
+            connection.close()
+        return str(mode).lower() == "wal"
+    except sqlite3.Error as e:
+        print(f"[WARNING] Mode WAL non activé pour {db_path}: {e}")
+        return False
+
+
+def _is_lock_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class ConcurrentDatabase:
+    """
+    Proxy de DatabaseManager tolérant aux écrivains concurrents
+
+    Avec un HistoryStore en écriture asynchrone, les méthodes
+    d'enregistrement (HISTORY_SAVE_METHODS) mettent la conversation en file
+    au lieu d'écrire pendant la requête.
+
+
+    Args:
+        factory: Fonction qui crée le DatabaseManager (rappelée par reopen())
+        store_factory: Fonction qui crée le HistoryStore (après le DatabaseManager)
+    """
+
+    def __init__(self, factory, store_factory=None):
+        self._factory = factory
+        self._db = factory()
+        self._local = threading.local()
+        # Après DatabaseManager: son schéma reste celui de la table conversations
+        self.store = store_factory() if store_factory else None
+
+    def reopen(self):
+        """Nouvelle connexion (après un fork, une connexion SQLite ne se partage pas)"""
+        self._db = self._factory()
+        if self.store is not None:
+            self.store.reopen()
+
+    # ---------- mesures par requête ----------
+
+    def reset_timing(self):
+        self._local.elapsed = 0.0
+
+    def elapsed(self) -> float:
+        """Temps passé en base par le thread courant depuis reset_timing()"""
+        return getattr(self._local, "elapsed", 0.0)
+
+    def __getattr__(self, name):
+        store = self.__dict__.get("store")
+        if name in HISTORY_SAVE_METHODS and store is not None and store.async_writes:
+            return self._enqueue
+        attribute = getattr(self._db, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                for attempt in range(LOCK_RETRIES):
+                    try:
+                        return attribute(*args, **kwargs)
+                    except sqlite3.OperationalError as e:
+                        if not _is_lock_error(e) or attempt == LOCK_RETRIES - 1:
+                            raise
+                        time.sleep(LOCK_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+            finally:
+                self._local.elapsed = self.elapsed() + time.perf_counter() - start
+                record_span(f"db.{name}", start)
+
+        return call
+
+    def _enqueue(self, question, answer, *args, **kwargs):
+        start = time.perf_counter()
+        self.store.enqueue(question, answer)
+        self._local.elapsed = self.elapsed() + time.perf_counter() - start
+        record_span("db.enqueue", start)
+        return True
+
+    def get_history(self, limit: int = 10):
+        """Dernières conversations (tuples id, question, answer, timestamp)"""
+        if self.store is None:
+            return self.__getattr__("get_history")(limit=limit)
+        return [
+            (item["id"], item["question"], item["answer"], item["timestamp"])
+            for item in self.store.page(limit=limit)["items"]
+        ]
+
+    def clear_history(self):
+        if self.store is None:
+            return self.__getattr__("clear_history")()
+        return self.store.clear()
+
+
+def _fts_query(text: str) -> str:
+    """Requête FTS5 sûre: chaque mot en préfixe, tous requis"""
+    return " ".join(f'"{word}"*' for word in _WORD_RE.findall(text))
+
+
+class HistoryStore:
+    """
+    Historique des conversations: pagination, recherche, écritures groupées
+
+    Args:
+        db_path: Fichier SQLite de DatabaseManager
+        async_writes: Enregistrer via la file d'écriture (sinon écriture directe)
+        batch_size: Conversations insérées au plus par transaction
+        flush_ms: Attente maximale pour compléter un lot
+        retention_days: Âge maximal des conversations (0 = illimité)
+        max_rows: Nombre maximal de conversations conservées (0 = illimité)
+        compact_interval_s: Période de la rétention et de la compaction
+    """
+
+    def __init__(self, db_path, async_writes: bool = True, batch_size: int = 64, flush_ms: float = 50,
+                 retention_days: int = 0, max_rows: int = 0, compact_interval_s: float = 3600):
+        self.db_path = str(db_path)
+        self.async_writes = async_writes
+        self.batch_size = max(1, batch_size)
+        self.flush = max(0.0, flush_ms) / 1000
+        self.retention_days = max(0, retention_days)
+        self.max_rows = max(0, max_rows)
+        self.compact_interval = compact_interval_s
+        self.fts = False
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._batches = 0
+        self._failed = 0
+        self._purged = 0
+        self._last_compaction = None
+        self._reset_state()
+        self._ensure_schema()
+
+    @classmethod
+    def from_config(cls, config) -> "HistoryStore":
+        return cls(
+            config.DB_PATH,
+            async_writes=getattr(config, "HISTORY_ASYNC_WRITES", True),
+            batch_size=getattr(config, "HISTORY_BATCH_SIZE", 64),
+            flush_ms=getattr(config, "HISTORY_FLUSH_MS", 50),
+            retention_days=getattr(config, "HISTORY_RETENTION_DAYS", 0),
+            max_rows=getattr(config, "HISTORY_MAX_ROWS", 0),
+            compact_interval_s=getattr(config, "HISTORY_COMPACT_INTERVAL_S", 3600),
+        )
+
+    def _reset_state(self):
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def reopen(self):
+        """Après un fork: connexions, file et thread d'écriture propres au processus"""
+        self._reset_state()
+
+    # ---------- connexion et schéma ----------
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _retry(self, fn):
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return fn()
+            except sqlite3.OperationalError as e:
+                if not _is_lock_error(e) or attempt == LOCK_RETRIES - 1:
+                    raise
+                time.sleep(LOCK_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+
+    def _ensure_schema(self):
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT NOT NULL, answer TEXT, "
+                "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp)")
+        try:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'conversations_fts'"
+            ).fetchone() is not None
+            with connection:
+                connection.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5("
+                    "question, answer, content='conversations', content_rowid='id', "
+                    "tokenize='unicode61 remove_diacritics 2')"
+                )
+                # Index externe tenu à jour par triggers (aussi pour les écritures de DatabaseManager)
+                connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS conversations_fts_ai AFTER INSERT ON conversations BEGIN "
+                    "INSERT INTO conversations_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); END"
+                )
+                connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN "
+                    "INSERT INTO conversations_fts(conversations_fts, rowid, question, answer) "
+                    "VALUES ('delete', old.id, old.question, old.answer); END"
+                )
+                connection.execute(
+                    "CREATE TRIGGER IF NOT EXISTS conversations_fts_au AFTER UPDATE ON conversations BEGIN "
+                    "INSERT INTO conversations_fts(conversations_fts, rowid, question, answer) "
+                    "VALUES ('delete', old.id, old.question, old.answer); "
+                    "INSERT INTO conversations_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); END"
+                )
+                if not exists:
+                    connection.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')")
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            print(f"[WARNING] FTS5 indisponible, recherche par LIKE: {e}")
+
+    # ---------- lecture ----------
+
+    def page(self, limit: int = 10, cursor: str = None, query: str = None) -> dict:
+        """
+        Page de conversations, plus récentes d'abord
+
+        Args:
+            limit: Taille de la page (au plus MAX_PAGE_SIZE)
+            cursor: next_cursor de la page précédente
+            query: Mots recherchés dans les questions et réponses
+
+        Returns:
+            {"items": [{id, question, answer, timestamp}], "next_cursor": str ou None}
+
+        Raises:
+            ValueError: Curseur invalide
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        try:
+            before = int(cursor) if cursor else None
+        except ValueError:
+            raise ValueError(f"Curseur invalide: {cursor}")
+
+        conditions, params = [], []
+        if query and query.strip():
+            if self.fts:
+                match = _fts_query(query)
+                if not match:
+                    return {"items": [], "next_cursor": None}
+                conditions.append("id IN (SELECT rowid FROM conversations_fts WHERE conversations_fts MATCH ?)")
+                params.append(match)
+            else:
+                conditions.append("(question LIKE ? OR answer LIKE ?)")
+                params += [f"%{query.strip()}%"] * 2
+        if before is not None:
+            conditions.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self._retry(lambda: self._connection().execute(
+            f"SELECT id, question, answer, timestamp FROM conversations {where}ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall())
+
+        items = [
+            {"id": row[0], "question": row[1], "answer": row[2] or "", "timestamp": str(row[3] or "")}
+            for row in rows[:limit]
+        ]
+        next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    # ---------- écriture ----------
+
+    def enqueue(self, question: str, answer: str):
+        """Mettre une conversation en file (écriture directe si async_writes=False)"""
+        row = (question, answer, datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT))
+        if not self.async_writes:
+            self._write([row])
+            return
+        with self._idle:
+            self._pending += 1
+        self._start_writer()
+        self._queue.put(row)
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                # Démarré à la première écriture: rien à reprendre au fork des workers
+                self._writer = threading.Thread(target=self._writer_loop, name="history-writer", daemon=True)
+                self._writer.start()
+
+    def _writer_loop(self):
+        next_compaction = time.monotonic()
+        while True:
+            timeout = max(0.0, next_compaction - time.monotonic()) if self.compact_interval else None
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                return
+
+            if row is not None:
+                batch, stop = [row], False
+                deadline = time.monotonic() + self.flush
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+                try:
+                    self._write(batch)
+                except sqlite3.Error as e:
+                    with self._stats_lock:
+                        self._failed += len(batch)
+                    print(f"[ERROR] Historique: {len(batch)} conversations non enregistrées: {e}")
+                finally:
+                    with self._idle:
+                        self._pending -= len(batch)
+                        self._idle.notify_all()
+                if stop:
+                    return
+
+            if self.compact_interval and time.monotonic() >= next_compaction:
+                try:
+                    self.compact()
+                except sqlite3.Error as e:
+                    print(f"[WARNING] Compaction de l'historique impossible: {e}")
+                next_compaction = time.monotonic() + self.compact_interval
+
+    def _write(self, rows: list):
+        def insert():
+            connection = self._connection()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO conversations (question, answer, timestamp) VALUES (?, ?, ?)", rows
+                )
+
+        self._retry(insert)
+        with self._stats_lock:
+            self._written += len(rows)
+            self._batches += 1
+
+    def wait_idle(self, timeout: float = 5.0) -> bool:
+        """Attendre que la file d'écriture soit vide"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Écrire les conversations en attente puis arrêter le thread d'écriture"""
+        writer = self._writer
+        if writer is not None:
+            self._queue.put(_STOP)
+            writer.join(timeout)
+            self._writer = None
+
+    # ---------- effacement, rétention, compaction ----------
+
+    def _delete_where(self, condition: str, params: tuple = ()) -> int:
+        """Supprimer par transactions de DELETE_BATCH lignes"""
+        deleted = 0
+        while True:
+            def delete():
+                connection = self._connection()
+                with connection:
+                    return connection.execute(
+                        f"DELETE FROM conversations WHERE id IN "
+                        f"(SELECT id FROM conversations WHERE {condition} LIMIT ?)",
+                        params + (DELETE_BATCH,)
+                    ).rowcount
+
+            count = self._retry(delete)
+            deleted += count
+            if count < DELETE_BATCH:
+                return deleted
+
+    def clear(self) -> int:
+        """Effacer tout l'historique (conversations en file comprises)"""
+        self.wait_idle()
+        return self._delete_where("1")
+
+    def apply_retention(self) -> int:
+        """
+        Supprimer les conversations hors politique de rétention
+
+        Returns:
+            Nombre de conversations supprimées
+        """
+        deleted = 0
+        if self.retention_days:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime(TIMESTAMP_FORMAT)
+            deleted += self._delete_where("timestamp < ?", (cutoff,))
+        if self.max_rows:
+            row = self._connection().execute(
+                "SELECT id FROM conversations ORDER BY id DESC LIMIT 1 OFFSET ?", (self.max_rows - 1,)
+            ).fetchone()
+            if row is not None:
+                deleted += self._delete_where("id < ?", (row[0],))
+        with self._stats_lock:
+            self._purged += deleted
+        return deleted
+
+    def compact(self) -> int:
+        """Rétention, fusion des segments FTS et troncature du journal WAL"""
+        deleted = self.apply_retention()
+        connection = self._connection()
+        if self.fts:
+            with connection:
+                connection.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('optimize')")
+        connection.execute("PRAGMA optimize")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._last_compaction = time.time()
+        if deleted:
+            print(f"[INFO] Historique: {deleted} conversations supprimées (rétention)")
+        return deleted
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "async_writes": self.async_writes,
+                "fts": self.fts,
+                "pending": self._pending,
+                "written": self._written,
+                "batches": self._batches,
+                "avg_batch": round(self._written / self._batches, 2) if self._batches else 0.0,
+                "failed": self._failed,
+                "purged": self._purged,
+                "last_compaction": self._last_compaction,
+            }
@@ -0,0 +1,397 @@
+"""
+Module HTTP Payload - Compression, réponses allégées et cache HTTP (ETag)
+
+Les réponses /api/ask (extraits complets des sources) et /api/history
+(réponses complètes) sont de gros JSON ; le frontend statique était servi
+sans en-tête de cache. Ce module réduit les octets transférés :
+- compression gzip, ou brotli si le paquet brotli est installé, négociée
+  par Accept-Encoding (les flux SSE et NDJSON ne sont pas compressés : ils
+  seraient retardés)
+- réponses allégées sur demande : sélection de champs et extraits tronqués
+- ETag et Cache-Control sur le frontend et les GET idempotents de l'API :
+  un client qui renvoie l'ETag (If-None-Match) reçoit un 304 sans corps
+
+Middlewares ASGI purs (comme ObservabilityMiddleware) : le streaming des
+autres réponses n'est pas mis en mémoire tampon.
+"""
+import hashlib
+import threading
+import zlib
+from collections import Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Types de contenu compressés (le reste: images, polices déjà compressées)
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "text/html", "text/css",
+    "text/javascript", "text/plain", "image/svg+xml",
+)
+
+# Flux émis au fil de l'eau: la compression retiendrait les premiers octets
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+
+ELLIPSIS = "…"
+
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _without(headers, *names: bytes) -> list:
+    return [(key, value) for key, value in headers if key.lower() not in names]
+
+
+def _weak_etag(headers) -> list:
+    """ETag faible (W/): le contenu compressé n'est pas identique octet pour octet"""
+    etag = _header(headers, b"etag")
+    if etag and not etag.startswith("W/"):
+        return _without(headers, b"etag") + [(b"etag", f"W/{etag}".encode("latin-1"))]
+    return headers
+
+
+def _accepted_encodings(scope) -> set:
+    """Encodages acceptés par le client (q=0 exclu)"""
+    value = _header(scope.get("headers") or [], b"accept-encoding") or ""
+    accepted = set()
+    for item in value.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class PayloadStats:
+    """Octets avant/après compression et réponses 304 (partagé par les middlewares)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compressed = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.not_modified = 0
+        self.not_modified_bytes = 0
+
+    def record_compressed(self, encoding: str, size_in: int, size_out: int):
+        with self._lock:
+            self.compressed[encoding] += 1
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+
+    def record_not_modified(self, size: int):
+        with self._lock:
+            self.not_modified += 1
+            self.not_modified_bytes += size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "encodings": ["br", "gzip"] if brotli is not None else ["gzip"],
+                "compressed": dict(self.compressed),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "compression_ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else 0.0,
+                "not_modified": self.not_modified,
+                "not_modified_bytes": self.not_modified_bytes,
+            }
+
+
+# ============ COMPRESSION ============
+
+class _Compressor:
+    """Compression incrémentale d'un corps (gzip ou brotli)"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=min(level, 11))
+        else:
+            # wbits=31: en-tête et CRC gzip
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI : compression gzip/brotli des réponses
+
+    Un corps envoyé en un seul message est compressé s'il dépasse
+    minimum_size ; un corps en plusieurs messages (fichiers statiques) est
+    compressé au fil de l'eau. L'ETag d'une réponse compressée (et du 304
+    qui la valide) devient faible.
+
+    Args:
+        app: Application ASGI
+        minimum_size: Taille en deçà de laquelle la réponse n'est pas compressée
+        gzip_level: Niveau de compression gzip (1-9)
+        brotli_quality: Qualité brotli (0-11 ; None = brotli désactivé)
+        stats: PayloadStats alimenté (octets avant/après)
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 stats: PayloadStats = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality if brotli is not None else None
+        self.stats = stats or PayloadStats()
+
+    def _choose(self, scope):
+        accepted = _accepted_encodings(scope)
+        if self.brotli_quality is not None and "br" in accepted:
+            return "br", self.brotli_quality
+        if "gzip" in accepted:
+            return "gzip", self.gzip_level
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding, level = self._choose(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        sizes = [0, 0]
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # Décision différée au premier fragment du corps (taille connue)
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = list(start.get("headers", []))
+                content_type = (_header(headers, b"content-type") or "").split(";")[0].strip().lower()
+                compress = (
+                    start["status"] not in (204, 304)
+                    and _header(headers, b"content-encoding") is None
+                    and content_type in COMPRESSIBLE_TYPES
+                    and (more_body or len(body) >= self.minimum_size)
+                )
+                if not compress:
+                    if start["status"] == 304:
+                        # Même ETag que la réponse 200 compressée qu'il valide
+                        headers = _weak_etag(headers)
+                    elif content_type not in STREAMING_TYPES and content_type in COMPRESSIBLE_TYPES:
+                        headers.append((b"vary", b"Accept-Encoding"))
+                    start["headers"] = headers
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, level)
+                headers = _weak_etag(_without(headers, b"content-length"))
+                headers += [(b"content-encoding", encoding.encode("latin-1")), (b"vary", b"Accept-Encoding")]
+                if not more_body:
+                    data = compressor.compress(body) + compressor.finish()
+                    headers.append((b"content-length", str(len(data)).encode("latin-1")))
+                    self.stats.record_compressed(encoding, len(body), len(data))
+                    start["headers"] = headers
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                start["headers"] = headers
+                await send(start)
+
+            sizes[0] += len(body)
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.finish()
+                self.stats.record_compressed(encoding, sizes[0], sizes[1] + len(data))
+            sizes[1] += len(data)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+# ============ ETAG / CACHE-CONTROL ============
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparaison faible (RFC 9110) : W/"x" et "x" désignent le même contenu"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ConditionalMiddleware:
+    """
+    Middleware ASGI : ETag, Cache-Control et réponses 304
+
+    Pour chaque GET dont le chemin correspond à une règle :
+    - Cache-Control de la règle
+    - ETag : celui de la réponse (fichiers statiques: taille et date), sinon
+      empreinte du corps quand il est envoyé en un seul message (JSON)
+    - If-None-Match correspondant : 304 sans corps ; les 304 de l'application
+      (StaticFiles) reçoivent aussi le Cache-Control et sont comptés
+
+    Args:
+        app: Application ASGI
+        rules: Liste de (chemin, Cache-Control) ; "/static/*" désigne un
+            préfixe, la première règle qui correspond s'applique
+        stats: PayloadStats alimenté (réponses 304, octets évités)
+    """
+
+    def __init__(self, app, rules: list, stats: PayloadStats = None):
+        self.app = app
+        self.rules = list(rules)
+        self.stats = stats or PayloadStats()
+
+    def _cache_control(self, path: str):
+        for pattern, cache_control in self.rules:
+            if path == pattern or (pattern.endswith("*") and path.startswith(pattern[:-1])):
+                return cache_control
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        cache_control = self._cache_control(scope["path"])
+        if cache_control is None:
+            await self.app(scope, receive, send)
+            return
+        if_none_match = _header(scope.get("headers") or [], b"if-none-match")
+
+        start = None
+        state = {"skip": False, "passthrough": False}
+
+        async def send_conditional(message):
+            nonlocal start
+            if state["skip"]:
+                # 304 déjà envoyé: le reste du corps n'est pas transmis
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"] or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = list(start.get("headers", []))
+            etag = _header(headers, b"etag")
+            if start["status"] == 200:
+                headers = _without(headers, b"cache-control") + [(b"cache-control", cache_control.encode("latin-1"))]
+                if etag is None and not more_body and scope["method"] == "GET":
+                    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+                    headers.append((b"etag", etag.encode("latin-1")))
+                if etag is not None and _etag_matches(if_none_match, etag):
+                    length = _header(headers, b"content-length")
+                    self.stats.record_not_modified(int(length) if length and length.isdigit() else len(body))
+                    kept = [(key, value) for key, value in headers
+                            if key.lower() in (b"etag", b"cache-control", b"vary", b"last-modified")]
+                    state["skip"] = True
+                    await send({"type": "http.response.start", "status": 304, "headers": kept})
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+            elif start["status"] == 304:
+                # 304 produit par l'application (StaticFiles) : même Cache-Control,
+                # taille évitée inconnue
+                headers = _without(headers, b"cache-control") + [(b"cache-control", cache_control.encode("latin-1"))]
+                self.stats.record_not_modified(0)
+            start["headers"] = headers
+            state["passthrough"] = True
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_conditional)
+
+
+# ============ RÉPONSES ALLÉGÉES ============
+
+def parse_fields(value) -> set:
+    """Champs demandés ("answer,sources" ou liste) ; None = tous"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = {field.strip() for field in value if field and field.strip()}
+    return fields or None
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """Tronquer un texte à max_chars caractères (sans couper un mot si possible)"""
+    if max_chars is None or text is None or len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ""
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + ELLIPSIS
+
+
+def slim_source(source: dict, excerpt_chars: int = None) -> dict:
+    """Source avec un extrait tronqué (surlignages ramenés à la partie conservée)"""
+    if excerpt_chars is None:
+        return source
+    source = dict(source)
+    excerpt = source.get("excerpt") or ""
+    source["excerpt"] = truncate_text(excerpt, excerpt_chars)
+    source["excerpt_truncated"] = len(source["excerpt"]) < len(excerpt)
+    if source.get("highlights") is not None:
+        # Positions valables dans la partie conservée (sans le "…" final)
+        kept = len(source["excerpt"]) - (1 if source["excerpt_truncated"] and source["excerpt"] else 0)
+        source["highlights"] = [
+            dict(span, end=min(span["end"], kept)) for span in source["highlights"] if span["start"] < kept
+        ]
+    return source
+
+
+def slim_payload(payload: dict, fields=None, excerpt_chars: int = None) -> dict:
+    """
+    Alléger une réponse JSON
+
+    Args:
+        payload: Réponse complète (dict)
+        fields: Champs de premier niveau conservés (success toujours conservé)
+        excerpt_chars: Longueur maximale des extraits des sources (0 = sans extrait)
+
+    Returns:
+        Nouveau dict (payload n'est pas modifié)
+    """
+    fields = parse_fields(fields)
+    if fields is not None:
+        payload = {key: value for key, value in payload.items() if key in fields or key == "success"}
+    else:
+        payload = dict(payload)
+    if excerpt_chars is not None and isinstance(payload.get("sources"), list):
+        payload["sources"] = [slim_source(source, excerpt_chars) for source in payload["sources"]]
+    return payload
@@ -0,0 +1,430 @@
+"""
+Module Hybrid Retrieval - BM25 + recherche dense, fusion RRF
+
+Les questions juridiques citent souvent un numéro d'article exact
+("L1234-5") ou des termes rares que la recherche dense rate. Ce module
+ajoute un index inversé BM25 en mémoire sur les mêmes chunks que Chroma,
+persisté à côté de chroma_db/ et synchronisé fichier par fichier avec le
+manifeste d'index. Les deux listes sont fusionnées par reciprocal-rank
+fusion (RRF) ; une référence d'article exacte court-circuite la recherche.
+"""
+import hashlib
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from index_manifest import INDEX_KEY, get_persist_dir, index_writer_lock
+
+BM25_VERSION = 3
+BM25_FILENAME = "bm25_index.pkl"
+
+# Références d'articles du Code du travail: L1234-5, R. 4121-1, D3141-1-2
+ARTICLE_RE = re.compile(r"\b([LRD])\s?\.?\s?(\d{3,4}(?:-\d+)+)\b", re.IGNORECASE)
+# Titre d'article: seul sur sa ligne, ou suivi d'un séparateur ("Article L1234-5 : Préavis").
+# Sensible à la casse: "l'article L. 1234-5" cité dans le texte n'est pas un titre
+ARTICLE_HEADING_RE = re.compile(
+    r"^[ \t]*Art(?:icle|\.)\s?([LRD])\s?\*?\s?\.?\s?(\d{3,4}(?:-\d+)+)[ \t]*(?:[:\u2013\u2014-].*)?$",
+    re.MULTILINE,
+)
+
+_TOKEN_RE = re.compile(r"[lrd]\d{3,4}(?:-\d+)+|\d+(?:-\d+)*|[a-z]+")
+
+STOPWORDS = frozenset(
+    "a au aux avec ce ces cette dans de des du elle en est et il ils la le les leur "
+    "lui mais me ne ni nous on ou par pas pour qu que qui sa se ses si son sont sur "
+    "ta te tes un une vos vous y d l j s c n t est-ce quel quelle quels quelles quoi "
+    "comment combien".split()
+)
+
+
+def article_ref(letter: str, number: str) -> str:
+    """Forme canonique d'une référence d'article (L1234-5)"""
+    return f"{letter.upper()}{number}"
+
+
+def find_article_refs(text: str) -> list:
+    """Références d'articles citées dans un texte, dans l'ordre"""
+    refs = [article_ref(letter, number) for letter, number in ARTICLE_RE.findall(text)]
+    return list(dict.fromkeys(refs))
+
+
+def tokenize(text: str) -> list:
+    """Tokens BM25: minuscules, sans accents, références d'articles conservées"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    # "L. 1234-5" et "L1234-5" donnent le même token
+    text = ARTICLE_RE.sub(lambda m: f" {m.group(1).lower()}{m.group(2)} ", text)
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def chunk_key(text: str, metadata: dict) -> str:
+    """Identité d'un chunk commune aux résultats denses et BM25"""
+    source = (metadata or {}).get("source", "")
+    return hashlib.sha1(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """
+    Index inversé BM25 (Okapi) sur les chunks du vector store
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}                      # doc_id -> (texte, métadonnées, longueur)
+        self.postings = defaultdict(dict)   # terme -> {doc_id: tf}
+        self.articles = defaultdict(set)    # référence -> doc_ids qui définissent l'article
+        self.doc_articles = {}              # doc_id -> références définies (suppression sans parcours)
+        self.file_docs = defaultdict(set)   # clé de fichier -> doc_ids
+        self.files = {}                     # clé de fichier -> sha256 (manifeste)
+        self.layout = None                  # modèle, découpage et collection de l'index
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ---------- construction incrémentale ----------
+
+    def add(self, doc_id: str, text: str, metadata: dict):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        metadata = dict(metadata or {})
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.docs[doc_id] = (text, metadata, length)
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        refs = {article_ref(l, n) for l, n in ARTICLE_HEADING_RE.findall(text)}
+        if metadata.get("article"):
+            refs.add(str(metadata["article"]).upper().replace(" ", "").replace(".", ""))
+        for ref in refs:
+            self.articles[ref].add(doc_id)
+        if refs:
+            self.doc_articles[doc_id] = frozenset(refs)
+        if metadata.get(INDEX_KEY):
+            self.file_docs[metadata[INDEX_KEY]].add(doc_id)
+
+    def remove(self, doc_id: str):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        text, metadata, length = entry
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        for ref in self.doc_articles.pop(doc_id, ()):
+            doc_ids = self.articles.get(ref)
+            if doc_ids is not None:
+                doc_ids.discard(doc_id)
+                if not doc_ids:
+                    del self.articles[ref]
+        file_key = metadata.get(INDEX_KEY)
+        if file_key in self.file_docs:
+            self.file_docs[file_key].discard(doc_id)
+
+    def remove_file(self, file_key: str):
+        for doc_id in list(self.file_docs.pop(file_key, ())):
+            self.remove(doc_id)
+
+    def copy(self) -> "BM25Index":
+        """Copie modifiable de l'index (entrées de docs, immuables, partagées)"""
+        index = BM25Index(self.k1, self.b)
+        index.docs = dict(self.docs)
+        index.postings = defaultdict(dict, {term: dict(docs) for term, docs in self.postings.items()})
+        index.articles = defaultdict(set, {ref: set(docs) for ref, docs in self.articles.items()})
+        index.doc_articles = dict(self.doc_articles)
+        index.file_docs = defaultdict(set, {key: set(docs) for key, docs in self.file_docs.items()})
+        index.files = dict(self.files)
+        index.layout = self.layout
+        index.total_length = self.total_length
+        return index
+
+    # ---------- recherche ----------
+
+    def scores(self, query: str, doc_ids=None) -> dict:
+        """Scores BM25 de la requête, pour tous les chunks ou ceux de doc_ids"""
+        scores = defaultdict(float)
+        if not self.docs:
+            return scores
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1.0
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id in (postings if doc_ids is None else [d for d in doc_ids if d in postings]):
+                tf = postings[doc_id]
+                length = self.docs[doc_id][2]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return scores
+
+    def search(self, query: str, k: int = 20) -> list:
+        """Top-k (doc_id, score BM25)"""
+        return heapq.nlargest(k, self.scores(query).items(), key=lambda item: item[1])
+
+    def idf(self, term: str) -> float:
+        """Poids IDF d'un terme (0 si le terme est absent de l'index)"""
+        postings = self.postings.get(term)
+        if not postings:
+            return 0.0
+        n_docs = len(self.docs)
+        return math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+
+    def article_docs(self, refs: list, query: str = "") -> list:
+        """
+        doc_ids des chunks qui définissent les articles cités
+
+        Plusieurs chunks pour un même article (parties d'un article long) :
+        classés par score BM25 de la requête, puis par identifiant.
+        """
+        doc_ids = []
+        for ref in refs:
+            defining = self.articles.get(ref, ())
+            scores = self.scores(query, defining) if query and len(defining) > 1 else {}
+            doc_ids.extend(sorted(defining, key=lambda doc_id: (-scores.get(doc_id, 0.0), doc_id)))
+        return list(dict.fromkeys(doc_ids))
+
+    # ---------- persistance ----------
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        state = {
+            "version": BM25_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "docs": self.docs,
+            "postings": dict(self.postings),
+            "articles": dict(self.articles),
+            "file_docs": dict(self.file_docs),
+            "files": self.files,
+            "layout": self.layout,
+            "total_length": self.total_length,
+        }
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        """Charger un index persisté (None si absent ou incompatible)"""
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if state.get("version") != BM25_VERSION:
+            return None
+        index = cls(state["k1"], state["b"])
+        index.docs = state["docs"]
+        index.postings = defaultdict(dict, state["postings"])
+        index.articles = defaultdict(set, state["articles"])
+        refs = defaultdict(set)
+        for ref, doc_ids in index.articles.items():
+            for doc_id in doc_ids:
+                refs[doc_id].add(ref)
+        index.doc_articles = {doc_id: frozenset(doc_refs) for doc_id, doc_refs in refs.items()}
+        index.file_docs = defaultdict(set, state["file_docs"])
+        index.files = state["files"]
+        index.layout = state["layout"]
+        index.total_length = state["total_length"]
+        return index
+
+    # ---------- synchronisation avec Chroma ----------
+
+    def _add_from_collection(self, vectorstore, where=None) -> int:
+        data = vectorstore.get(where=where, include=["documents", "metadatas"]) if where else \
+            vectorstore.get(include=["documents", "metadatas"])
+        for doc_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"]):
+            self.add(doc_id, text or "", metadata or {})
+        return len(data["ids"])
+
+    def sync(self, vectorstore, manifest) -> bool:
+        """
+        Aligner l'index sur la collection Chroma, fichier par fichier
+
+        Les textes sont relus depuis Chroma: aucun ré-encodage.
+
+        Returns:
+            True si l'index a été modifié
+        """
+        if manifest is None:
+            return False
+        # Le découpage en fait partie: changer de chunker réécrit la collection sous le même nom
+        layout = [manifest.embedding_model, manifest.chunk_size, manifest.chunk_overlap,
+                  manifest.chunker, manifest.collection_name]
+        files = manifest.files
+        if layout != self.layout:
+            # Reconstruction complète de la collection: identifiants Chroma différents
+            self.__init__(self.k1, self.b)
+            self._add_from_collection(vectorstore)
+            self.files, self.layout = dict(files), layout
+            return True
+
+        added = [k for k in files if k not in self.files]
+        removed = [k for k in self.files if k not in files]
+        changed = [k for k in files if k in self.files and files[k] != self.files[k]]
+        if not (added or removed or changed):
+            return False
+        for key in removed + changed:
+            self.remove_file(key)
+        for key in added + changed:
+            self._add_from_collection(vectorstore, where={INDEX_KEY: key})
+        self.files = dict(files)
+        return True
+
+
+# ============ RETRIEVER HYBRIDE ============
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """
+    Fusionner plusieurs classements (listes de clés) par RRF
+
+    Returns:
+        Liste (clé, score) triée par score décroissant
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _make_document(text: str, metadata: dict):
+    from langchain_core.documents import Document
+
+    return Document(page_content=text, metadata=metadata)
+
+
+class HybridRetriever:
+    """
+    Recherche hybride: dense (VectorStoreManager.retrieve) + BM25, fusion RRF
+
+    Args:
+        vector_store: VectorStoreManager (recherche dense d'origine)
+        bm25: BM25Index synchronisé avec la collection
+        k: Nombre de chunks retournés après fusion
+        bm25_k: Nombre de candidats BM25
+        rrf_k: Constante de lissage RRF
+        article_lookup: Court-circuiter la recherche sur référence d'article exacte
+    """
+
+    def __init__(self, vector_store, bm25: BM25Index, k: int = 4, bm25_k: int = 20,
+                 rrf_k: int = 60, article_lookup: bool = True):
+        self.vector_store = vector_store
+        self.bm25 = bm25
+        self.k = k
+        self.bm25_k = bm25_k
+        self.rrf_k = rrf_k
+        self.article_lookup = article_lookup
+        self.article_hits = 0
+        self.path = None
+        self._update_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, vector_store, config):
+        """Créer le retriever avec l'index BM25 persisté à côté de chroma_db/"""
+        path = get_persist_dir(config) / BM25_FILENAME
+        retriever = cls(
+            vector_store,
+            BM25Index.load(path) or BM25Index(),
+            k=getattr(config, "HYBRID_K", None) or getattr(config, "RETRIEVAL_K", 4),
+            bm25_k=getattr(config, "BM25_K", 20),
+            rrf_k=getattr(config, "RRF_K", 60),
+            article_lookup=getattr(config, "ARTICLE_LOOKUP", True),
+        )
+        retriever.path = path
+        return retriever
+
+    def update(self, manifest):
+        """
+        Synchroniser l'index BM25 avec le manifeste de l'index vectoriel
+
+        La synchronisation porte sur une copie, puis la référence est
+        remplacée : les recherches en cours gardent l'index précédent.
+        """
+        vectorstore = getattr(self.vector_store, "vectorstore", None)
+        if vectorstore is None or manifest is None:
+            return
+        with self._update_lock:
+            start = time.perf_counter()
+            updated = self.bm25.copy()
+            if not updated.sync(vectorstore, manifest):
+                return
+            self.bm25 = updated
+            with index_writer_lock(self.path.parent):
+                updated.save(self.path)
+            print(f"[OK] Index BM25 mis à jour: {len(updated)} chunks en {time.perf_counter() - start:.2f}s")
+
+    def idf(self, term: str) -> float:
+        """Poids IDF d'un terme dans l'index BM25 courant"""
+        return self.bm25.idf(term)
+
+    @staticmethod
+    def _bm25_document(bm25: BM25Index, doc_id: str, score: float, retrieval: str):
+        text, metadata, _ = bm25.docs[doc_id]
+        return _make_document(text, dict(metadata, score=round(score, 6), retrieval=retrieval))
+
+    def retrieve(self, question: str, *args, **kwargs) -> list:
+        """Même contrat que VectorStoreManager.retrieve()"""
+        # Index lu une seule fois: une mise à jour concurrente le remplace sans le modifier
+        bm25 = self.bm25
+        # Référence d'article exacte: pas besoin de recherche
+        if self.article_lookup:
+            doc_ids = bm25.article_docs(find_article_refs(question), question)
+            if doc_ids:
+                self.article_hits += 1
+                return [self._bm25_document(bm25, doc_id, 1.0, "article") for doc_id in doc_ids[:self.k]]
+
+        dense = self.vector_store.retrieve(question, *args, **kwargs) or []
+        sparse = bm25.search(question, self.bm25_k)
+
+        candidates = {}
+        dense_ranking = []
+        for doc in dense:
+            text = getattr(doc, "page_content", "")
+            metadata = getattr(doc, "metadata", None) or {}
+            key = chunk_key(text, metadata)
+            candidates.setdefault(key, (text, metadata))
+            dense_ranking.append(key)
+        sparse_ranking = []
+        for doc_id, _ in sparse:
+            text, metadata, _ = bm25.docs[doc_id]
+            key = chunk_key(text, metadata)
+            candidates.setdefault(key, (text, metadata))
+            sparse_ranking.append(key)
+
+        dense_keys, sparse_keys = set(dense_ranking), set(sparse_ranking)
+        results = []
+        for key, score in reciprocal_rank_fusion([dense_ranking, sparse_ranking], self.rrf_k)[:self.k]:
+            text, metadata = candidates[key]
+            retrieval = "both" if key in dense_keys and key in sparse_keys else (
+                "dense" if key in dense_keys else "bm25"
+            )
+            results.append(_make_document(text, dict(metadata, score=round(score, 6), retrieval=retrieval)))
+        return results
+
+    def stats(self) -> dict:
+        bm25 = self.bm25
+        return {
+            "chunks": len(bm25),
+            "terms": len(bm25.postings),
+            "articles": len(bm25.articles),
+            "article_hits": self.article_hits,
+            "k": self.k,
+        }
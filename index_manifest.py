@@ -0,0 +1,426 @@
+"""
+Module Index Manifest - Index vectoriel persistant et incrémental
+
+Le manifeste enregistre, à côté de chroma_db/, l'empreinte de chaque fichier
+du corpus ainsi que le modèle d'embedding et les paramètres de chunking.
+Au démarrage :
+- rien n'a changé      -> la collection Chroma existante est rouverte telle quelle
+- des fichiers changent -> seuls ces fichiers sont re-découpés et ré-encodés,
+                           leurs anciens chunks sont supprimés
+- modèle/chunking changé -> reconstruction complète
+
+Avec INGEST_STREAMING, les fichiers à indexer passent par le pipeline en
+flux d'ingestion.py (mémoire bornée) au lieu du chargement en bloc de
+VectorStoreManager.
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = "index_manifest.json"
+
+# Métadonnée ajoutée à chaque chunk pour le relier à son fichier source
+INDEX_KEY = "index_file"
+
+# Taille des lots envoyés à Chroma lors d'un ajout incrémental
+ADD_BATCH_SIZE = 256
+
+
+def get_persist_dir(config) -> Path:
+    """Répertoire de persistance Chroma (et du manifeste)"""
+    for name in ("CHROMA_DIR", "PERSIST_DIRECTORY", "VECTOR_DB_DIR", "CHROMA_PATH"):
+        value = getattr(config, name, None)
+        if value:
+            return Path(value)
+    return Path(os.environ.get("CHROMA_DIR", Path(config.CLEANED_DIR).parent.parent / "chroma_db"))
+
+
+def get_embedding_model_name(config) -> str:
+    """Nom du modèle d'embedding configuré (variante quantifiée incluse)"""
+    model_name = "unknown"
+    for name in ("EMBEDDING_MODEL", "EMBEDDING_MODEL_NAME", "EMBEDDINGS_MODEL"):
+        value = getattr(config, name, None)
+        if value:
+            model_name = str(value)
+            break
+    quantize = getattr(config, "EMBEDDING_QUANTIZE", "")
+    return f"{model_name}+{quantize}" if quantize else model_name
+
+
+# Version du découpage par articles (reconnaissance des titres) : la changer réindexe
+ARTICLE_CHUNKER_VERSION = 2
+
+
+def get_chunker_name(config) -> str:
+    """Découpage configuré: fenêtres fixes, ou articles avec leur taille maximale"""
+    if getattr(config, "CHUNKER", "recursive") == "article":
+        return f"article-v{ARTICLE_CHUNKER_VERSION}-{getattr(config, 'ARTICLE_MAX_CHARS', 1500)}"
+    return "recursive"
+
+
+def hash_file(path: Path, block_size: int = 1 << 20) -> str:
+    """Empreinte SHA-256 d'un fichier, lue par blocs"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_corpus(cleaned_dir) -> dict:
+    """
+    Calculer l'empreinte de chaque fichier du corpus
+
+    Returns:
+        Dict {chemin relatif posix: sha256}
+    """
+    root = Path(cleaned_dir)
+    files = {}
+    if not root.exists():
+        return files
+    for path in sorted(root.rglob("*")):
+        if path.is_file() and not path.name.startswith("."):
+            files[path.relative_to(root).as_posix()] = hash_file(path)
+    return files
+
+
+def document_key(doc, cleaned_dir) -> str:
+    """Clé du manifeste correspondant à un document chargé"""
+    metadata = getattr(doc, "metadata", None) or {}
+    source = metadata.get("source")
+    if not source:
+        return None
+    source = Path(source)
+    try:
+        return source.resolve().relative_to(Path(cleaned_dir).resolve()).as_posix()
+    except ValueError:
+        return source.name
+
+
+class IndexManifest:
+    """
+    Manifeste de l'index vectoriel persistant
+    """
+
+    def __init__(self, embedding_model: str, chunk_size, chunk_overlap,
+                 files: dict = None, collection_name: str = None, chunker: str = "recursive"):
+        self.version = MANIFEST_VERSION
+        self.embedding_model = embedding_model
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunker = chunker
+        self.files = dict(files or {})
+        self.collection_name = collection_name
+        self.updated_at = None
+
+    @classmethod
+    def from_config(cls, config, files: dict = None) -> "IndexManifest":
+        """Créer un manifeste à partir de la configuration courante"""
+        return cls(
+            embedding_model=get_embedding_model_name(config),
+            chunk_size=getattr(config, "CHUNK_SIZE", None),
+            chunk_overlap=getattr(config, "CHUNK_OVERLAP", None),
+            files=files,
+            chunker=get_chunker_name(config),
+        )
+
+    @classmethod
+    def load(cls, path: Path):
+        """Charger un manifeste depuis le disque (None si absent ou illisible)"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Manifeste sérialisé par to_dict() (None si version différente)"""
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        manifest = cls(
+            embedding_model=data.get("embedding_model"),
+            chunk_size=data.get("chunk_size"),
+            chunk_overlap=data.get("chunk_overlap"),
+            files=data.get("files"),
+            collection_name=data.get("collection_name"),
+            chunker=data.get("chunker", "recursive"),
+        )
+        manifest.updated_at = data.get("updated_at")
+        return manifest
+
+    def save(self, path: Path):
+        """Écrire le manifeste de façon atomique"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.updated_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "chunker": self.chunker,
+            "collection_name": self.collection_name,
+            "files": self.files,
+            "updated_at": self.updated_at,
+        }
+
+    def is_compatible(self, other: "IndexManifest") -> bool:
+        """Même modèle d'embedding et mêmes paramètres de chunking"""
+        return (
+            other is not None
+            and self.embedding_model == other.embedding_model
+            and self.chunk_size == other.chunk_size
+            and self.chunk_overlap == other.chunk_overlap
+            and self.chunker == other.chunker
+        )
+
+    def diff(self, files: dict):
+        """
+        Comparer le manifeste à l'état actuel du corpus
+
+        Returns:
+            Tuple (ajoutés, modifiés, supprimés) de clés de fichiers
+        """
+        added = sorted(set(files) - set(self.files))
+        removed = sorted(set(self.files) - set(files))
+        changed = sorted(k for k in set(files) & set(self.files) if files[k] != self.files[k])
+        return added, changed, removed
+
+    def fingerprint(self) -> str:
+        """Empreinte globale de l'index (change dès que le contenu indexé change)"""
+        layout = [self.embedding_model, self.chunk_size, self.chunk_overlap, self.files]
+        if self.chunker != "recursive":
+            # Découpage par défaut absent: les empreintes existantes ne changent pas
+            layout.append(self.chunker)
+        payload = json.dumps(layout, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# ============ ÉCRIVAIN UNIQUE ============
+
+WRITER_LOCK_FILENAME = ".index_writer.lock"
+
+
+@contextmanager
+def index_writer_lock(persist_dir: Path):
+    """
+    Verrou exclusif inter-processus pour les écritures dans l'index
+
+    Plusieurs workers (ou réplicas sur le même volume) peuvent démarrer en
+    même temps : un seul met l'index à jour, les autres attendent puis
+    rouvrent l'index à jour sans rien ré-encoder.
+    """
+    persist_dir = Path(persist_dir)
+    persist_dir.mkdir(parents=True, exist_ok=True)
+    with open(persist_dir / WRITER_LOCK_FILENAME, "a+") as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            # Windows: pas de flock, mode un seul processus
+            yield
+            return
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+# ============ OUVERTURE / MISE À JOUR DE L'INDEX ============
+
+def _open_collection(vector_store, persist_dir: Path, collection_name: str):
+    """Rouvrir une collection Chroma persistée sans ré-encoder"""
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        collection_name=collection_name,
+        embedding_function=vector_store.embeddings,
+        persist_directory=str(persist_dir),
+    )
+
+
+def _collection_count(vectorstore) -> int:
+    try:
+        return vectorstore._collection.count()
+    except Exception:
+        return 0
+
+
+def _tag_chunks(chunks, cleaned_dir):
+    """Ajouter la clé du fichier source aux métadonnées de chaque chunk"""
+    for chunk in chunks:
+        key = document_key(chunk, cleaned_dir)
+        if key:
+            chunk.metadata[INDEX_KEY] = key
+    return chunks
+
+
+def _delete_file_chunks(vectorstore, keys) -> int:
+    """Supprimer les chunks des fichiers donnés"""
+    deleted = 0
+    for key in keys:
+        ids = vectorstore.get(where={INDEX_KEY: key}).get("ids", [])
+        if ids:
+            vectorstore.delete(ids=ids)
+            deleted += len(ids)
+    return deleted
+
+
+def _chunk_documents(vector_store, config, documents):
+    """Découpage du chargement en bloc (VectorStoreManager ou articles)"""
+    if getattr(config, "CHUNKER", "recursive") != "article":
+        return vector_store.chunk_documents(documents)
+    from article_chunker import ArticleChunker, chunk_documents
+
+    return chunk_documents(documents, ArticleChunker.from_config(config))
+
+
+def _add_chunks(vectorstore, chunks):
+    for start in range(0, len(chunks), ADD_BATCH_SIZE):
+        vectorstore.add_documents(chunks[start:start + ADD_BATCH_SIZE])
+
+
+def _streaming_pipeline(config):
+    """Pipeline d'ingestion en flux (None: chargement en bloc par VectorStoreManager)"""
+    if not getattr(config, "INGEST_STREAMING", False):
+        return None
+    from ingestion import IngestionPipeline
+
+    return IngestionPipeline.from_config(config)
+
+
+def _index_streaming(pipeline, vectorstore, vector_store, config, keys) -> int:
+    """Indexer des fichiers du corpus en flux (mémoire bornée)"""
+    from ingestion import corpus_files
+
+    try:
+        return pipeline.index_files(vectorstore, vector_store.embeddings, corpus_files(config.CLEANED_DIR, keys))
+    finally:
+        pipeline.shutdown()
+
+
+def _full_rebuild(vector_store, config, files: dict, manifest_path: Path, previous):
+    """Reconstruire entièrement l'index et écrire un nouveau manifeste"""
+    persist_dir = get_persist_dir(config)
+    if previous is not None and previous.collection_name and persist_dir.exists():
+        # Supprimer l'ancienne collection pour ne pas dupliquer les chunks
+        try:
+            _open_collection(vector_store, persist_dir, previous.collection_name).delete_collection()
+        except Exception as e:
+            print(f"[WARNING] Impossible de supprimer l'ancienne collection: {e}")
+
+    pipeline = _streaming_pipeline(config)
+    if pipeline is not None:
+        from ingestion import open_collection
+
+        vector_store.vectorstore = open_collection(vector_store, config)
+        count = _index_streaming(pipeline, vector_store.vectorstore, vector_store, config, sorted(files))
+        if not count:
+            print("[WARNING] Aucun document a traiter, continuant sans vector store")
+            vector_store.vectorstore.delete_collection()
+            vector_store.vectorstore = None
+            return None
+        manifest = IndexManifest.from_config(config, files)
+        manifest.collection_name = vector_store.vectorstore._collection.name
+        manifest.save(manifest_path)
+        print(f"[OK] Index reconstruit en flux: {len(files)} fichiers, {count} chunks")
+        return manifest
+
+    documents = vector_store.load_documents(config.CLEANED_DIR)
+    if not documents:
+        print("[WARNING] Aucun document a traiter, continuant sans vector store")
+        vector_store.vectorstore = None
+        return None
+
+    chunks = _tag_chunks(_chunk_documents(vector_store, config, documents), config.CLEANED_DIR)
+    vector_store.create_vectorstore(chunks)
+
+    manifest = IndexManifest.from_config(config, files)
+    manifest.collection_name = getattr(
+        getattr(vector_store.vectorstore, "_collection", None), "name", None
+    )
+    manifest.save(manifest_path)
+    print(f"[OK] Index reconstruit: {len(files)} fichiers, {len(chunks)} chunks")
+    return manifest
+
+
+def open_or_build_vectorstore(vector_store, config) -> IndexManifest:
+    """
+    Ouvrir l'index persistant ou le mettre à jour de façon incrémentale
+    (sous le verrou d'écrivain unique)
+
+    Args:
+        vector_store: VectorStoreManager avec embeddings initialisés
+        config: RAGConfig
+
+    Returns:
+        Le manifeste de l'index actif (None si aucun document)
+    """
+    with index_writer_lock(get_persist_dir(config)):
+        return _open_or_build(vector_store, config)
+
+
+def _open_or_build(vector_store, config) -> IndexManifest:
+    start = time.perf_counter()
+    persist_dir = get_persist_dir(config)
+    manifest_path = persist_dir / MANIFEST_FILENAME
+
+    files = scan_corpus(config.CLEANED_DIR)
+    current = IndexManifest.from_config(config, files)
+    previous = IndexManifest.load(manifest_path)
+
+    if not current.is_compatible(previous) or not previous.collection_name:
+        print("[INFO] Index absent ou configuration modifiée, reconstruction complète")
+        return _full_rebuild(vector_store, config, files, manifest_path, previous)
+
+    vectorstore = _open_collection(vector_store, persist_dir, previous.collection_name)
+    if previous.files and _collection_count(vectorstore) == 0:
+        print("[WARNING] Collection persistée vide, reconstruction complète")
+        return _full_rebuild(vector_store, config, files, manifest_path, previous)
+
+    added, changed, removed = previous.diff(files)
+    vector_store.vectorstore = vectorstore
+
+    if not (added or changed or removed):
+        print(f"[OK] Index inchangé, collection rouverte en {time.perf_counter() - start:.2f}s")
+        return previous
+
+    print(f"[INFO] Mise à jour incrémentale: +{len(added)} ~{len(changed)} -{len(removed)} fichiers")
+    deleted = _delete_file_chunks(vectorstore, changed + removed)
+
+    to_index = set(added + changed)
+    count = 0
+    pipeline = _streaming_pipeline(config) if to_index else None
+    if pipeline is not None:
+        count = _index_streaming(pipeline, vectorstore, vector_store, config, sorted(to_index))
+    elif to_index:
+        documents = [
+            doc for doc in vector_store.load_documents(config.CLEANED_DIR)
+            if document_key(doc, config.CLEANED_DIR) in to_index
+        ]
+        if len(documents) < len(to_index):
+            print(f"[WARNING] {len(to_index) - len(documents)} fichier(s) modifié(s) non retrouvé(s) au chargement")
+        if documents:
+            chunks = _tag_chunks(_chunk_documents(vector_store, config, documents), config.CLEANED_DIR)
+            _add_chunks(vectorstore, chunks)
+            count = len(chunks)
+
+    current.collection_name = previous.collection_name
+    current.save(manifest_path)
+    print(
+        f"[OK] Index mis à jour en {time.perf_counter() - start:.2f}s "
+        f"({deleted} chunks supprimés, {count} ajoutés)"
+    )
+    return current
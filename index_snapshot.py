@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Module Index Snapshot - Instantané portable de l'index (démarrage des réplicas)
+
+Chaque conteneur rouvrait ou reconstruisait tout chroma_db/ (create_vectorstore
+sur un volume vide). Un instantané est un seul fichier versionné, exporté
+depuis l'index vectoriel :
+- vecteurs quantifiés (int8 avec échelle par ligne, ou float16), textes,
+  identifiants et métadonnées en colonnes : les tableaux de l'index compact
+- manifeste du corpus et modèle d'embedding
+- somme SHA-256 de l'en-tête et de chaque section
+
+Un réplica démarré avec INDEX_SNAPSHOT mappe le fichier en mémoire : aucune
+copie, aucun ré-encodage, la recherche passe par l'index compact (exact ou
+HNSW, selon l'export). L'index est alors en lecture seule (pas d'ingestion à
+chaud) et un instantané encodé avec un autre modèle d'embedding est refusé.
+
+Format :
+    0   8   b"RAGSNAP\\0"
+    8   4   version du format (uint32 little-endian)
+    12  4   longueur de l'en-tête JSON
+    16  32  SHA-256 de l'en-tête
+    48  ..  en-tête JSON, puis sections alignées sur 64 octets
+            (offsets relatifs au début des données)
+
+Usage:
+    python index_snapshot.py export snapshots/index.snap --dtype int8
+    # Sur le réplica: vérification (sommes, modèle) et copie sur disque local
+    python index_snapshot.py import /mnt/shared/index.snap --to /data/index.snap
+    INDEX_SNAPSHOT=/data/index.snap python app.py
+    python index_snapshot.py info snapshots/index.snap
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from compact_index import CompactIndex, _dequantize
+from index_manifest import IndexManifest, get_embedding_model_name
+
+SNAPSHOT_MAGIC = b"RAGSNAP\0"
+SNAPSHOT_VERSION = 1
+# Magic, version, longueur et SHA-256 de l'en-tête
+_PREFIX = struct.Struct("<8sII32s")
+# Alignement des sections (lignes de cache, lectures vectorisées)
+SECTION_ALIGN = 64
+
+
+class SnapshotError(Exception):
+    """Instantané illisible, corrompu ou incompatible avec la configuration"""
+
+
+def _align(offset: int) -> int:
+    return -(-offset // SECTION_ALIGN) * SECTION_ALIGN
+
+
+def _sha256(buffer) -> str:
+    return hashlib.sha256(buffer).hexdigest()
+
+
+# ============ EXPORT ============
+
+def _index_parts(path: Path) -> tuple:
+    """(documents JSON, sections [(nom, tableau)]) d'une version de l'index compact"""
+    documents, sections = {}, []
+    for file in sorted(path.iterdir()):
+        if file.suffix == ".json":
+            with open(file, "r", encoding="utf-8") as f:
+                documents[file.stem] = json.load(f)
+        elif file.suffix == ".npy":
+            sections.append((file.stem, np.load(file, mmap_mode="r")))
+        elif file.suffix == ".bin":
+            sections.append((file.stem, np.fromfile(file, dtype=np.uint8)))
+        elif file.suffix == ".npz":
+            with np.load(file) as group:
+                sections.extend((f"{file.stem}/{key}", group[key]) for key in group.files)
+    return documents, sections
+
+
+def export_snapshot(path: Path, collection, manifest: IndexManifest, dtype: str = "int8",
+                    search: str = "exact", hnsw_m: int = 16, hnsw_ef_construction: int = 100) -> dict:
+    """
+    Écrire un instantané de l'index (fichier remplacé de façon atomique)
+
+    Args:
+        path: Fichier de l'instantané
+        collection: Collection Chroma de l'index, ou SnapshotCollection (ré-export)
+        manifest: Manifeste de l'index (corpus, modèle d'embedding, découpage)
+        dtype: float16 ou int8 (échelle par ligne)
+        search: exact ou hnsw (graphe inclus dans l'instantané)
+
+    Returns:
+        En-tête de l'instantané
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+    try:
+        CompactIndex.write(work_dir / "index", collection, dtype, search, hnsw_m, hnsw_ef_construction)
+        documents, arrays = _index_parts(work_dir / "index")
+
+        sections, offset = [], 0
+        for name, array in arrays:
+            array = np.ascontiguousarray(array)
+            offset = _align(offset)
+            sections.append({
+                "name": name,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+                "nbytes": array.nbytes,
+                "sha256": _sha256(array.data),
+            })
+            offset += array.nbytes
+        header = {
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "embedding_model": manifest.embedding_model,
+            "fingerprint": manifest.fingerprint(),
+            "manifest": manifest.to_dict(),
+            "documents": documents,
+            "sections": sections,
+        }
+        encoded = json.dumps(header, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        data_start = _align(_PREFIX.size + len(encoded))
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(encoded),
+                                 hashlib.sha256(encoded).digest()))
+            f.write(encoded)
+            for section, (_, array) in zip(sections, arrays):
+                f.seek(data_start + section["offset"])
+                f.write(np.ascontiguousarray(array).data)
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return header
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ============ CHARGEMENT ============
+
+class IndexSnapshot:
+    """
+    Instantané ouvert en lecture seule, tableaux mappés depuis le fichier
+
+    Expose l'interface de stockage de l'index compact (array, blob, json,
+    arrays) : index est un CompactIndex sur les pages du fichier.
+
+    Args:
+        path: Fichier de l'instantané
+        embedding_model: Modèle d'embedding configuré ; un instantané encodé
+            avec un autre modèle est refusé (None: pas de contrôle)
+        verify: Contrôler la somme SHA-256 de chaque section (lit le fichier
+            une fois, ce qui charge aussi les pages en cache)
+
+    Raises:
+        SnapshotError: Fichier illisible, corrompu, de version inconnue ou
+            encodé avec un autre modèle d'embedding
+    """
+
+    def __init__(self, path: Path, embedding_model: str = None, verify: bool = True):
+        start = time.perf_counter()
+        self.path = Path(path)
+        try:
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Instantané {self.path} illisible: {e}") from e
+        self.header = self._read_header()
+        self.embedding_model = self.header["embedding_model"]
+        if embedding_model is not None and embedding_model != self.embedding_model:
+            raise SnapshotError(
+                f"Instantané {self.path} encodé avec {self.embedding_model}, modèle configuré "
+                f"{embedding_model}: refusé (ré-exporter l'instantané ou corriger EMBEDDING_MODEL)"
+            )
+        self.sections = {section["name"]: section for section in self.header["sections"]}
+        self.verified = False
+        if verify:
+            self.verify()
+        self.manifest = IndexManifest.from_dict(self.header["manifest"])
+        if self.manifest is None:
+            raise SnapshotError(f"Instantané {self.path}: version de manifeste inconnue")
+        self.index = CompactIndex(files=self)
+        self.open_ms = round(1000 * (time.perf_counter() - start), 2)
+
+    def _read_header(self) -> dict:
+        if len(self._mmap) < _PREFIX.size:
+            raise SnapshotError(f"Instantané {self.path} tronqué")
+        magic, version, length, digest = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{self.path} n'est pas un instantané d'index")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Instantané {self.path}: format {version} non pris en charge "
+                                f"(attendu: {SNAPSHOT_VERSION})")
+        encoded = self._mmap[_PREFIX.size:_PREFIX.size + length]
+        if len(encoded) < length or hashlib.sha256(encoded).digest() != digest:
+            raise SnapshotError(f"Instantané {self.path}: en-tête corrompu")
+        header = json.loads(encoded.decode("utf-8"))
+        self._data_start = _align(_PREFIX.size + length)
+        end = max((s["offset"] + s["nbytes"] for s in header["sections"]), default=0)
+        if self._data_start + end > len(self._mmap):
+            raise SnapshotError(f"Instantané {self.path} tronqué")
+        return header
+
+    def verify(self):
+        """
+        Contrôler les sommes SHA-256 des sections
+
+        Raises:
+            SnapshotError: Section corrompue
+        """
+        view = memoryview(self._mmap)
+        try:
+            for section in self.header["sections"]:
+                start = self._data_start + section["offset"]
+                if _sha256(view[start:start + section["nbytes"]]) != section["sha256"]:
+                    raise SnapshotError(f"Instantané {self.path}: section {section['name']} corrompue")
+        finally:
+            view.release()
+        self.verified = True
+
+    # ---------- interface de stockage de CompactIndex ----------
+
+    def array(self, name: str) -> np.ndarray:
+        """Tableau en lecture seule sur les pages du fichier (sans copie)"""
+        section = self.sections.get(name)
+        if section is None:
+            raise SnapshotError(f"Instantané {self.path}: section {name} absente")
+        dtype = np.dtype(section["dtype"])
+        if not section["nbytes"]:
+            return np.zeros(section["shape"], dtype=dtype)
+        return np.frombuffer(
+            self._mmap, dtype=dtype, count=section["nbytes"] // dtype.itemsize,
+            offset=self._data_start + section["offset"]
+        ).reshape(section["shape"])
+
+    def blob(self, name: str) -> np.ndarray:
+        return self.array(name)
+
+    def json(self, name: str):
+        return self.header["documents"][name]
+
+    def arrays(self, name: str) -> dict:
+        prefix = f"{name}/"
+        return {key[len(prefix):]: self.array(key) for key in self.sections if key.startswith(prefix)}
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+    def info(self) -> dict:
+        meta = self.json("meta")
+        return {
+            "path": str(self.path),
+            "created_at": self.header["created_at"],
+            "embedding_model": self.embedding_model,
+            "fingerprint": self.header["fingerprint"],
+            "files": len(self.manifest.files),
+            "chunks": meta["count"],
+            "dtype": meta["dtype"],
+            "search": meta["search"],
+            "bytes": self.nbytes,
+            "verified": self.verified,
+            "open_ms": self.open_ms,
+        }
+
+
+class SnapshotCollection:
+    """
+    Vue en lecture seule de l'instantané avec l'interface get() de Chroma
+
+    Remplace vector_store.vectorstore sur un réplica : la synchronisation
+    BM25 (recherche hybride) et un ré-export relisent les chunks depuis
+    le fichier mappé.
+    """
+
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.index = snapshot.index
+
+    def get(self, where: dict = None, include=("documents", "metadatas"), limit: int = None,
+            offset: int = 0, **kwargs) -> dict:
+        rows = np.flatnonzero(self.index.columns.mask(where)) if where else np.arange(len(self.index))
+        rows = rows[offset:offset + limit if limit else None]
+        data = {"ids": [self.index.ids[row] for row in rows]}
+        if "documents" in include:
+            data["documents"] = [self.index.texts[row] for row in rows]
+        if "metadatas" in include:
+            data["metadatas"] = [self.index.columns.metadata(row) for row in rows]
+        if "embeddings" in include:
+            scales = self.index.scales[rows] if self.index.scales is not None else None
+            data["embeddings"] = _dequantize(self.index.vectors[rows], scales)
+        return data
+
+
+def open_snapshot(config) -> IndexSnapshot:
+    """
+    Ouvrir l'instantané INDEX_SNAPSHOT d'un réplica
+
+    Raises:
+        SnapshotError: Instantané corrompu ou encodé avec un autre modèle
+            que celui de la configuration (le réplica ne démarre pas)
+    """
+    snapshot = IndexSnapshot(
+        config.INDEX_SNAPSHOT,
+        embedding_model=get_embedding_model_name(config),
+        verify=getattr(config, "SNAPSHOT_VERIFY", True)
+    )
+    info = snapshot.info()
+    print(f"[OK] Instantané {info['path']} ouvert en {info['open_ms']} ms: {info['chunks']} chunks "
+          f"({info['dtype']}, {info['search']}), sommes {'vérifiées' if info['verified'] else 'non vérifiées'}")
+    return snapshot
+
+
+# ============ LIGNE DE COMMANDE ============
+
+def _config(args):
+    if args.stub:
+        os.environ["RAG_STUB_MODELS"] = "true"
+    from simple_rag import RAGConfig, apply_stub_config
+
+    config = RAGConfig()
+    if getattr(config, "STUB_MODELS", False):
+        apply_stub_config(config)
+    return config
+
+
+def _print_info(snapshot: IndexSnapshot):
+    for key, value in snapshot.info().items():
+        print(f"  {key:>16}: {value}")
+
+
+def _probe(snapshot: IndexSnapshot) -> float:
+    """Durée (ms) d'une première recherche sur l'index mappé"""
+    start = time.perf_counter()
+    snapshot.index.search(np.ones(snapshot.json("meta")["dim"], dtype=np.float32), k=4)
+    return round(1000 * (time.perf_counter() - start), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instantané portable de l'index vectoriel")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Exporter l'index (ouvert ou mis à jour depuis le corpus)")
+    export.add_argument("output", type=Path, help="Fichier de l'instantané")
+    export.add_argument("--dtype", choices=("int8", "float16"), default="int8", help="Quantification des vecteurs")
+    export.add_argument("--search", choices=("exact", "hnsw"), default=None, help="Défaut: COMPACT_SEARCH")
+    export.add_argument("--stub", action="store_true", help="Modèles factices (RAG_STUB_MODELS)")
+    load = commands.add_parser("import", help="Vérifier un instantané (sommes, modèle) et le copier")
+    load.add_argument("snapshot", type=Path, help="Fichier de l'instantané")
+    load.add_argument("--to", type=Path, default=None, help="Copie locale (valeur de INDEX_SNAPSHOT)")
+    load.add_argument("--stub", action="store_true", help="Modèles factices (RAG_STUB_MODELS)")
+    info = commands.add_parser("info", help="Afficher l'en-tête (sans contrôle du modèle)")
+    info.add_argument("snapshot", type=Path, help="Fichier de l'instantané")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "info":
+            _print_info(IndexSnapshot(args.snapshot, verify=False))
+            return
+
+        config = _config(args)
+        if args.command == "export":
+            from simple_rag import build_vector_store
+
+            vector_store, manifest = build_vector_store(config)
+            if manifest is None or getattr(vector_store, "vectorstore", None) is None:
+                raise SystemExit("[ERROR] Aucun document indexé, rien à exporter")
+            start = time.perf_counter()
+            header = export_snapshot(
+                args.output, vector_store.vectorstore, manifest, dtype=args.dtype,
+                search=args.search or getattr(config, "COMPACT_SEARCH", "exact"),
+                hnsw_m=getattr(config, "COMPACT_HNSW_M", 16),
+                hnsw_ef_construction=getattr(config, "COMPACT_HNSW_EF_CONSTRUCTION", 100)
+            )
+            print(f"[OK] Instantané écrit en {time.perf_counter() - start:.2f}s: {args.output} "
+                  f"({header['documents']['meta']['count']} chunks, {args.output.stat().st_size / 1e6:.1f} Mo)")
+            return
+
+        snapshot = IndexSnapshot(args.snapshot, embedding_model=get_embedding_model_name(config))
+        if args.to is not None:
+            args.to.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = args.to.with_name(args.to.name + ".tmp")
+            shutil.copyfile(args.snapshot, tmp_path)
+            # Copie relue avant de remplacer l'instantané en place
+            snapshot = IndexSnapshot(tmp_path, embedding_model=snapshot.embedding_model)
+            os.replace(tmp_path, args.to)
+            snapshot.path = args.to
+        print(f"[OK] Instantané valide, première recherche en {_probe(snapshot)} ms")
+        _print_info(snapshot)
+        if args.to is not None:
+            print(f"[INFO] Démarrer le réplica avec INDEX_SNAPSHOT={args.to}")
+    except SnapshotError as e:
+        raise SystemExit(f"[ERROR] {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Module Inference Pool - Exécution des inférences hors de la boucle asyncio
+
+La récupération et la génération sont bloquantes (torch, Chroma) : elles
+tournent sur un pool de threads dédié avec une file d'admission bornée.
+Quand la file est pleine, l'appelant reçoit immédiatement QueueFullError
+au lieu d'attendre indéfiniment.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from observability import record_span
+
+# Nombre d'échantillons conservés pour les percentiles
+STATS_WINDOW = 512
+
+
+class QueueFullError(Exception):
+    """File d'admission pleine"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"File d'inférence pleine, réessayer dans {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class InferencePool:
+    """
+    Pool de workers pour les appels bloquants du système RAG
+    """
+
+    def __init__(self, workers: int = 1, max_queue: int = 8, name: str = "inference"):
+        """
+        Args:
+            workers: Nombre d'inférences exécutées en parallèle
+            max_queue: Nombre de requêtes admises en attente d'un worker
+            name: Préfixe des threads
+        """
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._started = {}                  # thread -> début de l'appel en cours
+        self._wait_times = deque(maxlen=STATS_WINDOW)
+        self._service_times = deque(maxlen=STATS_WINDOW)
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def is_saturated(self) -> bool:
+        """Vrai si une nouvelle requête serait refusée"""
+        return self._queued + self._running >= self.capacity
+
+    def estimated_wait(self) -> float:
+        """
+        Attente estimée (secondes) pour une requête admise maintenant
+
+        Les appels en cours ne comptent que pour leur temps restant estimé
+        (durée moyenne moins le temps déjà écoulé) ; la file, pour une durée
+        moyenne par appel.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            service = (sum(self._service_times) / len(self._service_times)) if self._service_times else 1.0
+            remaining = sum(max(0.0, service - (now - started)) for started in self._started.values())
+            return (remaining + service * self._queued) / self.workers
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.estimated_wait()))
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Soumettre un appel bloquant
+
+        Returns:
+            concurrent.futures.Future
+
+        Raises:
+            QueueFullError: Si la file d'admission est pleine
+        """
+        with self._lock:
+            if self._queued + self._running >= self.capacity:
+                self._rejected += 1
+                rejected = True
+            else:
+                self._queued += 1
+                rejected = False
+        if rejected:
+            raise QueueFullError(self._retry_after())
+
+        submitted_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._started[threading.get_ident()] = started_at
+                self._wait_times.append(started_at - submitted_at)
+            record_span("inference.queue", submitted_at, started_at - submitted_at)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._started.pop(threading.get_ident(), None)
+                    self._service_times.append(time.perf_counter() - started_at)
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+
+        # La trace de la requête (contextvars) suit l'appel sur le worker
+        future = self._executor.submit(contextvars.copy_context().run, job)
+        future.add_done_callback(self._release_cancelled)
+        return future
+
+    def _release_cancelled(self, future):
+        """Appel annulé avant d'avoir démarré (client parti, arrêt): libérer sa place en file"""
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+                self._cancelled += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Exécuter un appel bloquant sans bloquer la boucle asyncio
+
+        Si l'appelant est annulé, un appel encore en file est retiré (sa
+        place est libérée) ; un appel déjà démarré va à son terme.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        """Profondeur de file, temps d'attente et de service"""
+        with self._lock:
+            waits = list(self._wait_times)
+            services = list(self._service_times)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "wait_ms": {
+                    "avg": round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                    "p95": round(1000 * _percentile(waits, 0.95), 2),
+                },
+                "service_ms": {
+                    "avg": round(1000 * sum(services) / len(services), 2) if services else 0.0,
+                    "p95": round(1000 * _percentile(services, 0.95), 2),
+                },
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
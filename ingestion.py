@@ -0,0 +1,549 @@
+"""
+Module Ingestion - Pipeline d'ingestion en flux et mises à jour de l'index à chaud
+
+Les fichiers traversent quatre étapes, un fichier à la fois :
+1. extraction (PDF page par page, texte) et nettoyage
+2. découpage en chunks (position start_index, page des PDF) : fenêtres
+   fixes, ou articles et hiérarchie du code (CHUNKER=article)
+   -> étapes 1-2 dans un pool de processus (INGEST_WORKERS)
+3. embeddings par lots de taille fixe (INGEST_BATCH_SIZE)
+4. upsert dans Chroma (identifiants stables "<fichier>#<n>")
+
+Seuls les fichiers en préparation (fenêtre bornée) et un lot d'embeddings
+sont en mémoire : le pic ne dépend plus de la taille du corpus.
+
+DocumentManager ajoute, remplace ou supprime un document dans l'index actif
+(endpoints /api/documents) : le texte nettoyé est écrit dans CLEANED_DIR et
+le manifeste est mis à jour, le redémarrage ne ré-encode donc rien ; l'index
+BM25 et le cache de réponses suivent via set_index_manifest().
+"""
+import bisect
+import multiprocessing
+import os
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from article_chunker import ArticleChunker
+from index_manifest import (
+    INDEX_KEY, MANIFEST_FILENAME, IndexManifest, get_persist_dir, hash_file, index_writer_lock
+)
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt", ".md")
+
+# Jobs conservés pour le suivi de progression
+JOB_HISTORY = 100
+
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0e-\x1f\x7f]")
+_HYPHEN_RE = re.compile(r"(\w)-\n(\w)")
+_SPACES_RE = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+# ============ ÉTAPES 1-2 (POOL DE PROCESSUS) ============
+
+def extract_text(path: Path) -> list:
+    """Pages de texte d'un fichier (une seule pour un fichier texte)"""
+    path = Path(path)
+    if path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader
+
+        return [page.extract_text() or "" for page in PdfReader(str(path)).pages]
+    return [path.read_text(encoding="utf-8", errors="replace")]
+
+
+def clean_text(text: str) -> str:
+    """Unicode NFC, caractères de contrôle, césures de fin de ligne et espaces"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_RE.sub("", text)
+    text = _HYPHEN_RE.sub(r"\1\2", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def _splitter(chunk_size: int, chunk_overlap: int):
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+
+
+def prepare_file(key: str, path: str, source: str, chunk_size: int, chunk_overlap: int,
+                 article_max_chars: int = 0) -> dict:
+    """
+    Extraire, nettoyer et découper un fichier (exécuté dans le pool de processus)
+
+    Args:
+        chunk_size, chunk_overlap: Fenêtres du découpage par défaut
+        article_max_chars: Si > 0, découpage par articles (ArticleChunker)
+
+    Returns:
+        Dict {"key", "text" (texte nettoyé), "chunks": [(texte, métadonnées)]}
+    """
+    pages = [page for page in (clean_text(p) for p in extract_text(Path(path))) if page]
+    text = "\n\n".join(pages)
+
+    # Début de chaque page dans le texte complet (page des chunks PDF)
+    offsets, position = [], 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 2
+
+    if article_max_chars:
+        pieces = ArticleChunker(article_max_chars).split_text(text) if text else []
+    else:
+        documents = _splitter(chunk_size, chunk_overlap).create_documents([text]) if text else []
+        pieces = [(doc.page_content, {"start_index": doc.metadata.get("start_index", -1)}) for doc in documents]
+
+    chunks = []
+    for content, piece in pieces:
+        start = piece["start_index"]
+        metadata = {"source": source, INDEX_KEY: key, **piece}
+        if len(pages) > 1 and start >= 0:
+            metadata["page"] = bisect.bisect_right(offsets, start)
+        chunks.append((content, metadata))
+    return {"key": key, "text": text, "chunks": chunks}
+
+
+# ============ ÉTAPES 3-4 (EMBEDDINGS PAR LOTS, UPSERT) ============
+
+def chunk_id(key: str, index: int) -> str:
+    """Identifiant stable: un remplacement écrase les chunks de même rang"""
+    return f"{key}#{index}"
+
+
+def index_prepared(vectorstore, embeddings, prepared: dict, batch_size: int = 64, progress=None) -> int:
+    """
+    Encoder et insérer les chunks d'un fichier par lots de taille fixe,
+    puis retirer ses anciens chunks absents de la nouvelle version
+
+    Returns:
+        Nombre de chunks indexés
+    """
+    key = prepared["key"]
+    previous = set(vectorstore.get(where={INDEX_KEY: key}, include=[]).get("ids", []))
+    chunks = prepared["chunks"]
+    ids = []
+    for start in range(0, len(chunks), batch_size):
+        batch = chunks[start:start + batch_size]
+        texts = [text for text, _ in batch]
+        batch_ids = [chunk_id(key, start + i) for i in range(len(batch))]
+        vectorstore._collection.upsert(
+            ids=batch_ids,
+            embeddings=embeddings.embed_documents(texts),
+            documents=texts,
+            metadatas=[metadata for _, metadata in batch],
+        )
+        ids.extend(batch_ids)
+        if progress is not None:
+            progress(len(batch))
+    stale = previous - set(ids)
+    if stale:
+        vectorstore.delete(ids=sorted(stale))
+    return len(ids)
+
+
+class IngestionPipeline:
+    """
+    Pipeline en flux: préparation en parallèle, encodage par lots
+
+    Args:
+        chunk_size, chunk_overlap: Paramètres de découpage (ceux du manifeste)
+        article_max_chars: Découpage par articles si > 0 (CHUNKER=article)
+        workers: Processus de préparation (0 = dans le processus courant)
+        batch_size: Chunks encodés par passe du modèle d'embedding
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, workers: int = 2, batch_size: int = 64,
+                 article_max_chars: int = 0):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.article_max_chars = article_max_chars
+        self.workers = max(0, workers)
+        self.batch_size = max(1, batch_size)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "IngestionPipeline":
+        return cls(
+            chunk_size=getattr(config, "CHUNK_SIZE", 1000),
+            chunk_overlap=getattr(config, "CHUNK_OVERLAP", 200),
+            workers=getattr(config, "INGEST_WORKERS", 2),
+            batch_size=getattr(config, "INGEST_BATCH_SIZE", 64),
+            article_max_chars=(
+                getattr(config, "ARTICLE_MAX_CHARS", 1500) if getattr(config, "CHUNKER", "recursive") == "article" else 0
+            ),
+        )
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: pas de fork d'un processus qui porte torch et ses threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def prepare(self, files):
+        """
+        Préparer des fichiers dans l'ordre, au plus 2 x workers en cours
+
+        Args:
+            files: Itérable de (clé, chemin, source)
+
+        Yields:
+            (clé, fichier préparé ou None, exception ou None)
+        """
+        if not self.workers:
+            for key, path, source in files:
+                yield self._prepare_local(key, path, source)
+            return
+
+        window = deque()
+        for key, path, source in files:
+            window.append((key, path, source, self._submit(key, path, source)))
+            if len(window) >= 2 * self.workers:
+                yield self._result(*window.popleft())
+        while window:
+            yield self._result(*window.popleft())
+
+    def _prepare_local(self, key, path, source):
+        try:
+            return key, prepare_file(
+                key, str(path), source, self.chunk_size, self.chunk_overlap, self.article_max_chars
+            ), None
+        except Exception as e:
+            return key, None, e
+
+    def _submit(self, key, path, source):
+        if not self.workers:
+            return None
+        try:
+            return self._get_pool().submit(
+                prepare_file, key, str(path), source, self.chunk_size, self.chunk_overlap, self.article_max_chars
+            )
+        except BrokenProcessPool:
+            return None
+
+    def _result(self, key, path, source, future):
+        if future is not None:
+            try:
+                return key, future.result(), None
+            except BrokenProcessPool as e:
+                # Processus de préparation impossible à lancer (script principal
+                # sans garde __main__, mémoire...): on continue dans ce processus
+                with self._lock:
+                    if self.workers:
+                        print(f"[WARNING] Pool d'ingestion indisponible, préparation dans le processus courant: {e}")
+                        self.workers = 0
+                        if self._pool is not None:
+                            self._pool.shutdown(wait=False, cancel_futures=True)
+                            self._pool = None
+            except Exception as e:
+                return key, None, e
+        return self._prepare_local(key, path, source)
+
+    def index_files(self, vectorstore, embeddings, files) -> int:
+        """
+        Indexer des fichiers en flux (fichiers illisibles ignorés)
+
+        Returns:
+            Nombre de chunks indexés
+        """
+        total = 0
+        for key, prepared, error in self.prepare(files):
+            if error is not None:
+                print(f"[WARNING] Ingestion de {key} impossible: {error}")
+                continue
+            total += index_prepared(vectorstore, embeddings, prepared, self.batch_size)
+        return total
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def corpus_files(cleaned_dir, keys) -> list:
+    """(clé, chemin, source) des fichiers du corpus pris en charge par le pipeline"""
+    root = Path(cleaned_dir)
+    return [
+        (key, root / key, str(root / key))
+        for key in keys if Path(key).suffix.lower() in SUPPORTED_SUFFIXES
+    ]
+
+
+def new_collection_name() -> str:
+    """Nom unique: une reconstruction n'hérite jamais d'une collection orpheline"""
+    return time.strftime("documents_%Y%m%d_%H%M%S")
+
+
+def open_collection(vector_store, config, collection_name: str = None):
+    """Collection Chroma de l'index (créée vide si besoin)"""
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        collection_name=collection_name or new_collection_name(),
+        embedding_function=vector_store.embeddings,
+        persist_directory=str(get_persist_dir(config)),
+    )
+
+
+# ============ DOCUMENTS DE L'INDEX ACTIF ============
+
+class IngestionJob:
+    """Ajout, remplacement ou suppression d'un document (progression consultable)"""
+
+    def __init__(self, action: str, name: str):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.name = name
+        self.status = "queued"
+        self.stage = "queued"
+        self.chunks_total = 0
+        self.chunks_indexed = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def advance(self, count: int):
+        self.chunks_indexed += count
+
+    def to_dict(self) -> dict:
+        if self.status == "done":
+            progress = 1.0
+        elif self.chunks_total:
+            # Préparation ~10 %, embeddings et upsert ~90 %
+            progress = 0.1 + 0.9 * self.chunks_indexed / self.chunks_total
+        else:
+            progress = 0.0
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "action": self.action,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "chunks_total": self.chunks_total,
+            "chunks_indexed": self.chunks_indexed,
+            "progress": round(progress, 3),
+            "error": self.error,
+            "created_at": self.created_at,
+            "elapsed_s": round(end - (self.started_at or end), 2),
+        }
+
+
+class DocumentManager:
+    """
+    Ajouter, remplacer ou supprimer des documents dans l'index actif
+
+    Les jobs s'exécutent un par un sur un thread dédié (hors du pool
+    d'inférence) et sous le verrou d'écrivain unique de l'index.
+
+    Args:
+        qa_system: SimpleQASystem (vector_store, config, set_index_manifest)
+        pipeline: IngestionPipeline
+        max_bytes: Taille maximale d'un fichier importé
+    """
+
+    def __init__(self, qa_system, pipeline: IngestionPipeline, max_bytes: int = 50 * 1024 * 1024):
+        self.qa_system = qa_system
+        self.config = qa_system.config
+        self.pipeline = pipeline
+        self.max_bytes = max_bytes
+        self.root = Path(self.config.CLEANED_DIR)
+        self.persist_dir = get_persist_dir(self.config)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestion")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ---------- noms et manifeste ----------
+
+    def resolve(self, name: str):
+        """
+        Clé du manifeste et chemin du texte nettoyé d'un document
+
+        Un PDF est stocké sous forme de texte: "decret.pdf" -> "decret.txt"
+
+        Raises:
+            ValueError: Nom invalide ou format non pris en charge
+        """
+        relative = Path(name.strip().replace("\\", "/"))
+        if not relative.name or relative.is_absolute() or ".." in relative.parts or relative.name.startswith("."):
+            raise ValueError(f"Nom de document invalide: {name}")
+        if relative.suffix.lower() not in SUPPORTED_SUFFIXES:
+            raise ValueError(f"Format non pris en charge ({', '.join(SUPPORTED_SUFFIXES)})")
+        if relative.suffix.lower() == ".pdf":
+            relative = relative.with_suffix(".txt")
+        return relative.as_posix(), self.root / relative
+
+    def _manifest(self) -> IndexManifest:
+        manifest = IndexManifest.load(self.persist_dir / MANIFEST_FILENAME)
+        if manifest is None:
+            manifest = IndexManifest.from_config(self.config)
+        return manifest
+
+    def list_documents(self) -> list:
+        """Documents indexés (manifeste) et documents en cours d'import"""
+        documents = {}
+        manifest = self.qa_system.index_manifest or self._manifest()
+        for key in sorted(manifest.files):
+            path = self.root / key
+            try:
+                stat = path.stat()
+                size, updated = stat.st_size, stat.st_mtime
+            except OSError:
+                size, updated = None, None
+            documents[key] = {"name": key, "size": size, "updated_at": updated, "status": "indexed", "job": None}
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.status in ("queued", "running") or (job.status == "failed" and job.name not in documents):
+                entry = documents.setdefault(
+                    job.name, {"name": job.name, "size": None, "updated_at": None, "status": job.status, "job": None}
+                )
+                entry["status"] = "failed" if job.status == "failed" else "processing"
+                entry["job"] = job.to_dict()
+        return list(documents.values())
+
+    # ---------- jobs ----------
+
+    def _register(self, job: IngestionJob) -> IngestionJob:
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        return job
+
+    def job(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def jobs(self) -> list:
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def submit_upsert(self, name: str, data: bytes) -> IngestionJob:
+        """
+        Ajouter ou remplacer un document
+
+        Raises:
+            ValueError: Nom invalide, format non pris en charge ou fichier vide/trop gros
+        """
+        key, _ = self.resolve(name)
+        if not data:
+            raise ValueError("Fichier vide")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"Fichier trop volumineux (max {self.max_bytes // (1024 * 1024)} Mo)")
+
+        manifest = self.qa_system.index_manifest
+        job = self._register(IngestionJob("replace" if manifest and key in manifest.files else "add", key))
+        upload_dir = self.persist_dir / ".ingest"
+        upload_dir.mkdir(parents=True, exist_ok=True)
+        upload_path = upload_dir / f"{job.job_id}{Path(name).suffix.lower()}"
+        upload_path.write_bytes(data)
+        self._executor.submit(self._run, job, self._upsert, key, upload_path)
+        return job
+
+    def submit_delete(self, name: str) -> IngestionJob:
+        """
+        Supprimer un document de l'index et du corpus
+
+        Raises:
+            ValueError: Nom invalide
+            KeyError: Document inconnu
+        """
+        key, path = self.resolve(name)
+        manifest = self.qa_system.index_manifest
+        if not (manifest and key in manifest.files) and not path.exists():
+            raise KeyError(key)
+        job = self._register(IngestionJob("delete", key))
+        self._executor.submit(self._run, job, self._delete, key)
+        return job
+
+    def _run(self, job: IngestionJob, fn, *args):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            manifest = fn(job, *args)
+            # Hors du verrou: la mise à jour BM25 le reprend
+            job.stage = "refreshing"
+            self.qa_system.set_index_manifest(manifest)
+            job.status = job.stage = "done"
+            print(f"[OK] Document {job.name}: {job.action} terminé ({job.chunks_indexed or job.chunks_total} chunks)")
+        except Exception as e:
+            job.status = job.stage = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"[ERROR] Ingestion de {job.name} impossible: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def _collection(self, manifest: IndexManifest):
+        vector_store = self.qa_system.vector_store
+        if vector_store.vectorstore is None:
+            vector_store.vectorstore = open_collection(vector_store, self.config, manifest.collection_name)
+        manifest.collection_name = manifest.collection_name or vector_store.vectorstore._collection.name
+        return vector_store.vectorstore
+
+    def _upsert(self, job: IngestionJob, key: str, upload_path: Path) -> IndexManifest:
+        path = self.root / key
+        try:
+            with index_writer_lock(self.persist_dir):
+                manifest = self._manifest()
+                vectorstore = self._collection(manifest)
+                job.stage = "extracting"
+                for _, prepared, error in self.pipeline.prepare([(key, upload_path, str(path))]):
+                    if error is not None:
+                        raise error
+                    if not prepared["chunks"]:
+                        raise ValueError("Aucun texte extrait du document")
+                    job.chunks_total = len(prepared["chunks"])
+                    job.stage = "embedding"
+                    index_prepared(vectorstore, self.qa_system.vector_store.embeddings, prepared,
+                                   self.pipeline.batch_size, progress=job.advance)
+
+                    # Texte nettoyé conservé dans le corpus: le manifeste reste à jour au redémarrage
+                    job.stage = "saving"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = path.with_name(f".{path.name}.tmp")
+                    tmp_path.write_text(prepared["text"], encoding="utf-8")
+                    os.replace(tmp_path, path)
+                    manifest.files[key] = hash_file(path)
+                    manifest.save(self.persist_dir / MANIFEST_FILENAME)
+                return manifest
+        finally:
+            upload_path.unlink(missing_ok=True)
+
+    def _delete(self, job: IngestionJob, key: str) -> IndexManifest:
+        with index_writer_lock(self.persist_dir):
+            manifest = self._manifest()
+            job.stage = "deleting"
+            vectorstore = self.qa_system.vector_store.vectorstore
+            if vectorstore is not None:
+                ids = vectorstore.get(where={INDEX_KEY: key}, include=[]).get("ids", [])
+                if ids:
+                    vectorstore.delete(ids=ids)
+                job.chunks_total = len(ids)
+            (self.root / key).unlink(missing_ok=True)
+            manifest.files.pop(key, None)
+            manifest.save(self.persist_dir / MANIFEST_FILENAME)
+            return manifest
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pipeline.shutdown()
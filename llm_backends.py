@@ -0,0 +1,288 @@
+"""
+Module LLM Backends - Moteurs d'inférence interchangeables pour LLMManager
+
+LLM_BACKEND (RAGConfig) choisit ce que LLMManager charge dans llm.model :
+- transformers : chemin d'origine (LLMManager.load_model)
+- transformers-int8 : même modèle, couches Linear quantifiées int8
+  (quantification dynamique CPU, aucune dépendance supplémentaire)
+- gguf : modèle quantifié int4/int8 (fichier GGUF) exécuté par llama.cpp
+  (llama-cpp-python), derrière l'interface generate() de transformers
+
+Tous respectent le contrat utilisé par llm_runtime et llm_batching :
+generate(input_ids [lot, prompt], attention_mask, streamer, stopping_criteria,
+max_new_tokens, ...) -> tenseur [lot, prompt + nouveaux tokens] ; le streamer
+reçoit le prompt puis un tenseur [lot] par pas de décodage ; le critère
+d'arrêt est évalué à chaque pas (annulation par ligne).
+"""
+import os
+import queue
+import threading
+from types import SimpleNamespace
+
+DEFAULT_BACKEND = "transformers"
+
+# Attributs de RAGConfig qui portent le nom du modèle transformers
+_MODEL_NAME_ATTRS = ("LLM_MODEL", "LLM_MODEL_NAME", "MODEL_NAME", "LLM_MODEL_ID")
+
+
+def get_llm_model_name(config) -> str:
+    """Nom du modèle transformers configuré (tokenizer du backend gguf)"""
+    for name in _MODEL_NAME_ATTRS:
+        value = getattr(config, name, None)
+        if value:
+            return str(value)
+    return ""
+
+
+# ============ TRANSFORMERS ============
+
+def load_transformers(llm, config):
+    """Chemin d'origine de LLMManager"""
+    llm.load_model()
+
+
+def quantize_llm_int8(llm) -> bool:
+    """
+    Quantifier en int8 les couches Linear du modèle chargé (CPU)
+
+    Returns:
+        True si le modèle a été quantifié
+    """
+    import torch
+
+    model = getattr(llm, "model", None)
+    if model is None:
+        return False
+    device = getattr(model, "device", None)
+    if device is not None and getattr(device, "type", "cpu") != "cpu":
+        print(f"[WARNING] Quantification int8 dynamique réservée au CPU (modèle sur {device})")
+        return False
+    try:
+        # En place: LLMManager et le hook de génération gardent le même objet
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        print("[OK] LLM quantifié (int8 dynamique)")
+        return True
+    except Exception as e:
+        print(f"[WARNING] Quantification du LLM impossible: {e}")
+        return False
+
+
+def load_transformers_int8(llm, config):
+    """Modèle transformers puis quantification int8 dynamique"""
+    llm.load_model()
+    quantize_llm_int8(llm)
+
+
+# ============ GGUF (llama.cpp) ============
+
+class LlamaCppModel:
+    """
+    Modèle GGUF (llama.cpp) derrière l'interface generate() de transformers
+
+    llama.cpp décode une séquence par contexte : un lot de n lignes occupe
+    n contextes, avancés à tour de rôle d'un token à chaque pas. Les poids
+    sont partagés en mmap, chaque contexte n'ajoute que son cache KV.
+
+    Args:
+        model_path: Fichier GGUF
+        tokenizer: Tokenizer transformers du même modèle (mêmes identifiants)
+        n_ctx: Taille de contexte de chaque slot
+        n_threads: Threads de llama.cpp (None = choix de llama.cpp)
+        slots: Contextes ouverts (taille maximale d'un lot)
+    """
+
+    def __init__(self, model_path, tokenizer, n_ctx: int = 4096, n_threads: int = None, slots: int = 1):
+        try:
+            from llama_cpp import Llama
+        except ImportError:
+            raise ImportError("Backend gguf: installer llama-cpp-python (pip install llama-cpp-python)")
+        import torch
+        from transformers import GenerationConfig
+
+        self.model_path = str(model_path)
+        self.tokenizer = tokenizer
+        self.slots = max(1, slots)
+        contexts = [
+            Llama(model_path=self.model_path, n_ctx=n_ctx, n_threads=n_threads or None, verbose=False)
+            for _ in range(self.slots)
+        ]
+        probe = contexts[0]
+        self._check_vocabulary(probe, tokenizer)
+        self._free = queue.Queue()
+        self._acquire_lock = threading.Lock()
+        self._release(contexts)
+
+        self.device = torch.device("cpu")
+        self.dtype = torch.float32
+        self.config = SimpleNamespace(model_type="llama", vocab_size=probe.n_vocab(), is_encoder_decoder=False)
+        try:
+            self.generation_config = GenerationConfig.from_pretrained(tokenizer.name_or_path)
+        except Exception:
+            self.generation_config = GenerationConfig(eos_token_id=tokenizer.eos_token_id)
+        if self.generation_config.pad_token_id is None:
+            self.generation_config.pad_token_id = tokenizer.pad_token_id or tokenizer.eos_token_id
+        self._eos = {probe.token_eos(), tokenizer.eos_token_id}
+        self._eos.update(_as_ids(self.generation_config.eos_token_id))
+        self._eos.discard(None)
+
+    @staticmethod
+    def _check_vocabulary(llama, tokenizer):
+        probe = "Article L1234-1 du Code du travail : préavis de démission."
+        expected = tokenizer.encode(probe, add_special_tokens=False)
+        actual = llama.tokenize(probe.encode("utf-8"), add_bos=False, special=False)
+        if list(actual) != list(expected):
+            raise ValueError(
+                "Backend gguf: le tokenizer transformers ne correspond pas au vocabulaire du "
+                "fichier GGUF (LLM_GGUF_TOKENIZER doit désigner le même modèle)"
+            )
+
+    def eval(self):
+        return self
+
+    def _acquire(self, count: int) -> list:
+        # Un seul appelant réserve à la fois: pas d'interblocage entre deux lots
+        with self._acquire_lock:
+            return [self._free.get() for _ in range(count)]
+
+    def _release(self, contexts: list):
+        for context in contexts:
+            self._free.put(context)
+
+    def generate(self, inputs=None, **kwargs):
+        import torch
+
+        input_ids = kwargs.pop("input_ids", inputs)
+        attention_mask = kwargs.pop("attention_mask", None)
+        streamer = kwargs.pop("streamer", None)
+        criteria = kwargs.pop("stopping_criteria", None) or []
+        config = self.generation_config
+        if input_ids.dim() == 1:
+            input_ids = input_ids.unsqueeze(0)
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        rows = input_ids.shape[0]
+        if rows > self.slots:
+            raise ValueError(f"Backend gguf: lot de {rows} lignes pour {self.slots} contextes (LLM_BATCH_SIZE)")
+
+        max_new_tokens = kwargs.get("max_new_tokens") or config.max_new_tokens
+        if not max_new_tokens:
+            max_new_tokens = max(1, (kwargs.get("max_length") or config.max_length or 512) - input_ids.shape[1])
+        do_sample = kwargs.get("do_sample", config.do_sample)
+        sampling = {
+            "temp": float(kwargs.get("temperature") or config.temperature or 1.0) if do_sample else 0.0,
+            "top_p": float(kwargs.get("top_p") or config.top_p or 1.0),
+            "top_k": int(kwargs.get("top_k") or config.top_k or 0),
+            "repeat_penalty": float(kwargs.get("repetition_penalty") or config.repetition_penalty or 1.0),
+        }
+        eos = set(self._eos) | set(_as_ids(kwargs.get("eos_token_id")))
+        pad = kwargs.get("pad_token_id")
+        pad = config.pad_token_id if pad is None else pad
+
+        if streamer is not None:
+            streamer.put(input_ids)
+        contexts = self._acquire(rows)
+        generators = []
+        try:
+            for context, ids, mask in zip(contexts, input_ids.tolist(), attention_mask.tolist()):
+                prompt = [token for token, keep in zip(ids, mask) if keep]
+                # reset=True: llama.cpp réutilise le préfixe déjà évalué dans ce contexte
+                generators.append(context.generate(prompt, reset=True, **sampling))
+
+            generated = [[] for _ in range(rows)]
+            active = [True] * rows
+            for _ in range(max_new_tokens):
+                step = []
+                for i, generator in enumerate(generators):
+                    token = next(generator) if active[i] else pad
+                    if active[i]:
+                        generated[i].append(token)
+                        active[i] = token not in eos
+                    step.append(token)
+                if streamer is not None:
+                    streamer.put(torch.tensor(step))
+                if criteria:
+                    current = self._output(input_ids, generated, pad)
+                    for criterion in criteria:
+                        stop = criterion(current, None)
+                        stop = stop.tolist() if torch.is_tensor(stop) else [bool(stop)] * rows
+                        if len(stop) == 1 and rows > 1:
+                            stop = stop * rows
+                        active = [a and not s for a, s in zip(active, stop)]
+                if not any(active):
+                    break
+        finally:
+            for generator in generators:
+                generator.close()
+            self._release(contexts)
+            if streamer is not None:
+                streamer.end()
+        return self._output(input_ids, generated, pad)
+
+    @staticmethod
+    def _output(input_ids, generated: list, pad):
+        import torch
+
+        width = max(len(tokens) for tokens in generated)
+        new_tokens = torch.tensor(
+            [tokens + [pad] * (width - len(tokens)) for tokens in generated], dtype=input_ids.dtype
+        ).reshape(len(generated), width)
+        return torch.cat([input_ids, new_tokens], dim=1)
+
+
+def _as_ids(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def load_gguf(llm, config):
+    """Modèle GGUF quantifié (llama.cpp) et tokenizer transformers du même modèle"""
+    from transformers import AutoTokenizer
+
+    model_path = getattr(config, "LLM_GGUF_PATH", "")
+    if not model_path or not os.path.exists(model_path):
+        raise FileNotFoundError(f"Backend gguf: fichier GGUF introuvable ({model_path or 'LLM_GGUF_PATH non défini'})")
+    tokenizer_name = getattr(config, "LLM_GGUF_TOKENIZER", "") or get_llm_model_name(config)
+    if not tokenizer_name:
+        raise ValueError("Backend gguf: définir LLM_GGUF_TOKENIZER (tokenizer transformers du modèle)")
+
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    llm.tokenizer = tokenizer
+    llm.model = LlamaCppModel(
+        model_path,
+        tokenizer,
+        n_ctx=getattr(config, "LLM_GGUF_CTX", 4096),
+        n_threads=getattr(config, "LLM_GGUF_THREADS", 0) or None,
+        slots=max(1, getattr(config, "LLM_BATCH_SIZE", 1)),
+    )
+    print(f"[OK] LLM GGUF chargé ({os.path.basename(model_path)}, {llm.model.slots} contexte(s))")
+
+
+LLM_BACKENDS = {
+    "transformers": load_transformers,
+    "transformers-int8": load_transformers_int8,
+    "gguf": load_gguf,
+}
+
+
+def load_llm_backend(llm, config) -> str:
+    """
+    Charger le modèle de LLMManager avec le backend configuré (LLM_BACKEND)
+
+    Returns:
+        Nom du backend chargé
+
+    Raises:
+        ValueError: Backend inconnu
+    """
+    backend = (getattr(config, "LLM_BACKEND", "") or DEFAULT_BACKEND).lower()
+    loader = LLM_BACKENDS.get(backend)
+    if loader is None:
+        raise ValueError(f"LLM_BACKEND inconnu: {backend} ({', '.join(LLM_BACKENDS)})")
+    loader(llm, config)
+    llm.backend = backend
+    return backend
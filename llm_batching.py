@@ -0,0 +1,296 @@
+"""
+Module LLM Batching - Micro-batching dynamique des générations
+
+Les appels model.generate() concurrents (un par worker du pool d'inférence)
+sont déposés dans une file. Un thread ordonnanceur regroupe les requêtes
+arrivées dans une courte fenêtre (max_wait_ms, au plus max_batch_size),
+complète les prompts par padding à gauche, lance une seule génération
+pour le lot puis rend à chaque appelant sa propre ligne de sortie.
+Streaming et annulation restent individuels (streamer et critère
+d'arrêt répartis par ligne).
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from llm_runtime import _ContextStreamer, _with_stopping_criteria
+
+# Paramètres de génération qui empêchent le regroupement
+_UNBATCHABLE_KWARGS = (
+    "inputs_embeds", "past_key_values", "streamer", "stopping_criteria",
+    "logits_processor", "prefix_allowed_tokens_fn", "assistant_model",
+)
+
+
+class _Request:
+    """Génération en attente dans le lot"""
+
+    __slots__ = ("context", "input_ids", "attention_mask", "kwargs", "key",
+                 "output", "error", "done", "streamer")
+
+    def __init__(self, context, input_ids, attention_mask, kwargs, key):
+        self.context = context
+        self.input_ids = input_ids
+        self.attention_mask = attention_mask
+        self.kwargs = kwargs
+        self.key = key
+        self.output = None
+        self.error = None
+        self.done = threading.Event()
+        self.streamer = None
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+class _BatchStreamer:
+    """Répartit les tokens d'un lot entre les streamers de chaque requête"""
+
+    def __init__(self, requests, eos_token_ids):
+        self.requests = requests
+        self.eos_token_ids = set(eos_token_ids)
+        self.finished = [False] * len(requests)
+        self._prompt_seen = False
+
+    def put(self, value):
+        if not self._prompt_seen:
+            # Premier appel: prompts du lot, transmis sans padding
+            self._prompt_seen = True
+            for request in self.requests:
+                request.streamer.put(request.input_ids)
+            return
+        tokens = value.reshape(-1).tolist()
+        for i, (request, token) in enumerate(zip(self.requests, tokens)):
+            if self.finished[i] or request.context.cancelled.is_set():
+                self.finished[i] = True
+                continue
+            request.streamer.put(value.reshape(-1)[i:i + 1])
+            if token in self.eos_token_ids:
+                self.finished[i] = True
+
+    def end(self):
+        for request in self.requests:
+            request.streamer.end()
+
+
+class GenerationBatcher:
+    """
+    Ordonnanceur de micro-batching pour model.generate()
+
+    Args:
+        generate_fn: model.generate d'origine
+        tokenizer: Tokenizer de LLMManager (décodage du streaming)
+        max_batch_size: Taille maximale d'un lot
+        max_wait_ms: Attente maximale pour compléter un lot
+        pad_token_id: Token de padding (eos par défaut)
+        eos_token_ids: Token(s) de fin de séquence
+    """
+
+    def __init__(self, generate_fn, tokenizer=None, max_batch_size: int = 4,
+                 max_wait_ms: float = 20, pad_token_id=None, eos_token_ids=None):
+        self.generate_fn = generate_fn
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.eos_token_ids = _as_list(eos_token_ids)
+        self.pad_token_id = pad_token_id if pad_token_id is not None else (
+            self.eos_token_ids[0] if self.eos_token_ids else 0
+        )
+        self._batch_sizes = Counter()
+        self._start()
+        # Workers pré-forkés: les threads ne survivent pas au fork
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._deferred = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def for_model(cls, model, generate_fn, tokenizer=None, max_batch_size: int = 4, max_wait_ms: float = 20):
+        """Créer un ordonnanceur à partir de la configuration de génération du modèle"""
+        generation_config = getattr(model, "generation_config", None)
+        eos = getattr(generation_config, "eos_token_id", None)
+        pad = getattr(generation_config, "pad_token_id", None)
+        if pad is None and tokenizer is not None:
+            pad = getattr(tokenizer, "pad_token_id", None)
+        return cls(generate_fn, tokenizer, max_batch_size, max_wait_ms, pad, eos)
+
+    # ---------- côté appelant ----------
+
+    def submit(self, context, args, kwargs):
+        """
+        Générer via le prochain lot
+
+        Returns:
+            Tenseur [1, prompt + nouveaux tokens], ou None si l'appel ne
+            peut pas être regroupé (l'appelant garde le chemin direct)
+        """
+        import torch
+
+        kwargs = dict(kwargs)
+        if args:
+            if "input_ids" in kwargs or len(args) > 1:
+                return None
+            kwargs["input_ids"] = args[0]
+        input_ids = kwargs.pop("input_ids", None)
+        if input_ids is None:
+            input_ids = kwargs.pop("inputs", None)
+        if (
+            input_ids is None or not torch.is_tensor(input_ids) or input_ids.dim() != 2
+            or input_ids.shape[0] != 1 or kwargs.get("return_dict_in_generate")
+            or kwargs.get("num_return_sequences", 1) != 1 or kwargs.get("num_beams", 1) != 1
+            or any(kwargs.get(name) is not None for name in _UNBATCHABLE_KWARGS)
+        ):
+            return None
+
+        attention_mask = kwargs.pop("attention_mask", None)
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        kwargs.pop("pad_token_id", None)
+        key = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+
+        request = _Request(context, input_ids, attention_mask, kwargs, key)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    # ---------- ordonnanceur ----------
+
+    def _next_batch(self):
+        """Attendre une requête puis compléter le lot pendant max_wait"""
+        first = self._deferred.pop(0) if self._deferred else self._queue.get()
+        batch = [first]
+        # Requêtes compatibles déjà mises de côté
+        for request in list(self._deferred):
+            if len(batch) >= self.max_batch_size:
+                break
+            if request.key == first.key:
+                self._deferred.remove(request)
+                batch.append(request)
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request.key == first.key:
+                batch.append(request)
+            else:
+                self._deferred.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # Requêtes abandonnées avant le départ du lot
+            active = []
+            for request in batch:
+                if request.context is not None and request.context.cancelled.is_set():
+                    request.output = request.input_ids
+                    request.done.set()
+                else:
+                    active.append(request)
+            if not active:
+                continue
+            try:
+                self._generate(active)
+            except Exception as e:
+                for request in active:
+                    request.error = e
+            finally:
+                for request in active:
+                    request.done.set()
+
+    def _generate(self, batch):
+        import torch
+
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+
+        max_len = max(r.input_ids.shape[1] for r in batch)
+        pad_lengths = [max_len - r.input_ids.shape[1] for r in batch]
+        input_ids = torch.cat([
+            torch.nn.functional.pad(r.input_ids, (pad, 0), value=self.pad_token_id)
+            for r, pad in zip(batch, pad_lengths)
+        ])
+        attention_mask = torch.cat([
+            torch.nn.functional.pad(r.attention_mask, (pad, 0), value=0)
+            for r, pad in zip(batch, pad_lengths)
+        ])
+
+        contexts = [r.context for r in batch]
+        for request in batch:
+            request.streamer = _ContextStreamer(request.context, self.tokenizer)
+
+        kwargs = dict(batch[0].kwargs)
+        kwargs["pad_token_id"] = self.pad_token_id
+        kwargs["streamer"] = _BatchStreamer(batch, self.eos_token_ids)
+        _with_stopping_criteria(kwargs, _row_cancel_criteria(contexts))
+
+        started = time.perf_counter()
+        for context in contexts:
+            context.generate_started_at = started
+        try:
+            output = self.generate_fn(input_ids=input_ids, attention_mask=attention_mask, **kwargs)
+        finally:
+            finished = time.perf_counter()
+            for context in contexts:
+                context.finished_at = finished
+
+        eos = set(self.eos_token_ids)
+        for i, (request, pad) in enumerate(zip(batch, pad_lengths)):
+            row = output[i, pad:]
+            # Couper le padding ajouté après la fin de séquence de cette ligne
+            prompt_len = request.input_ids.shape[1]
+            generated = row[prompt_len:].tolist()
+            end = len(generated)
+            for position, token in enumerate(generated):
+                if token in eos:
+                    end = position + 1
+                    break
+            request.output = row[:prompt_len + end].unsqueeze(0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            requests = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(1000 * self.max_wait, 2),
+                "batches": batches,
+                "requests": requests,
+                "avg_batch_size": round(requests / batches, 2) if batches else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "queued": self._queue.qsize() + len(self._deferred),
+            }
+
+
+def _row_cancel_criteria(contexts):
+    """Critère d'arrêt par ligne: chaque requête s'annule indépendamment"""
+    import torch
+    from transformers import StoppingCriteria
+
+    class RowCancelCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.tensor(
+                [context is not None and context.cancelled.is_set() for context in contexts],
+                dtype=torch.bool, device=input_ids.device
+            )
+
+    return RowCancelCriteria()
@@ -0,0 +1,334 @@
+"""
+Module LLM Runtime - Contrôle de la génération de LLMManager
+
+LLMManager et QASystem appellent model.generate() (transformers) en interne.
+Ce module remplace generate() sur l'instance du modèle par une version qui
+lit le contexte de génération du thread courant pour :
+- diffuser les tokens au fil de l'eau (streaming)
+- interrompre la génération quand le client abandonne
+- mesurer le time-to-first-token et le débit (tokens/s) de chaque requête
+- réutiliser le cache KV des préfixes de prompt fréquents (prefix_cache.py)
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from observability import span
+
+# Nombre de requêtes conservées pour les statistiques
+STATS_WINDOW = 512
+
+_local = threading.local()
+
+
+class GenerationCancelled(Exception):
+    """Génération abandonnée (client déconnecté)"""
+
+
+class GenerationContext:
+    """
+    État d'une requête de génération
+
+    Args:
+        emit: Callback optionnel emit(kind, data) appelé depuis le thread
+              d'inférence ("sources" puis "token" pour chaque fragment)
+    """
+
+    def __init__(self, emit=None):
+        self.emit_callback = emit
+        self.cancelled = threading.Event()
+        self.started_at = time.perf_counter()
+        self.retrieved_at = None
+        self.generate_started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self.prefix_tokens = 0
+        self.prefill_saved_ms = None
+
+    @property
+    def streaming(self) -> bool:
+        return self.emit_callback is not None
+
+    def emit(self, kind: str, data):
+        if self.emit_callback is not None:
+            self.emit_callback(kind, data)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def on_tokens(self, count: int):
+        if count and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += count
+
+    def metrics(self) -> dict:
+        """Time-to-first-token (depuis l'arrivée de la requête), débit et étapes"""
+        metrics = {"tokens": self.tokens}
+        if self.retrieved_at is not None and self.generate_started_at is not None:
+            # Construction du prompt et tokenisation (entre récupération et génération)
+            metrics["prompt_ms"] = round(1000 * max(0.0, self.generate_started_at - self.retrieved_at), 2)
+        if self.generate_started_at is not None and self.finished_at is not None:
+            metrics["llm_ms"] = round(1000 * (self.finished_at - self.generate_started_at), 2)
+        if self.prefix_tokens:
+            metrics["prefix_tokens"] = self.prefix_tokens
+        if self.prefill_saved_ms is not None:
+            metrics["prefill_saved_ms"] = self.prefill_saved_ms
+        if self.generate_started_at is not None and self.first_token_at is not None:
+            metrics["prefill_ms"] = round(1000 * max(0.0, self.first_token_at - self.generate_started_at), 2)
+        if self.first_token_at is not None:
+            metrics["ttft_ms"] = round(1000 * (self.first_token_at - self.started_at), 2)
+            decode_time = (self.finished_at or time.perf_counter()) - self.first_token_at
+            if decode_time > 0 and self.tokens > 1:
+                metrics["tokens_per_s"] = round((self.tokens - 1) / decode_time, 2)
+        return metrics
+
+
+def current_context():
+    """Contexte de génération du thread courant (ou None)"""
+    return getattr(_local, "context", None)
+
+
+@contextmanager
+def generation_context(context: GenerationContext):
+    """Associer un contexte de génération au thread courant"""
+    previous = current_context()
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = previous
+
+
+# ============ STATISTIQUES ============
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class GenerationStats:
+    """Agrégats TTFT / tokens par seconde sur les dernières requêtes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ttft = deque(maxlen=STATS_WINDOW)
+        self._rates = deque(maxlen=STATS_WINDOW)
+        self.requests = 0
+        self.cancelled = 0
+        self.tokens = 0
+
+    def record(self, context: GenerationContext):
+        metrics = context.metrics()
+        with self._lock:
+            self.requests += 1
+            self.tokens += context.tokens
+            if context.cancelled.is_set():
+                self.cancelled += 1
+            if "ttft_ms" in metrics:
+                self._ttft.append(metrics["ttft_ms"])
+            if "tokens_per_s" in metrics:
+                self._rates.append(metrics["tokens_per_s"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            ttft, rates = list(self._ttft), list(self._rates)
+            return {
+                "requests": self.requests,
+                "cancelled": self.cancelled,
+                "tokens": self.tokens,
+                "ttft_ms": {
+                    "avg": round(sum(ttft) / len(ttft), 2) if ttft else 0.0,
+                    "p95": round(_percentile(ttft, 0.95), 2),
+                },
+                "tokens_per_s": {
+                    "avg": round(sum(rates) / len(rates), 2) if rates else 0.0,
+                },
+            }
+
+
+generation_stats = GenerationStats()
+
+
+# ============ STREAMER / ARRÊT ============
+
+class _ContextStreamer:
+    """
+    Streamer compatible transformers (put/end)
+
+    Le premier put() reçoit le prompt, ignoré. Les suivants reçoivent les
+    nouveaux tokens : ils sont comptés et, en mode streaming, décodés
+    incrémentalement puis émis comme fragments de texte.
+    """
+
+    def __init__(self, context: GenerationContext, tokenizer=None, inner=None):
+        self.context = context
+        self.tokenizer = tokenizer if context.streaming else None
+        self.inner = inner
+        self._prompt_seen = False
+        self._token_cache = []
+        self._printed = 0
+
+    def put(self, value):
+        if self.inner is not None:
+            self.inner.put(value)
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        self.context.on_tokens(int(value.numel()))
+        if self.tokenizer is None:
+            return
+        self._token_cache.extend(value.reshape(-1).tolist())
+        text = self.tokenizer.decode(self._token_cache, skip_special_tokens=True)
+        # Attendre la fin d'un caractère multi-octets avant d'émettre
+        if text.endswith("\ufffd"):
+            return
+        if len(text) > self._printed:
+            self.context.emit("token", text[self._printed:])
+            self._printed = len(text)
+
+    def end(self):
+        if self.inner is not None:
+            self.inner.end()
+
+
+def _cancel_criteria(context: GenerationContext):
+    """StoppingCriteria qui arrête la génération dès l'annulation"""
+    import torch
+    from transformers import StoppingCriteria
+
+    class CancelCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full(
+                (input_ids.shape[0],), context.cancelled.is_set(),
+                dtype=torch.bool, device=input_ids.device
+            )
+
+    return CancelCriteria()
+
+
+def _with_stopping_criteria(kwargs, criteria):
+    from transformers import StoppingCriteriaList
+
+    existing = kwargs.get("stopping_criteria")
+    merged = StoppingCriteriaList(list(existing) if existing else [])
+    merged.append(criteria)
+    kwargs["stopping_criteria"] = merged
+
+
+# ============ PRÉFIXES EN CACHE ============
+
+def _prefix_lookup(prefix_cache, args, kwargs):
+    """Préparer generate() avec le plus long préfixe en cache (une ligne, sans padding)"""
+    if prefix_cache is None or args or kwargs.get("past_key_values") is not None:
+        return None
+    input_ids = kwargs.get("input_ids")
+    attention_mask = kwargs.get("attention_mask")
+    if input_ids is None or input_ids.dim() != 2 or input_ids.shape[0] != 1:
+        return None
+    if attention_mask is not None and not bool(attention_mask.all()):
+        return None
+    with span("llm.prefix_lookup"):
+        lookup = prefix_cache.lookup(input_ids)
+    if lookup.hit:
+        kwargs["past_key_values"] = lookup.cache
+    # Le cache KV de la génération sert à mémoriser les préfixes fréquents
+    kwargs["return_dict_in_generate"] = True
+    return lookup
+
+
+def _prefix_store(prefix_cache, lookup, context, output, return_dict: bool):
+    """Mesurer le préremplissage, mémoriser le préfixe fréquent et rendre la sortie attendue"""
+    if context.first_token_at is not None:
+        context.prefill_saved_ms = prefix_cache.record_prefill(
+            lookup, context.first_token_at - context.generate_started_at
+        )
+    prefix_cache.offer(lookup, getattr(output, "past_key_values", None))
+    if return_dict or not hasattr(output, "sequences"):
+        return output
+    return output.sequences
+
+
+# ============ HOOK SUR LE MODÈLE ============
+
+def install_generation_hook(llm, max_batch_size: int = 1, max_wait_ms: float = 20, prefix_cache=None):
+    """
+    Remplacer model.generate() de LLMManager par la version contrôlée
+
+    Sans contexte de génération actif, l'appel d'origine est inchangé.
+
+    Args:
+        llm: LLMManager dont le modèle est chargé
+        max_batch_size: > 1 active le micro-batching des générations concurrentes
+        max_wait_ms: Attente maximale pour compléter un lot
+        prefix_cache: PrefixCache optionnel (générations non regroupées)
+
+    Returns:
+        GenerationBatcher si le micro-batching est actif, sinon None
+    """
+    model = getattr(llm, "model", None)
+    if model is None:
+        return None
+    if getattr(model, "_rag_generation_hook", False):
+        model._rag_prefix_cache = prefix_cache
+        return getattr(model, "_rag_batcher", None)
+
+    original_generate = model.generate
+    batcher = None
+    if max_batch_size > 1:
+        from llm_batching import GenerationBatcher
+
+        batcher = GenerationBatcher.for_model(
+            model, original_generate, getattr(llm, "tokenizer", None), max_batch_size, max_wait_ms
+        )
+
+    def generate(*args, **kwargs):
+        context = current_context()
+        if context is None:
+            return original_generate(*args, **kwargs)
+        if context.cancelled.is_set():
+            raise GenerationCancelled()
+        with span("llm.generate", batched=batcher is not None):
+            return _generate(context, args, kwargs)
+
+    def _generate(context, args, kwargs):
+        if batcher is not None and kwargs.get("streamer") is None:
+            output = batcher.submit(context, args, kwargs)
+            if output is not None:
+                if context.cancelled.is_set():
+                    raise GenerationCancelled()
+                return output
+
+        kwargs["streamer"] = _ContextStreamer(
+            context, getattr(llm, "tokenizer", None), inner=kwargs.get("streamer")
+        )
+        _with_stopping_criteria(kwargs, _cancel_criteria(context))
+
+        prefix_cache = model._rag_prefix_cache
+        return_dict = kwargs.get("return_dict_in_generate", False)
+        lookup = _prefix_lookup(prefix_cache, args, kwargs)
+        if lookup is not None:
+            context.prefix_tokens = lookup.length
+
+        context.generate_started_at = time.perf_counter()
+        try:
+            output = original_generate(*args, **kwargs)
+        finally:
+            context.finished_at = time.perf_counter()
+        if lookup is not None:
+            output = _prefix_store(prefix_cache, lookup, context, output, return_dict)
+        # Ne pas laisser QASystem sauvegarder une réponse tronquée
+        if context.cancelled.is_set():
+            raise GenerationCancelled()
+        return output
+
+    model.generate = generate
+    model._rag_generation_hook = True
+    model._rag_prefix_cache = prefix_cache
+    model._rag_batcher = batcher
+    return batcher
+
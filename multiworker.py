@@ -0,0 +1,134 @@
+"""
+Module Multi-Worker - Service pré-forké avec état partagé
+
+Le processus maître charge une seule fois le système RAG (embeddings,
+LLM, index Chroma, index BM25), puis fork N workers uvicorn qui écoutent
+sur le même socket. Les poids et les index en lecture seule sont partagés
+en copy-on-write : la mémoire totale croît de l'état propre à chaque
+worker, pas d'une copie complète des modèles.
+
+- gc.freeze() avant le fork : le ramasse-miettes ne réécrit pas les pages
+  partagées des objets chargés par le maître
+- l'index est ouvert (et mis à jour si besoin) par le maître seul, sous le
+  verrou d'écrivain unique (index_manifest.index_writer_lock)
+- chaque worker rouvre sa connexion SQLite et relance ses threads
+  (os.register_at_fork dans QueryEmbedder / GenerationBatcher)
+- un worker qui meurt est relancé par le maître
+
+Linux/macOS uniquement (os.fork) ; sinon, repli sur un seul processus.
+"""
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+RESPAWN_DELAY = 1.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _limit_torch_threads(workers: int):
+    """Répartir les cœurs entre workers (évite la sur-souscription OpenMP)"""
+    threads = int(os.environ.get("WORKER_TORCH_THREADS", 0)) or max(1, (os.cpu_count() or 1) // workers)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    return threads
+
+
+def _run_worker(app, sock: socket.socket, workers: int, after_fork=None, log_level: str = "info"):
+    import uvicorn
+
+    if after_fork is not None:
+        after_fork()
+    threads = _limit_torch_threads(workers)
+    print(f"[OK] Worker {os.getpid()} démarré ({threads} threads torch)")
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def serve_prefork(app, load, workers: int, host: str = "0.0.0.0", port: int = 8001,
+                  after_fork=None, log_level: str = "info"):
+    """
+    Charger le système une fois puis servir avec N workers forkés
+
+    Args:
+        app: Application ASGI
+        load: Chargement complet du système (exécuté dans le maître)
+        workers: Nombre de workers
+        after_fork: Appelé dans chaque worker juste après le fork
+    """
+    import uvicorn
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        if workers > 1:
+            print("[WARNING] os.fork indisponible, démarrage en un seul processus")
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    start = time.perf_counter()
+    load()
+    print(f"[OK] Système chargé par le maître en {time.perf_counter() - start:.1f}s, fork de {workers} workers")
+
+    sock = _bind(host, port)
+    # Objets chargés rendus invisibles au GC: pages partagées non réécrites
+    gc.collect()
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _run_worker(app, sock, workers, after_fork, log_level)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"[WARNING] Worker {pid} arrêté (statut {status}), redémarrage")
+            time.sleep(RESPAWN_DELAY)
+            spawn()
+
+    sock.close()
+    print("[SHUTDOWN] Tous les workers sont arrêtés")
+    sys.exit(0)
@@ -0,0 +1,363 @@
+"""
+Module Observability - Traces par requête et métriques Prometheus
+
+Chaque requête /api/* reçoit un identifiant (en-tête X-Request-ID, repris
+de la requête s'il est fourni). Les étapes du pipeline (file d'inférence,
+cache, embedding, recherche, packing, génération, écritures SQLite) y
+ajoutent des spans : durée, début relatif et attributs. La trace suit la
+requête sur les threads du pool d'inférence (contextvars copiés par
+InferencePool.submit).
+
+À la fin de la requête :
+- les durées alimentent les histogrammes de /api/metrics
+- la trace est journalisée (DEBUG, ou WARNING au-delà de TRACE_SLOW_MS)
+- les dernières traces restent consultables par identifiant
+
+Les métriques sont au format texte Prometheus, sans dépendance externe.
+En mode multi-worker, chaque worker expose ses propres compteurs.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Secondes: de l'embedding en cache (ms) à une génération CPU complète
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+logger = logging.getLogger("legal-ai-api.trace")
+
+_current = contextvars.ContextVar("rag_trace", default=None)
+
+
+# ============ TRACES ============
+
+class Trace:
+    """
+    Spans d'une requête
+
+    Args:
+        request_id: Identifiant renvoyé dans l'en-tête X-Request-ID
+        name: Méthode et chemin de la requête
+    """
+
+    def __init__(self, request_id: str, name: str = ""):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.timestamp = time.time()
+        self.duration = None
+        self.status = None
+        self.spans = []
+
+    def add_span(self, name: str, started_at: float, duration: float, **attrs):
+        span = {
+            "name": name,
+            "start_ms": round(1000 * (started_at - self.started_at), 2),
+            "duration_ms": round(1000 * duration, 2),
+        }
+        if attrs:
+            span["attrs"] = attrs
+        self.spans.append(span)
+
+    def finish(self, status: int = None):
+        self.duration = time.perf_counter() - self.started_at
+        self.status = status
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "status": self.status,
+            "timestamp": self.timestamp,
+            "duration_ms": round(1000 * (self.duration or 0.0), 2),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+        }
+
+
+def current_trace():
+    """Trace de la requête en cours (ou None hors requête)"""
+    return _current.get()
+
+
+def record_span(name: str, started_at: float, duration: float = None, **attrs):
+    """Ajouter un span déjà mesuré (perf_counter) à la trace courante"""
+    trace = _current.get()
+    if trace is not None:
+        if duration is None:
+            duration = time.perf_counter() - started_at
+        trace.add_span(name, started_at, duration, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mesurer un bloc comme span de la trace courante (sans effet hors requête)"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, started_at, time.perf_counter() - started_at, **attrs)
+
+
+class TraceBuffer:
+    """Dernières traces terminées, consultables par identifiant de requête"""
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        if not self.size:
+            return
+        with self._lock:
+            self._traces[trace.request_id] = trace
+            self._traces.move_to_end(trace.request_id)
+            while len(self._traces) > self.size:
+                self._traces.popitem(last=False)
+
+    def get(self, request_id: str):
+        with self._lock:
+            trace = self._traces.get(request_id)
+        return trace.to_dict() if trace else None
+
+
+# ============ MÉTRIQUES ============
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Compteur monotone (par combinaison de labels)"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = defaultdict(float)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif (buckets en secondes)"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = {}
+        self._sums = defaultdict(float)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            counts = self._counts.setdefault(label_values, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[label_values] += value
+
+    def render(self) -> list:
+        with self._lock:
+            snapshot = {key: (list(counts), self._sums[key]) for key, counts in self._counts.items()}
+        lines = self.header()
+        for key, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Valeur instantanée lue au moment du scrape"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn, labels=()):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+
+    def render(self) -> list:
+        try:
+            values = self.fn()
+        except Exception as e:
+            logger.debug("Jauge %s illisible: %s", self.name, e)
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key if isinstance(key, tuple) else (key,))} "
+            f"{_format_value(float(value))}"
+            for key, value in values.items() if value is not None
+        ]
+
+
+class ObservedCounter(Gauge):
+    """Compteur tenu ailleurs (stats() d'un composant), lu au scrape"""
+    kind = "counter"
+
+
+class MetricsRegistry:
+    """Ensemble des métriques exposées par /api/metrics"""
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, fn, labels: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, fn, labels))
+
+    def observed_counter(self, name: str, help_text: str, fn, labels: tuple = ()) -> ObservedCounter:
+        return self._add(ObservedCounter(name, help_text, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ============ MIDDLEWARE ============
+
+class ObservabilityMiddleware:
+    """
+    Middleware ASGI : identifiant de requête, trace et métriques HTTP
+
+    Middleware ASGI pur (pas BaseHTTPMiddleware) : la trace reste active
+    pendant tout le streaming et se termine avec le dernier fragment envoyé.
+
+    Args:
+        app: Application ASGI
+        registry: Registre où créer les métriques HTTP et d'étapes
+        traces: TraceBuffer des dernières traces
+        slow_ms: Durée au-delà de laquelle la trace est journalisée en WARNING
+        prefix: Chemins tracés (les fichiers statiques ne le sont pas)
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, traces: TraceBuffer = None,
+                 slow_ms: float = 0, prefix: str = "/api/"):
+        self.app = app
+        self.traces = traces
+        self.slow = slow_ms / 1000 if slow_ms else None
+        self.prefix = prefix
+        self.requests = registry.counter(
+            "rag_http_requests_total", "Requêtes HTTP par endpoint et statut", ("endpoint", "status"))
+        self.errors = registry.counter(
+            "rag_http_errors_total", "Réponses 5xx et exceptions par endpoint", ("endpoint",))
+        self.latency = registry.histogram(
+            "rag_http_request_duration_seconds", "Durée des requêtes HTTP (streaming inclus)", ("endpoint",))
+        self.stages = registry.histogram(
+            "rag_stage_duration_seconds", "Durée des étapes du pipeline par requête", ("stage",))
+
+    @staticmethod
+    def _request_id(scope) -> str:
+        for name, value in scope.get("headers") or []:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_RE.match(candidate):
+                    return candidate
+        return uuid.uuid4().hex
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(self._request_id(scope), f"{scope['method']} {scope['path']}")
+        token = _current.set(trace)
+        header = (REQUEST_ID_HEADER.lower().encode("latin-1"), trace.request_id.encode("latin-1"))
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # Aussi en cas d'exception ou de client déconnecté pendant le streaming
+            _current.reset(token)
+            self._finish(trace, scope, status)
+
+    def _finish(self, trace: Trace, scope, status: int):
+        trace.finish(status)
+        endpoint = getattr(scope.get("endpoint"), "__name__", None) or "unmatched"
+        self.requests.inc(endpoint, str(status))
+        if status >= 500:
+            self.errors.inc(endpoint)
+        self.latency.observe(trace.duration, endpoint)
+        for item in trace.spans:
+            self.stages.observe(item["duration_ms"] / 1000, item["name"])
+        if self.traces is not None:
+            self.traces.add(trace)
+
+        if self.slow is not None and trace.duration >= self.slow:
+            logger.warning("Requête lente %s", json.dumps(trace.to_dict(), ensure_ascii=False))
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Trace %s", json.dumps(trace.to_dict(), ensure_ascii=False))
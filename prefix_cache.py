@@ -0,0 +1,225 @@
+"""
+Module Prefix Cache - Réutilisation du cache KV des préfixes de prompt
+
+Chaque génération recalcule le prompt complet (préremplissage) : prompt
+système fixe puis, souvent, les mêmes articles en contexte. Ce cache
+conserve l'état clé/valeur d'attention des préfixes fréquents pour que les
+requêtes qui les partagent ne recalculent que la suite :
+- préfixes découpés en blocs de tokens (PREFIX_CACHE_BLOCK_TOKENS) ; un
+  préfixe est mis en cache quand il a été vu PREFIX_CACHE_MIN_HITS fois
+  (prompt système, puis séquences d'articles populaires)
+- état KV extrait de la génération elle-même (aucune passe supplémentaire)
+- LRU bornée en mémoire (PREFIX_CACHE_MAX_MB)
+- temps de préremplissage économisé estimé par requête
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+# Coût moyen d'un token de prompt: moyenne glissante exponentielle
+PREFILL_EWMA = 0.1
+
+
+class _Entry:
+    __slots__ = ("ids", "cache", "nbytes", "hits")
+
+    def __init__(self, ids, cache, nbytes):
+        self.ids = ids
+        self.cache = cache
+        self.nbytes = nbytes
+        self.hits = 0
+
+
+def _cache_nbytes(cache) -> int:
+    """Taille des tenseurs clé/valeur d'un cache transformers"""
+    import torch
+
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (getattr(layer, "keys", None), getattr(layer, "values", None))]
+    else:
+        tensors = list(getattr(cache, "key_cache", [])) + list(getattr(cache, "value_cache", []))
+    return sum(t.numel() * t.element_size() for t in tensors if torch.is_tensor(t))
+
+
+def supports_prefix_cache(model) -> bool:
+    """Modèle transformers (torch) : llama.cpp gère déjà son propre préfixe"""
+    try:
+        import torch
+    except ImportError:
+        return False
+    return isinstance(model, torch.nn.Module) and hasattr(model, "generate")
+
+
+class PrefixLookup:
+    """Résultat d'une recherche : préfixe réutilisé et clés des blocs du prompt"""
+
+    __slots__ = ("ids", "keys", "length", "cache")
+
+    def __init__(self, ids, keys, length=0, cache=None):
+        self.ids = ids
+        self.keys = keys
+        self.length = length
+        self.cache = cache
+
+    @property
+    def hit(self) -> bool:
+        return self.cache is not None
+
+
+class PrefixCache:
+    """
+    Cache LRU d'états KV de préfixes de prompt
+
+    Args:
+        block_tokens: Granularité des préfixes (tokens)
+        max_bytes: Taille maximale des états KV conservés
+        min_hits: Occurrences d'un préfixe avant sa mise en cache
+        track: Nombre de préfixes dont les occurrences sont comptées
+    """
+
+    def __init__(self, block_tokens: int = 32, max_bytes: int = 512 * 1024 * 1024,
+                 min_hits: int = 2, track: int = 8192):
+        self.block_tokens = max(1, block_tokens)
+        self.max_bytes = max_bytes
+        self.min_hits = max(1, min_hits)
+        self.track = max(1, track)
+        self._entries = OrderedDict()
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.lookups = 0
+        self.hits = 0
+        self.reused_tokens = 0
+        self.stored = 0
+        self.evictions = 0
+        self.prefill_ms_per_token = None
+        self.saved_ms = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> "PrefixCache":
+        return cls(
+            block_tokens=getattr(config, "PREFIX_CACHE_BLOCK_TOKENS", 32),
+            max_bytes=getattr(config, "PREFIX_CACHE_MAX_MB", 512) * 1024 * 1024,
+            min_hits=getattr(config, "PREFIX_CACHE_MIN_HITS", 2),
+        )
+
+    def _block_keys(self, ids: tuple) -> list:
+        """(longueur, clé) de chaque préfixe aligné sur un bloc, strictement plus court que le prompt"""
+        keys, key = [], None
+        for end in range(self.block_tokens, len(ids), self.block_tokens):
+            key = hash((key, ids[end - self.block_tokens:end]))
+            keys.append((end, key))
+        return keys
+
+    def lookup(self, input_ids) -> PrefixLookup:
+        """
+        Plus long préfixe en cache du prompt (une ligne, sans padding)
+
+        Returns:
+            PrefixLookup ; .cache est une copie utilisable par generate()
+        """
+        ids = tuple(input_ids.reshape(-1).tolist())
+        keys = self._block_keys(ids)
+        entry = None
+        with self._lock:
+            self.lookups += 1
+            for length, key in reversed(keys):
+                candidate = self._entries.get(key)
+                # Collision de hachage improbable mais vérifiée
+                if candidate is not None and candidate.ids == ids[:length]:
+                    self._entries.move_to_end(key)
+                    candidate.hits += 1
+                    self.hits += 1
+                    self.reused_tokens += length
+                    entry = candidate
+                    break
+        if entry is None:
+            return PrefixLookup(ids, keys)
+        # generate() complète le cache reçu: chaque requête part d'une copie
+        return PrefixLookup(ids, keys, len(entry.ids), copy.deepcopy(entry.cache))
+
+    def offer(self, lookup: PrefixLookup, cache):
+        """
+        Compter les préfixes du prompt et conserver le plus long préfixe fréquent
+
+        Args:
+            lookup: Résultat de lookup() pour ce prompt
+            cache: Cache KV retourné par generate() (prompt + tokens générés)
+        """
+        target = None
+        with self._lock:
+            for length, key in lookup.keys:
+                count = self._seen.pop(key, 0) + 1
+                self._seen[key] = count
+                if count >= self.min_hits and length > lookup.length and key not in self._entries:
+                    target = (length, key)
+            while len(self._seen) > self.track:
+                self._seen.popitem(last=False)
+        if target is None or cache is None or not hasattr(cache, "crop"):
+            return
+        length, key = target
+        excess = cache.get_seq_length() - length
+        if excess < 0:
+            return
+        if excess:
+            # Valeur négative: retirer les derniers tokens (prompt au-delà du préfixe, réponse)
+            cache.crop(-excess)
+        nbytes = _cache_nbytes(cache)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = _Entry(lookup.ids[:length], cache, nbytes)
+            self.bytes += nbytes
+            self.stored += 1
+            while self.bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def record_prefill(self, lookup: PrefixLookup, prefill_s: float):
+        """
+        Mesurer le préremplissage d'une requête et estimer le temps économisé
+
+        Returns:
+            Temps économisé estimé (ms) si un préfixe a été réutilisé, sinon None
+        """
+        with self._lock:
+            # Coût par token mesuré sur les prompts calculés en entier (le coût fixe
+            # d'un appel fausserait l'estimation sur la courte suite d'un préfixe)
+            if not lookup.hit and lookup.ids and prefill_s > 0:
+                per_token = 1000 * prefill_s / len(lookup.ids)
+                if self.prefill_ms_per_token is None:
+                    self.prefill_ms_per_token = per_token
+                else:
+                    self.prefill_ms_per_token += PREFILL_EWMA * (per_token - self.prefill_ms_per_token)
+            if not lookup.hit or self.prefill_ms_per_token is None:
+                return None
+            saved = lookup.length * self.prefill_ms_per_token
+            self.saved_ms += saved
+            return round(saved, 2)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "reused_tokens": self.reused_tokens,
+                "stored": self.stored,
+                "evictions": self.evictions,
+                "prefill_ms_per_token": round(self.prefill_ms_per_token or 0.0, 3),
+                "prefill_saved_ms": round(self.saved_ms, 2),
+            }
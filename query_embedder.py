@@ -0,0 +1,251 @@
+"""
+Module Query Embedder - Service d'embedding partagé
+
+Enveloppe le modèle d'embedding de VectorStoreManager (interface
+Langchain embed_query / embed_documents) pour que la recherche, le cache
+de réponses et l'ingestion partagent un seul modèle par processus :
+- les embed_query concurrents sont regroupés en une seule passe du modèle
+- cache LRU des vecteurs de requêtes, clé = texte normalisé
+- variante quantifiée int8 optionnelle (quantification dynamique CPU)
+- latence d'embedding mesurée par requête
+"""
+import math
+import os
+import queue
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+
+from observability import record_span
+
+STATS_WINDOW = 512
+
+
+def normalize_text(text: str) -> str:
+    """Clé de cache: unicode NFC et espaces normalisés"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def quantize_embeddings_model(embeddings, mode: str) -> bool:
+    """
+    Quantifier le modèle sentence-transformers sous-jacent
+
+    Args:
+        embeddings: Objet Langchain (HuggingFaceEmbeddings) exposant .client
+        mode: "int8" (quantification dynamique des couches Linear)
+
+    Returns:
+        True si le modèle a été quantifié
+    """
+    model = getattr(embeddings, "client", None)
+    if not mode or model is None:
+        return False
+    if mode != "int8":
+        print(f"[WARNING] Quantification d'embedding inconnue: {mode}")
+        return False
+    try:
+        import torch
+
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        embeddings.client = quantized
+        print("[OK] Modèle d'embedding quantifié (int8 dynamique)")
+        return True
+    except Exception as e:
+        print(f"[WARNING] Quantification du modèle d'embedding impossible: {e}")
+        return False
+
+
+class _Pending:
+    __slots__ = ("text", "vector", "error", "done")
+
+    def __init__(self, text):
+        self.text = text
+        self.vector = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class QueryEmbedder:
+    """
+    Embeddings Langchain avec regroupement, cache et mesures
+
+    Args:
+        embeddings: Embeddings Langchain d'origine
+        max_batch_size: Nombre maximal de requêtes par passe du modèle
+        max_wait_ms: Attente maximale pour compléter un lot
+        cache_size: Nombre de vecteurs de requêtes conservés (0 = pas de cache)
+    """
+
+    def __init__(self, embeddings, max_batch_size: int = 32, max_wait_ms: float = 0,
+                 cache_size: int = 4096):
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self.queries = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.documents = 0
+        # Les modèles à instruction de requête n'encodent pas une requête
+        # comme un document: pas de regroupement via embed_documents
+        self._batchable = not (
+            getattr(embeddings, "query_instruction", None)
+            or getattr(embeddings, "query_encode_kwargs", None)
+        )
+        if self._batchable and self.max_batch_size > 1:
+            self._start()
+            # Workers pré-forkés: les threads ne survivent pas au fork
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="query-embedder", daemon=True).start()
+
+    def __getattr__(self, name):
+        # Attributs propres au modèle d'origine (model_name, client, ...)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+    # ---------- mesures par requête ----------
+
+    def reset_timing(self):
+        self._local.elapsed = 0.0
+
+    def elapsed(self) -> float:
+        """Temps d'embedding cumulé du thread courant depuis reset_timing()"""
+        return getattr(self._local, "elapsed", 0.0)
+
+    def _record(self, elapsed: float):
+        self._local.elapsed = self.elapsed() + elapsed
+        with self._lock:
+            self._latencies.append(elapsed)
+
+    # ---------- interface Langchain ----------
+
+    def embed_query(self, text: str) -> list:
+        start = time.perf_counter()
+        key = normalize_text(text)
+        with self._lock:
+            self.queries += 1
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+        if vector is None:
+            vector = self._encode(key)
+            if self.cache_size:
+                with self._lock:
+                    self._cache[key] = vector
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            record_span("embed", start, cached=False)
+        else:
+            record_span("embed", start, cached=True)
+        self._record(time.perf_counter() - start)
+        return list(vector)
+
+    def embed_documents(self, texts: list) -> list:
+        with self._lock:
+            self.documents += len(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def prefetch(self, texts: list, batch_size: int = 64) -> int:
+        """
+        Encoder d'avance des requêtes par lots et les placer dans le cache
+
+        Les embed_query suivants sur ces textes (recherche, cache de
+        réponses) sont servis par le cache.
+
+        Returns:
+            Nombre de requêtes encodées
+        """
+        if not self.cache_size:
+            return 0
+        with self._lock:
+            keys = list(OrderedDict.fromkeys(
+                key for key in map(normalize_text, texts) if key not in self._cache
+            ))
+        # Au-delà de la taille du cache, les premiers vecteurs seraient évincés avant usage
+        keys = keys[:self.cache_size]
+        batch_size = max(1, batch_size)
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            if self._batchable:
+                vectors = self.embeddings.embed_documents(batch)
+            else:
+                vectors = [self.embeddings.embed_query(key) for key in batch]
+            with self._lock:
+                self.batches += 1
+                self.batched_queries += len(batch)
+                for key, vector in zip(batch, vectors):
+                    self._cache[key] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return len(keys)
+
+    # ---------- regroupement ----------
+
+    def _encode(self, text: str):
+        if not self._batchable or self.max_batch_size == 1:
+            return self.embeddings.embed_query(text)
+        pending = _Pending(text)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.vector
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            # Sans attente, on prend ce qui s'est accumulé pendant la passe précédente
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self.embeddings.embed_documents([p.text for p in batch])
+                for pending, vector in zip(batch, vectors):
+                    pending.vector = vector
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                with self._lock:
+                    self.batches += 1
+                    self.batched_queries += len(batch)
+                for pending in batch:
+                    pending.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            p95 = latencies[min(len(latencies) - 1, max(0, math.ceil(0.95 * len(latencies)) - 1))] if latencies else 0.0
+            return {
+                "queries": self.queries,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self._cache),
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+                "documents": self.documents,
+                "latency_ms": {
+                    "avg": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                    "p95": round(1000 * p95, 2),
+                },
+            }
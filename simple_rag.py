@@ -2,7 +2,13 @@
 Module Simple RAG - Wrapper autour du système RAG complet
 Pour compatibilité avec app.py
 """
+import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 
 # Configuration des chemins
@@ -14,7 +20,7 @@ sys.path.insert(0, str(SRC_DIR))
 sys.path.insert(0, str(BACKEND_DIR))
 
 try:
-    from rag.config import RAGConfig
+    from rag.config import RAGConfig as BaseRAGConfig
     from rag.qa_system import QASystem
     from rag.vector_store import VectorStoreManager
     from rag.llm_manager import LLMManager
@@ -23,43 +29,424 @@ except ImportError as e:
     print(f"[WARNING] Erreur import RAG complet: {e}")
     raise
 
+from answer_cache import AnswerCache
+from compact_index import install_compact_backend
+from contract_analysis import ContractAnalyzer
+from context_packer import ContextPacker
+from extractive import ExtractiveAnswerer
+from history_store import HISTORY_SAVE_METHODS, ConcurrentDatabase, HistoryStore, enable_wal
+from hybrid_retrieval import HybridRetriever
+from index_manifest import open_or_build_vectorstore
+from index_snapshot import SnapshotCollection, open_snapshot
+from llm_backends import load_llm_backend, quantize_llm_int8
+from ingestion import DocumentManager, IngestionPipeline
+from query_embedder import QueryEmbedder, quantize_embeddings_model
+from stub_models import StubEmbeddings, apply_stub_config, install_stub_llm
+from observability import record_span, span
+from prefix_cache import PrefixCache, supports_prefix_cache
+from llm_runtime import (
+    GenerationContext, current_context, generation_context, generation_stats,
+    install_generation_hook
+)
+
+
+class RAGConfig(BaseRAGConfig):
+    """
+    Configuration RAG complétée des paramètres de service
+    (surchargeables par variables d'environnement)
+    """
+    
+    # Cache de réponses (exact + sémantique)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))
+    ANSWER_CACHE_MAX_MB = int(os.getenv("ANSWER_CACHE_MAX_MB", 64))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.92))
+    
+    # Service d'embedding des requêtes (regroupement, cache, int8 optionnel)
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+    EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 0))
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 4096))
+    EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "")
+    
+    # Moteur d'inférence du LLM: transformers, transformers-int8 (CPU) ou gguf (llama.cpp)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "transformers").lower()
+    LLM_GGUF_PATH = os.getenv("LLM_GGUF_PATH", "")
+    LLM_GGUF_TOKENIZER = os.getenv("LLM_GGUF_TOKENIZER", "")  # défaut: modèle transformers de la config
+    LLM_GGUF_CTX = int(os.getenv("LLM_GGUF_CTX", 4096))
+    LLM_GGUF_THREADS = int(os.getenv("LLM_GGUF_THREADS", 0))  # 0 = choix de llama.cpp
+    
+    # Micro-batching des générations (1 = désactivé, INFERENCE_WORKERS >= taille de lot)
+    LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 1))
+    LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", 20))
+    
+    # Cache KV des préfixes de prompt fréquents (générations non regroupées)
+    PREFIX_CACHE_ENABLED = os.getenv("PREFIX_CACHE_ENABLED", "true").lower() == "true"
+    PREFIX_CACHE_MAX_MB = int(os.getenv("PREFIX_CACHE_MAX_MB", 512))
+    PREFIX_CACHE_BLOCK_TOKENS = int(os.getenv("PREFIX_CACHE_BLOCK_TOKENS", 32))
+    PREFIX_CACHE_MIN_HITS = int(os.getenv("PREFIX_CACHE_MIN_HITS", 2))
+    
+    # Réponses extractives sans LLM (passages et phrases surlignées)
+    EXTRACTIVE_MAX_PASSAGES = int(os.getenv("EXTRACTIVE_MAX_PASSAGES", 3))
+    EXTRACTIVE_MAX_SENTENCES = int(os.getenv("EXTRACTIVE_MAX_SENTENCES", 2))
+    
+    # Recherche dense: chroma, ou compact (matrice float16/int8 en mmap, exacte ou HNSW)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    COMPACT_DTYPE = os.getenv("COMPACT_DTYPE", "float16").lower()
+    COMPACT_SEARCH = os.getenv("COMPACT_SEARCH", "exact").lower()
+    COMPACT_HNSW_M = int(os.getenv("COMPACT_HNSW_M", 16))
+    COMPACT_HNSW_EF = int(os.getenv("COMPACT_HNSW_EF", 64))
+    COMPACT_HNSW_EF_CONSTRUCTION = int(os.getenv("COMPACT_HNSW_EF_CONSTRUCTION", 100))
+    
+    # Réplica en lecture seule: index chargé depuis un instantané (index_snapshot.py), sans Chroma
+    INDEX_SNAPSHOT = os.getenv("INDEX_SNAPSHOT", "")
+    SNAPSHOT_VERIFY = os.getenv("SNAPSHOT_VERIFY", "true").lower() == "true"
+    
+    # Recherche hybride BM25 + dense (fusion RRF) ou dense seule
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+    HYBRID_K = int(os.getenv("HYBRID_K", 0))  # 0 = RETRIEVAL_K
+    BM25_K = int(os.getenv("BM25_K", 20))
+    RRF_K = int(os.getenv("RRF_K", 60))
+    ARTICLE_LOOKUP = os.getenv("ARTICLE_LOOKUP", "true").lower() == "true"
+    
+    # Préparation du contexte: fusion, déduplication et budget de tokens du prompt
+    CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 1500))  # 0 = pas de limite
+    CONTEXT_DEDUP_SIMILARITY = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", 0.9))
+    
+    # Chargement du LLM en parallèle des embeddings et de l'index
+    STARTUP_PARALLEL = os.getenv("STARTUP_PARALLEL", "true").lower() == "true"
+    
+    # Découpage: fenêtres fixes (CHUNK_SIZE / CHUNK_OVERLAP) ou articles du code (hiérarchie en métadonnées)
+    CHUNKER = os.getenv("CHUNKER", "recursive").lower()
+    ARTICLE_MAX_CHARS = int(os.getenv("ARTICLE_MAX_CHARS", 1500))
+    
+    # Ingestion en flux (startup et /api/documents)
+    INGEST_STREAMING = os.getenv("INGEST_STREAMING", "true").lower() == "true"
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", min(4, os.cpu_count() or 1)))  # 0 = sans pool de processus
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))
+    INGEST_MAX_MB = int(os.getenv("INGEST_MAX_MB", 50))
+    
+    # Historique: écritures groupées hors requête, rétention et compaction
+    HISTORY_ASYNC_WRITES = os.getenv("HISTORY_ASYNC_WRITES", "true").lower() == "true"
+    HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 64))
+    HISTORY_FLUSH_MS = float(os.getenv("HISTORY_FLUSH_MS", 50))
+    HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 0))  # 0 = illimité
+    HISTORY_MAX_ROWS = int(os.getenv("HISTORY_MAX_ROWS", 0))  # 0 = illimité
+    HISTORY_COMPACT_INTERVAL_S = float(os.getenv("HISTORY_COMPACT_INTERVAL_S", 3600))
+    
+    # Questions en masse (/api/ask/batch, batch_ask.py)
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 0))  # 0 = LLM_BATCH_SIZE
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 2000))
+    
+    # Analyse de contrats (/api/analyze): clauses analysées en parallèle sur le pool d'inférence
+    ANALYSIS_MAX_CHARS = int(os.getenv("ANALYSIS_MAX_CHARS", 100000))
+    ANALYSIS_MAX_CLAUSES = int(os.getenv("ANALYSIS_MAX_CLAUSES", 80))
+    ANALYSIS_CLAUSE_MAX_CHARS = int(os.getenv("ANALYSIS_CLAUSE_MAX_CHARS", 2000))
+    ANALYSIS_SOURCES = int(os.getenv("ANALYSIS_SOURCES", 3))
+    ANALYSIS_MAX_NEW_TOKENS = int(os.getenv("ANALYSIS_MAX_NEW_TOKENS", 160))
+    ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 0))  # 0 = INFERENCE_WORKERS
+    
+    # Modèles factices pour les benchmarks hors ligne (index et historique isolés)
+    STUB_MODELS = os.getenv("RAG_STUB_MODELS", "false").lower() == "true"
+    STUB_TOKEN_MS = float(os.getenv("STUB_TOKEN_MS", 20))
+    STUB_EMBED_MS = float(os.getenv("STUB_EMBED_MS", 5))
+    STUB_MAX_NEW_TOKENS = int(os.getenv("STUB_MAX_NEW_TOKENS", 64))
+    STUB_EMBEDDING_DIM = int(os.getenv("STUB_EMBEDDING_DIM", 384))
+
+
+def _phase(startup, name: str):
+    """Phase de démarrage suivie (StartupTracker) ou contexte neutre"""
+    return startup.phase(name) if startup is not None else nullcontext()
+
+
+def build_vector_store(config, startup=None):
+    """
+    Créer le VectorStoreManager avec le service d'embedding partagé
+    et rouvrir l'index persistant
+    
+    Args:
+        config: RAGConfig
+        startup: StartupTracker (durées des phases embeddings / vector_store)
+    
+    Returns:
+        Tuple (vector_store, manifeste de l'index)
+    """
+    with _phase(startup, "embeddings"):
+        vector_store = VectorStoreManager(config)
+        if getattr(config, "STUB_MODELS", False):
+            vector_store.embeddings = StubEmbeddings(config.STUB_EMBEDDING_DIM, config.STUB_EMBED_MS)
+        else:
+            vector_store.initialize_embeddings()
+        
+        # Un seul modèle d'embedding par processus: recherche, cache et ingestion
+        quantize_embeddings_model(vector_store.embeddings, getattr(config, "EMBEDDING_QUANTIZE", ""))
+        vector_store.embeddings = QueryEmbedder(
+            vector_store.embeddings,
+            max_batch_size=getattr(config, "EMBEDDING_BATCH_SIZE", 32),
+            max_wait_ms=getattr(config, "EMBEDDING_BATCH_WAIT_MS", 0),
+            cache_size=getattr(config, "EMBEDDING_CACHE_SIZE", 4096)
+        )
+    
+    # Rouvrir l'index persistant (ré-encode seulement les fichiers modifiés),
+    # ou mapper l'instantané d'un réplica (refusé si le modèle d'embedding diffère)
+    with _phase(startup, "vector_store"):
+        if getattr(config, "INDEX_SNAPSHOT", ""):
+            vector_store.snapshot = open_snapshot(config)
+            vector_store.vectorstore = SnapshotCollection(vector_store.snapshot)
+            return vector_store, vector_store.snapshot.manifest
+        manifest = open_or_build_vectorstore(vector_store, config)
+        if getattr(vector_store, "vectorstore", None) is not None and hasattr(vector_store.vectorstore, "_embedding_function"):
+            vector_store.vectorstore._embedding_function = vector_store.embeddings
+    return vector_store, manifest
+
+
+def open_history_db(config):
+    """Base d'historique en WAL, sûre avec plusieurs workers, écritures en file"""
+    enable_wal(config.DB_PATH)
+    return ConcurrentDatabase(
+        lambda: DatabaseManager(config.DB_PATH),
+        store_factory=lambda: HistoryStore.from_config(config)
+    )
+
+
+def load_llm(config, startup=None):
+    """Charger le LLM (phase llm du démarrage)"""
+    with _phase(startup, "llm"):
+        llm = LLMManager(config)
+        if getattr(config, "STUB_MODELS", False):
+            install_stub_llm(llm, config)
+            # Le LLM factice se quantifie aussi: comparaison des backends hors ligne
+            llm.backend = "stub"
+            if getattr(config, "LLM_BACKEND", "") == "transformers-int8" and quantize_llm_int8(llm):
+                llm.backend = "stub-int8"
+        else:
+            load_llm_backend(llm, config)
+    return llm
+
+
+# ============ RÉSULTAT STRUCTURÉ ============
+
+@dataclass
+class RetrievedChunk:
+    """Chunk effectivement transmis au LLM"""
+    rank: int
+    content: str
+    metadata: dict
+    score: float = None
+    highlights: list = None  # Phrases surlignées (réponses extractives)
+    
+    @property
+    def source(self) -> str:
+        return self.metadata.get('source') or 'Code du travail'
+
+
+@dataclass
+class AskResult:
+    """Réponse, chunks récupérés et temps par étape (ms)"""
+    question: str
+    answer: str
+    chunks: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+
+
+def _to_chunk(rank: int, doc) -> RetrievedChunk:
+    """Normaliser un document Langchain ou un dictionnaire"""
+    if isinstance(doc, dict):
+        metadata = dict(doc.get('metadata') or {})
+        if doc.get('source'):
+            metadata.setdefault('source', doc['source'])
+        content = doc.get('page_content') or doc.get('content', '')
+        score = doc.get('score')
+    else:
+        metadata = dict(getattr(doc, 'metadata', None) or {})
+        content = getattr(doc, 'page_content', '')
+        score = None
+    if score is None:
+        score = metadata.get('score', metadata.get('relevance_score'))
+    return RetrievedChunk(rank=rank, content=content, metadata=metadata, score=score)
+
+
+class RecordingVectorStore:
+    """
+    Proxy du VectorStoreManager qui enregistre ce que QASystem récupère
+    
+    QASystem appelle retrieve() une seule fois par question : le proxy
+    conserve les documents et la durée de cet appel pour le thread courant,
+    ce qui évite une seconde recherche pour construire les sources.
+    Avec un ContextPacker, QASystem reçoit les documents déjà ajustés au
+    budget de tokens.
+    """
+    
+    def __init__(self, vector_store, retrieve_fn=None, packer=None):
+        object.__setattr__(self, '_vector_store', vector_store)
+        object.__setattr__(self, '_retrieve_fn', retrieve_fn or vector_store.retrieve)
+        object.__setattr__(self, '_packer', packer)
+        object.__setattr__(self, '_local', threading.local())
+    
+    def __getattr__(self, name):
+        return getattr(self._vector_store, name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._vector_store, name, value)
+    
+    def start_recording(self):
+        self._local.docs = None
+        self._local.elapsed = 0.0
+        self._local.packing = {}
+    
+    def stop_recording(self):
+        """Retourne (documents, durée en secondes, statistiques de packing) du dernier retrieve()"""
+        docs, elapsed = getattr(self._local, 'docs', None), getattr(self._local, 'elapsed', 0.0)
+        packing = getattr(self._local, 'packing', None) or {}
+        self._local.docs = None
+        return docs or [], elapsed, packing
+    
+    def retrieve(self, *args, **kwargs):
+        start = time.perf_counter()
+        docs = self._retrieve_fn(*args, **kwargs)
+        self._local.elapsed = getattr(self._local, 'elapsed', 0.0) + time.perf_counter() - start
+        record_span("retrieve", start, docs=len(docs))
+        if self._packer is not None:
+            start = time.perf_counter()
+            docs, packing = self._packer.pack(docs)
+            packing["pack_ms"] = round(1000 * (time.perf_counter() - start), 2)
+            self._local.packing = packing
+            record_span("pack", start, docs=len(docs))
+        self._local.docs = docs
+        
+        # En streaming, les sources partent avant le premier token
+        context = current_context()
+        if context is not None:
+            context.retrieved_at = time.perf_counter()
+        if context is not None and context.streaming:
+            context.emit("sources", [_to_chunk(i, doc) for i, doc in enumerate(docs, 1)])
+        return docs
+
 
 class SimpleQASystem:
     """
     Système QA simplifié - Wrapper autour du système RAG complet
     """
     
-    def __init__(self):
-        """Initialiser le système RAG simplifié"""
+    def __init__(self, config=None, vector_store=None, llm=None, db=None, startup=None):
+        """
+        Initialiser le système RAG simplifié
+        
+        Args:
+            config: RAGConfig (créée si absente)
+            vector_store, llm, db: Composants déjà initialisés (optionnels)
+            startup: StartupTracker (état et durée de chargement par composant)
+        """
         try:
             # Configuration
-            self.config = RAGConfig()
+            self.config = config or RAGConfig()
+            if config is None and getattr(self.config, "STUB_MODELS", False):
+                apply_stub_config(self.config)
+            self.index_manifest = None
+            
+            # LLM chargé en arrière-plan pendant l'ouverture de l'index
+            llm_future = None
+            if llm is None and getattr(self.config, "STARTUP_PARALLEL", False):
+                loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-loader")
+                llm_future = loader.submit(load_llm, self.config, startup)
+                loader.shutdown(wait=False)
             
             # Vector Store
-            self.vector_store = VectorStoreManager(self.config)
-            self.vector_store.initialize_embeddings()
+            if vector_store is None:
+                vector_store, self.index_manifest = build_vector_store(self.config, startup)
+            self.vector_store = vector_store
+            embeddings = getattr(self.vector_store, "embeddings", None)
+            self.query_embedder = embeddings if isinstance(embeddings, QueryEmbedder) else None
             
-            # Charger ou créer le vector store
-            documents = self.vector_store.load_documents(self.config.CLEANED_DIR)
-            if documents:
-                chunks = self.vector_store.chunk_documents(documents)
-                self.vector_store.create_vectorstore(chunks)
-            else:
-                print("[WARNING] Aucun document a traiter, continuant sans vector store")
-                self.vector_store.vectorstore = None
+            # Database
+            if db is None:
+                with _phase(startup, "db"):
+                    db = open_history_db(self.config)
+            self.db = db
             
             # LLM
-            self.llm = LLMManager(self.config)
-            self.llm.load_model()
+            if llm_future is not None:
+                llm = llm_future.result()
+            elif llm is None:
+                llm = load_llm(self.config, startup)
+            self.llm = llm
+            self.prefix_cache = None
+            if getattr(self.config, "PREFIX_CACHE_ENABLED", False) and supports_prefix_cache(self.llm.model):
+                self.prefix_cache = PrefixCache.from_config(self.config)
+            self.batcher = install_generation_hook(
+                self.llm,
+                max_batch_size=getattr(self.config, "LLM_BATCH_SIZE", 1),
+                max_wait_ms=getattr(self.config, "LLM_BATCH_WAIT_MS", 20),
+                prefix_cache=self.prefix_cache
+            )
             
-            # Database
-            self.db = DatabaseManager(self.config.DB_PATH)
+            # Index compact: remplace la recherche dense avant que les autres composants la capturent
+            # (toujours actif sur un réplica démarré depuis un instantané)
+            self.compact_index = None
+            snapshot = getattr(self.vector_store, "snapshot", None)
+            if snapshot is not None or getattr(self.config, "VECTOR_BACKEND", "chroma") == "compact":
+                self.compact_index = install_compact_backend(self.vector_store, self.config, snapshot=snapshot)
             
-            # QA System
-            self.qa_system = QASystem(self.vector_store, self.llm, self.db)
+            # Recherche hybride BM25 + dense (index BM25 synchronisé avec le manifeste)
+            self.hybrid = None
+            if getattr(self.config, "RETRIEVAL_MODE", "dense") == "hybrid":
+                self.hybrid = HybridRetriever.from_config(self.vector_store, self.config)
             
-            print("[OK] SimpleQASystem initialisé avec succès")
+            # Contexte du prompt ajusté au budget de tokens (tokenizer du LLM)
+            self.packer = None
+            if getattr(self.config, "CONTEXT_PACKING", False):
+                self.packer = ContextPacker(
+                    tokenizer=getattr(self.llm, "tokenizer", None),
+                    max_tokens=self.config.CONTEXT_MAX_TOKENS,
+                    dedup_similarity=self.config.CONTEXT_DEDUP_SIMILARITY
+                )
+            
+            # QA System (retrieve() enregistré pour réutiliser les sources)
+            self.retriever = RecordingVectorStore(
+                self.vector_store, self.hybrid.retrieve if self.hybrid else None, self.packer
+            )
+            self.qa_system = QASystem(self.retriever, self.llm, self.db)
+            
+            # Réponses extractives: même recherche, sans passer par le LLM
+            self.extractive = ExtractiveAnswerer.from_config(
+                self.hybrid.retrieve if self.hybrid else self.vector_store.retrieve,
+                self.config,
+                idf_fn=self.hybrid.idf if self.hybrid else None
+            )
             
+            # Analyse de contrats clause par clause: même recherche, prompt dédié
+            self.analyzer = ContractAnalyzer.from_config(
+                self.hybrid.retrieve if self.hybrid else self.vector_store.retrieve,
+                self.llm,
+                self.config,
+                query_embedder=self.query_embedder,
+                packer=self.packer
+            )
+            
+            # Cache de réponses (invalidé quand l'index change)
+            self.answer_cache = None
+            if getattr(self.config, "ANSWER_CACHE_ENABLED", False):
+                embeddings = getattr(self.vector_store, "embeddings", None)
+                semantic = embeddings is not None and self.config.ANSWER_CACHE_SIMILARITY < 1
+                self.answer_cache = AnswerCache(
+                    embed_fn=embeddings.embed_query if semantic else None,
+                    similarity_threshold=self.config.ANSWER_CACHE_SIMILARITY,
+                    max_entries=self.config.ANSWER_CACHE_SIZE,
+                    ttl=self.config.ANSWER_CACHE_TTL,
+                    max_bytes=self.config.ANSWER_CACHE_MAX_MB * 1024 * 1024
+                )
+            self.set_index_manifest(self.index_manifest)
+            
+            # Ajout / remplacement / suppression de documents sans redémarrage
+            self.documents = DocumentManager(
+                self,
+                IngestionPipeline.from_config(self.config),
+                max_bytes=getattr(self.config, "INGEST_MAX_MB", 50) * 1024 * 1024
+            )
+            
+            print("[OK] SimpleQASystem initialisé avec succès")
+        
         except Exception as e:
             print(f"[ERROR] Erreur initialisation SimpleQASystem: {e}")
             raise
@@ -84,6 +471,163 @@ class SimpleQASystem:
             print(f"[ERROR] Erreur lors de la réponse: {e}")
             raise
     
+    def set_index_manifest(self, manifest):
+        """Enregistrer le manifeste de l'index actif (invalide le cache si changé)"""
+        self.index_manifest = manifest
+        if self.compact_index is not None:
+            self.compact_index.update(manifest)
+        if self.hybrid is not None:
+            self.hybrid.update(manifest)
+        if self.answer_cache is not None:
+            self.answer_cache.set_index_version(manifest.fingerprint() if manifest else None)
+    
+    def save_history(self, question: str, answer: str) -> bool:
+        """Enregistrer une question/réponse calculée hors de QASystem.ask"""
+        for name in HISTORY_SAVE_METHODS:
+            method = getattr(self.db, name, None)
+            if callable(method):
+                method(question, answer)
+                return True
+        print("[WARNING] DatabaseManager: aucune méthode d'enregistrement d'historique trouvée")
+        return False
+    
+    def ask_cached(self, question: str, save: bool = True) -> AskResult | None:
+        """
+        Réponse du cache de réponses, sans récupération ni génération
+        
+        Returns:
+            AskResult, ou None si la question n'est pas en cache
+        """
+        if self.answer_cache is None:
+            return None
+        start = time.perf_counter()
+        if self.query_embedder is not None:
+            self.query_embedder.reset_timing()
+        with span("cache.lookup"):
+            lookup = self.answer_cache.lookup(question)
+        if not lookup.hit:
+            return None
+        return self._cached_answer(question, lookup, save, GenerationContext(), start)
+    
+    def _cached_answer(self, question: str, lookup, save: bool, context: GenerationContext, start: float) -> AskResult:
+        """Servir une réponse depuis le cache"""
+        result = lookup.result
+        if context.streaming:
+            context.emit("sources", result.chunks)
+            context.emit("token", result.answer)
+        if save:
+            self.save_history(question, result.answer)
+        timings = {"cache": lookup.tier, "total_ms": round(1000 * (time.perf_counter() - start), 2)}
+        if self.query_embedder is not None:
+            timings["embed_ms"] = round(1000 * self.query_embedder.elapsed(), 2)
+        return replace(result, question=question, timings=timings)
+    
+    def ask_detailed(self, question: str, save: bool = True, context: GenerationContext = None,
+                     use_cache: bool = True) -> AskResult:
+        """
+        Répondre à une question en une seule passe de récupération
+        
+        Args:
+            question: La question posée
+            save: Sauvegarder dans l'historique
+            context: Contexte de génération (streaming, annulation)
+            use_cache: Consulter le cache de réponses
+        
+        Returns:
+            AskResult avec la réponse, les chunks vus par le LLM et les temps
+        
+        Raises:
+            GenerationCancelled: Si le contexte a été annulé
+        """
+        context = context or GenerationContext()
+        start = time.perf_counter()
+        if self.query_embedder is not None:
+            self.query_embedder.reset_timing()
+        if hasattr(self.db, "reset_timing"):
+            self.db.reset_timing()
+        
+        lookup = None
+        if use_cache and self.answer_cache is not None:
+            with span("cache.lookup"):
+                lookup = self.answer_cache.lookup(question)
+            if lookup.hit:
+                return self._cached_answer(question, lookup, save, context, start)
+        
+        # Embeddings déjà calculés (cache sémantique) avant la récupération
+        embed_before = self.query_embedder.elapsed() if self.query_embedder is not None else 0.0
+        self.retriever.start_recording()
+        try:
+            with generation_context(context), span("qa.ask"):
+                answer = self.qa_system.ask(question, verbose=False, debug=False, save=save)
+        finally:
+            docs, retrieve_time, packing = self.retriever.stop_recording()
+            generation_stats.record(context)
+        if context.retrieved_at is not None and context.generate_started_at is not None:
+            # Construction du prompt par QASystem (entre récupération et génération)
+            record_span("prompt", context.retrieved_at, context.generate_started_at - context.retrieved_at)
+        total = time.perf_counter() - start
+        
+        timings = {
+            "retrieve_ms": round(1000 * retrieve_time, 2),
+            "generate_ms": round(1000 * (total - retrieve_time), 2),
+            "total_ms": round(1000 * total, 2),
+        }
+        if self.query_embedder is not None:
+            timings["embed_ms"] = round(1000 * self.query_embedder.elapsed(), 2)
+            retrieve_embed = self.query_embedder.elapsed() - embed_before
+            timings["search_ms"] = round(1000 * max(0.0, retrieve_time - retrieve_embed), 2)
+        if hasattr(self.db, "elapsed"):
+            timings["db_ms"] = round(1000 * self.db.elapsed(), 2)
+        timings.update(packing)
+        timings.update(context.metrics())
+        result = AskResult(
+            question=question,
+            answer=answer,
+            chunks=[_to_chunk(i, doc) for i, doc in enumerate(docs, 1)],
+            timings=timings
+        )
+        if lookup is not None:
+            self.answer_cache.store(lookup, result)
+        return result
+    
+    def ask_extractive(self, question: str, save: bool = True, reason: str = "requested") -> AskResult:
+        """
+        Réponse extractive: passages récupérés et phrases surlignées, sans LLM
+        
+        Args:
+            question: La question posée
+            save: Sauvegarder dans l'historique
+            reason: Origine (requested, slo, queue_full) pour les statistiques
+        
+        Returns:
+            AskResult (timings["mode"] = "extractive", surlignages dans chunk.highlights)
+        """
+        start = time.perf_counter()
+        if self.query_embedder is not None:
+            self.query_embedder.reset_timing()
+        with span("extractive.retrieve"):
+            docs = self.extractive.retrieve_fn(question) or []
+        retrieved_at = time.perf_counter()
+        with span("extractive.highlight"):
+            answer, docs, highlights = self.extractive.answer(question, docs)
+        chunks = [_to_chunk(i, doc) for i, doc in enumerate(docs, 1)]
+        for chunk, spans in zip(chunks, highlights):
+            chunk.highlights = spans
+        if save:
+            self.save_history(question, answer)
+        total = time.perf_counter() - start
+        self.extractive.record(reason, total)
+        timings = {
+            "mode": "extractive",
+            "reason": reason,
+            "retrieve_ms": round(1000 * (retrieved_at - start), 2),
+            "extract_ms": round(1000 * (total - (retrieved_at - start)), 2),
+            "total_ms": round(1000 * total, 2),
+        }
+        if self.query_embedder is not None:
+            timings["embed_ms"] = round(1000 * self.query_embedder.elapsed(), 2)
+        return AskResult(question=question, answer=answer, chunks=chunks, timings=timings)
+    
     def answer(self, question: str, verbose: bool = False) -> dict:
         """
         Répondre à une question avec sources
@@ -96,21 +640,16 @@ class SimpleQASystem:
             Dict avec la réponse et les sources
         """
         try:
-            answer = self.ask(question, verbose=verbose)
-            
-            # Récupérer les sources
-            if self.vector_store.vectorstore:
-                relevant_docs = self.vector_store.retrieve(question)
-                sources = [doc.metadata.get('source', 'Unknown') for doc in relevant_docs]
-            else:
-                sources = []
+            result = self.ask_detailed(question)
+            sources = [chunk.metadata.get('source', 'Unknown') for chunk in result.chunks]
             
             return {
                 "success": True,
                 "question": question,
-                "answer": answer,
+                "answer": result.answer,
                 "sources": sources,
-                "source_count": len(sources)
+                "source_count": len(sources),
+                "timings": result.timings
             }
         except Exception as e:
             print(f"[ERROR] Erreur lors de la réponse: {e}")
@@ -128,5 +667,11 @@ class SimpleQASystem:
             "status": "ok",
             "rag_ready": self.qa_system is not None,
             "llm_available": self.llm.model is not None,
-            "vectorstore": self.vector_store.vectorstore is not None
+            "llm_backend": getattr(self.llm, "backend", None),
+            "vectorstore": self.vector_store.vectorstore is not None,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "embeddings": self.query_embedder.stats() if self.query_embedder else None,
+            "retrieval": self.hybrid.stats() if self.hybrid else {"mode": "dense"},
+            "vector_index": self.compact_index.stats() if self.compact_index else {"backend": "chroma"},
+            "context": self.packer.stats() if self.packer else None
         }
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Module Startup Phases - Démarrage progressif du système RAG
+
+Le serveur accepte les connexions immédiatement ; les modules lourds
+(torch, transformers, langchain, chromadb) et les modèles sont chargés
+en arrière-plan, phase par phase. Chaque composant (imports, embeddings,
+vector store, LLM, base de données) a un état et une durée de chargement,
+exposés par /api/ready. Les durées du dernier démarrage réussi sont
+conservées pour estimer le temps restant pendant le warm-up.
+
+Profil du temps d'import (suivi des régressions de démarrage):
+    python startup_phases.py
+    python startup_phases.py --output import_profile.json
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+PROFILE_PATH = Path(os.getenv("STARTUP_PROFILE_PATH", BASE_DIR / "startup_profile.json"))
+
+COMPONENTS = ("imports", "embeddings", "vector_store", "llm", "db")
+
+# Modules lourds, importés dans cet ordre (chaque durée exclut les précédents)
+HEAVY_MODULES = (
+    "numpy", "torch", "transformers", "sentence_transformers", "langchain_core",
+    "chromadb", "langchain_chroma", "rag.config", "rag.vector_store",
+    "rag.llm_manager", "rag.qa_system", "rag.database", "simple_rag",
+)
+
+# Estimations (s) utilisées avant le premier démarrage réussi
+DEFAULT_DURATIONS = {"imports": 15.0, "embeddings": 10.0, "vector_store": 5.0, "llm": 60.0, "db": 0.5}
+
+
+def profile_imports(modules=HEAVY_MODULES) -> dict:
+    """
+    Importer les modules un par un en mesurant chaque import
+
+    Returns:
+        Dict module -> durée en ms (None si le module est absent)
+    """
+    profile = {}
+    for name in modules:
+        already_loaded = name in sys.modules
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            profile[name] = 0.0 if already_loaded else round(1000 * (time.perf_counter() - start), 1)
+        except ImportError:
+            profile[name] = None
+    return profile
+
+
+class StartupTracker:
+    """
+    État des phases de démarrage
+
+    Args:
+        components: Noms des composants suivis
+        profile_path: Fichier des durées du dernier démarrage réussi
+    """
+
+    def __init__(self, components=COMPONENTS, profile_path: Path = PROFILE_PATH):
+        self.profile_path = Path(profile_path)
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.imports = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._components = {
+            name: {"status": "pending", "duration_s": None, "error": None, "_start": None}
+            for name in components
+        }
+        self._expected = dict(DEFAULT_DURATIONS)
+        self._expected.update(self._load_profile())
+
+    def _load_profile(self) -> dict:
+        try:
+            with open(self.profile_path, "r", encoding="utf-8") as f:
+                return {k: float(v) for k, v in json.load(f).get("durations", {}).items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_profile(self):
+        durations = {
+            name: state["duration_s"] for name, state in self._components.items()
+            if state["status"] == "ready" and state["duration_s"] is not None
+        }
+        try:
+            tmp_path = self.profile_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"durations": durations, "imports_ms": self.imports,
+                           "total_s": self.elapsed()}, f, indent=2)
+            os.replace(tmp_path, self.profile_path)
+        except OSError as e:
+            print(f"[WARNING] Profil de démarrage non enregistré: {e}")
+
+    # ---------- phases ----------
+
+    @contextmanager
+    def phase(self, name: str):
+        """Marquer le chargement d'un composant"""
+        with self._lock:
+            state = self._components.setdefault(
+                name, {"status": "pending", "duration_s": None, "error": None, "_start": None}
+            )
+            state["status"] = "loading"
+            state["_start"] = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                state["status"] = "failed"
+                state["error"] = str(e)
+                state["duration_s"] = round(time.perf_counter() - state["_start"], 3)
+            raise
+        with self._lock:
+            state["status"] = "ready"
+            state["duration_s"] = round(time.perf_counter() - state["_start"], 3)
+        print(f"[OK] Démarrage: {name} prêt en {state['duration_s']:.2f}s")
+
+    def run_imports(self, modules=HEAVY_MODULES):
+        """Phase d'import des modules lourds, avec profil par module"""
+        with self.phase("imports"):
+            self.imports = profile_imports(modules)
+        slowest = sorted(
+            ((ms, name) for name, ms in self.imports.items() if ms), reverse=True
+        )[:3]
+        if slowest:
+            print("[INFO] Imports les plus lents: " + ", ".join(f"{name} {ms:.0f}ms" for ms, name in slowest))
+
+    def mark_ready(self):
+        self.finished_at = time.time()
+        self._ready.set()
+        self._save_profile()
+
+    def mark_failed(self, error):
+        self.error = str(error)
+        self.finished_at = time.time()
+
+    # ---------- état ----------
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def elapsed(self) -> float:
+        return round((self.finished_at or time.time()) - self.started_at, 3)
+
+    def _remaining(self, name: str, now: float) -> float:
+        state = self._components[name]
+        expected = self._expected.get(name, 0.0)
+        if state["status"] == "pending":
+            return expected
+        if state["status"] == "loading":
+            return max(0.0, expected - (now - state["_start"]))
+        return 0.0
+
+    def eta(self) -> float:
+        """Temps restant estimé (s) d'après le dernier démarrage réussi"""
+        if self.ready or self.failed:
+            return 0.0
+        now = time.perf_counter()
+        with self._lock:
+            remaining = {name: self._remaining(name, now) for name in self._components}
+        # Le LLM charge en parallèle des embeddings, de l'index et de la base
+        llm = remaining.pop("llm", 0.0)
+        imports = remaining.pop("imports", 0.0)
+        return round(imports + max(llm, sum(remaining.values())), 1)
+
+    def state(self) -> dict:
+        with self._lock:
+            components = {
+                name: {k: v for k, v in state.items() if not k.startswith("_")}
+                for name, state in self._components.items()
+            }
+        if self.ready:
+            status = "ready"
+        elif self.failed:
+            status = "failed"
+        else:
+            status = "starting"
+        return {
+            "status": status,
+            "ready": self.ready,
+            "elapsed_s": self.elapsed(),
+            "eta_s": self.eta(),
+            "error": self.error,
+            "components": components,
+            "imports_ms": self.imports,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil du temps d'import des modules lourds")
+    parser.add_argument("--output", type=Path, default=None, help="Fichier JSON de résultats")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BASE_DIR / "backend" / "src"))
+    sys.path.insert(0, str(BASE_DIR / "backend"))
+    sys.path.insert(0, str(BASE_DIR))
+
+    start = time.perf_counter()
+    profile = profile_imports()
+    total = round(1000 * (time.perf_counter() - start), 1)
+
+    print(f"\n{'module':<24} {'ms':>10}")
+    for name, ms in profile.items():
+        print(f"{name:<24} {'absent' if ms is None else ms:>10}")
+    print(f"{'total':<24} {total:>10}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"imports_ms": profile, "total_ms": total}, f, indent=2)
+        print(f"\n[OK] Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Module Stub Models - Modèles factices pour les benchmarks hors ligne
+
+Avec RAG_STUB_MODELS=true, le système complet (API, pool d'inférence,
+Chroma, QASystem, historique) tourne sans télécharger ni charger les
+vrais modèles :
+- embeddings : hachage de mots et de trigrammes de caractères (déterministe)
+- LLM : petit Llama à poids aléatoires, tokenizer octet par octet, latence
+  par token configurable (STUB_TOKEN_MS)
+
+L'index, le manifeste et l'historique sont isolés dans des chemins "_stub"
+pour ne jamais toucher aux données réelles. Les réponses n'ont aucun sens :
+seuls les temps et le comportement sous charge sont représentatifs.
+"""
+import hashlib
+import math
+import re
+import time
+from pathlib import Path
+
+from index_manifest import get_persist_dir
+
+STUB_EMBEDDING_MODEL = "stub-hash"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def apply_stub_config(config):
+    """Isoler l'index et l'historique du mode factice"""
+    persist_dir = get_persist_dir(config)
+    stub_dir = str(persist_dir.parent / f"{persist_dir.name}_stub")
+    names = [n for n in ("CHROMA_DIR", "PERSIST_DIRECTORY", "VECTOR_DB_DIR", "CHROMA_PATH") if getattr(config, n, None)]
+    for name in names or ["CHROMA_DIR"]:
+        setattr(config, name, stub_dir)
+    db_path = Path(config.DB_PATH)
+    config.DB_PATH = str(db_path.with_name(f"{db_path.stem}_stub{db_path.suffix}"))
+    config.EMBEDDING_MODEL = f"{STUB_EMBEDDING_MODEL}-{getattr(config, 'STUB_EMBEDDING_DIM', 384)}"
+    config.EMBEDDING_QUANTIZE = ""
+    print(f"[INFO] Modèles factices: index {stub_dir}, historique {config.DB_PATH}")
+
+
+class StubEmbeddings:
+    """
+    Embeddings Langchain factices (interface embed_query / embed_documents)
+
+    Args:
+        dim: Dimension des vecteurs
+        latency_ms: Temps simulé par passe du modèle
+    """
+
+    def __init__(self, dim: int = 384, latency_ms: float = 0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.model_name = f"{STUB_EMBEDDING_MODEL}-{dim}"
+
+    def _vector(self, text: str) -> list:
+        vector = [0.0] * self.dim
+        words = _WORD_RE.findall(text.lower())
+        features = words + [w[i:i + 3] for w in words for i in range(max(1, len(w) - 2))]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+def _byte_tokenizer():
+    """Tokenizer octet par octet construit en mémoire (aucun téléchargement)"""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    alphabet = pre_tokenizers.ByteLevel.alphabet()
+    vocab = {char: i for i, char in enumerate(sorted(alphabet))}
+    tokenizer = Tokenizer(models.BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer)
+    fast.add_special_tokens({"bos_token": "<s>", "eos_token": "</s>", "pad_token": "<pad>"})
+    fast.chat_template = (
+        "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}"
+        "{% if add_generation_prompt %}assistant: {% endif %}"
+    )
+    return fast
+
+
+def install_stub_llm(llm, config):
+    """
+    Installer un petit Llama aléatoire dans un LLMManager (sans load_model())
+
+    STUB_TOKEN_MS simule le temps de décodage par token ; STUB_MAX_NEW_TOKENS
+    borne la longueur des réponses (un modèle aléatoire n'émet presque jamais eos).
+    """
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM, StoppingCriteria, StoppingCriteriaList
+
+    tokenizer = _byte_tokenizer()
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=4,
+        max_position_embeddings=8192, bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id, pad_token_id=tokenizer.pad_token_id,
+    )).eval()
+
+    token_delay = getattr(config, "STUB_TOKEN_MS", 0) / 1000
+    max_new_tokens = getattr(config, "STUB_MAX_NEW_TOKENS", 64)
+
+    class TokenDelay(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            time.sleep(token_delay)
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+    original_generate = model.generate
+
+    def generate(*args, **kwargs):
+        kwargs["max_new_tokens"] = min(kwargs.get("max_new_tokens") or max_new_tokens, max_new_tokens)
+        kwargs.pop("max_length", None)
+        if token_delay:
+            criteria = StoppingCriteriaList(kwargs.get("stopping_criteria") or [])
+            criteria.append(TokenDelay())
+            kwargs["stopping_criteria"] = criteria
+        with torch.no_grad():
+            return original_generate(*args, **kwargs)
+
+    model.generate = generate
+    llm.model = model
+    llm.tokenizer = tokenizer
+    print(f"[OK] LLM factice installé ({token_delay * 1000:.0f} ms/token, {max_new_tokens} tokens max)")
+    return llm
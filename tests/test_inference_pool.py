@@ -0,0 +1,91 @@
+"""Tests de la file d'admission d'InferencePool"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inference_pool import InferencePool, QueueFullError  # noqa: E402
+
+
+def test_cancelled_queued_call_releases_its_slot():
+    pool = InferencePool(workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def scenario():
+        blocker = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(pool.run(lambda: "never"))
+        await asyncio.sleep(0.05)
+        assert pool.stats()["queue_depth"] == 1
+
+        # Client parti pendant que l'appel attend un worker
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert pool.stats()["queue_depth"] == 0
+        assert pool.stats()["cancelled"] == 1
+
+        release.set()
+        await blocker
+
+    try:
+        asyncio.run(scenario())
+        stats = pool.stats()
+        assert stats["queue_depth"] == 0 and stats["running"] == 0
+        assert pool.estimated_wait() == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_capacity_is_restored_after_cancellations():
+    pool = InferencePool(workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def scenario():
+        blocker = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        for _ in range(5):
+            waiting = [asyncio.ensure_future(pool.run(lambda: None)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for task in waiting:
+                task.cancel()
+            await asyncio.gather(*waiting, return_exceptions=True)
+        # Les deux places de la file sont de nouveau disponibles
+        futures = [pool.submit(lambda: 1) for _ in range(2)]
+        try:
+            pool.submit(lambda: 1)
+            raise AssertionError("QueueFullError attendue")
+        except QueueFullError:
+            pass
+        release.set()
+        await blocker
+        assert [await asyncio.wrap_future(f) for f in futures] == [1, 1]
+
+    try:
+        asyncio.run(scenario())
+        assert pool.stats()["queue_depth"] == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_estimated_wait_counts_only_remaining_time_of_running_calls():
+    pool = InferencePool(workers=1, max_queue=2)
+    release = threading.Event()
+    try:
+        pool.submit(time.sleep, 0.2).result()
+        pool.submit(release.wait)
+        time.sleep(0.15)
+        # Appel en cours depuis 0.15s pour une durée moyenne de 0.2s
+        assert pool.estimated_wait() < 0.1
+        time.sleep(0.1)
+        # Génération plus longue que la moyenne, file vide: pas d'attente estimée
+        assert pool.estimated_wait() == 0
+        pool.submit(lambda: None)
+        assert 0.15 < pool.estimated_wait() < 0.3
+    finally:
+        release.set()
+        pool.shutdown()